@@ -0,0 +1,134 @@
+#!/bin/env python3
+import sys
+def eprint(*args, **kwargs): print(*args, file=sys.stderr, **kwargs)
+
+import os
+import re
+import time
+import cProfile
+import contextlib
+import resource
+import threading
+from datetime import datetime
+
+
+class ARAXActionProfiler:
+    """
+    Measures what each ARAXi action run by ARAXQuery.executeProcessingPlan() costs: wall and CPU time, growth of the
+    process's peak resident set size, and the numbers of knowledge graph nodes and edges and of results before and after
+    it. The stats are kept in the envelope's query_options['action_stats'] as they are collected.
+
+    Profiling is opt-in: if the ARAX_PROFILE_DIR environment variable names a directory, each action is also run under
+    cProfile, and for queries that take longer than ARAX_PROFILE_THRESHOLD_SECONDS (default 30) the profiles are dumped
+    there as pstats files, one per action. Sampling profilers like py-spy need no hook: the start_datetime, pid and
+    thread_id in the stats tell which part of a `py-spy record --pid` trace belongs to which action.
+    """
+
+    def __init__(self, start_time=None, profile_dir=None, profile_threshold_seconds=None):
+        self.start_time = start_time if start_time is not None else time.time()
+        self.profile_dir = profile_dir if profile_dir is not None else os.environ.get('ARAX_PROFILE_DIR')
+        if profile_threshold_seconds is None:
+            profile_threshold_seconds = float(os.environ.get('ARAX_PROFILE_THRESHOLD_SECONDS', 30))
+        self.profile_threshold_seconds = profile_threshold_seconds
+        self.action_stats = []
+        self.profiles = []
+
+
+    @contextlib.contextmanager
+    def profile_action(self, response, command, parameters=None, implicit=False):
+        """
+        Context manager that measures the action run inside it and records its stats, even if it returns early or raises
+        """
+        n_nodes_before, n_edges_before, n_results_before = self.get_counts(response)
+        peak_rss_before = self.get_peak_rss_mb()
+        profile = None
+        if self.profile_dir is not None:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Another profiler is already active on this thread
+                profile = None
+        start_datetime = datetime.now()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+
+        try:
+            yield
+        finally:
+            cpu_seconds = time.process_time() - cpu_start
+            wall_seconds = time.perf_counter() - wall_start
+            if profile is not None:
+                profile.disable()
+                self.profiles.append((len(self.action_stats) + 1, command, profile))
+            n_nodes_after, n_edges_after, n_results_after = self.get_counts(response)
+
+            stats = { 'action_number': len(self.action_stats) + 1, 'command': command, 'parameters': parameters,
+                'start_datetime': start_datetime.isoformat(), 'pid': os.getpid(), 'thread_id': threading.get_ident(),
+                'wall_seconds': round(wall_seconds, 3), 'cpu_seconds': round(cpu_seconds, 3),
+                'peak_rss_delta_mb': round(self.get_peak_rss_mb() - peak_rss_before, 1),
+                'n_kg_nodes_before': n_nodes_before, 'n_kg_nodes_after': n_nodes_after,
+                'n_kg_edges_before': n_edges_before, 'n_kg_edges_after': n_edges_after,
+                'n_results_before': n_results_before, 'n_results_after': n_results_after }
+            if implicit:
+                stats['implicit'] = True
+            self.action_stats.append(stats)
+            response.debug(f"Action '{command}' took {stats['wall_seconds']} s ({stats['cpu_seconds']} s CPU), peak RSS grew by {stats['peak_rss_delta_mb']} MB")
+
+            #### Keep the stats with the envelope as they accumulate (some actions, like create_message, replace it)
+            if response.envelope is not None:
+                if response.envelope.query_options is None:
+                    response.envelope.query_options = {}
+                response.envelope.query_options['action_stats'] = self.action_stats
+
+
+    def get_counts(self, response):
+        """
+        Returns the numbers of knowledge graph nodes, knowledge graph edges and results in the response's message
+        """
+        envelope = response.envelope
+        message = envelope.message if envelope is not None else None
+        if message is None:
+            return 0, 0, 0
+        knowledge_graph = message.knowledge_graph
+        n_nodes = len(knowledge_graph.nodes or {}) if knowledge_graph is not None else 0
+        n_edges = len(knowledge_graph.edges or {}) if knowledge_graph is not None else 0
+        n_results = len(message.results or [])
+        return n_nodes, n_edges, n_results
+
+
+    def get_peak_rss_mb(self):
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and in kilobytes everywhere else
+        if sys.platform == 'darwin':
+            return peak_rss / 1024 / 1024
+        return peak_rss / 1024
+
+
+    def dump_profiles(self, response):
+        """
+        If profiling is on and the query took longer than the threshold, write out the profile of each action.
+        Returns the list of files written
+        """
+        elapsed = time.time() - self.start_time
+        if self.profile_dir is None or len(self.profiles) == 0 or elapsed < self.profile_threshold_seconds:
+            return []
+
+        try:
+            os.makedirs(self.profile_dir, exist_ok=True)
+        except OSError as error:
+            eprint(f"ERROR: Unable to create profile dir {self.profile_dir}: {error}")
+            return []
+
+        query_label = f"{datetime.fromtimestamp(self.start_time).strftime('%Y%m%d-%H%M%S')}_{os.getpid()}_{threading.get_ident()}"
+        profile_paths = []
+        for action_number, command, profile in self.profiles:
+            profile_path = f"{self.profile_dir}/{query_label}_{action_number:02d}_{re.sub(r'[^A-Za-z0-9_]', '_', command)}.prof"
+            try:
+                profile.dump_stats(profile_path)
+                profile_paths.append(profile_path)
+            except OSError as error:
+                eprint(f"ERROR: Unable to write profile to {profile_path}: {error}")
+        response.info(f"Query took {round(elapsed, 1)} s, over the profiling threshold of {self.profile_threshold_seconds} s. "
+            f"Wrote {len(profile_paths)} action profiles to {self.profile_dir}/{query_label}_*.prof")
+        return profile_paths
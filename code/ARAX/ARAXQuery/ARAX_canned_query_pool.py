@@ -0,0 +1,204 @@
+#!/bin/env python3
+import sys
+def eprint(*args, **kwargs): print(*args, file=sys.stderr, **kwargs)
+
+import os
+import io
+import ast
+import json
+import shlex
+import time
+import queue
+import threading
+import importlib
+import contextlib
+import traceback
+import multiprocessing
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../../UI/OpenAPI/python-flask-server/")
+from openapi_server.models.message import Message
+
+
+class ARAXCannedQueryPool:
+    """
+    A pool of long-lived worker processes that answer canned (query_type_id + terms) queries with the legacy solution
+    code in reasoningtool/QuestionAnswering. Each worker changes into that directory once (the solution modules open
+    their data files relative to it), imports the Q0-Q4 solution modules up front and then takes one job at a time, so
+    queries no longer pay for interpreter startup, imports and Neo4j connection setup, and the server process never has
+    to os.chdir(). At most n_workers queries run at once; others wait for a free worker. A job that runs longer than
+    job_timeout seconds has its worker killed and replaced
+    """
+
+    PRELOAD_MODULES = [ 'ParseQuestion', 'Q0Solution', 'Q1Solution', 'Q2Solution', 'Q3Solution', 'Q4Solution' ]
+
+    def __init__(self, n_workers=2, job_timeout=300, solutions_dir=None, preload_modules=None):
+        self.n_workers = n_workers
+        self.job_timeout = job_timeout
+        if solutions_dir is None:
+            solutions_dir = os.path.dirname(os.path.abspath(__file__))+"/../../reasoningtool/QuestionAnswering"
+        self.solutions_dir = os.path.abspath(solutions_dir)
+        self.preload_modules = preload_modules if preload_modules is not None else self.PRELOAD_MODULES
+
+        # Fresh interpreters rather than forks of a multi-threaded server
+        self.context = multiprocessing.get_context('spawn')
+        self.idle_workers = queue.Queue()
+        self.closed = False
+        for i_worker in range(n_workers):
+            self.idle_workers.put(self.start_worker())
+
+
+    def start_worker(self):
+        parent_connection, child_connection = self.context.Pipe()
+        process = self.context.Process(target=_worker_main, args=(child_connection, self.solutions_dir, self.preload_modules), daemon=True)
+        process.start()
+        child_connection.close()
+        return process, parent_connection
+
+
+    def stop_worker(self, worker):
+        process, connection = worker
+        connection.close()
+        if process.is_alive():
+            process.terminate()
+        process.join(5)
+
+
+    def answer(self, query_type_id, terms, timeout=None):
+        """
+        Answer a canned query and return the resulting Message. Raises TimeoutError if the timeout runs out (waiting
+        for a free worker counts against it) before the job is done, and RuntimeError if the legacy code fails
+        """
+        if self.closed:
+            raise RuntimeError("The canned query pool has been closed")
+        if timeout is None:
+            timeout = self.job_timeout
+        deadline = time.monotonic() + timeout
+        try:
+            worker = self.idle_workers.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"All {self.n_workers} canned query workers stayed busy for {timeout} seconds")
+
+        try:
+            process, connection = worker
+            try:
+                connection.send((query_type_id, terms))
+                finished = connection.poll(max(deadline - time.monotonic(), 0))
+                if finished:
+                    status, payload = connection.recv()
+            except (EOFError, OSError) as error:
+                raise RuntimeError(f"Canned query worker {process.pid} died: {error}")
+            if not finished:
+                raise TimeoutError(f"Canned query {query_type_id} did not finish within {timeout} seconds")
+        except Exception:
+            #### The worker may be stuck or gone, so replace it
+            self.stop_worker(worker)
+            worker = None if self.closed else self.start_worker()
+            raise
+        finally:
+            #### Hand the worker back, unless the pool was closed while it was busy
+            if self.closed and worker is not None:
+                self.stop_worker(worker)
+            elif worker is not None:
+                self.idle_workers.put(worker)
+
+        if status != 'OK':
+            raise RuntimeError(payload)
+        return Message.from_dict(payload)
+
+
+    def close(self, timeout=10):
+        """
+        Stop the workers. Ones still busy after the timeout (e.g. with a stuck job) are killed as soon as they are handed back
+        """
+        deadline = time.monotonic() + timeout
+        for i_worker in range(self.n_workers):
+            try:
+                worker = self.idle_workers.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                eprint(f"WARNING: {self.n_workers - i_worker} canned query workers were still busy when the pool was closed")
+                self.closed = True
+                return
+            try:
+                worker[1].send(None)
+            except (EOFError, OSError):
+                pass
+            self.stop_worker(worker)
+        self.closed = True
+
+
+#### The pool shared by all ARAXQuery objects in this process, created the first time it is needed
+_canned_query_pool = None
+_canned_query_pool_lock = threading.Lock()
+
+def get_canned_query_pool():
+    global _canned_query_pool
+    with _canned_query_pool_lock:
+        if _canned_query_pool is None:
+            _canned_query_pool = ARAXCannedQueryPool()
+        return _canned_query_pool
+
+
+##################################################################################################
+#### What runs in each worker process
+
+def _worker_main(connection, solutions_dir, preload_modules):
+    os.chdir(solutions_dir)
+    sys.path.insert(0, solutions_dir)
+
+    #### Import the solution modules once. Ones that fail are retried (and the error reported) when a job needs them
+    for module_name in preload_modules:
+        try:
+            importlib.import_module(module_name)
+        except Exception as error:
+            eprint(f"WARNING: Canned query worker {os.getpid()} could not import {module_name}: {error}")
+
+    while True:
+        try:
+            job = connection.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if job is None:
+            break
+        query_type_id, terms = job
+        try:
+            connection.send(('OK', _answer_canned_query(query_type_id, terms)))
+        except Exception as error:
+            connection.send(('ERROR', f"An error occurred answering canned query {query_type_id}: {error}: {traceback.format_exc()}"))
+
+
+def _answer_canned_query(query_type_id, terms):
+
+    #### Q0 has its own answer() method
+    if query_type_id == 'Q0':
+        q0_solution = importlib.import_module('Q0Solution')
+        message = q0_solution.Q0().answer(terms['term'], use_json=True)
+        if hasattr(message, 'to_dict'):
+            return message.to_dict()
+        return ast.literal_eval(repr(message))
+
+    #### The others are run as the command line scripts they are, capturing the JSON they print
+    parse_question = importlib.import_module('ParseQuestion')
+    arguments = shlex.split(parse_question.ParseQuestion().get_execution_string(query_type_id, terms))
+    module_name = os.path.splitext(os.path.basename(arguments[0]))[0]
+    solution = importlib.import_module(module_name)
+
+    #### Q1Solution collects its results in a module-level FormatResponse, which must start out empty for every job
+    if module_name == 'Q1Solution':
+        solution.response = solution.FormatOutput.FormatResponse(1)
+
+    original_argv = sys.argv
+    sys.argv = arguments
+    try:
+        with contextlib.redirect_stdout(io.StringIO()) as stdout:
+            try:
+                solution.main()
+            except SystemExit:
+                pass
+    finally:
+        sys.argv = original_argv
+
+    output = stdout.getvalue()
+    try:
+        return json.loads(output)
+    except ValueError:
+        raise ValueError(f"{module_name} did not print a JSON message. The unparsable output was: {output}")
@@ -1,6 +1,9 @@
 #!/bin/env python3
 import sys
 import os
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, Future
 from typing import List, Dict, Tuple, Union, Set, Optional
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))  # ARAXQuery directory
@@ -23,6 +26,7 @@ class ARAXExpander:
 
     def __init__(self):
         self.default_kp = "ARAX/KG2"
+        self.max_concurrent_qedge_expansions = 4
         self.protein_category = "biolink:Protein"
         self.gene_category = "biolink:Gene"
         self.edge_key_parameter_info = {
@@ -61,6 +65,20 @@ class ARAXExpander:
             "type": "boolean",
             "description": "Whether to consider curie synonyms and merge synonymous nodes."
         }
+        self.stream_results_parameter_info = {
+            "is_required": False,
+            "examples": ["true", "false"],
+            "enum": ["true", "false", "True", "False", "t", "f", "T", "F"],
+            "default": "false",
+            "type": "boolean",
+            "description": "Whether to load answers from Neo4j one edge at a time as they arrive (vs. all at once)."
+        }
+        self.max_edges_parameter_info = {
+            "is_required": False,
+            "examples": ["1000", "50000"],
+            "type": "integer",
+            "description": "The maximum number of edges to load per query edge (only applies when stream_results=true)."
+        }
         self.command_definitions = {
             "ARAX/KG1": {
                 "dsl_command": "expand(kp=ARAX/KG1)",
@@ -71,7 +89,9 @@ class ARAXExpander:
                     "node_key": self.node_key_parameter_info,
                     "continue_if_no_results": self.continue_if_no_results_parameter_info,
                     "enforce_directionality": self.enforce_directionality_parameter_info,
-                    "use_synonyms": self.use_synonyms_parameter_info
+                    "use_synonyms": self.use_synonyms_parameter_info,
+                    "stream_results": self.stream_results_parameter_info,
+                    "max_edges": self.max_edges_parameter_info
                 }
             },
             "ARAX/KG2": {
@@ -84,7 +104,9 @@ class ARAXExpander:
                     "node_key": self.node_key_parameter_info,
                     "continue_if_no_results": self.continue_if_no_results_parameter_info,
                     "enforce_directionality": self.enforce_directionality_parameter_info,
-                    "use_synonyms": self.use_synonyms_parameter_info
+                    "use_synonyms": self.use_synonyms_parameter_info,
+                    "stream_results": self.stream_results_parameter_info,
+                    "max_edges": self.max_edges_parameter_info
                 }
             },
             "BTE": {
@@ -128,6 +150,14 @@ class ARAXExpander:
                         "default": 99,
                         "type": "integer",
                         "description": "What percentile to use as a cut-off/threshold for the specified COHD method."
+                    },
+                    "use_COHD_index": {
+                        "is_required": False,
+                        "examples": ["true", "false"],
+                        "enum": ["true", "false", "True", "False", "t", "f", "T", "F"],
+                        "default": "false",
+                        "type": "boolean",
+                        "description": "Whether to look up COHD pairs in the memory-mapped columnar COHD index (if it has been built) instead of the COHD database."
                     }
                 }
             },
@@ -320,28 +350,49 @@ class ARAXExpander:
 
             # Expand the query graph edge by edge (much faster for neo4j queries, and allows easy integration with BTE)
             ordered_qedge_keys_to_expand = self._get_order_to_expand_qedges_in(query_sub_graph, log)
-
-            for qedge_key in ordered_qedge_keys_to_expand:
-                qedge = query_graph.edges[qedge_key]
-                answer_kg, edge_node_usage_map = self._expand_edge(qedge_key, kp_to_use, dict_kg, continue_if_no_results,
-                                                                   query_graph, use_synonyms, log)
-                if log.status != 'OK':
-                    return response
-                elif qedge.exclude and not answer_kg.is_empty():
-                    self._store_kryptonite_edge_info(edge_node_usage_map, qedge_key, query_graph, encountered_kryptonite_edges_info, log)
-                else:
-                    # Update our map of which qnodes each of an edge's nodes fulfill (differs from source vs. target)
-                    if qedge_key not in node_usages_by_edges_map:
-                        node_usages_by_edges_map[qedge_key] = dict()
-                    node_usages_by_edges_map[qedge_key].update(edge_node_usage_map)
-                    self._merge_answer_into_message_kg(answer_kg, dict_kg, log)
-                if log.status != 'OK':
-                    return response
-
-                self._apply_any_kryptonite_edges(dict_kg, query_graph, node_usages_by_edges_map, encountered_kryptonite_edges_info, log)
-                self._prune_dead_end_paths(dict_kg, query_sub_graph, node_usages_by_edges_map, qedge, log)
-                if log.status != 'OK':
-                    return response
+            qedge_dependencies = self._get_qedge_dependencies(ordered_qedge_keys_to_expand, query_graph)
+
+            # Qedges whose answers don't feed into one another are expanded concurrently, but their answers are always
+            # merged into the KG (and kryptonite/pruning applied) in the same order as if run one at a time
+            hop_timings = dict()
+            expand_start = time.time()
+            executor = ThreadPoolExecutor(max_workers=self.max_concurrent_qedge_expansions)
+            pending_expansions = dict()
+            merged_qedge_keys = set()
+            try:
+                for qedge_key in ordered_qedge_keys_to_expand:
+                    self._submit_ready_qedge_expansions(ordered_qedge_keys_to_expand, qedge_dependencies, merged_qedge_keys,
+                                                        pending_expansions, executor, kp_to_use, dict_kg,
+                                                        continue_if_no_results, query_graph, use_synonyms, log)
+                    answer_kg, edge_node_usage_map, edge_log, hop_timings[qedge_key] = pending_expansions[qedge_key].result()
+                    log.merge(edge_log)
+                    qedge = query_graph.edges[qedge_key]
+                    if log.status != 'OK':
+                        return response
+                    elif qedge.exclude and not answer_kg.is_empty():
+                        self._store_kryptonite_edge_info(edge_node_usage_map, qedge_key, query_graph, encountered_kryptonite_edges_info, log)
+                    else:
+                        # Update our map of which qnodes each of an edge's nodes fulfill (differs from source vs. target)
+                        if qedge_key not in node_usages_by_edges_map:
+                            node_usages_by_edges_map[qedge_key] = dict()
+                        node_usages_by_edges_map[qedge_key].update(edge_node_usage_map)
+                        self._merge_answer_into_message_kg(answer_kg, dict_kg, log)
+                    if log.status != 'OK':
+                        return response
+
+                    self._apply_any_kryptonite_edges(dict_kg, query_graph, node_usages_by_edges_map, encountered_kryptonite_edges_info, log)
+                    self._prune_dead_end_paths(dict_kg, query_sub_graph, node_usages_by_edges_map, qedge, log)
+                    merged_qedge_keys.add(qedge_key)
+                    if log.status != 'OK':
+                        return response
+            finally:
+                # If we're bailing out on an error, don't start any queued qedge expansions or wait on in-flight ones
+                all_qedges_merged = len(merged_qedge_keys) == len(ordered_qedge_keys_to_expand)
+                executor.shutdown(wait=all_qedges_merged, cancel_futures=not all_qedges_merged)
+
+            response.data['hop_timings'] = hop_timings
+            timing_summary = ", ".join([f"{qedge_key}: {round(seconds, 2)}s" for qedge_key, seconds in hop_timings.items()])
+            log.info(f"Expand time per qedge was: {timing_summary} (total wall time: {round(time.time() - expand_start, 2)}s)")
 
         # Expand any specified nodes
         if input_qnode_keys:
@@ -377,7 +428,8 @@ class ARAXExpander:
         return response
 
     def _expand_edge(self, qedge_key: str, kp_to_use: str, dict_kg: QGOrganizedKnowledgeGraph, continue_if_no_results: bool,
-                     query_graph: QueryGraph, use_synonyms: bool, log: ARAXResponse) -> Tuple[QGOrganizedKnowledgeGraph, Dict[str, Dict[str, str]]]:
+                     query_graph: QueryGraph, use_synonyms: bool, log: ARAXResponse,
+                     edge_query_graph: Optional[QueryGraph] = None) -> Tuple[QGOrganizedKnowledgeGraph, Dict[str, Dict[str, str]]]:
         # This function answers a single-edge (one-hop) query using the specified knowledge provider
         log.info(f"Expanding qedge {qedge_key} using {kp_to_use}")
         answer_kg = QGOrganizedKnowledgeGraph()
@@ -385,7 +437,8 @@ class ARAXExpander:
         qedge = query_graph.edges[qedge_key]
 
         # Create a query graph for this edge (that uses synonyms as well as curies found in prior steps)
-        edge_query_graph = self._get_query_graph_for_edge(qedge_key, query_graph, dict_kg, log)
+        if edge_query_graph is None:
+            edge_query_graph = self._get_query_graph_for_edge(qedge_key, query_graph, dict_kg, log)
         if log.status != 'OK':
             return answer_kg, edge_to_nodes_map
         if not any(qnode for qnode in edge_query_graph.nodes.values() if qnode.id):
@@ -794,6 +847,67 @@ class ARAXExpander:
 
         log.debug(f"After pruning, KG counts are: {eu.get_printable_counts_by_qg_id(dict_kg)}")
 
+    def _submit_ready_qedge_expansions(self, ordered_qedge_keys: List[str], qedge_dependencies: Dict[str, Set[str]],
+                                       merged_qedge_keys: Set[str], pending_expansions: Dict[str, Future],
+                                       executor: ThreadPoolExecutor, kp_to_use: str, dict_kg: QGOrganizedKnowledgeGraph,
+                                       continue_if_no_results: bool, query_graph: QueryGraph, use_synonyms: bool,
+                                       log: ARAXResponse):
+        # This function kicks off expansion of any qedges whose dependencies have all been merged into the KG. The
+        # query graph for each qedge is built here (rather than in the worker thread) since it reads from the KG, so
+        # worker threads never touch the KG while this (main) thread merges answers into it.
+        for qedge_key in ordered_qedge_keys:
+            if qedge_key not in pending_expansions and qedge_dependencies[qedge_key].issubset(merged_qedge_keys):
+                edge_log = self._create_edge_log(log)
+                edge_query_graph = self._get_query_graph_for_edge(qedge_key, query_graph, dict_kg, edge_log)
+                pending_expansions[qedge_key] = executor.submit(self._timed_expand_edge, qedge_key, kp_to_use,
+                                                                continue_if_no_results, query_graph, use_synonyms,
+                                                                edge_log, edge_query_graph)
+
+    @staticmethod
+    def _create_edge_log(log: ARAXResponse) -> ARAXResponse:
+        # Each qedge gets its own log (merged into the main one once it's done); the KP queriers read Expand's
+        # parameters from their log, so those are copied over, and it pushes its messages onto the main log's event
+        # stream (if any) as they're logged, rather than once the qedge has been merged
+        edge_log = ARAXResponse()
+        edge_log.data['parameters'] = dict(log.data['parameters'])
+        edge_log.event_queue = log.event_queue
+        return edge_log
+
+    def _timed_expand_edge(self, qedge_key: str, kp_to_use: str, continue_if_no_results: bool, query_graph: QueryGraph,
+                           use_synonyms: bool, edge_log: ARAXResponse,
+                           edge_query_graph: QueryGraph) -> Tuple[QGOrganizedKnowledgeGraph, Dict[str, Dict[str, str]], ARAXResponse, float]:
+        # This function is run in a worker thread. It's given the qedge's already-built query graph (and not the KG,
+        # which the main thread keeps merging answers into).
+        start = time.time()
+        try:
+            answer_kg, edge_node_usage_map = self._expand_edge(qedge_key, kp_to_use, QGOrganizedKnowledgeGraph(),
+                                                               continue_if_no_results, query_graph, use_synonyms,
+                                                               edge_log, edge_query_graph)
+        except Exception:
+            tb = traceback.format_exc()
+            error_type, error, _ = sys.exc_info()
+            edge_log.error(f"Encountered a problem expanding qedge {qedge_key}: {tb}", error_code=error_type.__name__)
+            answer_kg, edge_node_usage_map = QGOrganizedKnowledgeGraph(), dict()
+        return answer_kg, edge_node_usage_map, edge_log, time.time() - start
+
+    @staticmethod
+    def _get_qedge_dependencies(ordered_qedge_keys: List[str], query_graph: QueryGraph) -> Dict[str, Set[str]]:
+        """
+        This function determines which of the qedges to expand depend on the answers of others. A qedge depends on any
+        qedge ordered before it that it shares a qnode without curies with (since that qnode's curies will be fed in
+        from the earlier qedge's answer); qedges that share only qnodes with curies specified can run concurrently.
+        Example return value: {"e00": set(), "e01": {"e00"}, "e02": set()}
+        """
+        qedge_dependencies = dict()
+        for index, qedge_key in enumerate(ordered_qedge_keys):
+            qedge = query_graph.edges[qedge_key]
+            unpinned_qnode_keys = {qnode_key for qnode_key in {qedge.subject, qedge.object}
+                                   if not query_graph.nodes[qnode_key].id}
+            qedge_dependencies[qedge_key] = {earlier_qedge_key for earlier_qedge_key in ordered_qedge_keys[:index]
+                                             if unpinned_qnode_keys.intersection({query_graph.edges[earlier_qedge_key].subject,
+                                                                                  query_graph.edges[earlier_qedge_key].object})}
+        return qedge_dependencies
+
     def _get_order_to_expand_qedges_in(self, query_graph: QueryGraph, log: ARAXResponse) -> List[str]:
         """
         This function determines what order to expand the edges in a query graph in; it aims to start with a required,
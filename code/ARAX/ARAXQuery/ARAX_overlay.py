@@ -140,6 +140,13 @@ class ARAXOverlay:
                     "type": "string",
                     "description": "Which measure from COHD should be considered."
                 }
+        self.use_COHD_index_info = {
+                    "is_required": False,
+                    "enum": ['true', 'false'],
+                    "default": "false",
+                    "type": "boolean",
+                    "description": "Whether to look up COHD pairs in the memory-mapped columnar COHD index (if it has been built) instead of the COHD database."
+                }
         self.filter_type_info = {
                     "is_required": False,
                     "examples": ['top_n', 'cutoff', None],
@@ -223,6 +230,7 @@ This information is then included as an edge attribute.
                 ],
                 "parameters": {
                     'COHD_method': self.COHD_method_info,
+                    'use_COHD_index': self.use_COHD_index_info,
                     'virtual_relation_label' : self.virtual_relation_label_info,
                     'subject_qnode_key': self.subject_qnode_key_info,
                     'object_qnode_key': self.object_qnode_key_info
@@ -560,6 +568,7 @@ This information is included in edge attributes with the name 'icees_p-value'.
                                     'paired_concept_frequency': {'true', 'false'},
                                     'observed_expected_ratio': {'true', 'false'},
                                     'chi_square': {'true', 'false'},
+                                    'use_COHD_index': {'true', 'false'},
                                     'virtual_relation_label': {self.parameters['virtual_relation_label'] if 'virtual_relation_label' in self.parameters else None},
                                     'subject_qnode_key': set([key for key in self.message.query_graph.nodes.keys()]),
                                     'object_qnode_key': set([key for key in self.message.query_graph.nodes.keys()])
@@ -570,6 +579,7 @@ This information is included in edge attributes with the name 'icees_p-value'.
                                     'paired_concept_frequency': {'true', 'false'},
                                     'observed_expected_ratio': {'true', 'false'},
                                     'chi_square': {'true', 'false'},
+                                    'use_COHD_index': {'true', 'false'},
                                     'virtual_relation_label': {'any string label used to identify the virtual edge (optional, otherwise information is added as an attribute to all existing edges in the KG)'},
                                     'subject_qnode_key': {'a specific subject query node id (optional, otherwise applied to all edges)'},
                                     'object_qnode_key': {'a specific object query node id (optional, otherwise applied to all edges)'}
@@ -8,10 +8,10 @@ import ast
 import re
 import time
 from datetime import datetime
-import subprocess
 import traceback
 from collections import Counter
 import numpy as np
+import queue
 import threading
 import json
 import uuid
@@ -25,6 +25,8 @@ from ARAX_resultify import ARAXResultify
 from ARAX_query_graph_interpreter import ARAXQueryGraphInterpreter
 from ARAX_messenger import ARAXMessenger
 from ARAX_ranker import ARAXRanker
+from ARAX_action_profiler import ARAXActionProfiler
+from ARAX_canned_query_pool import get_canned_query_pool
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../../UI/OpenAPI/python-flask-server/")
 from openapi_server.models.response import Response
@@ -57,54 +59,73 @@ class ARAXQuery:
         self.response = None
         self.message = None
         self.rtxConfig = RTXConfiguration()
+        self.event_queue = None
+        self.action_profiler = None
+        #### Callers that take queries from outside (e.g. the API) set the origin to have each query logged in the
+        #### ARAXQueryTracker along with the stats of its actions. Queries ARAX runs internally (e.g. for FET) are not logged
+        self.origin = None
+        self.remote_address = None
+        self.query_tracker = None
+        self.tracker_id = None
+        self.response_id = None
+        self.results_finalized = False
 
 
     def query_return_stream(self,query):
-
-        main_query_thread = threading.Thread(target=self.asynchronous_query, args=(query,))
+        """
+        Runs the query on another thread and streams back newline-delimited JSON (NDJSON): each log message
+        as soon as it is logged, each final result as {"result": ...} as soon as no remaining action can
+        change it, and finally the envelope (whose results are left out, as null, if they were already streamed)
+        """
+
+        event_queue = queue.Queue()
+        main_query_thread = threading.Thread(target=self.asynchronous_query, args=(query,event_queue))
         main_query_thread.start()
 
-        if self.response is None or "DONE" not in self.response.status:
-
-            # Sleep until a response object has been created
-            while self.response is None:
-                time.sleep(0.1)
-
-            i_message = 0
-            n_messages = len(self.response.messages)
-
-            while "DONE" not in self.response.status:
-                n_messages = len(self.response.messages)
-                while i_message < n_messages:
-                    yield(json.dumps(self.response.messages[i_message])+"\n")
-                    i_message += 1
-                time.sleep(0.2)
-
-            # #### If there are any more logging messages in the queue, send them first
-            n_messages = len(self.response.messages)
-            while i_message < n_messages:
-                yield(json.dumps(self.response.messages[i_message])+"\n")
-                i_message += 1
-
-            # Remove the little DONE flag the other thread used to signal this thread that it is done
-            self.response.status = re.sub('DONE,','',self.response.status)
-
-            # Stream the resulting message back to the client
-            yield(json.dumps(self.response.envelope.to_dict()))
+        # Block on the event queue (no polling) and pass the events along until the other thread is done
+        while True:
+            event_type, event = event_queue.get()
+            if event_type == ARAXResponse.EVENT_DONE:
+                break
+            if event_type == ARAXResponse.EVENT_RESULT:
+                yield(json.dumps({ 'result': event })+"\n")
+            else:
+                yield(json.dumps(event)+"\n")
+
+        # Stream the resulting message back to the client, without the results that were already sent
+        if self.response is not None and self.response.envelope is not None:
+            message = self.response.envelope.message
+            results = message.results if message is not None else None
+            if self.results_finalized and results is not None:
+                message.results = None
+            try:
+                yield(json.dumps(self.response.envelope.to_dict())+"\n")
+            finally:
+                if message is not None:
+                    message.results = results
 
         # Wait until both threads rejoin here and the return
         main_query_thread.join()
         return { 'DONE': True }
 
 
-    def asynchronous_query(self,query):
+    def asynchronous_query(self,query,event_queue=None):
 
-        #### Define a new response object if one does not yet exist
-        if self.response is None:
-            self.response = ARAXResponse()
+        #### Have every response created by query() push its events onto this queue
+        self.event_queue = event_queue
 
-        #### Execute the query
-        self.query(query)
+        #### Execute the query, and let the streaming thread know when it's done, no matter what
+        try:
+            self.query(query)
+        except Exception as error:
+            if self.response is None:
+                self.response = ARAXResponse()
+                if event_queue is not None:
+                    self.response.open_event_stream(event_queue)
+            self.response.error(f"An uncaught error occurred: {error}: {repr(traceback.format_exc())}", error_code="UncaughtARAXiError")
+        finally:
+            if event_queue is not None:
+                event_queue.put((ARAXResponse.EVENT_DONE, None))
 
         #### Do we still need all this cruft?
         #result = self.query(query)
@@ -115,9 +136,6 @@ class ARAXQuery:
         #message.message_code = result.error_code
         #message.code_description = result.message
         #message.log = result.messages
-
-        # Insert a little flag into the response status to denote that this thread is done
-        self.response.status = f"DONE,{self.response.status}"
         return
 
 
@@ -130,9 +148,23 @@ class ARAXQuery:
 
     def query(self,query):
 
+        #### Log queries from outside in the query tracker, however processing them ends
+        self.response_id = None
+        self.create_tracker_entry(query)
+        try:
+            return self.process_query(query)
+        finally:
+            self.update_tracker_entry()
+
+
+    def process_query(self,query):
+
         #### Create the skeleton of the response
         response = ARAXResponse()
         self.response = response
+        self.results_finalized = False
+        if self.event_queue is not None:
+            response.open_event_stream(self.event_queue)
 
         #### Announce the launch of query()
         #### Note that setting ARAXResponse.output = 'STDERR' means that we get noisy output to the logs
@@ -175,6 +207,7 @@ class ARAXQuery:
         if "have_operations" in query_attributes:
             response.info(f"Found input processing plan. Sending to the ProcessingPlanExecutor")
             result = self.executeProcessingPlan(query)
+            self.report_action_stats(response)
             return response
 
         #### Otherwise extract the id and the terms from the incoming parameters
@@ -211,8 +244,11 @@ class ARAXQuery:
         #### Still have special handling for Q0
         if id == 'Q0':
             response.info(f"Answering 'what is' question with Q0 handler")
-            q0 = Q0()
-            message = q0.answer(terms["term"],use_json=True)
+            try:
+                message = get_canned_query_pool().answer(id, terms)
+            except Exception as error:
+                response.error(f"Unable to answer canned query {id}: {error}", error_code="CannedQueryError")
+                return response
             if 'original_question' in query["message"]:
               message.original_question = query["message"]["original_question"]
               message.restated_question = query["message"]["restated_question"]
@@ -230,37 +266,28 @@ class ARAXQuery:
         else:
 
             response.info(f"Entering legacy handler for a canned query")
-
-            #### Use the ParseQuestion system to determine what the execution_string should be
-            txltr = ParseQuestion()
             eprint(terms)
-            command = "python3 " + txltr.get_execution_string(id,terms)
 
-            #### Set CWD to the QuestioningAnswering area and then invoke from the shell the Q1Solution code
-            cwd = os.getcwd()
-            os.chdir(os.path.dirname(os.path.abspath(__file__))+"/../../reasoningtool/QuestionAnswering")
-            eprint(command)
-            returnedText = subprocess.run( [ command ], stdout=subprocess.PIPE, shell=True )
-            os.chdir(cwd)
+            #### Have one of the warm workers run the solution code (from the QuestionAnswering area) and hand back the message
+            try:
+                message = get_canned_query_pool().answer(id, terms)
+            except TimeoutError as error:
+                response.error(f"Unable to answer canned query {id}: {error}", error_code="CannedQueryTimeout")
+                return response
 
-            #### reformat the stdout result of the shell command into a string
-            reformattedText = returnedText.stdout.decode('utf-8')
-            #eprint(reformattedText)
+            #### If it fails, the just create a new Message object with a notice about the failure
+            except Exception as error:
+                response.error("Error getting the message from the reasoner. This is an internal bug that needs to be fixed. Unable to respond to this question at this time. The error was: " + str(error), error_code="InternalError551")
+                return response
 
-            #### Try to decode that string into a message object
             try:
-                #data = ast.literal_eval(reformattedText)
-                data = json.loads(reformattedText)
-                message = Message.from_dict(data)
                 if message.message_code is None:
                     if message.result_code is not None:
                         message.message_code = message.result_code
                     else:
                         message.message_code = "wha??"
-
-            #### If it fails, the just create a new Message object with a notice about the failure
             except:
-                response.error("Error parsing the message from the reasoner. This is an internal bug that needs to be fixed. Unable to respond to this question at this time. The unparsable message was: " + reformattedText, error_code="InternalError551")
+                response.error("Error parsing the message from the reasoner. This is an internal bug that needs to be fixed. Unable to respond to this question at this time. The unparsable message was: " + str(message), error_code="InternalError551")
                 return response
 
             #print(query)
@@ -380,8 +407,10 @@ class ARAXQuery:
 
         response = self.response
         response.debug(f"Entering executeProcessingPlan")
+        start_time = time.time()
         messages = []
         message = None
+        bypass_cache = str(input_operations_dict.get('bypass_cache', 'false')).lower() == 'true'
 
         # If there is already a message (perhaps with a query_graph) already in the query, preserve it
         if 'message' in input_operations_dict and input_operations_dict['message'] is not None:
@@ -516,6 +545,24 @@ class ARAXQuery:
                 response.envelope.operations = {}
             response.envelope.operations['actions'] = operations.actions
 
+            #### Unless asked to bypass the cache, see if these same actions have already been run on this same input message
+            #### (usually just a query graph). Inputs fetched from elsewhere (message_uris, fetch_message) can't be cached this way
+            answer_cache_key = None
+            if operations.message_uris is None and operations.messages is None and \
+                    not any(action['command'] == 'fetch_message' for action in result.data['actions']):
+                answer_cache_key = response_cache.get_answer_cache_key(result.data['actions'], response.envelope.message)
+                if bypass_cache:
+                    response.info("bypass_cache is set, so computing a fresh answer")
+                else:
+                    cached_answer = response_cache.get_cached_answer(answer_cache_key, response)
+                    if cached_answer is not None:
+                        cached_response_id, cached_envelope = cached_answer
+                        response.envelope = Response.from_dict(cached_envelope)
+                        response.envelope.logs = response.messages
+                        return_action = next((action for action in result.data['actions'] if action['command'] == 'return'), None)
+                        return self.finish_processing_plan(response, operations, return_action, response_cache,
+                                                           cached_response_id=cached_response_id)
+
 
             #### Import the individual ARAX processing modules and process DSL commands
             from ARAX_expander import ARAXExpander
@@ -531,148 +578,221 @@ class ARAXQuery:
             filter_results = ARAXFilterResults()
             self.message = message
 
-            #### Process each action in order
-            action_stats = { }
+            #### Process each action in order, keeping track of what each one costs
+            action_profiler = ARAXActionProfiler(start_time=start_time)
+            self.action_profiler = action_profiler
             actions = result.data['actions']
-            for action in actions:
+            #### The results are final (and can be streamed) once the last action that may change them is done
+            result_action_indexes = [ index for index, action in enumerate(actions) if action['command'] not in { 'create_message', 'add_qnode', 'add_qedge', 'return' } ]
+            last_result_action_index = result_action_indexes[-1] if result_action_indexes else None
+            action = None
+            for action_index, action in enumerate(actions):
                 response.info(f"Processing action '{action['command']}' with parameters {action['parameters']}")
                 nonstandard_result = False
                 skip_merge = False
 
-                # Catch a crash
-                try:
-                    if action['command'] == 'create_message':
-                        messenger.create_envelope(response)
-                        #### Put our input processing actions into the envelope
-                        if response.envelope.query_options is None:
-                            response.envelope.query_options = {}
-                        response.envelope.query_options['actions'] = operations.actions
+                with action_profiler.profile_action(response, action['command'], action['parameters']):
+                    # Catch a crash
+                    try:
+                        if action['command'] == 'create_message':
+                            messenger.create_envelope(response)
+                            #### Put our input processing actions into the envelope
+                            if response.envelope.query_options is None:
+                                response.envelope.query_options = {}
+                            response.envelope.query_options['actions'] = operations.actions
+
+                        elif action['command'] == 'fetch_message':
+                            messenger.apply_fetch_message(response,action['parameters'])
+
+                        elif action['command'] == 'add_qnode':
+                            messenger.add_qnode(response,action['parameters'])
+
+                        elif action['command'] == 'add_qedge':
+                            messenger.add_qedge(response,action['parameters'])
+
+                        elif action['command'] == 'expand':
+                            expander.apply(response,action['parameters'])
+
+                        elif action['command'] == 'filter':
+                            filter.apply(response,action['parameters'])
+
+                        elif action['command'] == 'resultify':
+                            resultifier.apply(response, action['parameters'])
+
+                        elif action['command'] == 'overlay':  # recognize the overlay command
+                            overlay.apply(response, action['parameters'])
+
+                        elif action['command'] == 'filter_kg':  # recognize the filter_kg command
+                            filter_kg.apply(response, action['parameters'])
+
+                        elif action['command'] == 'filter_results':  # recognize the filter_results command
+                            response.debug(f"Before filtering, there are {len(response.envelope.message.results)} results")
+                            filter_results.apply(response, action['parameters'])
+
+                        elif action['command'] == 'query_graph_reasoner':
+                            response.info(f"Sending current query_graph to the QueryGraphReasoner")
+                            qgr = QueryGraphReasoner()
+                            message = qgr.answer(ast.literal_eval(repr(message.query_graph)), TxltrApiFormat=True)
+                            self.message = message
+                            nonstandard_result = True
+
+                        elif action['command'] == 'return':
+                            break
+
+                        elif action['command'] == 'rank_results':
+                            response.info(f"Running experimental reranker on results")
+                            try:
+                                ranker = ARAXRanker()
+                                #ranker.aggregate_scores(message, response=response)
+                                ranker.aggregate_scores_dmk(response)
+                            except Exception as error:
+                                exception_type, exception_value, exception_traceback = sys.exc_info()
+                                response.error(f"An uncaught error occurred: {error}: {repr(traceback.format_exception(exception_type, exception_value, exception_traceback))}", error_code="UncaughtARAXiError")
+                                return response
+
+                        else:
+                            response.error(f"Unrecognized command {action['command']}", error_code="UnrecognizedCommand")
+                            return response
 
-                    elif action['command'] == 'fetch_message':
-                        messenger.apply_fetch_message(response,action['parameters'])
+                    except Exception as error:
+                        exception_type, exception_value, exception_traceback = sys.exc_info()
+                        response.error(f"An uncaught error occurred: {error}: {repr(traceback.format_exception(exception_type, exception_value, exception_traceback))}", error_code="UncaughtARAXiError")
+                        return response
 
-                    elif action['command'] == 'add_qnode':
-                        messenger.add_qnode(response,action['parameters'])
+                #### If we're in an error state return now
+                if response.status != 'OK':
+                    response.envelope.status = response.error_code
+                    response.envelope.description = response.message
+                    return response
 
-                    elif action['command'] == 'add_qedge':
-                        messenger.add_qedge(response,action['parameters'])
+                #### Immediately after resultify, run the experimental ranker
+                if action['command'] == 'resultify':
+                    response.info(f"Running experimental reranker on results")
+                    with action_profiler.profile_action(response, 'rank_results', {}, implicit=True):
+                        try:
+                            ranker = ARAXRanker()
+                            #ranker.aggregate_scores(message, response=response)
+                            ranker.aggregate_scores_dmk(response)
+                        except Exception as error:
+                            exception_type, exception_value, exception_traceback = sys.exc_info()
+                            response.error(f"An uncaught error occurred: {error}: {repr(traceback.format_exception(exception_type, exception_value, exception_traceback))}", error_code="UncaughtARAXiError")
+                            return response
 
-                    elif action['command'] == 'expand':
-                        expander.apply(response,action['parameters'])
+                #### Once no remaining action can change the results, send them to any client streaming the response
+                if action_index == last_result_action_index:
+                    self.finalize_results(response)
 
-                    elif action['command'] == 'filter':
-                        filter.apply(response,action['parameters'])
+            #### At the end, process the explicit return() action, or implicitly perform one
+            return self.finish_processing_plan(response, operations, action, response_cache, answer_cache_key=answer_cache_key,
+                                               compute_seconds=time.time() - start_time)
+
+
+    def finish_processing_plan(self, response, operations, action, response_cache, answer_cache_key=None, compute_seconds=None,
+                               cached_response_id=None):
+
+        #### Process the explicit return() action, or implicitly perform one
+        return_action = { 'command': 'return', 'parameters': { 'response': 'true', 'store': 'true' } }
+        if action is not None and action['command'] == 'return':
+            return_action = action
+            #### If an explicit one left out some parameters, set the defaults
+            if 'store' not in return_action['parameters']:
+                return_action['parameters']['store'] = 'false'
+            if 'response' not in return_action['parameters']:
+                return_action['parameters']['response'] = 'false'
+
+        #print(json.dumps(ast.literal_eval(repr(response.__dict__)), sort_keys=True, indent=2))
+
+        # Fill out the message with data
+        response.envelope.status = response.error_code
+        response.envelope.description = response.message
+        if response.envelope.query_options is None:
+            response.envelope.query_options = {}
+        response.envelope.query_options['actions'] = operations.actions
+
+        # Finalize the results, unless that was already done after the last action that could change them
+        self.finalize_results(response)
+
+        # If store=true, then put the message in the database (a cached answer is already there)
+        response_id = cached_response_id
+        if return_action['parameters']['store'] == 'true' and response_id is None:
+            response.debug(f"Storing resulting Message")
+            response_id = response_cache.add_new_response(response)
+
+            # And remember it as the answer to these actions on this query graph, unless something may have gone
+            # wrong along the way (e.g. a KP that timed out) that would make it a poor answer to hand out again
+            if answer_cache_key is not None and response.n_errors == 0 and response.n_warnings == 0:
+                response_cache.add_cached_answer(answer_cache_key, response_id, compute_seconds)
+        self.response_id = response_id
+
+        #### If asking for the full message back
+        if return_action['parameters']['response'] == 'true':
+            response.info(f"Processing is complete. Transmitting resulting Message back to client.")
+            return response
 
-                    elif action['command'] == 'resultify':
-                        resultifier.apply(response, action['parameters'])
+        #### Else just the id is returned
+        else:
+            if response_id is None:
+                response_id = 0
+            n_results = len(response.envelope.message.results)
+            response.info(f"Processing is complete. Resulting Message id is {response_id} and is available to fetch via /response endpoint.")
 
-                    elif action['command'] == 'overlay':  # recognize the overlay command
-                        overlay.apply(response, action['parameters'])
+            servername = 'localhost'
+            if self.rtxConfig.is_production_server:
+                servername = 'arax.ncats.io'
+            url = f"https://{servername}/api/arax/v1.0/response/{response_id}"
 
-                    elif action['command'] == 'filter_kg':  # recognize the filter_kg command
-                        filter_kg.apply(response, action['parameters'])
+            return( { "status": 200, "response_id": str(response_id), "n_results": n_results, "url": url }, 200)
 
-                    elif action['command'] == 'filter_results':  # recognize the filter_results command
-                        response.debug(f"Before filtering, there are {len(response.envelope.message.results)} results")
-                        filter_results.apply(response, action['parameters'])
 
-                    elif action['command'] == 'query_graph_reasoner':
-                        response.info(f"Sending current query_graph to the QueryGraphReasoner")
-                        qgr = QueryGraphReasoner()
-                        message = qgr.answer(ast.literal_eval(repr(message.query_graph)), TxltrApiFormat=True)
-                        self.message = message
-                        nonstandard_result = True
+    def finalize_results(self, response):
 
-                    elif action['command'] == 'return':
-                        action_stats['return_action'] = action
-                        break
+        #### Update the reasoner_id to ARAX if not already present, and push the results to any client streaming the response
+        if self.results_finalized or response.envelope is None or response.envelope.message is None:
+            return
+        for result in response.envelope.message.results or []:
+            if result.reasoner_id is None:
+                result.reasoner_id = 'ARAX'
+            response.stream_result(result)
+        self.results_finalized = True
 
-                    elif action['command'] == 'rank_results':
-                        response.info(f"Running experimental reranker on results")
-                        try:
-                            ranker = ARAXRanker()
-                            #ranker.aggregate_scores(message, response=response)
-                            ranker.aggregate_scores_dmk(response)
-                        except Exception as error:
-                            exception_type, exception_value, exception_traceback = sys.exc_info()
-                            response.error(f"An uncaught error occurred: {error}: {repr(traceback.format_exception(exception_type, exception_value, exception_traceback))}", error_code="UncaughtARAXiError")
-                            return response
 
-                    else:
-                        response.error(f"Unrecognized command {action['command']}", error_code="UnrecognizedCommand")
-                        return response
+    def report_action_stats(self, response):
 
-                except Exception as error:
-                    exception_type, exception_value, exception_traceback = sys.exc_info()
-                    response.error(f"An uncaught error occurred: {error}: {repr(traceback.format_exception(exception_type, exception_value, exception_traceback))}", error_code="UncaughtARAXiError")
-                    return response
+        #### Dump the action profiles if profiling is on and the query was slow
+        if self.action_profiler is not None:
+            self.action_profiler.dump_profiles(response)
 
-                #### If we're in an error state return now
-                if response.status != 'OK':
-                    response.envelope.status = response.error_code
-                    response.envelope.description = response.message
-                    return response
 
-                #### Immediately after resultify, run the experimental ranker
-                if action['command'] == 'resultify':
-                    response.info(f"Running experimental reranker on results")
-                    try:
-                        ranker = ARAXRanker()
-                        #ranker.aggregate_scores(message, response=response)
-                        ranker.aggregate_scores_dmk(response)
-                    except Exception as error:
-                        exception_type, exception_value, exception_traceback = sys.exc_info()
-                        response.error(f"An uncaught error occurred: {error}: {repr(traceback.format_exception(exception_type, exception_value, exception_traceback))}", error_code="UncaughtARAXiError")
-                        return response
+    def create_tracker_entry(self, query):
 
-            #### At the end, process the explicit return() action, or implicitly perform one
-            return_action = { 'command': 'return', 'parameters': { 'response': 'true', 'store': 'true' } }
-            if action is not None and action['command'] == 'return':
-                return_action = action
-                #### If an explicit one left out some parameters, set the defaults
-                if 'store' not in return_action['parameters']:
-                    return_action['parameters']['store'] = 'false'
-                if 'response' not in return_action['parameters']:
-                    return_action['parameters']['response'] = 'false'
-
-            #print(json.dumps(ast.literal_eval(repr(response.__dict__)), sort_keys=True, indent=2))
-
-            # Fill out the message with data
-            response.envelope.status = response.error_code
-            response.envelope.description = response.message
-            if response.envelope.query_options is None:
-                response.envelope.query_options = {}
-            response.envelope.query_options['actions'] = operations.actions
-
-            # Update the reasoner_id to ARAX if not already present
-            for result in response.envelope.message.results:
-                if result.reasoner_id is None:
-                    result.reasoner_id = 'ARAX'
-
-            # If store=true, then put the message in the database
-            response_id = None
-            if return_action['parameters']['store'] == 'true':
-                response.debug(f"Storing resulting Message")
-                response_id = response_cache.add_new_response(response)
-                
-            #### If asking for the full message back
-            if return_action['parameters']['response'] == 'true':
-                response.info(f"Processing is complete. Transmitting resulting Message back to client.")
-                return response
+        if self.origin is None:
+            return
+        try:
+            from ARAX_query_tracker import ARAXQueryTracker
+            self.query_tracker = ARAXQueryTracker()
+            self.tracker_id = self.query_tracker.create_tracker_entry({ 'origin': self.origin, 'input_query': query,
+                'remote_address': self.remote_address or '????' })
+        except Exception as error:
+            eprint(f"ERROR: Unable to create a query tracker entry: {error}")
+            self.query_tracker = None
+            self.tracker_id = None
 
-            #### Else just the id is returned
-            else:
-                if response_id is None:
-                    response_id = 0
-                n_results = len(message.results)
-                response.info(f"Processing is complete. Resulting Message id is {response_id} and is available to fetch via /response endpoint.")
 
-                servername = 'localhost'
-                if self.rtxConfig.is_production_server:
-                    servername = 'arax.ncats.io'
-                url = f"https://{servername}/api/arax/v1.0/response/{response_id}"
+    def update_tracker_entry(self):
 
-                return( { "status": 200, "response_id": str(response_id), "n_results": n_results, "url": url }, 200)
+        #### Record how the query ended and what each of its actions cost
+        if self.query_tracker is None or self.tracker_id is None:
+            return
+        response = self.response
+        try:
+            if self.action_profiler is not None and len(self.action_profiler.action_stats) > 0:
+                self.query_tracker.add_action_stats(self.tracker_id, self.action_profiler.action_stats)
+            status = response.status if response is not None else 'ERROR'
+            self.query_tracker.update_tracker_entry(self.tracker_id, { 'status': f"Completed {status}", 'message_id': self.response_id,
+                'message_code': response.error_code if response is not None else None,
+                'code_description': (response.message or '')[:50] if response is not None else None })
+        except Exception as error:
+            eprint(f"ERROR: Unable to update query tracker entry {self.tracker_id}: {error}")
 
 
 
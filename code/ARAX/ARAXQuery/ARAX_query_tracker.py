@@ -31,29 +31,55 @@ class ARAXQuery(Base):
     code_description = Column(String(50), nullable=True)
     remote_address = Column(String(50), nullable=False)
 
+class ARAXQueryAction(Base):
+    __tablename__ = 'arax_query_action'
+    query_action_id = Column(Integer, primary_key=True)
+    query_id = Column(Integer, nullable=False)
+    action_number = Column(Integer, nullable=False)
+    command = Column(String(50), nullable=False)
+    start_datetime = Column(String(26), nullable=False) ## ISO formatted YYYY-MM-DDTHH:mm:ss.ffffff
+    wall_seconds = Column(Float, nullable=False)
+    cpu_seconds = Column(Float, nullable=False)
+    peak_rss_delta_mb = Column(Float, nullable=False)
+    n_kg_nodes_before = Column(Integer, nullable=False)
+    n_kg_nodes_after = Column(Integer, nullable=False)
+    n_kg_edges_before = Column(Integer, nullable=False)
+    n_kg_edges_after = Column(Integer, nullable=False)
+    n_results_before = Column(Integer, nullable=False)
+    n_results_after = Column(Integer, nullable=False)
+    action_stats = Column(PickleType, nullable=False) ## blob object with everything, including the parameters
+
 class ARAXQueryTracker:
 
-    def __init__(self):
+    def __init__(self, database_url=None):
         self.session = ""
+        self.engine = None
         self.databaseName = "RTXFeedback"
+        self.database_url = database_url
         self.connect() 
 
     def __del__(self):
-        self.disconnect()
+        if self.engine is not None:
+            self.disconnect()
 
     def create_tables(self):
         Base.metadata.drop_all(self.engine)
         Base.metadata.create_all(self.engine)
 
     def connect(self):
-        rtxConfig = RTXConfiguration()
-        engine = create_engine("mysql+pymysql://" + rtxConfig.mysql_feedback_username + ":" + rtxConfig.mysql_feedback_password + "@" + rtxConfig.mysql_feedback_host + "/" + self.databaseName)
+        database_url = self.database_url
+        if database_url is None:
+            rtxConfig = RTXConfiguration()
+            database_url = "mysql+pymysql://" + rtxConfig.mysql_feedback_username + ":" + rtxConfig.mysql_feedback_password + "@" + rtxConfig.mysql_feedback_host + "/" + self.databaseName
+        engine = create_engine(database_url)
         DBSession = sessionmaker(bind=engine)
         session = DBSession()
         self.session = session
         self.engine = engine
         if not engine.dialect.has_table(engine, 'arax_query'):
             self.create_tables()
+        elif not engine.dialect.has_table(engine, 'arax_query_action'):
+            ARAXQueryAction.__table__.create(engine)
 
     def disconnect(self):
         session = self.session
@@ -93,6 +119,28 @@ class ARAXQueryTracker:
         tracker_id = tracker_entry.query_id
         return tracker_id
 
+    def add_action_stats(self, tracker_id, action_stats):
+        session = self.session
+        for stats in action_stats:
+            session.add(ARAXQueryAction(query_id=tracker_id,
+                action_number=stats['action_number'],
+                command=stats['command'],
+                start_datetime=stats['start_datetime'],
+                wall_seconds=stats['wall_seconds'],
+                cpu_seconds=stats['cpu_seconds'],
+                peak_rss_delta_mb=stats['peak_rss_delta_mb'],
+                n_kg_nodes_before=stats['n_kg_nodes_before'],
+                n_kg_nodes_after=stats['n_kg_nodes_after'],
+                n_kg_edges_before=stats['n_kg_edges_before'],
+                n_kg_edges_after=stats['n_kg_edges_after'],
+                n_results_before=stats['n_results_before'],
+                n_results_after=stats['n_results_after'],
+                action_stats=stats))
+        session.commit()
+
+    def get_action_stats(self, tracker_id):
+        return self.session.query(ARAXQueryAction).filter(ARAXQueryAction.query_id==tracker_id).order_by(ARAXQueryAction.action_number).all()
+
     def get_entries(self, last_N_hours=24, incomplete_only=False):
         if incomplete_only:
             return self.session.query(ARAXQuery).filter(
@@ -1,5 +1,6 @@
 #!/bin/env python3
 import math
+import multiprocessing
 import os
 import networkx as nx
 import numpy as np
@@ -8,8 +9,10 @@ import sys
 import json
 import ast
 import re
+import time
+import traceback
 
-from typing import Set, Union, Dict, List, Callable
+from typing import Set, Union, Dict, List
 from ARAX_response import ARAXResponse
 from query_graph_info import QueryGraphInfo
 
@@ -37,54 +40,68 @@ def _get_query_graph_networkx_from_query_graph(query_graph: QueryGraph) -> nx.Mu
     return query_graph_nx
 
 
-def _get_weighted_graph_networkx_from_result_graph(kg_edge_id_to_edge: Dict[str, Edge],
-                                                   qg_nx: Union[nx.MultiDiGraph, nx.MultiGraph],
-                                                   result: Result) -> Union[nx.MultiDiGraph,
-                                                                            nx.MultiGraph]:
-    res_graph = qg_nx.copy()
-    qg_edge_tuples = tuple(qg_nx.edges(keys=True, data=True))
-    qg_edge_key_to_edge_tuple = {edge_tuple[2]: edge_tuple for edge_tuple in qg_edge_tuples}
-    for key, edge_binding_list in result.edge_bindings.items():
-        # FIXME: EWD: there's a problem here, but I'm baffled by what this is supposed to be doing
-        for edge_binding in edge_binding_list:
-            kg_edge = kg_edge_id_to_edge[edge_binding.id]
-            kg_edge_attributes = {x.name:x.value for x in kg_edge.attributes}
-            kg_edge_conf = kg_edge.confidence
-            #kg_edge_conf = kg_edge_attributes["confidence"]
-            qedge_keys = kg_edge.qedge_keys
-            for qedge_key in qedge_keys:
-                qedge_tuple = qg_edge_key_to_edge_tuple[qedge_key]
-                res_graph[qedge_tuple[0]][qedge_tuple[1]][qedge_key]['weight'] = kg_edge_conf
-    return res_graph
-
-
-def _get_weighted_graphs_networkx_from_result_graphs(kg_edge_id_to_edge: Dict[str, Edge],
-                                                     qg_nx: Union[nx.MultiDiGraph, nx.MultiGraph],
-                                                     results: List[Result]) -> List[Union[nx.MultiDiGraph,
-                                                                                          nx.MultiGraph]]:
-    res_list = []
-    for result in results:
-        res_list.append(_get_weighted_graph_networkx_from_result_graph(kg_edge_id_to_edge,
-                                                                       qg_nx,
-                                                                       result))
-    return res_list
-
-
-# credit: StackOverflow:15590812
-def _collapse_nx_multigraph_to_weighted_graph(graph_nx: Union[nx.MultiDiGraph,
-                                                              nx.MultiGraph]) -> Union[nx.DiGraph,
-                                                                                       nx.Graph]:
-    if type(graph_nx) == nx.MultiGraph:
-        ret_graph = nx.Graph()
-    elif type(graph_nx) == nx.MultiDiGraph:
-        ret_graph = nx.DiGraph()
-    for u, v, data in graph_nx.edges(data=True):
-        w = data['weight'] if 'weight' in data else 1.0
-        if ret_graph.has_edge(u, v):
-            ret_graph[u][v]['weight'] += w
-        else:
-            ret_graph.add_edge(u, v, weight=w)
-    return ret_graph
+def _get_result_qedge_weights(kg_edge_id_to_edge: Dict[str, Edge],
+                              qedge_index_by_key: Dict[str, int],
+                              results: List[Result]) -> np.ndarray:
+    # Each result graph has the shape of the query graph, with each qedge weighted by the confidence of its KG edge
+    # (if several KG edges are bound, the last one processed wins); returns one row of qedge weights per result
+    weights = np.zeros((len(results), len(qedge_index_by_key)))
+    for result_index, result in enumerate(results):
+        for key, edge_binding_list in result.edge_bindings.items():
+            for edge_binding in edge_binding_list:
+                kg_edge = kg_edge_id_to_edge[edge_binding.id]
+                for qedge_key in kg_edge.qedge_keys:
+                    weights[result_index, qedge_index_by_key[qedge_key]] = kg_edge.confidence
+    return weights
+
+
+def _get_result_adjacency_matrices(qedge_weights: np.ndarray,
+                                   qedge_node_indexes: List[tuple],
+                                   num_qnodes: int) -> np.ndarray:
+    # Stacks each result graph's weighted adjacency matrix (parallel qedges summed), indexed by qnode position
+    adjacency_matrices = np.zeros((qedge_weights.shape[0], num_qnodes, num_qnodes))
+    for qedge_index, (subject_index, object_index) in enumerate(qedge_node_indexes):
+        adjacency_matrices[:, subject_index, object_index] += qedge_weights[:, qedge_index]
+    return adjacency_matrices
+
+
+def _get_max_distance_qnode_pairs(qg_nx: Union[nx.MultiDiGraph, nx.MultiGraph]) -> (int, List[tuple]):
+    # Every result graph has the query graph's edges (even if some have zero weight), so the pairs of qnodes that are
+    # farthest apart are the same for all of them
+    apsp_dict = dict(nx.algorithms.shortest_paths.unweighted.all_pairs_shortest_path_length(qg_nx))
+    path_len_with_pairs_list = [(node_i, node_j, path_len) for node_i, node_i_dict in apsp_dict.items() for node_j, path_len in node_i_dict.items()]
+    max_path_len = max([path_len_with_pair_list_item[2] for path_len_with_pair_list_item in path_len_with_pairs_list])
+    pairs_with_max_path_len = [path_len_with_pair_list_item[0:2] for path_len_with_pair_list_item in path_len_with_pairs_list if
+                               path_len_with_pair_list_item[2] == max_path_len]
+    return max_path_len, pairs_with_max_path_len
+
+
+def _get_max_flow_value(capacity_matrix: np.ndarray, source_index: int, target_index: int) -> float:
+    # Edmonds-Karp on a (small, dense) capacity matrix
+    residual = capacity_matrix.tolist()
+    num_nodes = len(residual)
+    flow_value = 0.0
+    while True:
+        parents = [-1] * num_nodes
+        parents[source_index] = source_index
+        queue = [source_index]
+        for node_index in queue:
+            for neighbor_index in range(num_nodes):
+                if parents[neighbor_index] == -1 and residual[node_index][neighbor_index] > 0:
+                    parents[neighbor_index] = node_index
+                    queue.append(neighbor_index)
+        if parents[target_index] == -1:
+            return flow_value
+        path = []
+        node_index = target_index
+        while node_index != source_index:
+            path.append((parents[node_index], node_index))
+            node_index = parents[node_index]
+        bottleneck = min(residual[node_i][node_j] for node_i, node_j in path)
+        for node_i, node_j in path:
+            residual[node_i][node_j] -= bottleneck
+            residual[node_j][node_i] += bottleneck
+        flow_value += bottleneck
 
 
 # computes quantile ranks in *ascending* order (so a higher x entry has a higher
@@ -95,72 +112,92 @@ def _quantile_rank_list(x: List[float]) -> np.array:
     return y/len(y)
 
 
-def _score_networkx_graphs_by_max_flow(result_graphs_nx: List[Union[nx.MultiDiGraph,
-                                                                    nx.MultiGraph]]) -> List[float]:
-    max_flow_values = []
-    for result_graph_nx in result_graphs_nx:
-        if len(result_graph_nx) > 1:
-            apsp_dict = dict(nx.algorithms.shortest_paths.unweighted.all_pairs_shortest_path_length(result_graph_nx))
-            path_len_with_pairs_list = [(node_i, node_j, path_len) for node_i, node_i_dict in apsp_dict.items() for node_j, path_len in node_i_dict.items()]
-            max_path_len = max([path_len_with_pair_list_item[2] for path_len_with_pair_list_item in
-                                path_len_with_pairs_list])
-            pairs_with_max_path_len = [path_len_with_pair_list_item[0:2] for path_len_with_pair_list_item in path_len_with_pairs_list if
-                                       path_len_with_pair_list_item[2] == max_path_len]
-            max_flow_values_for_node_pairs = []
-            result_graph_collapsed_nx = _collapse_nx_multigraph_to_weighted_graph(result_graph_nx)
-            for source_node_id, target_node_id in pairs_with_max_path_len:
-                max_flow_values_for_node_pairs.append(nx.algorithms.flow.maximum_flow_value(result_graph_collapsed_nx,
-                                                                                            source_node_id,
-                                                                                            target_node_id,
-                                                                                            capacity="weight"))
-            max_flow_value = 0.0
-            if len(max_flow_values_for_node_pairs) > 0:
-                max_flow_value = sum(max_flow_values_for_node_pairs)/float(len(max_flow_values_for_node_pairs))
-        else:
-            max_flow_value = 1.0
-        max_flow_values.append(max_flow_value)
+def _score_adjacency_matrices_by_max_flow(adjacency_matrices: np.ndarray, max_path_len: int,
+                                          pairs_with_max_path_len: List[tuple]) -> np.ndarray:
+    if adjacency_matrices.shape[1] <= 1:
+        return np.ones(adjacency_matrices.shape[0])
+    pairs_with_max_path_len = [(node_i, node_j) for node_i, node_j in pairs_with_max_path_len if node_i != node_j]
+    max_flow_values = np.zeros(adjacency_matrices.shape[0])
+    if pairs_with_max_path_len:
+        for result_index, adjacency_matrix in enumerate(adjacency_matrices):
+            max_flow_values_for_node_pairs = [_get_max_flow_value(adjacency_matrix, node_i, node_j) for node_i, node_j in pairs_with_max_path_len]
+            max_flow_values[result_index] = sum(max_flow_values_for_node_pairs)/float(len(max_flow_values_for_node_pairs))
     return max_flow_values
 
 
-def _score_networkx_graphs_by_longest_path(result_graphs_nx: List[Union[nx.MultiDiGraph,
-                                                                        nx.MultiGraph]]) -> List[float]:
-    result_scores = []
-    for result_graph_nx in result_graphs_nx:
-        apsp_dict = dict(nx.algorithms.shortest_paths.unweighted.all_pairs_shortest_path_length(result_graph_nx))
-        path_len_with_pairs_list = [(node_i, node_j, path_len) for node_i, node_i_dict in apsp_dict.items() for node_j, path_len in node_i_dict.items()]
-        max_path_len = max([path_len_with_pair_list_item[2] for path_len_with_pair_list_item in
-                            path_len_with_pairs_list])
-        pairs_with_max_path_len = [path_len_with_pair_list_item[0:2] for path_len_with_pair_list_item in path_len_with_pairs_list if
-                                   path_len_with_pair_list_item[2] == max_path_len]
-        map_node_name_to_index = {node_id: node_index for node_index, node_id in enumerate(result_graph_nx.nodes)}
-        adj_matrix = nx.to_numpy_matrix(result_graph_nx)
-        adj_matrix_power = np.linalg.matrix_power(adj_matrix, max_path_len)/math.factorial(max_path_len)
-        score_list = [adj_matrix_power[map_node_name_to_index[node_i],
-                                       map_node_name_to_index[node_j]] for node_i, node_j in pairs_with_max_path_len]
-        result_score = np.mean(score_list)
-        result_scores.append(result_score)
-    return result_scores
-
-
-def _score_networkx_graphs_by_frobenius_norm(result_graphs_nx: List[Union[nx.MultiDiGraph,
-                                                                          nx.MultiGraph]]) -> List[float]:
-    result_scores = []
-    for result_graph_nx in result_graphs_nx:
-        adj_matrix = nx.to_numpy_matrix(result_graph_nx)
-        result_score = np.linalg.norm(adj_matrix, ord='fro')
-        result_scores.append(result_score)
-    return result_scores
-
-
-def _score_result_graphs_by_networkx_graph_scorer(kg_edge_id_to_edge: Dict[str, Edge],
-                                                  qg_nx: Union[nx.MultiDiGraph, nx.MultiGraph],
-                                                  results: List[Result],
-                                                  nx_graph_scorer: Callable[[List[Union[nx.MultiDiGraph,
-                                                                                        nx.MultiGraph]]], np.array]) -> List[float]:
-    result_graphs_nx = _get_weighted_graphs_networkx_from_result_graphs(kg_edge_id_to_edge,
-                                                                        qg_nx,
-                                                                        results)
-    return nx_graph_scorer(result_graphs_nx)
+def _score_adjacency_matrices_by_longest_path(adjacency_matrices: np.ndarray, max_path_len: int,
+                                              pairs_with_max_path_len: List[tuple]) -> np.ndarray:
+    adj_matrix_powers = np.linalg.matrix_power(adjacency_matrices, max_path_len)/math.factorial(max_path_len)
+    node_i_indexes, node_j_indexes = zip(*pairs_with_max_path_len)
+    return np.mean(adj_matrix_powers[:, list(node_i_indexes), list(node_j_indexes)], axis=1)
+
+
+def _score_adjacency_matrices_by_frobenius_norm(adjacency_matrices: np.ndarray, max_path_len: int,
+                                                pairs_with_max_path_len: List[tuple]) -> np.ndarray:
+    return np.linalg.norm(adjacency_matrices, ord='fro', axis=(1, 2))
+
+
+RESULT_GRAPH_SCORERS = {'max_flow': _score_adjacency_matrices_by_max_flow,
+                        'longest_path': _score_adjacency_matrices_by_longest_path,
+                        'frobenius_norm': _score_adjacency_matrices_by_frobenius_norm}
+RESULT_SCORING_CHUNK_SIZE = 2000  # Number of results scored per process pool task
+MIN_RESULTS_FOR_PROCESS_POOL = 20000  # Below this, scoring in parallel isn't worth the ~1.5s it takes to spawn the processes
+RESULT_SCORING_TIMEOUT_SECONDS = 300  # How long to wait for the process pool before giving up and scoring serially
+
+
+def _score_result_graph_chunk(scorer_args: tuple) -> (Dict[str, np.ndarray], Dict[str, float]):
+    adjacency_matrices, max_path_len, pairs_with_max_path_len = scorer_args
+    scores = dict()
+    scorer_times = dict()
+    for scorer_name, scorer in RESULT_GRAPH_SCORERS.items():
+        start = time.time()
+        scores[scorer_name] = scorer(adjacency_matrices, max_path_len, pairs_with_max_path_len)
+        scorer_times[scorer_name] = time.time() - start
+    return scores, scorer_times
+
+
+def _score_result_graphs(kg_edge_id_to_edge: Dict[str, Edge],
+                         query_graph: QueryGraph,
+                         results: List[Result],
+                         response: ARAXResponse) -> List[np.ndarray]:
+    """
+    Scores each result graph by max flow, longest path, and Frobenius norm. Each result's weighted adjacency matrix
+    (over the query graph's qnodes) is built once and shared by all three scorers, which work on stacks of these
+    matrices. Large numbers of results are scored in chunks on a process pool. Returns a list of score arrays, one
+    per scorer.
+    """
+    qg_nx = _get_query_graph_networkx_from_query_graph(query_graph)
+    qnode_index_by_key = {qnode_key: qnode_index for qnode_index, qnode_key in enumerate(qg_nx.nodes)}
+    qedge_index_by_key = {qedge_key: qedge_index for qedge_index, qedge_key in enumerate(query_graph.edges)}
+    qedge_node_indexes = [(qnode_index_by_key[qedge.subject], qnode_index_by_key[qedge.object]) for qedge in query_graph.edges.values()]
+    max_path_len, pairs_with_max_path_len = _get_max_distance_qnode_pairs(qg_nx)
+    pair_indexes_with_max_path_len = [(qnode_index_by_key[node_i], qnode_index_by_key[node_j]) for node_i, node_j in pairs_with_max_path_len]
+
+    start = time.time()
+    qedge_weights = _get_result_qedge_weights(kg_edge_id_to_edge, qedge_index_by_key, results)
+    adjacency_matrices = _get_result_adjacency_matrices(qedge_weights, qedge_node_indexes, len(qnode_index_by_key))
+    response.debug(f"Built weighted adjacency matrices for {len(results)} result graphs in {round(time.time() - start, 3)}s")
+
+    chunks = [(adjacency_matrices[chunk_start:chunk_start + RESULT_SCORING_CHUNK_SIZE], max_path_len, pair_indexes_with_max_path_len)
+              for chunk_start in range(0, len(results), RESULT_SCORING_CHUNK_SIZE)]
+    chunk_outputs = None
+    if len(results) >= MIN_RESULTS_FOR_PROCESS_POOL and len(chunks) > 1:
+        # Fresh interpreters rather than forks: forking the multi-threaded server can deadlock on locks other threads hold
+        try:
+            with multiprocessing.get_context('spawn').Pool(processes=min(len(chunks), os.cpu_count() or 1)) as executor:
+                chunk_outputs = executor.map_async(_score_result_graph_chunk, chunks).get(timeout=RESULT_SCORING_TIMEOUT_SECONDS)
+        except multiprocessing.TimeoutError:
+            response.warning(f"Scoring results in parallel took over {RESULT_SCORING_TIMEOUT_SECONDS}s, so scoring them serially instead")
+        except Exception:
+            tb = traceback.format_exc()
+            response.warning(f"Failed to score results in parallel, so scoring them serially instead: {tb}")
+    if chunk_outputs is None:
+        chunk_outputs = [_score_result_graph_chunk(chunk) for chunk in chunks]
+
+    scorer_times = {scorer_name: sum(chunk_times[scorer_name] for _, chunk_times in chunk_outputs) for scorer_name in RESULT_GRAPH_SCORERS}
+    response.info(f"Scored {len(results)} result graphs in {len(chunks)} chunk(s); time per scorer (summed over chunks): "
+                  f"{', '.join(f'{scorer_name}: {round(scorer_time, 3)}s' for scorer_name, scorer_time in scorer_times.items())}")
+    return [np.concatenate([chunk_scores[scorer_name] for chunk_scores, _ in chunk_outputs]) for scorer_name in RESULT_GRAPH_SCORERS]
 
 
 class ARAXRanker:
@@ -269,15 +306,7 @@ and [frobenius norm](https://en.wikipedia.org/wiki/Matrix_norm#Frobenius_norm).
                     n_publications = len(edge_attribute_dict["publications"])
                 else:
                     n_publications = 0
-                if n_publications == 0:
-                    pub_value = 0.01
-                else:
-                    pub_value = np.log(n_publications)
-                    max_value = 1.0
-                    curve_steepness = 3.16993
-                    logistic_midpoint = 1.38629
-                    pub_value = max_value / float(1 + np.exp(-curve_steepness * (pub_value - logistic_midpoint)))
-                edge_confidence *= pub_value
+                edge_confidence *= float(self.__normalize_n_publications(n_publications))
         return edge_confidence
 
     def edge_attribute_score_normalizer(self, edge_attribute_name: str, edge_attribute_value) -> float:
@@ -327,7 +356,7 @@ and [frobenius norm](https://en.wikipedia.org/wiki/Matrix_norm#Frobenius_norm).
         max_value = 1
         curve_steepness = 15
         logistic_midpoint = 0.60
-        normalized_value = max_value / float(1+np.exp(-curve_steepness*(value - logistic_midpoint)))
+        normalized_value = max_value / (1 + np.exp(-curve_steepness*(value - logistic_midpoint)))
         # TODO: if "near" to the min value, set to zero (maybe one std dev from the min value of the logistic curve?)
         # TODO: make sure max value can be obtained
         return normalized_value
@@ -339,7 +368,7 @@ and [frobenius norm](https://en.wikipedia.org/wiki/Matrix_norm#Frobenius_norm).
         max_value = 1
         curve_steepness = -9
         logistic_midpoint = 0.60
-        normalized_value = max_value / float(1 + np.exp(-curve_steepness * (value - logistic_midpoint)))
+        normalized_value = max_value / (1 + np.exp(-curve_steepness * (value - logistic_midpoint)))
         # TODO: if "near" to the min value, set to zero (maybe one std dev from the min value of the logistic curve?)
         # TODO: make sure max value can be obtained
         return normalized_value
@@ -353,7 +382,7 @@ and [frobenius norm](https://en.wikipedia.org/wiki/Matrix_norm#Frobenius_norm).
         max_value = 1
         curve_steepness = 20
         logistic_midpoint = 0.8
-        normalized_value = max_value / float(1 + np.exp(-curve_steepness * (value - logistic_midpoint)))
+        normalized_value = max_value / (1 + np.exp(-curve_steepness * (value - logistic_midpoint)))
         # TODO: if "near" to the min value, set to zero (maybe one std dev from the min value of the logistic curve?)
         # TODO: make sure max value can be obtained
         return normalized_value
@@ -383,7 +412,7 @@ and [frobenius norm](https://en.wikipedia.org/wiki/Matrix_norm#Frobenius_norm).
         max_value = 1
         curve_steepness = 2000  # really steep since the max values I've ever seen are quite small (eg .03)
         logistic_midpoint = 0.002  # seems like an ok mid point, but....
-        normalized_value = max_value / float(1 + np.exp(-curve_steepness * (value - logistic_midpoint)))
+        normalized_value = max_value / (1 + np.exp(-curve_steepness * (value - logistic_midpoint)))
         # TODO: if "near" to the min value, set to zero (maybe one std dev from the min value of the logistic curve?)
         # TODO: make sure max value can be obtained
         # print(f"value: {value}, normalized: {normalized_value}")
@@ -396,7 +425,7 @@ and [frobenius norm](https://en.wikipedia.org/wiki/Matrix_norm#Frobenius_norm).
         max_value = 1
         curve_steepness = 2  # Todo: need to fiddle with this as it's not quite weighting things enough
         logistic_midpoint = 2  # Exp[2] more likely than chance
-        normalized_value = max_value / float(1 + np.exp(-curve_steepness * (value - logistic_midpoint)))
+        normalized_value = max_value / (1 + np.exp(-curve_steepness * (value - logistic_midpoint)))
         # TODO: if "near" to the min value, set to zero (maybe one std dev from the min value of the logistic curve?)
         # TODO: make sure max value can be obtained
         # print(f"value: {value}, normalized: {normalized_value}")
@@ -420,7 +449,7 @@ and [frobenius norm](https://en.wikipedia.org/wiki/Matrix_norm#Frobenius_norm).
         max_value = 1
         curve_steepness = 0.03
         logistic_midpoint = 200
-        normalized_value = max_value / float(1 + np.exp(-curve_steepness * (value - logistic_midpoint)))
+        normalized_value = max_value / (1 + np.exp(-curve_steepness * (value - logistic_midpoint)))
         # TODO: if "near" to the min value, set to zero (maybe one std dev from the min value of the logistic curve?)
         # TODO: make sure max value can be obtained
         # print(f"value: {value}, normalized: {normalized_value}")
@@ -439,7 +468,7 @@ and [frobenius norm](https://en.wikipedia.org/wiki/Matrix_norm#Frobenius_norm).
         max_value = 1.0
         curve_steepness = 0.849
         logistic_midpoint = 4.97
-        normalized_value = max_value / float(1 + np.exp(-curve_steepness * (value - logistic_midpoint)))
+        normalized_value = max_value / (1 + np.exp(-curve_steepness * (value - logistic_midpoint)))
         return normalized_value
 
 
@@ -466,13 +495,76 @@ and [frobenius norm](https://en.wikipedia.org/wiki/Matrix_norm#Frobenius_norm).
         max_value = 1.0
         curve_steepness = 3
         logistic_midpoint = 2.7
-        normalized_value = max_value / float(1 + np.exp(-curve_steepness * (value - logistic_midpoint)))
+        normalized_value = max_value / (1 + np.exp(-curve_steepness * (value - logistic_midpoint)))
 
         return normalized_value
 
     def __normalize_Richards_effector_genes(self, value):
         return value
 
+    def __normalize_n_publications(self, value):
+        """
+        For SemMedDB edges: Scale the confidence by the log of the number of supporting publications, and heavily
+        penalize edges with no publications at all (0.01)
+        """
+        max_value = 1.0
+        curve_steepness = 3.16993
+        logistic_midpoint = 1.38629
+        with np.errstate(divide='ignore'):
+            normalized_value = max_value / (1 + np.exp(-curve_steepness * (np.log(value) - logistic_midpoint)))
+        return np.where(value == 0, 0.01, normalized_value)
+
+    def edge_attribute_column_normalizer(self, edge_attribute_name: str, edge_attribute_values: np.ndarray) -> np.ndarray:
+        """
+        Vectorized edge_attribute_score_normalizer: takes all the values of a single known edge attribute (as floats,
+        with NaN for anything that isn't a number) and normalizes them all at once into the interval [0,1]
+        """
+        normalized_values = np.zeros(len(edge_attribute_values))
+        is_number = ~np.isnan(edge_attribute_values)
+        # Fix hyphens or spaces to underscores in names
+        edge_attribute_name = re.sub(r'[- ]','_',edge_attribute_name)
+        normalizer = getattr(self, '_' + self.__class__.__name__ + '__normalize_' + edge_attribute_name)
+        with np.errstate(all='ignore'):  # the scalar normalizers also let -log(0) and exp() overflow through as inf
+            normalized_values[is_number] = normalizer(value=edge_attribute_values[is_number])
+        return normalized_values
+
+    def get_edge_attribute_columns(self, edges: List[Edge]):
+        """
+        Makes a single pass over the attributes of the given edges and pulls out:
+        1. every known attribute, as one column per attribute name: (index of the edge it came from, value as a float)
+        2. the explicitly given edge confidences, by edge index
+        3. the number of publications of each SemMedDB edge, as (edge index, number of publications) columns
+        """
+        known_attributes = set(self.known_attributes)
+        edge_indexes_by_attribute = dict()
+        values_by_attribute = dict()
+        given_confidences = dict()
+        semmeddb_edge_indexes = []
+        semmeddb_n_publications = []
+        for edge_index, edge in enumerate(edges):
+            if edge.attributes is None:
+                continue
+            edge_attribute_dict = {}
+            for edge_attribute in edge.attributes:
+                edge_attribute_dict[edge_attribute.name] = edge_attribute.value
+                if edge_attribute.name in known_attributes:
+                    try:
+                        value = float(edge_attribute.value)
+                    except (TypeError, ValueError):
+                        value = np.nan
+                    edge_indexes_by_attribute.setdefault(edge_attribute.name, []).append(edge_index)
+                    values_by_attribute.setdefault(edge_attribute.name, []).append(value)
+            if edge_attribute_dict.get("confidence", None) is not None:
+                given_confidences[edge_index] = edge_attribute_dict["confidence"]
+            if edge_attribute_dict.get("provided_by", None) is not None and "SEMMEDDB:" in edge_attribute_dict["provided_by"]:
+                semmeddb_edge_indexes.append(edge_index)
+                publications = edge_attribute_dict.get("publications", None)
+                semmeddb_n_publications.append(len(publications) if publications is not None else 0)
+        attribute_columns = {attribute_name: (np.array(edge_indexes, dtype=np.int64), np.array(values_by_attribute[attribute_name], dtype=float))
+                             for attribute_name, edge_indexes in edge_indexes_by_attribute.items()}
+        semmeddb_columns = (np.array(semmeddb_edge_indexes, dtype=np.int64), np.array(semmeddb_n_publications, dtype=float))
+        return attribute_columns, given_confidences, semmeddb_columns
+
     def aggregate_scores_dmk(self, response):
         """
         Take in a message,
@@ -500,51 +592,44 @@ and [frobenius norm](https://en.wikipedia.org/wiki/Matrix_norm#Frobenius_norm).
         #    4. Auto-thresholding of values (eg. if chi_square <0.05, penalize the most, if probability_treats < 0.8, penalize the most, etc.)
         #    5. Allow for ranked answers (eg. observed_expected can have a single, huge value, skewing the rest of them
 
-        # #### Iterate through all the edges in the knowledge graph to:
-        # #### 1) Create a dict of all edges by id
-        # #### 2) Collect some min,max stats for edge_attributes that we may need later
+        # #### Pull every known edge attribute out of the knowledge graph in a single pass, as one column per attribute
         kg_edge_id_to_edge = self.kg_edge_id_to_edge
+        kg_edge_id_to_edge.update(message.knowledge_graph.edges)
+        edges = list(message.knowledge_graph.edges.values())
+        attribute_columns, given_confidences, semmeddb_columns = self.get_edge_attribute_columns(edges)
+
+        # #### Collect some min,max stats for edge_attributes that we may need later (ignoring inf, -inf, and nan), adding
+        # #### to the stats of any knowledge graphs this ranker has already seen
         score_stats = self.score_stats
         no_non_inf_float_flag = True
-        for edge_key,edge in message.knowledge_graph.edges.items():
-            kg_edge_id_to_edge[edge_key] = edge
-            if edge.attributes is not None:
-                for edge_attribute in edge.attributes:
-                    for attribute_name in self.known_attributes:
-                        if edge_attribute.name == attribute_name:
-                            if attribute_name not in score_stats:
-                                score_stats[attribute_name] = {'minimum': None, 'maximum': None}  # FIXME: doesn't handle the case when all values are inf|NaN
-                            value = float(edge_attribute.value)
-                            # initialize if not None already
-                            if not np.isinf(value) and not np.isinf(-value) and not np.isnan(value):  # Ignore inf, -inf, and nan
-                                no_non_inf_float_flag = False
-                                if not score_stats[attribute_name]['minimum']:
-                                    score_stats[attribute_name]['minimum'] = value
-                                if not score_stats[attribute_name]['maximum']:
-                                    score_stats[attribute_name]['maximum'] = value
-                                if value > score_stats[attribute_name]['maximum']:
-                                    score_stats[attribute_name]['maximum'] = value
-                                if value < score_stats[attribute_name]['minimum']:
-                                    score_stats[attribute_name]['minimum'] = value
+        for attribute_name, (edge_indexes, values) in attribute_columns.items():
+            if attribute_name not in score_stats:
+                score_stats[attribute_name] = {'minimum': None, 'maximum': None}  # FIXME: doesn't handle the case when all values are inf|NaN
+            finite_values = values[np.isfinite(values)]
+            if finite_values.size:
+                no_non_inf_float_flag = False
+                minimum = float(finite_values.min())
+                maximum = float(finite_values.max())
+                if score_stats[attribute_name]['minimum'] is None or minimum < score_stats[attribute_name]['minimum']:
+                    score_stats[attribute_name]['minimum'] = minimum
+                if score_stats[attribute_name]['maximum'] is None or maximum > score_stats[attribute_name]['maximum']:
+                    score_stats[attribute_name]['maximum'] = maximum
 
         if no_non_inf_float_flag:
             response.warning(
                         f"No non-infinite value was encountered in any edge attribute in the knowledge graph.")
         response.info(f"Summary of available edge metrics: {score_stats}")
 
-        # Loop over the entire KG and normalize and combine the score of each edge, place that information in the confidence attribute of the edge
-        for edge_key,edge in message.knowledge_graph.edges.items():
-            edge_attributes = {x.name:x.value for x in edge.attributes}
-            if edge_attributes.get("confidence", None) is not None:
-            #if False:       # FIXME: there is no longer such an attribute. Stored as a generic attribute?
-            #if edge.confidence is not None:
-                # don't touch the confidence, since apparently someone already knows what the confidence should be
-                edge.confidence = edge_attributes['confidence']
-                #continue
-            else:
-                confidence = self.edge_attribute_score_combiner(edge)
-                #edge.attributes.append(Attribute(name="confidence", value=confidence))
-                edge.confidence = confidence
+        # Normalize each attribute column and multiply them together into the confidence of each edge (currently a dead
+        # simple "just multiply them all together", as in edge_attribute_score_combiner), then write the confidences
+        # back, unless someone already knows what the confidence of an edge should be
+        edge_confidences = np.ones(len(edges))
+        for attribute_name, (edge_indexes, values) in attribute_columns.items():
+            np.multiply.at(edge_confidences, edge_indexes, self.edge_attribute_column_normalizer(attribute_name, values))
+        semmeddb_edge_indexes, semmeddb_n_publications = semmeddb_columns
+        np.multiply.at(edge_confidences, semmeddb_edge_indexes, self.__normalize_n_publications(semmeddb_n_publications))
+        for edge_index, (edge, confidence) in enumerate(zip(edges, edge_confidences.tolist())):
+            edge.confidence = given_confidences.get(edge_index, confidence)
 
         # Now that each edge has a confidence attached to it based on it's attributes, we can now:
         # 1. consider edge types of the results
@@ -554,19 +639,14 @@ and [frobenius norm](https://en.wikipedia.org/wiki/Matrix_norm#Frobenius_norm).
         ###################################
         # TODO: Replace this with a more "intelligent" separate function
         # now we can loop over all the results, and combine their edge confidences (now populated)
-        qg_nx = _get_query_graph_networkx_from_query_graph(message.query_graph)
         kg_edge_id_to_edge = self.kg_edge_id_to_edge
         results = message.results
-        ranks_list = list(map(_quantile_rank_list,
-                              map(lambda scorer_func: _score_result_graphs_by_networkx_graph_scorer(kg_edge_id_to_edge,
-                                                                                                    qg_nx,
-                                                                                                    results,
-                                                                                                    scorer_func),
-                                  [_score_networkx_graphs_by_max_flow,
-                                   _score_networkx_graphs_by_longest_path,
-                                   _score_networkx_graphs_by_frobenius_norm])))
+        if results:
+            ranks_list = list(map(_quantile_rank_list, _score_result_graphs(kg_edge_id_to_edge, message.query_graph, results, response)))
+        else:
+            ranks_list = []
         #print(ranks_list)
-        result_scores = sum(ranks_list)/float(len(ranks_list))
+        result_scores = sum(ranks_list)/float(len(ranks_list)) if ranks_list else []
         #print(result_scores)
         for result, score in zip(results, result_scores):
             result.confidence = score
@@ -3,6 +3,7 @@ import sys
 def eprint(*args, **kwargs): print(*args, file=sys.stderr, **kwargs)
 
 import datetime
+import queue
 
 
 class ARAXResponse:
@@ -22,6 +23,11 @@ class ARAXResponse:
     output = None
     #output = 'STDERR'
 
+    #### Types of the events pushed over an event stream (see open_event_stream())
+    EVENT_MESSAGE = 'message'
+    EVENT_RESULT = 'result'
+    EVENT_DONE = 'done'
+
     #### Constructor
     def __init__(self, status='OK', logging_level=WARNING, error_code='OK', message='Normal completion'):
         self.status = status
@@ -34,6 +40,49 @@ class ARAXResponse:
         self.n_warnings = 0
         self.data = {}
         self.envelope = None
+        self.event_queue = None
+
+
+    #### Open a channel over which events are pushed as they happen
+    def open_event_stream(self, event_queue=None):
+        """Public method that opens an event stream on the response object. From then on, every
+        logged (or merged) message is pushed onto the returned queue as an (EVENT_MESSAGE, message)
+        tuple as soon as it is added, and results can be pushed with stream_result(), so that a
+        consumer on another thread can block on the queue instead of polling the messages list.
+        The producer signals the end of the stream with close_event_stream().
+
+        :param event_queue: An existing queue to push events onto (default: a new queue.Queue).
+        :type event_queue: queue.Queue
+        :return: The queue that events will be pushed onto
+        :rtype: queue.Queue
+        """
+        if event_queue is None:
+            event_queue = queue.Queue()
+        self.event_queue = event_queue
+        return event_queue
+
+
+    #### Push a finished result onto the event stream
+    def stream_result(self, result):
+        """Public method that pushes a result onto the event stream (if one is open) as an
+        (EVENT_RESULT, result_dict) tuple, so that it can be sent to the client before the
+        full envelope is ready. The result is serialized right away, so later changes to it
+        are not reflected in the pushed event. Does nothing if no event stream is open.
+
+        :param result: A result that is not expected to change anymore.
+        :type result: Result
+        """
+        if self.event_queue is not None:
+            self.event_queue.put((self.EVENT_RESULT, result.to_dict()))
+
+
+    #### Signal the end of the event stream
+    def close_event_stream(self):
+        """Public method that pushes a final (EVENT_DONE, None) tuple onto the event stream
+        (if one is open) to let the consumer know that nothing more will follow.
+        """
+        if self.event_queue is not None:
+            self.event_queue.put((self.EVENT_DONE, None))
 
 
     #### Add a debugging message
@@ -123,8 +172,11 @@ class ARAXResponse:
         """
 
         timestamp = str(datetime.datetime.now().isoformat())
-        self.messages.append( { 'timestamp': timestamp, 'level': self.level_names[level], 'code': code, 'message': message } )
+        message_dict = { 'timestamp': timestamp, 'level': self.level_names[level], 'code': code, 'message': message }
+        self.messages.append(message_dict)
         self.n_messages += 1
+        if self.event_queue is not None:
+            self.event_queue.put((self.EVENT_MESSAGE, message_dict))
 
         # Create a pretty printable message prefix
         prefix = f"{timestamp} {self.level_names[level]}: "
@@ -152,8 +204,12 @@ class ARAXResponse:
         self.n_messages += response_to_merge.n_messages
         self.n_errors += response_to_merge.n_errors
         self.n_warnings += response_to_merge.n_warnings
+        # Messages of a response that logs to the same event stream were already pushed when they were logged
+        push_messages = self.event_queue is not None and response_to_merge.event_queue is not self.event_queue
         for message in response_to_merge.messages:
             self.messages.append(message)
+            if push_messages:
+                self.event_queue.put((self.EVENT_MESSAGE, message))
         if response_to_merge.status != 'OK':
             self.status = response_to_merge.status
             self.error_code = response_to_merge.error_code
@@ -236,6 +292,18 @@ class ResponseTests(unittest.TestCase):
     def test_show(self):
         self.assertGreater(len(self.response.show(level=self.response.INFO)), 285)
 
+    def test_event_stream(self):
+        response = ARAXResponse()
+        event_queue = response.open_event_stream()
+        response.info('Streamed right away')
+        response.merge(self.response)
+        response.close_event_stream()
+        events = []
+        while not event_queue.empty():
+            events.append(event_queue.get())
+        self.assertEqual([event_type for event_type, event in events], [response.EVENT_MESSAGE] * 5 + [response.EVENT_DONE])
+        self.assertEqual(events[0][1]['message'], 'Streamed right away')
+
 
 ##########################################################################################
 def main():
@@ -19,6 +19,7 @@ import collections
 import math
 import os
 import sys
+import numpy as np
 from typing import List, Dict, Set, Union, Iterable, cast, Optional, Tuple
 from ARAX_response import ARAXResponse
 
@@ -563,6 +564,8 @@ def _get_results_for_kg_by_qg(kg: KnowledgeGraph,              # all nodes *must
 
     # Convert the final result graphs into actual Swagger object model results
     results = []
+    essence_qnode_key = _get_essence_node_for_qg(qg)
+    essence_qnode = qg.nodes.get(essence_qnode_key)
     for result_graph in final_result_graphs:
         node_bindings = dict()
         for qnode_key, node_keys in result_graph['nodes'].items():
@@ -573,8 +576,6 @@ def _get_results_for_kg_by_qg(kg: KnowledgeGraph,              # all nodes *must
         result = Result(node_bindings=node_bindings, edge_bindings=edge_bindings)
 
         # Fill out the essence for the result
-        essence_qnode_key = _get_essence_node_for_qg(qg)
-        essence_qnode = qg.nodes.get(essence_qnode_key)
         essence_kg_node_key_set = result_graph['nodes'].get(essence_qnode_key, set())
         if len(essence_kg_node_key_set) == 1:
             essence_kg_node_key = next(iter(essence_kg_node_key_set))
@@ -670,18 +671,15 @@ def _get_kg_edge_keys_by_qg_key(knowledge_graph: KnowledgeGraph) -> Dict[str, Se
     return edge_keys_by_qg_key
 
 
-def _get_connected_qnode_keys(qnode_key: str, query_graph: QueryGraph) -> Set[str]:
-    qnode_keys_used_on_same_qedges = set()
-    for qedge in query_graph.edges.values():
-        qnode_keys_used_on_same_qedges.add(qedge.subject)
-        qnode_keys_used_on_same_qedges.add(qedge.object)
-    return qnode_keys_used_on_same_qedges.difference({qnode_key})
-
-
-def _create_new_empty_result_graph(query_graph: QueryGraph) -> Dict[str, Dict[str, Set[str]]]:
-    empty_result_graph = {'nodes': {qnode_key: set() for qnode_key in query_graph.nodes},
-                          'edges': {qedge_key: set() for qedge_key in query_graph.edges}}
-    return empty_result_graph
+def _create_result_graph(node_index_result_graph: Dict[str, np.ndarray], kg_node_keys_by_qnode_index: Dict[str, List[str]],
+                         kg_edge_index: Tuple[Dict[Tuple[str, int, int], List[str]], Dict[Tuple[str, int], List[int]], Dict[Tuple[str, int], List[int]]],
+                         query_graph: QueryGraph) -> Dict[str, Dict[str, Set[str]]]:
+    result_graph = {'nodes': {qnode_key: {kg_node_keys_by_qnode_index[qnode_key][node_index] for node_index in node_indexes.tolist()}
+                              for qnode_key, node_indexes in node_index_result_graph.items()},
+                    'edges': {qedge_key: _get_edges_between_nodes(qedge_key, node_index_result_graph[qedge.subject],
+                                                                  node_index_result_graph[qedge.object], kg_edge_index)
+                              for qedge_key, qedge in query_graph.edges.items()}}
+    return result_graph
 
 
 def _copy_result_graph(result_graph: Dict[str, Dict[str, Set[str]]]) -> Dict[str, Dict[str, Set[str]]]:
@@ -700,42 +698,62 @@ def _get_parallel_qedge_keys(input_qedge: QEdge, query_graph: QueryGraph) -> Set
     return parallel_qedge_keys
 
 
-def _get_kg_node_adj_map_by_qg_key(kg_node_keys_by_qg_key: Dict[str, Set[str]], knowledge_graph: KnowledgeGraph, query_graph: QueryGraph) -> Dict[str, Dict[str, Dict[str, Set[str]]]]:
-    # Returned dict looks like {'n00': {'UMLS:11234': {'n01': {UniProtKB:122}}}}
-    # First initiate the overall structure of our (QG-organized) adjacency map
-    kg_node_to_node_map = {qnode_key: dict() for qnode_key in kg_node_keys_by_qg_key}
-    for qnode_key in query_graph.nodes:
-        node_keys_set = kg_node_keys_by_qg_key[qnode_key]
-        connected_qnode_keys = _get_connected_qnode_keys(qnode_key, query_graph)
-        for node_key in node_keys_set:
-            kg_node_to_node_map[qnode_key][node_key] = {connected_qnode_key: set() for connected_qnode_key in connected_qnode_keys}
+def _get_kg_node_csr_adj_map(kg_node_indexes_by_qg_key: Dict[str, Dict[str, int]], knowledge_graph: KnowledgeGraph,
+                             query_graph: QueryGraph) -> Dict[Tuple[str, str], Tuple[np.ndarray, np.ndarray]]:
+    """
+    This function builds an integer-indexed adjacency map for the KG, organized by the QG. KG nodes are referred to by
+    their index within the (sorted) list of nodes fulfilling a given qnode. For each ordered pair of qnodes connected
+    by a qedge, the adjacency is stored in CSR form as an (indptr, indices) tuple: the nodes fulfilling qnode_key_2
+    that are connected to node i fulfilling qnode_key_1 are indices[indptr[i]:indptr[i + 1]] (sorted and unique).
+    Two KG nodes are only considered connected if ALL qedges between their qnodes are fulfilled between them.
+    """
+    parallel_qedge_keys_map = {qedge_key: _get_parallel_qedge_keys(qedge, query_graph) for qedge_key, qedge in query_graph.edges.items()
+                               if qedge.subject != qedge.object}
 
-    # Create a record of which qedge IDs are fulfilled between which node pairs
+    # Create a record of which qedge IDs are fulfilled between which node pairs (only needed if there are parallel qedges)
     node_pair_to_qedge_key_map = dict()
-    for edge in knowledge_graph.edges.values():
-        node_pair_key = _get_edge_node_pair_key(edge)
-        if node_pair_key not in node_pair_to_qedge_key_map:
-            node_pair_to_qedge_key_map[node_pair_key] = set()
-        node_pair_to_qedge_key_map[node_pair_key] = node_pair_to_qedge_key_map[node_pair_key].union(set(edge.qedge_keys))
-
-    # Fill out which KG nodes are connected to which
+    if any(len(parallel_qedge_keys) > 1 for parallel_qedge_keys in parallel_qedge_keys_map.values()):
+        for edge in knowledge_graph.edges.values():
+            node_pair_key = _get_edge_node_pair_key(edge)
+            if node_pair_key not in node_pair_to_qedge_key_map:
+                node_pair_to_qedge_key_map[node_pair_key] = set()
+            node_pair_to_qedge_key_map[node_pair_key].update(edge.qedge_keys)
+
+    # Record which KG nodes are connected to which, in both directions
+    qnode_key_pairs = {(qedge.subject, qedge.object) for qedge_key, qedge in query_graph.edges.items() if qedge_key in parallel_qedge_keys_map}
+    qnode_key_pairs.update({(qnode_key_2, qnode_key_1) for qnode_key_1, qnode_key_2 in qnode_key_pairs})
+    connections = {qnode_key_pair: ([], []) for qnode_key_pair in qnode_key_pairs}
     for edge in knowledge_graph.edges.values():
         for qedge_key in edge.qedge_keys:
             # Note: KG may contain some qedge IDs not in this version of the QG due to option group handling
-            if qedge_key in query_graph.edges:
-                qedge = query_graph.edges[qedge_key]
-                # Make sure ALL qedges between these two nodes have been fulfilled before marking them as 'connected'
-                parallel_qedge_keys = _get_parallel_qedge_keys(qedge, query_graph)
-                if parallel_qedge_keys.issubset(node_pair_to_qedge_key_map[_get_edge_node_pair_key(edge)]):
-                    qnode_key_1 = qedge.subject
-                    qnode_key_2 = qedge.object
-                    if edge.subject in kg_node_keys_by_qg_key[qnode_key_1] and edge.object in kg_node_keys_by_qg_key[qnode_key_2]:
-                        kg_node_to_node_map[qnode_key_1][edge.subject][qnode_key_2].add(edge.object)
-                        kg_node_to_node_map[qnode_key_2][edge.object][qnode_key_1].add(edge.subject)
-                    if edge.subject in kg_node_keys_by_qg_key[qnode_key_2] and edge.object in kg_node_keys_by_qg_key[qnode_key_1]:
-                        kg_node_to_node_map[qnode_key_2][edge.subject][qnode_key_1].add(edge.object)
-                        kg_node_to_node_map[qnode_key_1][edge.object][qnode_key_2].add(edge.subject)
-    return kg_node_to_node_map
+            parallel_qedge_keys = parallel_qedge_keys_map.get(qedge_key)
+            if parallel_qedge_keys is None:
+                continue
+            # Make sure ALL qedges between these two nodes have been fulfilled before marking them as 'connected'
+            if len(parallel_qedge_keys) > 1 and not parallel_qedge_keys.issubset(node_pair_to_qedge_key_map[_get_edge_node_pair_key(edge)]):
+                continue
+            qedge = query_graph.edges[qedge_key]
+            for qnode_key_1, qnode_key_2 in [(qedge.subject, qedge.object), (qedge.object, qedge.subject)]:
+                subject_index = kg_node_indexes_by_qg_key[qnode_key_1].get(edge.subject)
+                object_index = kg_node_indexes_by_qg_key[qnode_key_2].get(edge.object)
+                if subject_index is not None and object_index is not None:
+                    connections[(qnode_key_1, qnode_key_2)][0].append(subject_index)
+                    connections[(qnode_key_1, qnode_key_2)][1].append(object_index)
+                    connections[(qnode_key_2, qnode_key_1)][0].append(object_index)
+                    connections[(qnode_key_2, qnode_key_1)][1].append(subject_index)
+
+    # Then convert the connections into CSR arrays
+    kg_node_csr_adj_map = dict()
+    for (qnode_key_1, qnode_key_2), (row_indexes, column_indexes) in connections.items():
+        num_rows = len(kg_node_indexes_by_qg_key[qnode_key_1])
+        num_columns = len(kg_node_indexes_by_qg_key[qnode_key_2])
+        # Sorting encoded (row, column) pairs orders the neighbors of each row and removes duplicates
+        encoded_pairs = np.unique(np.array(row_indexes, dtype=np.int64) * num_columns + np.array(column_indexes, dtype=np.int64))
+        indptr = np.zeros(num_rows + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(np.bincount(encoded_pairs // max(num_columns, 1), minlength=num_rows))
+        indices = encoded_pairs % max(num_columns, 1)
+        kg_node_csr_adj_map[(qnode_key_1, qnode_key_2)] = (indptr, indices)
+    return kg_node_csr_adj_map
 
 
 def _result_graph_is_fulfilled(result_graph: Dict[str, Dict[str, Set[str]]], query_graph: QueryGraph) -> bool:
@@ -746,17 +764,6 @@ def _result_graph_is_fulfilled(result_graph: Dict[str, Dict[str, Set[str]]], que
     return True
 
 
-def _get_all_adjacent_nodes(kg_node_keys: Set[str], start_qnode_key: str, target_qnode_key: str,
-                            kg_node_adj_map_by_qg_key: Dict[str, Dict[str, Dict[str, Set[str]]]]) -> Set[str]:
-    """
-    This function returns all nodes adjacent to a set of nodes (kg_node_keys) that fulfill the target_qnode_key. The
-    start_qnode_key is the qnode ID that the set of input nodes fulfill. Being adjacent to the set of nodes means that
-    the node is connected to ANY of the individual input nodes in the set (not ALL).
-    """
-    connections = [kg_node_adj_map_by_qg_key[start_qnode_key][kg_node_key][target_qnode_key] for kg_node_key in kg_node_keys]
-    return {node_key for node_key_set in connections for node_key in node_key_set}
-
-
 def _find_qnode_connected_to_sub_qg(qnode_keys_to_connect_to: Set[str], qnode_keys_to_choose_from: Set[str], qg: QueryGraph) -> Tuple[str, Set[str]]:
     """
     This function selects a qnode ID from the qnode_keys_to_choose_from that connects to one or more of the qnode IDs
@@ -786,149 +793,234 @@ def _get_qg_adj_map_undirected(qg) -> Dict[str, Set[str]]:
     return qg_adj_map
 
 
-def _extract_sub_qg_adj_map(qg_adj_map: Dict[str, Set[str]], allowed_qnode_keys: Set[str]) -> Dict[str, Set[str]]:
+def _get_csr_row_positions(indptr: np.ndarray, row_indexes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
     """
-    This function extracts the node adjacency info for a "subgraph" of the query graph (represented by
-    allowed_qnode_keys). Example of qg_adj_map: {"n0": {"n1"}, "n1": {"n0"}}
+    This function returns the positions (in a CSR indices array) of the entries for all of the given rows, concatenated,
+    along with the number of entries in each row.
     """
-    return {qnode_key: neighbor_qnode_keys.intersection(allowed_qnode_keys)
-            for qnode_key, neighbor_qnode_keys in qg_adj_map.items() if qnode_key in allowed_qnode_keys}
+    starts = indptr[row_indexes]
+    lengths = indptr[row_indexes + 1] - starts
+    row_offsets = np.cumsum(lengths) - lengths
+    return np.repeat(starts - row_offsets, lengths) + np.arange(lengths.sum()), lengths
 
 
-def _clean_up_dead_ends(result_graph: Dict[str, Dict[str, Set[str]]],
-                        sub_qg_adj_map: Dict[str, Set[str]],
-                        kg_node_adj_map_by_qg_key: Dict[str, Dict[str, Dict[str, Set[str]]]]) -> Dict[str, Dict[str, Set[str]]]:
+def _get_all_adjacent_nodes(node_indexes: np.ndarray, csr_adj: Tuple[np.ndarray, np.ndarray]) -> np.ndarray:
     """
-    This function iteratively removes "dead ends" from a result graph until no more dead ends can be found. Dead ends
-    can be thought of as intermediate nodes (typically for is_set=True qnodes) that connect to only a subset of the
-    nodes they should be connected to according to the query graph. Only the part of the result graph that has been
-    "fulfilled" so far during the result construction process is evaluated here: the sub_qg_adj_map must contain only
-    info for qnodes fulfilled thus far.
+    This function returns the (sorted) indexes of all nodes adjacent to a set of nodes (node_indexes) in the given CSR
+    adjacency map. Being adjacent to the set of nodes means that the node is connected to ANY of the individual input
+    nodes in the set (not ALL).
     """
-    fulfilled_qnode_keys = set(sub_qg_adj_map)
-    found_dead_ends = True
-    while found_dead_ends:
-        found_dead_ends = False
-        nodes_to_remove = dict()
-        # Go through each qnode "role" in our result graph, and check the nodes corresponding to that qnode
-        for qnode_key in fulfilled_qnode_keys:
-            corresponding_node_keys = result_graph["nodes"][qnode_key]
-            required_neighbor_qnode_keys = sub_qg_adj_map[qnode_key]
-            # Make sure each node for this qnode ID is connected to at LEAST one node fulfilling each neighbor qnode ID
-            for corresponding_node_key in corresponding_node_keys:
-                for neighbor_qnode_key in required_neighbor_qnode_keys:
-                    # Look for at least one node in the result graph in this neighbor spot that this node is linked to
-                    neighbors_in_kg = kg_node_adj_map_by_qg_key[qnode_key][corresponding_node_key][neighbor_qnode_key]
-                    if not neighbors_in_kg.intersection(result_graph["nodes"][neighbor_qnode_key]):
-                        # Mark this node for removal from this result graph since it's lacking a neighbor here
-                        found_dead_ends = True
-                        if qnode_key not in nodes_to_remove:
-                            nodes_to_remove[qnode_key] = set()
-                        nodes_to_remove[qnode_key].add(corresponding_node_key)
-        # Actually go through and remove our nodes marked for removal
-        for qnode_key, node_keys in nodes_to_remove.items():
-            result_graph["nodes"][qnode_key] = result_graph["nodes"][qnode_key].difference(node_keys)
-    return result_graph
+    indptr, indices = csr_adj
+    if len(node_indexes) == 1:
+        node_index = node_indexes[0]
+        return indices[indptr[node_index]:indptr[node_index + 1]]
+    positions, _ = _get_csr_row_positions(indptr, node_indexes)
+    return np.unique(indices[positions])
 
 
-def _create_result_graphs(kg: KnowledgeGraph,
-                          qg: QueryGraph,
-                          ignore_edge_direction: bool = True) -> List[Result]:
-    result_graphs = []
+def _get_supported_nodes(node_indexes: np.ndarray, csr_adj: Tuple[np.ndarray, np.ndarray],
+                         neighbor_node_indexes: np.ndarray, neighbor_csr_adj: Tuple[np.ndarray, np.ndarray]) -> np.ndarray:
+    """
+    This function returns the subset of node_indexes that are connected to at least one of the neighbor_node_indexes.
+    csr_adj maps the nodes to their neighbors and neighbor_csr_adj maps in the other direction; we walk whichever
+    side has fewer nodes.
+    """
+    if len(neighbor_node_indexes) <= len(node_indexes):
+        return np.intersect1d(node_indexes, _get_all_adjacent_nodes(neighbor_node_indexes, neighbor_csr_adj), assume_unique=True)
+    indptr, indices = csr_adj
+    positions, lengths = _get_csr_row_positions(indptr, node_indexes)
+    is_neighbor = np.zeros(len(neighbor_csr_adj[0]) - 1, dtype=bool)
+    is_neighbor[neighbor_node_indexes] = True
+    is_supported = np.zeros(len(node_indexes), dtype=bool)
+    is_supported[np.repeat(np.arange(len(node_indexes)), lengths)[is_neighbor[indices[positions]]]] = True
+    return node_indexes[is_supported]
+
+
+def _get_qnode_expansion_order(qg_adj_map: Dict[str, Set[str]], num_kg_nodes_by_qg_key: Dict[str, int]) -> List[str]:
+    """
+    This function decides the order in which qnodes are filled in while constructing result graphs. We start with the
+    qnode fulfilled by the fewest KG nodes and then repeatedly pick the qnode with the fewest KG nodes out of those
+    connected to the qnodes already chosen, so that the number of partial result graphs stays as small as possible.
+    """
+    qnode_keys_remaining = set(qg_adj_map)
+    qnode_key_order = []
+    while qnode_keys_remaining:
+        connected_qnode_keys = [qnode_key for qnode_key in qnode_keys_remaining if qg_adj_map[qnode_key].intersection(qnode_key_order)]
+        next_qnode_key = min(connected_qnode_keys if connected_qnode_keys else qnode_keys_remaining,
+                             key=lambda qnode_key: (num_kg_nodes_by_qg_key[qnode_key], qnode_key))
+        qnode_key_order.append(next_qnode_key)
+        qnode_keys_remaining.remove(next_qnode_key)
+    return qnode_key_order
+
+
+def _clean_up_dead_ends(domains: Dict[str, np.ndarray],
+                        new_qnode_key: str,
+                        qg_adj_map: Dict[str, Set[str]],
+                        kg_node_csr_adj_map: Dict[Tuple[str, str], Tuple[np.ndarray, np.ndarray]]) -> bool:
+    """
+    This function removes "dead ends" from a partial result graph (domains, which maps each qnode fulfilled so far to
+    the indexes of its KG nodes) right after new_qnode_key has been filled in. Dead ends can be thought of as nodes
+    (typically for is_set=True qnodes) that connect to no node in one of their neighboring qnode spots. Nodes for the
+    new qnode are connected to all prior neighboring qnode spots by construction, so we only need to check the prior
+    neighbors against the new qnode, and then re-check the neighbors of any qnode spot that loses nodes (until nothing
+    more changes). Returns False if a qnode spot is left empty (meaning this partial result graph is a dead end itself).
+    """
+    arcs_to_check = [(qnode_key, new_qnode_key) for qnode_key in qg_adj_map[new_qnode_key]
+                     if qnode_key in domains and len(domains[qnode_key]) > 1]
+    while arcs_to_check:
+        qnode_key, neighbor_qnode_key = arcs_to_check.pop()
+        supported_node_indexes = _get_supported_nodes(domains[qnode_key], kg_node_csr_adj_map[(qnode_key, neighbor_qnode_key)],
+                                                      domains[neighbor_qnode_key], kg_node_csr_adj_map[(neighbor_qnode_key, qnode_key)])
+        if len(supported_node_indexes) < len(domains[qnode_key]):
+            if not len(supported_node_indexes):
+                return False
+            domains[qnode_key] = supported_node_indexes
+            arcs_to_check += [(other_qnode_key, qnode_key) for other_qnode_key in qg_adj_map[qnode_key]
+                              if other_qnode_key in domains and other_qnode_key != neighbor_qnode_key]
+    return True
+
+
+def _get_kg_node_indexes_by_qg_key(kg: KnowledgeGraph, qg: QueryGraph) -> Tuple[Dict[str, List[str]], Dict[str, Dict[str, int]]]:
+    # Refer to KG nodes by their index in the sorted list of KG nodes fulfilling each qnode
     kg_node_keys_by_qg_key = _get_kg_node_keys_by_qg_key(kg)
-    kg_node_adj_map_by_qg_key = _get_kg_node_adj_map_by_qg_key(kg_node_keys_by_qg_key, kg, qg)
+    kg_node_keys_by_qnode_index = {qnode_key: sorted(kg_node_keys_by_qg_key.get(qnode_key, set())) for qnode_key in qg.nodes}
+    kg_node_indexes_by_qg_key = {qnode_key: {node_key: node_index for node_index, node_key in enumerate(node_keys)}
+                                 for qnode_key, node_keys in kg_node_keys_by_qnode_index.items()}
+    return kg_node_keys_by_qnode_index, kg_node_indexes_by_qg_key
+
+
+def _create_node_index_result_graphs(kg: KnowledgeGraph, qg: QueryGraph,
+                                     kg_node_indexes_by_qg_key: Dict[str, Dict[str, int]]) -> List[Dict[str, np.ndarray]]:
+    """
+    This function finds the node bindings for each result: it returns a list of "node index result graphs", each of
+    which maps every qnode to an array of the indexes of its KG nodes (per kg_node_indexes_by_qg_key).
+    """
+    num_kg_nodes_by_qg_key = {qnode_key: len(node_indexes) for qnode_key, node_indexes in kg_node_indexes_by_qg_key.items()}
+    kg_node_csr_adj_map = _get_kg_node_csr_adj_map(kg_node_indexes_by_qg_key, kg, qg)
     qg_adj_map = _get_qg_adj_map_undirected(qg)
 
-    # Iteratively construct "result graphs" (initially containing only nodes, not edges) by walking through all qnodes
-    qnode_keys_remaining = set(qg.nodes)
-    qnode_keys_already_handled = set()
-    while qnode_keys_remaining:
-        # Start with a random qnode if this is our first iteration
-        if not qnode_keys_already_handled:
-            current_qnode_key = list(qnode_keys_remaining)[0]
-            prior_qnode_connections = set()
-        # Otherwise find a yet unhandled qnode ID that connects somehow to the part of the QG we've already handled
-        else:
-            current_qnode_key, prior_qnode_connections = _find_qnode_connected_to_sub_qg(qnode_keys_already_handled, qnode_keys_remaining, qg)
-        current_qnode = qg.nodes[current_qnode_key]
-
-        # Initialize our result graphs if this is our first iteration
-        if not result_graphs:
-            all_node_keys_in_kg_for_this_qnode_key = kg_node_keys_by_qg_key.get(current_qnode_key)
-            # We'll start with one result graph with ALL corresponding nodes in the KG in this spot if is_set=True
-            if current_qnode.is_set:
-                new_result_graph = _create_new_empty_result_graph(qg)
-                new_result_graph["nodes"][current_qnode_key] = all_node_keys_in_kg_for_this_qnode_key
-                result_graphs.append(new_result_graph)
-            # Otherwise, we'll start with a result graph for EACH corresponding node in the KG
-            else:
-                for node_key in all_node_keys_in_kg_for_this_qnode_key:
-                    new_result_graph = _create_new_empty_result_graph(qg)
-                    new_result_graph["nodes"][current_qnode_key] = {node_key}
-                    result_graphs.append(new_result_graph)
-        # Otherwise fan out our existing result graphs, filling out this qnode spot in them based on prior contents
-        else:
-            new_result_graphs = []
-            sub_qg_adj_map = _extract_sub_qg_adj_map(qg_adj_map, qnode_keys_already_handled.union({current_qnode_key}))
-            for result_graph in result_graphs:
-                # Figure out which KG nodes could fulfill the current qnode in this result
-                prior_qnodes_kg_nodes = {prior_qnode_key: result_graph["nodes"][prior_qnode_key] for prior_qnode_key in prior_qnode_connections}
-                current_kg_node_possibilities = [_get_all_adjacent_nodes(corresponding_kg_nodes, prior_qnode_key, current_qnode_key, kg_node_adj_map_by_qg_key)
-                                                 for prior_qnode_key, corresponding_kg_nodes in prior_qnodes_kg_nodes.items()]
-                # Only keep connections that have links to KG nodes in ALL prior connected qnode roles
-                final_connected_kg_nodes = set.intersection(*current_kg_node_possibilities)
-                if current_qnode.is_set:
-                    # Replace this result graph with a new one with all valid connections listed under this qnode
-                    new_result_graph = _copy_result_graph(result_graph)
-                    new_result_graph["nodes"][current_qnode_key] = final_connected_kg_nodes
-                    pruned_result_graph = _clean_up_dead_ends(result_graph=new_result_graph,
-                                                              sub_qg_adj_map=sub_qg_adj_map,
-                                                              kg_node_adj_map_by_qg_key=kg_node_adj_map_by_qg_key)
-                    new_result_graphs.append(pruned_result_graph)
+    # Iteratively construct partial result graphs (initially containing only nodes, not edges) by walking through all
+    # qnodes, most selective first; each partial result graph maps the qnodes handled so far to arrays of KG node indexes
+    qnode_key_order = _get_qnode_expansion_order(qg_adj_map, num_kg_nodes_by_qg_key)
+    start_qnode_key = qnode_key_order[0]
+    all_start_node_indexes = np.arange(num_kg_nodes_by_qg_key[start_qnode_key])
+    # We'll start with one result graph with ALL corresponding nodes in the KG in this spot if is_set=True
+    if qg.nodes[start_qnode_key].is_set:
+        partial_result_graphs = [{start_qnode_key: all_start_node_indexes}] if len(all_start_node_indexes) else []
+    # Otherwise, we'll start with a result graph for EACH corresponding node in the KG
+    else:
+        partial_result_graphs = [{start_qnode_key: all_start_node_indexes[node_index:node_index + 1]}
+                                 for node_index in range(len(all_start_node_indexes))]
+
+    # Then fan out our existing result graphs, filling out each following qnode spot based on prior contents
+    qnode_keys_already_handled = {start_qnode_key}
+    for current_qnode_key in qnode_key_order[1:]:
+        prior_qnode_connections = sorted(qg_adj_map[current_qnode_key].intersection(qnode_keys_already_handled))
+        current_qnode_is_set = qg.nodes[current_qnode_key].is_set
+        new_partial_result_graphs = []
+        for partial_result_graph in partial_result_graphs:
+            # Only keep KG nodes that have links to KG nodes in ALL prior connected qnode roles
+            final_connected_node_indexes = None
+            for prior_qnode_key in prior_qnode_connections:
+                connected_node_indexes = _get_all_adjacent_nodes(partial_result_graph[prior_qnode_key],
+                                                                 kg_node_csr_adj_map[(prior_qnode_key, current_qnode_key)])
+                if final_connected_node_indexes is None:
+                    final_connected_node_indexes = connected_node_indexes
                 else:
-                    # Create a new result graph for each new valid connected node
-                    for connected_node_key in final_connected_kg_nodes:
-                        new_result_graph = _copy_result_graph(result_graph)
-                        new_result_graph["nodes"][current_qnode_key] = {connected_node_key}
-                        pruned_result_graph = _clean_up_dead_ends(result_graph=new_result_graph,
-                                                                  sub_qg_adj_map=sub_qg_adj_map,
-                                                                  kg_node_adj_map_by_qg_key=kg_node_adj_map_by_qg_key)
-                        new_result_graphs.append(pruned_result_graph)
-            result_graphs = new_result_graphs
-
-        # Update our records about which qnodes we've already processed
-        qnode_keys_remaining.remove(current_qnode_key)
+                    final_connected_node_indexes = np.intersect1d(final_connected_node_indexes, connected_node_indexes, assume_unique=True)
+            if final_connected_node_indexes is None or not len(final_connected_node_indexes):
+                continue
+            if current_qnode_is_set:
+                # Extend this result graph with all valid connections listed under this qnode
+                node_index_groups = [final_connected_node_indexes]
+            else:
+                # Create a new result graph for each new valid connected node
+                node_index_groups = [final_connected_node_indexes[position:position + 1]
+                                     for position in range(len(final_connected_node_indexes))]
+            for node_indexes in node_index_groups:
+                new_partial_result_graph = dict(partial_result_graph)
+                new_partial_result_graph[current_qnode_key] = node_indexes
+                if _clean_up_dead_ends(new_partial_result_graph, current_qnode_key, qg_adj_map, kg_node_csr_adj_map):
+                    new_partial_result_graphs.append(new_partial_result_graph)
+        partial_result_graphs = new_partial_result_graphs
         qnode_keys_already_handled.add(current_qnode_key)
 
+    return partial_result_graphs
+
+
+def _get_kg_edge_index(kg_node_indexes_by_qg_key: Dict[str, Dict[str, int]], knowledge_graph: KnowledgeGraph, query_graph: QueryGraph,
+                       ignore_edge_direction: bool) -> Tuple[Dict[Tuple[str, int, int], List[str]], Dict[Tuple[str, int], List[int]], Dict[Tuple[str, int], List[int]]]:
+    """
+    This function indexes the KG edges fulfilling each qedge by the indexes of the KG nodes they connect (in the
+    qedge's subject and object qnode spots). It returns three dicts: the edge keys by (qedge_key, subject_index,
+    object_index), and the object indexes by (qedge_key, subject_index) and subject indexes by (qedge_key,
+    object_index) that have at least one such edge. If ignore_edge_direction is True, edges pointing the opposite way
+    from their qedge are indexed as though they were flipped.
+    """
+    edge_keys_by_node_pair = dict()
+    object_indexes_by_subject = dict()
+    subject_indexes_by_object = dict()
+    for edge_key, edge in knowledge_graph.edges.items():
+        for qedge_key in edge.qedge_keys:
+            # Note: KG may contain some qedges not in this version of the QG due to option group handling
+            qedge = query_graph.edges.get(qedge_key)
+            if not qedge:
+                continue
+            node_key_pairs = [(edge.subject, edge.object), (edge.object, edge.subject)] if ignore_edge_direction else [(edge.subject, edge.object)]
+            for subject_key, object_key in node_key_pairs:
+                subject_index = kg_node_indexes_by_qg_key[qedge.subject].get(subject_key)
+                object_index = kg_node_indexes_by_qg_key[qedge.object].get(object_key)
+                if subject_index is None or object_index is None:
+                    continue
+                node_pair = (qedge_key, subject_index, object_index)
+                if node_pair not in edge_keys_by_node_pair:
+                    edge_keys_by_node_pair[node_pair] = []
+                    object_indexes_by_subject.setdefault((qedge_key, subject_index), []).append(object_index)
+                    subject_indexes_by_object.setdefault((qedge_key, object_index), []).append(subject_index)
+                edge_keys_by_node_pair[node_pair].append(edge_key)
+    return edge_keys_by_node_pair, object_indexes_by_subject, subject_indexes_by_object
+
+
+def _get_edges_between_nodes(qedge_key: str, subject_node_indexes: np.ndarray, object_node_indexes: np.ndarray,
+                             kg_edge_index: Tuple[Dict[Tuple[str, int, int], List[str]], Dict[Tuple[str, int], List[int]], Dict[Tuple[str, int], List[int]]]) -> Set[str]:
+    """
+    This function returns the keys of all KG edges fulfilling qedge_key that connect any of the subject nodes to any of
+    the object nodes. If either side is a single node, we just look up each node pair; otherwise we walk the edges
+    incident to the smaller set of nodes, rather than checking every possible pair of nodes.
+    """
+    edge_keys_by_node_pair, object_indexes_by_subject, subject_indexes_by_object = kg_edge_index
+    subject_node_indexes = subject_node_indexes.tolist()
+    object_node_indexes = object_node_indexes.tolist()
+    edge_keys = set()
+    if len(subject_node_indexes) == 1 or len(object_node_indexes) == 1:
+        for subject_index in subject_node_indexes:
+            for object_index in object_node_indexes:
+                edge_keys.update(edge_keys_by_node_pair.get((qedge_key, subject_index, object_index), []))
+    elif len(subject_node_indexes) <= len(object_node_indexes):
+        object_node_indexes = set(object_node_indexes)
+        for subject_index in subject_node_indexes:
+            for object_index in object_indexes_by_subject.get((qedge_key, subject_index), []):
+                if object_index in object_node_indexes:
+                    edge_keys.update(edge_keys_by_node_pair[(qedge_key, subject_index, object_index)])
+    else:
+        subject_node_indexes = set(subject_node_indexes)
+        for object_index in object_node_indexes:
+            for subject_index in subject_indexes_by_object.get((qedge_key, object_index), []):
+                if subject_index in subject_node_indexes:
+                    edge_keys.update(edge_keys_by_node_pair[(qedge_key, subject_index, object_index)])
+    return edge_keys
+
+
+def _create_result_graphs(kg: KnowledgeGraph,
+                          qg: QueryGraph,
+                          ignore_edge_direction: bool = True) -> List[Result]:
+    kg_node_keys_by_qnode_index, kg_node_indexes_by_qg_key = _get_kg_node_indexes_by_qg_key(kg, qg)
+    node_index_result_graphs = _create_node_index_result_graphs(kg, qg, kg_node_indexes_by_qg_key)
+
     # Then add edges to our result graphs as appropriate
-    edges_by_node_pairs = {qedge_key: dict() for qedge_key in qg.edges}
-    for edge_key, edge in kg.edges.items():
-        if edge.qedge_keys:
-            for qedge_key in edge.qedge_keys:
-                # Note: KG may contain some qedges not in this version of the QG due to option group handling
-                if qedge_key in set(qg.edges):
-                    edge_node_pair = f"{edge.subject}--{edge.object}"
-                    if edge_node_pair not in edges_by_node_pairs[qedge_key]:
-                        edges_by_node_pairs[qedge_key][edge_node_pair] = set()
-                    edges_by_node_pairs[qedge_key][edge_node_pair].add(edge_key)
-                    if ignore_edge_direction:
-                        node_pair_in_other_direction = f"{edge.object}--{edge.subject}"
-                        if node_pair_in_other_direction not in edges_by_node_pairs[qedge_key]:
-                            edges_by_node_pairs[qedge_key][node_pair_in_other_direction] = set()
-                        edges_by_node_pairs[qedge_key][node_pair_in_other_direction].add(edge_key)
-    for result_graph in result_graphs:
-        for qedge_key in result_graph['edges']:
-            qedge = qg.edges[qedge_key]
-            potential_nodes_1 = result_graph['nodes'][qedge.subject]
-            potential_nodes_2 = result_graph['nodes'][qedge.object]
-            possible_node_pairs = set()
-            for node_1 in potential_nodes_1:
-                for node_2 in potential_nodes_2:
-                    node_pair_key = f"{node_1}--{node_2}"
-                    possible_node_pairs.add(node_pair_key)
-            for node_pair in possible_node_pairs:
-                ids_of_matching_edges = edges_by_node_pairs[qedge_key].get(node_pair, set())
-                result_graph['edges'][qedge_key] = result_graph['edges'][qedge_key].union(ids_of_matching_edges)
+    kg_edge_index = _get_kg_edge_index(kg_node_indexes_by_qg_key, kg, qg, ignore_edge_direction)
+    result_graphs = [_create_result_graph(node_index_result_graph, kg_node_keys_by_qnode_index, kg_edge_index, qg)
+                     for node_index_result_graph in node_index_result_graphs]
 
     final_result_graphs = [result_graph for result_graph in result_graphs if _result_graph_is_fulfilled(result_graph, qg)]
     return final_result_graphs
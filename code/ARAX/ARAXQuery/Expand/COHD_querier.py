@@ -4,7 +4,6 @@ import os
 import traceback
 import ast
 import itertools
-import numpy as np
 from typing import List, Dict, Tuple
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -22,15 +21,21 @@ from openapi_server.models.query_graph import QueryGraph
 from openapi_server.models.q_node import QNode
 from openapi_server.models.q_edge import QEdge
 sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/../../../ARAX/KnowledgeSources/COHD_local/scripts/")
-from COHDIndex import COHDIndex
+from COHDIndex import COHDIndex, COHD_METRICS
 sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/../../../ARAX/NodeSynonymizer/")
 from node_synonymizer import NodeSynonymizer
 
+COHD_METRIC_EDGE_NAMES = {'paired_concept_freq': ("paired_concept_frequency", "paired concept frequency"),
+                          'observed_expected_ratio': ("ln_observed_expected_ratio", "natural logarithm of observed expected ratio"),
+                          'chi_square': ("chi_square_pvalue", "chi square pvalue")}
+
+
 class COHDQuerier:
 
     def __init__(self, response_object: ARAXResponse) -> Tuple[QGOrganizedKnowledgeGraph, Dict[str, Dict[str, str]]]:
         self.response = response_object
-        self.cohdindex = COHDIndex()
+        use_columnar_index = self.response.data.get('parameters', dict()).get('use_COHD_index', False)
+        self.cohdindex = COHDIndex(use_columnar_index=use_columnar_index)
         self.synonymizer = NodeSynonymizer()
 
     def answer_one_hop_query(self, query_graph: QueryGraph) -> Tuple[QGOrganizedKnowledgeGraph, Dict[str, Dict[str, str]]]:
@@ -92,553 +97,26 @@ class COHDQuerier:
     def _answer_query_using_COHD_paired_concept_freq(self, query_graph: QueryGraph, COHD_method_percentile: float, log: ARAXResponse) -> Tuple[QGOrganizedKnowledgeGraph, Dict[str, Dict[str, str]]]:
         qedge_key = next(qedge_key for qedge_key in query_graph.edges)
         log.debug(f"Processing query results for edge {qedge_key} by using paired concept frequency")
-        final_kg = QGOrganizedKnowledgeGraph()
-        edge_to_nodes_map = dict()
-        # if COHD_method_threshold == float("inf"):
-        #     threshold = pow(10, -3.365)  # default threshold based on the distribution of 0.99 quantile
-        # else:
-        #     threshold = COHD_method_threshold
-        # log.info(f"The threshod used to filter paired concept frequency is {threshold}")
-
-        # extract information from the QueryGraph
-        qedge = query_graph.edges[qedge_key]
-        source_qnode_key = qedge.subject
-        target_qnode_key = qedge.object
-        source_qnode = query_graph.nodes[source_qnode_key]
-        target_qnode = query_graph.nodes[target_qnode_key]
-
-        # check if both ends of edge have no curie
-        if (source_qnode.id is None) and (target_qnode.id is None):
-            log.error(f"Both ends of edge {qedge_key} are None", error_code="BadEdge")
-            return final_kg, edge_to_nodes_map
-
-        # Convert curie ids to OMOP ids
-        if source_qnode.id is not None:
-            source_qnode_omop_ids = self._get_omop_id_from_curies(source_qnode_key, query_graph, log)
-        else:
-            source_qnode_omop_ids = None
-        if log.status != 'OK':
-            return final_kg, edge_to_nodes_map
-        if target_qnode.id is not None:
-            target_qnode_omop_ids = self._get_omop_id_from_curies(target_qnode_key, query_graph, log)
-        else:
-            target_qnode_omop_ids = None
-        if log.status != 'OK':
-            return final_kg, edge_to_nodes_map
-
-        # expand edges according to the OMOP id pairs
-        if (source_qnode_omop_ids is None) and (target_qnode_omop_ids is None):
-            return final_kg, edge_to_nodes_map
-
-        elif (source_qnode_omop_ids is not None) and (target_qnode_omop_ids is not None):
-            source_dict = dict()
-            target_dict = dict()
-            average_threshold = 0
-            count = 0
-            for (source_preferred_key, target_preferred_key) in itertools.product(list(source_qnode_omop_ids.keys()), list(target_qnode_omop_ids.keys())):
-
-                if source_qnode.category is None and target_qnode.category is None:
-                    pass
-                else:
-                    if self.synonymizer.get_canonical_curies(source_preferred_key)[source_preferred_key]['preferred_type'] == source_qnode.category:
-                        pass
-                    else:
-                        continue
-                    if self.synonymizer.get_canonical_curies(target_preferred_key)[target_preferred_key]['preferred_type'] == target_qnode.category:
-                        pass
-                    else:
-                        continue
-
-                if len(source_qnode_omop_ids[source_preferred_key]) == 0:
-                    log.warning(f"No OMOP concept id was found for source preferred id '{source_preferred_key}'' with qnode id '{qedge.subject}'")
-                    continue
-                elif len(self.cohdindex.get_paired_concept_freq(concept_id_1=source_qnode_omop_ids[source_preferred_key], dataset_id=3)) == 0:
-                    log.warning(f"No paired concept ids was found from COHD database for source preferred id '{source_preferred_key}'' with qnode id '{qedge.subject}'")
-                    continue
-                else:
-                    pass
-
-                if len(target_qnode_omop_ids[target_preferred_key]) == 0:
-                    log.warning(f"No OMOP concept id was found for target preferred id '{target_preferred_key}'' with qnode id '{qedge.object}'")
-                    continue
-                elif len(self.cohdindex.get_paired_concept_freq(concept_id_1=target_qnode_omop_ids[target_preferred_key], dataset_id=3)) == 0:
-                    log.warning(f"No paired concept ids was found from COHD database for target preferred id '{target_preferred_key}'' with qnode id '{qedge.object}'")
-                    continue
-                else:
-                    pass
-
-                frequency = 0
-                threshold1 = np.percentile([row['concept_frequency'] for row in self.cohdindex.get_paired_concept_freq(concept_id_1=source_qnode_omop_ids[source_preferred_key], dataset_id=3) if row['concept_frequency'] != 0], COHD_method_percentile)  # calculate the percentile after removing the extreme value e.g. 0
-                threshold2 = np.percentile([row['concept_frequency'] for row in self.cohdindex.get_paired_concept_freq(concept_id_1=target_qnode_omop_ids[target_preferred_key], dataset_id=3) if row['concept_frequency'] != 0], COHD_method_percentile)  # calculate the percentile after removing the extreme value e.g. 0
-                threshold = min(threshold1, threshold2)  # pick the minimum one for threshold
-                average_threshold = average_threshold + threshold
-                count = count + 1
-                omop_pairs = [f"{omop1}_{omop2}" for (omop1, omop2) in itertools.product(source_qnode_omop_ids[source_preferred_key], target_qnode_omop_ids[target_preferred_key])]
-                if len(omop_pairs) != 0:
-                    res = self.cohdindex.get_paired_concept_freq(concept_id_pair=omop_pairs, dataset_id=3)  # use the hierarchical dataset
-                    if len(res) != 0:
-                        maximum_concept_frequency = res[0]['concept_frequency']  # the result returned from get_paired_concept_freq was sorted by decreasing order
-                        frequency = maximum_concept_frequency
-                value = frequency
-                if value >= threshold:
-                    swagger_edge_key, swagger_edge = self._convert_to_swagger_edge(source_preferred_key, target_preferred_key, "paired_concept_frequency", value)
-                else:
-                    continue
-
-                source_dict[source_preferred_key] = source_qnode_key
-                target_dict[target_preferred_key] = target_qnode_key
-
-                # Record which of this edge's nodes correspond to which qnode_key
-                if swagger_edge_key not in edge_to_nodes_map:
-                    edge_to_nodes_map[swagger_edge_key] = dict()
-                edge_to_nodes_map[swagger_edge_key][source_qnode_key] = source_preferred_key
-                edge_to_nodes_map[swagger_edge_key][target_qnode_key] = target_preferred_key
-
-                # Finally add the current edge to our answer knowledge graph
-                final_kg.add_edge(swagger_edge_key, swagger_edge, qedge_key)
-
-            # Add the nodes to our answer knowledge graph
-            if len(source_dict) != 0:
-                for source_preferred_key in source_dict:
-                    swagger_node_key, swagger_node = self._convert_to_swagger_node(source_preferred_key)
-                    final_kg.add_node(swagger_node_key, swagger_node, source_dict[source_preferred_key])
-            if len(target_dict) != 0:
-                for target_preferred_key in target_dict:
-                    swagger_node_key, swagger_node = self._convert_to_swagger_node(target_preferred_key)
-                    final_kg.add_node(swagger_node_key, swagger_node, target_dict[target_preferred_key])
-
-            if count != 0:
-                log.info(f"The average threshold based on {COHD_method_percentile}th percentile of paired concept frequency is {threshold/count}")
-
-            return final_kg, edge_to_nodes_map
-
-        elif source_qnode_omop_ids is not None:
-            source_dict = dict()
-            target_dict = dict()
-            new_edge = dict()
-            average_threshold = 0
-            count = 0
-            for source_preferred_key in source_qnode_omop_ids:
-
-                if source_qnode.category is None:
-                    pass
-                else:
-                    if self.synonymizer.get_canonical_curies(source_preferred_key)[source_preferred_key]['preferred_type'] == source_qnode.category:
-                        pass
-                    else:
-                        log.warning(f"The preferred type of source preferred id '{source_preferred_key}' can't match to the given source type '{source_qnode.category}''")
-                        continue
-
-                if len(source_qnode_omop_ids[source_preferred_key]) == 0:
-                    log.warning(f"No OMOP concept id was found for source preferred id '{source_preferred_key}'' with qnode id '{qedge.subject}'")
-                    continue
-                elif len(self.cohdindex.get_paired_concept_freq(concept_id_1=source_qnode_omop_ids[source_preferred_key], dataset_id=3)) == 0:
-                    log.warning(f"No paired concept frequency was found from COHD database for source preferred id '{source_preferred_key}'' with qnode id '{qedge.subject}'")
-                    continue
-                else:
-                    pass
-
-                new_edge[source_preferred_key] = dict()
-                threshold = np.percentile([row['concept_frequency'] for row in self.cohdindex.get_paired_concept_freq(concept_id_1=source_qnode_omop_ids[source_preferred_key], dataset_id=3) if row['concept_frequency'] != 0], COHD_method_percentile)
-                average_threshold = average_threshold + threshold
-                count = count + 1
-                freq_data_list = [row for row in self.cohdindex.get_paired_concept_freq(concept_id_1=source_qnode_omop_ids[source_preferred_key], dataset_id=3) if row['concept_frequency'] >= threshold]
-                for freq_data in freq_data_list:
-                    if target_qnode.category is None:
-                        preferred_target_list = self.cohdindex.get_curies_from_concept_id(freq_data['concept_id_2'])
-                    else:
-                        preferred_target_list = [preferred_target_curie for preferred_target_curie in self.cohdindex.get_curies_from_concept_id(freq_data['concept_id_2']) if self.synonymizer.get_canonical_curies(preferred_target_curie)[preferred_target_curie]['preferred_type'] == target_qnode.category]
-
-                    for target_preferred_key in preferred_target_list:
-                        if target_preferred_key not in new_edge[source_preferred_key]:
-                            new_edge[source_preferred_key][target_preferred_key] = freq_data['concept_frequency']
-                        else:
-                            if freq_data['concept_frequency'] > new_edge[source_preferred_key][target_preferred_key]:
-                                new_edge[source_preferred_key][target_preferred_key] = freq_data['concept_frequency']
-
-                if len(new_edge[source_preferred_key]) != 0:
-                    for target_preferred_key in new_edge[source_preferred_key]:
-                        swagger_edge_key, swagger_edge = self._convert_to_swagger_edge(source_preferred_key, target_preferred_key, "paired_concept_frequency", new_edge[source_preferred_key][target_preferred_key])
-
-                        source_dict[source_preferred_key] = source_qnode_key
-                        target_dict[target_preferred_key] = target_qnode_key
-
-                        # Record which of this edge's nodes correspond to which qnode_key
-                        if swagger_edge_key not in edge_to_nodes_map:
-                            edge_to_nodes_map[swagger_edge_key] = dict()
-                            edge_to_nodes_map[swagger_edge_key][source_qnode_key] = source_preferred_key
-                            edge_to_nodes_map[swagger_edge_key][target_qnode_key] = target_preferred_key
-
-                        # Finally add the current edge to our answer knowledge graph
-                        final_kg.add_edge(swagger_edge_key, swagger_edge, qedge_key)
-
-            # Add the nodes to our answer knowledge graph
-            if len(source_dict) != 0:
-                for source_preferred_key in source_dict:
-                    swagger_node_key, swagger_node = self._convert_to_swagger_node(source_preferred_key)
-                    final_kg.add_node(swagger_node_key, swagger_node, source_dict[source_preferred_key])
-            if len(target_dict) != 0:
-                for target_preferred_key in target_dict:
-                    swagger_node_key, swagger_node = self._convert_to_swagger_node(target_preferred_key)
-                    final_kg.add_node(swagger_node_key, swagger_node, target_dict[target_preferred_key])
-
-            if count != 0:
-                log.info(f"The average threshold based on {COHD_method_percentile}th percentile of paired concept frequency is {threshold/count}")
-
-            return final_kg, edge_to_nodes_map
-
-        else:
-            source_dict = dict()
-            target_dict = dict()
-            new_edge = dict()
-            average_threshold = 0
-            count = 0
-            for target_preferred_key in target_qnode_omop_ids:
-
-                if target_qnode.category is None:
-                    pass
-                else:
-                    if self.synonymizer.get_canonical_curies(target_preferred_key)[target_preferred_key]['preferred_type'] == target_qnode.category:
-                        pass
-                    else:
-                        continue
-
-                if len(target_qnode_omop_ids[target_preferred_key]) == 0:
-                    log.warning(f"No OMOP concept id was found for target preferred id '{target_preferred_key}'' with qnode id '{qedge.object}'")
-                    continue
-                elif len(self.cohdindex.get_paired_concept_freq(concept_id_1=target_qnode_omop_ids[target_preferred_key], dataset_id=3)) == 0:
-                    log.warning(f"No paired concept frequency was found from COHD database for target preferred id '{target_preferred_key}'' with qnode id '{qedge.object}'")
-                    continue
-                else:
-                    pass
-
-                new_edge[target_preferred_key] = dict()
-                threshold = np.percentile([row['concept_frequency'] for row in self.cohdindex.get_paired_concept_freq(concept_id_1=target_qnode_omop_ids[target_preferred_key], dataset_id=3) if row['concept_frequency'] != 0], COHD_method_percentile)
-                average_threshold = average_threshold + threshold
-                count = count + 1
-                freq_data_list = [row for row in self.cohdindex.get_paired_concept_freq(concept_id_1=target_qnode_omop_ids[target_preferred_key], dataset_id=3) if row['concept_frequency'] >= threshold]
-                for freq_data in freq_data_list:
-                    if source_qnode.category is None:
-                        preferred_source_list = self.cohdindex.get_curies_from_concept_id(freq_data['concept_id_2'])
-                    else:
-                        preferred_source_list = [preferred_source_curie for preferred_source_curie in self.cohdindex.get_curies_from_concept_id(freq_data['concept_id_2']) if self.synonymizer.get_canonical_curies(preferred_source_curie)[preferred_source_curie]['preferred_type'] == source_qnode.category]
-
-                    for source_preferred_key in preferred_source_list:
-                        if source_preferred_key not in new_edge[target_preferred_key]:
-                            new_edge[target_preferred_key][source_preferred_key] = freq_data['concept_frequency']
-                        else:
-                            if freq_data['concept_frequency'] > new_edge[target_preferred_key][source_preferred_key]:
-                                new_edge[target_preferred_key][source_preferred_key] = freq_data['concept_frequency']
-
-                if len(new_edge[target_preferred_key]) != 0:
-                    for source_preferred_key in new_edge[target_preferred_key]:
-                        swagger_edge_key, swagger_edge = self._convert_to_swagger_edge(source_preferred_key, target_preferred_key, "paired_concept_frequency", new_edge[target_preferred_key][source_preferred_key])
-
-                        source_dict[source_preferred_key] = source_qnode_key
-                        target_dict[target_preferred_key] = target_qnode_key
-
-                        # Record which of this edge's nodes correspond to which qnode_key
-                        if swagger_edge_key not in edge_to_nodes_map:
-                            edge_to_nodes_map[swagger_edge_key] = dict()
-                            edge_to_nodes_map[swagger_edge_key][source_qnode_key] = source_preferred_key
-                            edge_to_nodes_map[swagger_edge_key][target_qnode_key] = target_preferred_key
-
-                        # Finally add the current edge to our answer knowledge graph
-                        final_kg.add_edge(swagger_edge_key, swagger_edge, qedge_key)
-
-            # Add the nodes to our answer knowledge graph
-            if len(source_dict) != 0:
-                for source_preferred_key in source_dict:
-                    swagger_node_key, swagger_node = self._convert_to_swagger_node(source_preferred_key)
-                    final_kg.add_node(swagger_node_key, swagger_node, source_dict[source_preferred_key])
-            if len(target_dict) != 0:
-                for target_preferred_key in target_dict:
-                    swagger_node_key, swagger_node = self._convert_to_swagger_node(target_preferred_key)
-                    final_kg.add_node(swagger_node_key, swagger_node, target_dict[target_preferred_key])
-
-            if count != 0:
-                log.info(f"The average threshold based on {COHD_method_percentile}th percentile of paired concept frequency is {threshold/count}")
-
-            return final_kg, edge_to_nodes_map
+        return self._answer_query_using_COHD_metric(query_graph, 'paired_concept_freq', COHD_method_percentile, log)
 
     def _answer_query_using_COHD_observed_expected_ratio(self, query_graph: QueryGraph, COHD_method_percentile: float, log: ARAXResponse) -> Tuple[QGOrganizedKnowledgeGraph, Dict[str, Dict[str, str]]]:
         qedge_key = next(qedge_key for qedge_key in query_graph.edges)
         log.debug(f"Processing query results for edge {qedge_key} by using natural logarithm of observed expected ratio")
-        final_kg = QGOrganizedKnowledgeGraph()
-        edge_to_nodes_map = dict()
-        # if COHD_method_threshold == float("inf"):
-        #     threshold = 4.44  # default threshold based on the distribution of 0.99 quantile
-        # else:
-        #     threshold = COHD_method_threshold
-        # log.info(f"The threshod used to filter natural logarithm of observed expected ratio is {threshold}")
-
-        # extract information from the QueryGraph
-        qedge = query_graph.edges[qedge_key]
-        source_qnode_key = qedge.subject
-        target_qnode_key = qedge.object
-        source_qnode = query_graph.nodes[source_qnode_key]
-        target_qnode = query_graph.nodes[target_qnode_key]
-
-        # check if both ends of edge have no curie
-        if (source_qnode.id is None) and (target_qnode.id is None):
-            log.error(f"Both ends of edge {qedge_key} are None", error_code="BadEdge")
-            return final_kg, edge_to_nodes_map
-
-        # Convert curie ids to OMOP ids
-        if source_qnode.id is not None:
-            source_qnode_omop_ids = self._get_omop_id_from_curies(source_qnode_key, query_graph, log)
-        else:
-            source_qnode_omop_ids = None
-        if log.status != 'OK':
-            return final_kg, edge_to_nodes_map
-        if target_qnode.id is not None:
-            target_qnode_omop_ids = self._get_omop_id_from_curies(target_qnode_key, query_graph, log)
-        else:
-            target_qnode_omop_ids = None
-        if log.status != 'OK':
-            return final_kg, edge_to_nodes_map
-
-        # expand edges according to the OMOP id pairs
-        if (source_qnode_omop_ids is None) and (target_qnode_omop_ids is None):
-            return final_kg, edge_to_nodes_map
-
-        elif (source_qnode_omop_ids is not None) and (target_qnode_omop_ids is not None):
-            source_dict = dict()
-            target_dict = dict()
-            average_threshold = 0
-            count = 0
-            for (source_preferred_key, target_preferred_key) in itertools.product(list(source_qnode_omop_ids.keys()), list(target_qnode_omop_ids.keys())):
-
-                if source_qnode.category is None and target_qnode.category is None:
-                    pass
-                else:
-                    if self.synonymizer.get_canonical_curies(source_preferred_key)[source_preferred_key]['preferred_type'] == source_qnode.category:
-                        pass
-                    else:
-                        continue
-                    if self.synonymizer.get_canonical_curies(target_preferred_key)[target_preferred_key]['preferred_type'] == target_qnode.category:
-                        pass
-                    else:
-                        continue
-
-                if len(source_qnode_omop_ids[source_preferred_key]) == 0:
-                    log.warning(f"No OMOP concept id was found for source preferred id '{source_preferred_key}'' with qnode id '{qedge.subject}'")
-                    continue
-                elif len(self.cohdindex.get_obs_exp_ratio(concept_id_1=source_qnode_omop_ids[source_preferred_key], dataset_id=3)) == 0:
-                    log.warning(f"No paired concept ids was found from COHD database for source preferred id '{source_preferred_key}'' with qnode id '{qedge.subject}'")
-                    continue
-                else:
-                    pass
-
-                if len(target_qnode_omop_ids[target_preferred_key]) == 0:
-                    log.warning(f"No OMOP concept id was found for target preferred id '{target_preferred_key}'' with qnode id '{qedge.object}'")
-                    continue
-                elif len(self.cohdindex.get_obs_exp_ratio(concept_id_1=target_qnode_omop_ids[target_preferred_key], dataset_id=3)) == 0:
-                    log.warning(f"No paired concept ids was found from COHD database for target preferred id '{target_preferred_key}'' with qnode id '{qedge.object}'")
-                    continue
-                else:
-                    pass
-
-                value = float("-inf")
-                threshold1 = np.percentile([row['ln_ratio'] for row in self.cohdindex.get_obs_exp_ratio(concept_id_1=source_qnode_omop_ids[source_preferred_key], domain="", dataset_id=3) if row['ln_ratio'] != float("-inf")], COHD_method_percentile)  # calculate the percentile after removing the extreme value e.g. -inf
-                threshold2 = np.percentile([row['ln_ratio'] for row in self.cohdindex.get_obs_exp_ratio(concept_id_1=target_qnode_omop_ids[target_preferred_key], domain="", dataset_id=3) if row['ln_ratio'] != float("-inf")], COHD_method_percentile)  # calculate the percentile after removing the extreme value e.g. -inf
-                threshold = min(threshold1, threshold2)  # pick the minimum one for threshold
-                average_threshold = average_threshold + threshold
-                count = count + 1
-                omop_pairs = [f"{omop1}_{omop2}" for (omop1, omop2) in itertools.product(source_qnode_omop_ids[source_preferred_key], target_qnode_omop_ids[target_preferred_key])]
-                if len(omop_pairs) != 0:
-                    res = self.cohdindex.get_obs_exp_ratio(concept_id_pair=omop_pairs, domain="", dataset_id=3)  # use the hierarchical dataset
-                    if len(res) != 0:
-                        maximum_ln_ratio = res[0]['ln_ratio']  # the result returned from get_paired_concept_freq was sorted by decreasing order
-                        value = maximum_ln_ratio
-                if value >= threshold:
-                    swagger_edge_key, swagger_edge = self._convert_to_swagger_edge(source_preferred_key, target_preferred_key, "ln_observed_expected_ratio", value)
-                else:
-                    continue
-
-                source_dict[source_preferred_key] = source_qnode_key
-                target_dict[target_preferred_key] = target_qnode_key
-
-                # Record which of this edge's nodes correspond to which qnode_key
-                if swagger_edge_key not in edge_to_nodes_map:
-                    edge_to_nodes_map[swagger_edge_key] = dict()
-                edge_to_nodes_map[swagger_edge_key][source_qnode_key] = source_preferred_key
-                edge_to_nodes_map[swagger_edge_key][target_qnode_key] = target_preferred_key
-
-                # Finally add the current edge to our answer knowledge graph
-                final_kg.add_edge(swagger_edge_key, swagger_edge, qedge_key)
-
-            # Add the nodes to our answer knowledge graph
-            if len(source_dict) != 0:
-                for source_preferred_key in source_dict:
-                    swagger_node_key, swagger_node = self._convert_to_swagger_node(source_preferred_key)
-                    final_kg.add_node(swagger_node_key, swagger_node, source_dict[source_preferred_key])
-            if len(target_dict) != 0:
-                for target_preferred_key in target_dict:
-                    swagger_node_key, swagger_node = self._convert_to_swagger_node(target_preferred_key)
-                    final_kg.add_node(swagger_node_key, swagger_node, target_dict[target_preferred_key])
-
-            if count != 0:
-                log.info(f"The average threshold based on {COHD_method_percentile}th percentile of natural logarithm of observed expected ratio is {threshold/count}")
-
-            return final_kg, edge_to_nodes_map
-
-        elif source_qnode_omop_ids is not None:
-            source_dict = dict()
-            target_dict = dict()
-            new_edge = dict()
-            average_threshold = 0
-            count = 0
-            for source_preferred_key in source_qnode_omop_ids:
-
-                if source_qnode.category is None:
-                    pass
-                else:
-                    if self.synonymizer.get_canonical_curies(source_preferred_key)[source_preferred_key]['preferred_type'] == source_qnode.category:
-                        pass
-                    else:
-                        continue
-
-                if len(source_qnode_omop_ids[source_preferred_key]) == 0:
-                    log.warning(f"No OMOP concept id was found for source preferred id '{source_preferred_key}'' with qnode id '{qedge.subject}'")
-                    continue
-                elif len(self.cohdindex.get_obs_exp_ratio(concept_id_1=source_qnode_omop_ids[source_preferred_key], dataset_id=3)) == 0:
-                    log.warning(f"No paired concept frequency was found from COHD database for source preferred id '{source_preferred_key}'' with qnode id '{qedge.subject}'")
-                    continue
-                else:
-                    pass
-
-                new_edge[source_preferred_key] = dict()
-                threshold = np.percentile([row['ln_ratio'] for row in self.cohdindex.get_obs_exp_ratio(concept_id_1=source_qnode_omop_ids[source_preferred_key], domain="", dataset_id=3) if row['ln_ratio'] != float("-inf")], COHD_method_percentile)
-                average_threshold = average_threshold + threshold
-                count = count + 1
-                ln_ratio_data_list = [row for row in self.cohdindex.get_obs_exp_ratio(concept_id_1=source_qnode_omop_ids[source_preferred_key], domain="", dataset_id=3) if row['ln_ratio'] >= threshold]
-                for ln_ratio_data in ln_ratio_data_list:
-                    if target_qnode.category is None:
-                        preferred_target_list = self.cohdindex.get_curies_from_concept_id(ln_ratio_data['concept_id_2'])
-                    else:
-                        preferred_target_list = [preferred_target_curie for preferred_target_curie in self.cohdindex.get_curies_from_concept_id(ln_ratio_data['concept_id_2']) if self.synonymizer.get_canonical_curies(preferred_target_curie)[preferred_target_curie]['preferred_type'] == target_qnode.category]
-
-                    for target_preferred_key in preferred_target_list:
-                        if target_preferred_key not in new_edge[source_preferred_key]:
-                            new_edge[source_preferred_key][target_preferred_key] = ln_ratio_data['ln_ratio']
-                        else:
-                            if ln_ratio_data['ln_ratio'] > new_edge[source_preferred_key][target_preferred_key]:
-                                new_edge[source_preferred_key][target_preferred_key] = ln_ratio_data['ln_ratio']
-
-                if len(new_edge[source_preferred_key]) != 0:
-                    for target_preferred_key in new_edge[source_preferred_key]:
-                        swagger_edge_key, swagger_edge = self._convert_to_swagger_edge(source_preferred_key, target_preferred_key, "ln_observed_expected_ratio", new_edge[source_preferred_key][target_preferred_key])
-
-                        source_dict[source_preferred_key] = source_qnode_key
-                        target_dict[target_preferred_key] = target_qnode_key
-
-                        # Record which of this edge's nodes correspond to which qnode_key
-                        if swagger_edge_key not in edge_to_nodes_map:
-                            edge_to_nodes_map[swagger_edge_key] = dict()
-                            edge_to_nodes_map[swagger_edge_key][source_qnode_key] = source_preferred_key
-                            edge_to_nodes_map[swagger_edge_key][target_qnode_key] = target_preferred_key
-
-                        # Finally add the current edge to our answer knowledge graph
-                        final_kg.add_edge(swagger_edge_key, swagger_edge, qedge_key)
-
-            # Add the nodes to our answer knowledge graph
-            if len(source_dict) != 0:
-                for source_preferred_key in source_dict:
-                    swagger_node_key, swagger_node = self._convert_to_swagger_node(source_preferred_key)
-                    final_kg.add_node(swagger_node_key, swagger_node, source_dict[source_preferred_key])
-            if len(target_dict) != 0:
-                for target_preferred_key in target_dict:
-                    swagger_node_key, swagger_node = self._convert_to_swagger_node(target_preferred_key)
-                    final_kg.add_node(swagger_node_key, swagger_node, target_dict[target_preferred_key])
-
-            if count != 0:
-                log.info(f"The average threshold based on {COHD_method_percentile}th percentile of natural logarithm of observed expected ratio is {threshold/count}")
-            return final_kg, edge_to_nodes_map
-
-        else:
-            source_dict = dict()
-            target_dict = dict()
-            new_edge = dict()
-            average_threshold = 0
-            count = 0
-            for target_preferred_key in target_qnode_omop_ids:
-
-                if target_qnode.category is None:
-                    pass
-                else:
-                    if self.synonymizer.get_canonical_curies(target_preferred_key)[target_preferred_key]['preferred_type'] == target_qnode.category:
-                        pass
-                    else:
-                        continue
-
-                if len(target_qnode_omop_ids[target_preferred_key]) == 0:
-                    log.warning(f"No OMOP concept id was found for target preferred id '{target_preferred_key}'' with qnode id '{qedge.object}'")
-                    continue
-                elif len(self.cohdindex.get_paired_concept_freq(concept_id_1=target_qnode_omop_ids[target_preferred_key], dataset_id=3)) == 0:
-                    log.warning(f"No paired concept frequency was found from COHD database for target preferred id '{target_preferred_key}'' with qnode id '{qedge.object}'")
-                    continue
-                else:
-                    pass
-
-                new_edge[target_preferred_key] = dict()
-                threshold = np.percentile([row['ln_ratio'] for row in self.cohdindex.get_obs_exp_ratio(concept_id_1=target_qnode_omop_ids[target_preferred_key], domain="", dataset_id=3) if row['ln_ratio'] != float("-inf")], COHD_method_percentile)
-                average_threshold = average_threshold + threshold
-                count = count + 1
-                ln_ratio_data_list = [row for row in self.cohdindex.get_obs_exp_ratio(concept_id_1=target_qnode_omop_ids[target_preferred_key], domain="", dataset_id=3) if row['ln_ratio'] >= threshold]
-                for ln_ratio_data in ln_ratio_data_list:
-                    if source_qnode.category is None:
-                        preferred_source_list = self.cohdindex.get_curies_from_concept_id(ln_ratio_data['concept_id_2'])
-                    else:
-                        preferred_source_list = [preferred_source_curie for preferred_source_curie in self.cohdindex.get_curies_from_concept_id(ln_ratio_data['concept_id_2']) if self.synonymizer.get_canonical_curies(preferred_source_curie)[preferred_source_curie]['preferred_type'] == source_qnode.category]
-
-                    for source_preferred_key in preferred_source_list:
-                        if source_preferred_key not in new_edge[target_preferred_key]:
-                            new_edge[target_preferred_key][source_preferred_key] = ln_ratio_data['ln_ratio']
-                        else:
-                            if ln_ratio_data['ln_ratio'] > new_edge[target_preferred_key][source_preferred_key]:
-                                new_edge[target_preferred_key][source_preferred_key] = ln_ratio_data['ln_ratio']
-
-                if len(new_edge[target_preferred_key]) != 0:
-                    for source_preferred_key in new_edge[target_preferred_key]:
-                        swagger_edge_key, swagger_edge = self._convert_to_swagger_edge(source_preferred_key, target_preferred_key, "ln_observed_expected_ratio", new_edge[target_preferred_key][source_preferred_key])
-
-                        source_dict[source_preferred_key] = source_qnode_key
-                        target_dict[target_preferred_key] = target_qnode_key
-
-                        # Record which of this edge's nodes correspond to which qnode_key
-                        if swagger_edge_key not in edge_to_nodes_map:
-                            edge_to_nodes_map[swagger_edge_key] = dict()
-                            edge_to_nodes_map[swagger_edge_key][source_qnode_key] = source_preferred_key
-                            edge_to_nodes_map[swagger_edge_key][target_qnode_key] = target_preferred_key
-
-                        # Finally add the current edge to our answer knowledge graph
-                        final_kg.add_edge(swagger_edge_key, swagger_edge, qedge_key)
-
-            # Add the nodes to our answer knowledge graph
-            if len(source_dict) != 0:
-                for source_preferred_key in source_dict:
-                    swagger_node_key, swagger_node = self._convert_to_swagger_node(source_preferred_key)
-                    final_kg.add_node(swagger_node_key, swagger_node, source_dict[source_preferred_key])
-            if len(target_dict) != 0:
-                for target_preferred_key in target_dict:
-                    swagger_node_key, swagger_node = self._convert_to_swagger_node(target_preferred_key)
-                    final_kg.add_node(swagger_node_key, swagger_node, target_dict[target_preferred_key])
-
-            if count != 0:
-                log.info(f"The average threshold based on {COHD_method_percentile}th percentile of natural logarithm of observed expected ratio is {threshold/count}")
-            return final_kg, edge_to_nodes_map
+        return self._answer_query_using_COHD_metric(query_graph, 'observed_expected_ratio', COHD_method_percentile, log)
 
     def _answer_query_using_COHD_chi_square(self, query_graph: QueryGraph, COHD_method_percentile: float, log: ARAXResponse) -> Tuple[QGOrganizedKnowledgeGraph, Dict[str, Dict[str, str]]]:
         qedge_key = next(qedge_key for qedge_key in query_graph.edges)
         log.debug(f"Processing query results for edge {qedge_key} by using chi square pvalue")
+        return self._answer_query_using_COHD_metric(query_graph, 'chi_square', COHD_method_percentile, log)
+
+    def _answer_query_using_COHD_metric(self, query_graph: QueryGraph, metric: str, COHD_method_percentile: float, log: ARAXResponse) -> Tuple[QGOrganizedKnowledgeGraph, Dict[str, Dict[str, str]]]:
+        qedge_key = next(qedge_key for qedge_key in query_graph.edges)
         final_kg = QGOrganizedKnowledgeGraph()
         edge_to_nodes_map = dict()
-        # if COHD_method_threshold == float("inf"):
-        #     threshold = pow(10, -270.7875)  # default threshold based on the distribution of 0.99 quantile
-        # else:
-        #     threshold = COHD_method_threshold
-        # log.info(f"The threshod used to filter chi square pvalue is {threshold}")
+        edge_name, metric_description = COHD_METRIC_EDGE_NAMES[metric]
+        higher_is_better = COHD_METRICS[metric]['higher_is_better']
+        # Smaller p-values are better, so their threshold comes from the lower tail of the distribution
+        percentile = COHD_method_percentile if higher_is_better else 100 - COHD_method_percentile
 
         # extract information from the QueryGraph
         qedge = query_graph.edges[qedge_key]
@@ -670,235 +148,122 @@ class COHDQuerier:
         if (source_qnode_omop_ids is None) and (target_qnode_omop_ids is None):
             return final_kg, edge_to_nodes_map
 
-        elif (source_qnode_omop_ids is not None) and (target_qnode_omop_ids is not None):
-            source_dict = dict()
-            target_dict = dict()
-            average_threshold = 0
-            count = 0
-            for (source_preferred_key, target_preferred_key) in itertools.product(list(source_qnode_omop_ids.keys()), list(target_qnode_omop_ids.keys())):
-
-                if source_qnode.category is None and target_qnode.category is None:
-                    pass
-                else:
-                    if self.synonymizer.get_canonical_curies(source_preferred_key)[source_preferred_key]['preferred_type'] == source_qnode.category:
-                        pass
-                    else:
-                        continue
-                    if self.synonymizer.get_canonical_curies(target_preferred_key)[target_preferred_key]['preferred_type'] == target_qnode.category:
-                        pass
-                    else:
-                        continue
-
-                if len(source_qnode_omop_ids[source_preferred_key]) == 0:
-                    log.warning(f"No OMOP concept id was found for source preferred id '{source_preferred_key}'' with qnode id '{qedge.subject}'")
-                    continue
-                elif len(self.cohdindex.get_obs_exp_ratio(concept_id_1=source_qnode_omop_ids[source_preferred_key], dataset_id=3)) == 0:
-                    log.warning(f"No paired concept ids was found from COHD database for source preferred id '{source_preferred_key}'' with qnode id '{qedge.subject}'")
-                    continue
-                else:
-                    pass
-
-                if len(target_qnode_omop_ids[target_preferred_key]) == 0:
-                    log.warning(f"No OMOP concept id was found for target preferred id '{target_preferred_key}'' with qnode id '{qedge.object}'")
-                    continue
-                elif len(self.cohdindex.get_obs_exp_ratio(concept_id_1=target_qnode_omop_ids[target_preferred_key], dataset_id=3)) == 0:
-                    log.warning(f"No paired concept ids was found from COHD database for target preferred id '{target_preferred_key}'' with qnode id '{qedge.object}'")
-                    continue
-                else:
-                    pass
-
-                value = float("inf")
-                threshold1 = np.percentile([row['p-value'] for row in self.cohdindex.get_chi_square(concept_id_1=source_qnode_omop_ids[source_preferred_key], domain="", dataset_id=3) if row['p-value'] != 0], COHD_method_percentile)  # calculate the percentile after removing the extreme value e.g. 0
-                threshold2 = np.percentile([row['p-value'] for row in self.cohdindex.get_chi_square(concept_id_1=target_qnode_omop_ids[target_preferred_key], domain="", dataset_id=3) if row['p-value'] != 0], COHD_method_percentile)  # calculate the percentile after removing the extreme value e.g. 0
-                threshold = max(threshold1, threshold2)  # pick the maximum one for threshold
-                average_threshold = average_threshold + threshold
-                count = count + 1
-                omop_pairs = [f"{omop1}_{omop2}" for (omop1, omop2) in itertools.product(source_qnode_omop_ids[source_preferred_key], target_qnode_omop_ids[target_preferred_key])]
-
-                if len(omop_pairs) != 0:
-                    res = self.cohdIndex.get_chi_square(concept_id_pair=omop_pairs, domain="", dataset_id=3)  # use the hierarchical dataset
-                    if len(res) != 0:
-                        minimum_pvalue = res[0]['p-value']  # the result returned from get_paired_concept_freq was sorted by decreasing order
-                        value = minimum_pvalue
-
-                if value <= threshold:
-                    swagger_edge_key, swagger_edge = self._convert_to_swagger_edge(source_preferred_key, target_preferred_key, "chi_square_pvalue", value)
-                else:
-                    continue
-
-                source_dict[source_preferred_key] = source_qnode_key
-                target_dict[target_preferred_key] = target_qnode_key
-
-                # Record which of this edge's nodes correspond to which qnode_key
-                if swagger_edge_key not in edge_to_nodes_map:
-                    edge_to_nodes_map[swagger_edge_key] = dict()
-                edge_to_nodes_map[swagger_edge_key][source_qnode_key] = source_preferred_key
-                edge_to_nodes_map[swagger_edge_key][target_qnode_key] = target_preferred_key
-
-                # Finally add the current edge to our answer knowledge graph
-                final_kg.add_edge(swagger_edge_key, swagger_edge, qedge_key)
-
-            # Add the nodes to our answer knowledge graph
-            if len(source_dict) != 0:
-                for source_preferred_key in source_dict:
-                    swagger_node_key, swagger_node = self._convert_to_swagger_node(source_preferred_key)
-                    final_kg.add_node(swagger_node_key, swagger_node, source_dict[source_preferred_key])
-            if len(target_dict) != 0:
-                for target_preferred_key in target_dict:
-                    swagger_node_key, swagger_node = self._convert_to_swagger_node(target_preferred_key)
-                    final_kg.add_node(swagger_node_key, swagger_node, target_dict[target_preferred_key])
-
-            if count != 0:
-                log.info(f"The average threshold based on {COHD_method_percentile}th percentile of chi square pvalue is {threshold/count}")
-            return final_kg, edge_to_nodes_map
-
-        elif source_qnode_omop_ids is not None:
-            source_dict = dict()
-            target_dict = dict()
-            new_edge = dict()
-            average_threshold = 0
-            count = 0
-            for source_preferred_key in source_qnode_omop_ids:
-
-                if source_qnode.category is None:
-                    pass
-                else:
-                    if self.synonymizer.get_canonical_curies(source_preferred_key)[source_preferred_key]['preferred_type'] == source_qnode.category:
-                        pass
-                    else:
-                        continue
-
-                if len(source_qnode_omop_ids[source_preferred_key]) == 0:
-                    log.warning(f"No OMOP concept id was found for source preferred id '{source_preferred_key}'' with qnode id '{qedge.subject}'")
-                    continue
-                elif len(self.cohdindex.get_obs_exp_ratio(concept_id_1=source_qnode_omop_ids[source_preferred_key], dataset_id=3)) == 0:
-                    log.warning(f"No paired concept frequency was found from COHD database for source preferred id '{source_preferred_key}'' with qnode id '{qedge.subject}'")
-                    continue
+        # Canonicalize the input curies and look up their thresholds all at once, rather than once per curie (pair)
+        input_curies = list(source_qnode_omop_ids or dict()) + list(target_qnode_omop_ids or dict())
+        canonical_curies = self.synonymizer.get_canonical_curies(input_curies) if len(input_curies) != 0 else dict()
+        if source_qnode_omop_ids is not None:
+            source_qnode_omop_ids = self._get_usable_omop_ids(source_qnode_omop_ids, source_qnode, canonical_curies, "source", qedge.subject, log)
+            source_thresholds = self.cohdindex.get_percentile_thresholds(source_qnode_omop_ids, metric, percentile, dataset_id=3)  # use the hierarchical dataset
+            source_qnode_omop_ids = self._remove_curies_without_pairs(source_qnode_omop_ids, source_thresholds, "source", qedge.subject, log)
+        if target_qnode_omop_ids is not None:
+            target_qnode_omop_ids = self._get_usable_omop_ids(target_qnode_omop_ids, target_qnode, canonical_curies, "target", qedge.object, log)
+            target_thresholds = self.cohdindex.get_percentile_thresholds(target_qnode_omop_ids, metric, percentile, dataset_id=3)  # use the hierarchical dataset
+            target_qnode_omop_ids = self._remove_curies_without_pairs(target_qnode_omop_ids, target_thresholds, "target", qedge.object, log)
+
+        new_edge = dict()  # Maps (source curie, target curie) to the value of the metric for that pair
+        average_threshold = 0
+        count = 0
+        if (source_qnode_omop_ids is not None) and (target_qnode_omop_ids is not None):
+            pair_values = self.cohdindex.get_best_pair_values(source_qnode_omop_ids, target_qnode_omop_ids, metric, dataset_id=3)  # use the hierarchical dataset
+            for (source_preferred_key, target_preferred_key) in itertools.product(source_qnode_omop_ids, target_qnode_omop_ids):
+                # pick the least strict of the two thresholds
+                if higher_is_better:
+                    threshold = min(source_thresholds[source_preferred_key], target_thresholds[target_preferred_key])
                 else:
-                    pass
-
-                new_edge[source_preferred_key] = dict()
-                threshold = np.percentile([row['p-value'] for row in self.cohdindex.get_chi_square(concept_id_1=source_qnode_omop_ids[source_preferred_key], domain="", dataset_id=3) if row['p-value'] != 0], (100 - COHD_method_percentile))
+                    threshold = max(source_thresholds[source_preferred_key], target_thresholds[target_preferred_key])
                 average_threshold = average_threshold + threshold
                 count = count + 1
-                pvalue_data_list = [row for row in self.cohdindex.get_chi_square(concept_id_1=source_qnode_omop_ids[source_preferred_key], domain="", dataset_id=3) if row['p-value'] <= threshold]
-                for pvalue_data in pvalue_data_list:
-                    if target_qnode.category is None:
-                        preferred_target_list = self.cohdindex.get_curies_from_concept_id(pvalue_data['concept_id_2'])
-                    else:
-                        preferred_target_list = [preferred_target_curie for preferred_target_curie in self.cohdindex.get_curies_from_concept_id(pvalue_data['concept_id_2']) if self.synonymizer.get_canonical_curies(preferred_target_curie)[preferred_target_curie]['preferred_type'] == target_qnode.category]
-
-                    for target_preferred_key in preferred_target_list:
-                        if target_preferred_key not in new_edge[source_preferred_key]:
-                            new_edge[source_preferred_key][target_preferred_key] = pvalue_data['p-value']
-                        else:
-                            if pvalue_data['p-value'] < new_edge[source_preferred_key][target_preferred_key]:
-                                new_edge[source_preferred_key][target_preferred_key] = pvalue_data['p-value']
-
-                if len(new_edge[source_preferred_key]) != 0:
-                    for target_preferred_key in new_edge[source_preferred_key]:
-                        swagger_edge_key, swagger_edge = self._convert_to_swagger_edge(source_preferred_key, target_preferred_key, "chi_square_pvalue", new_edge[source_preferred_key][target_preferred_key])
-
-                        source_dict[source_preferred_key] = source_qnode_key
-                        target_dict[target_preferred_key] = target_qnode_key
-
-                        # Record which of this edge's nodes correspond to which qnode_key
-                        if swagger_edge_key not in edge_to_nodes_map:
-                            edge_to_nodes_map[swagger_edge_key] = dict()
-                            edge_to_nodes_map[swagger_edge_key][source_qnode_key] = source_preferred_key
-                            edge_to_nodes_map[swagger_edge_key][target_qnode_key] = target_preferred_key
-
-                        # Finally add the current edge to our answer knowledge graph
-                        final_kg.add_edge(swagger_edge_key, swagger_edge, qedge_key)
-
-            # Add the nodes to our answer knowledge graph
-            if len(source_dict) != 0:
-                for source_preferred_key in source_dict:
-                    swagger_node_key, swagger_node = self._convert_to_swagger_node(source_preferred_key)
-                    final_kg.add_node(swagger_node_key, swagger_node, source_dict[source_preferred_key])
-            if len(target_dict) != 0:
-                for target_preferred_key in target_dict:
-                    swagger_node_key, swagger_node = self._convert_to_swagger_node(target_preferred_key)
-                    final_kg.add_node(swagger_node_key, swagger_node, target_dict[target_preferred_key])
-
-            if count != 0:
-                log.info(f"The average threshold based on {COHD_method_percentile}th percentile of chi square pvalue is {threshold/count}")
-
-            return final_kg, edge_to_nodes_map
-
+                value = pair_values.get((source_preferred_key, target_preferred_key))
+                if value is not None and self._passes_threshold(value, threshold, higher_is_better):
+                    new_edge[(source_preferred_key, target_preferred_key)] = value
         else:
-            source_dict = dict()
-            target_dict = dict()
-            new_edge = dict()
-            average_threshold = 0
-            count = 0
-            for target_preferred_key in target_qnode_omop_ids:
-
-                if target_qnode.category is None:
-                    pass
-                else:
-                    if self.synonymizer.get_canonical_curies(target_preferred_key)[target_preferred_key]['preferred_type'] == target_qnode.category:
-                        pass
-                    else:
-                        continue
-
-                if len(target_qnode_omop_ids[target_preferred_key]) == 0:
-                    log.warning(f"No OMOP concept id was found for target preferred id '{target_preferred_key}'' with qnode id '{qedge.object}'")
-                    continue
-                elif len(self.cohdindex.get_paired_concept_freq(concept_id_1=target_qnode_omop_ids[target_preferred_key], dataset_id=3)) == 0:
-                    log.warning(f"No paired concept frequency was found from COHD database for target preferred id '{target_preferred_key}'' with qnode id '{qedge.object}'")
-                    continue
-                else:
-                    pass
-
-                new_edge[target_preferred_key] = dict()
-                threshold = np.percentile([row['p-value'] for row in self.cohdindex.get_chi_square(concept_id_1=target_qnode_omop_ids[target_preferred_key], domain="", dataset_id=3) if row['p-value'] != 0], COHD_method_percentile)
+            source_is_pinned = source_qnode_omop_ids is not None
+            pinned_omop_ids, pinned_thresholds = (source_qnode_omop_ids, source_thresholds) if source_is_pinned else (target_qnode_omop_ids, target_thresholds)
+            other_qnode = target_qnode if source_is_pinned else source_qnode
+            pinned_partners = dict()
+            for pinned_preferred_key, omop_ids in pinned_omop_ids.items():
+                threshold = pinned_thresholds[pinned_preferred_key]
                 average_threshold = average_threshold + threshold
                 count = count + 1
-                pvalue_data_list = [row for row in self.cohdindex.get_chi_square(concept_id_1=target_qnode_omop_ids[target_preferred_key], domain="", dataset_id=3) if row['p-value'] <= threshold]
-                for pvalue_data in pvalue_data_list:
-                    if source_qnode.category is None:
-                        preferred_source_list = self.cohdindex.get_curies_from_concept_id(pvalue_data['concept_id_2'])
-                    else:
-                        preferred_source_list = [preferred_source_curie for preferred_source_curie in self.cohdindex.get_curies_from_concept_id(pvalue_data['concept_id_2']) if self.synonymizer.get_canonical_curies(preferred_source_curie)[preferred_source_curie]['preferred_type'] == source_qnode.category]
-
-                    for source_preferred_key in preferred_source_list:
-                        if source_preferred_key not in new_edge[target_preferred_key]:
-                            new_edge[target_preferred_key][source_preferred_key] = pvalue_data['p-value']
-                        else:
-                            if pvalue_data['p-value'] < new_edge[target_preferred_key][source_preferred_key]:
-                                new_edge[target_preferred_key][source_preferred_key] = pvalue_data['p-value']
-
-                if len(new_edge[target_preferred_key]) != 0:
-                    for source_preferred_key in new_edge[target_preferred_key]:
-                        swagger_edge_key, swagger_edge = self._convert_to_swagger_edge(source_preferred_key, target_preferred_key, "chi_square_pvalue", new_edge[target_preferred_key][source_preferred_key])
-
-                        source_dict[source_preferred_key] = source_qnode_key
-                        target_dict[target_preferred_key] = target_qnode_key
-
-                        # Record which of this edge's nodes correspond to which qnode_key
-                        if swagger_edge_key not in edge_to_nodes_map:
-                            edge_to_nodes_map[swagger_edge_key] = dict()
-                            edge_to_nodes_map[swagger_edge_key][source_qnode_key] = source_preferred_key
-                            edge_to_nodes_map[swagger_edge_key][target_qnode_key] = target_preferred_key
-
-                        # Finally add the current edge to our answer knowledge graph
-                        final_kg.add_edge(swagger_edge_key, swagger_edge, qedge_key)
-
-            # Add the nodes to our answer knowledge graph
-            if len(source_dict) != 0:
-                for source_preferred_key in source_dict:
-                    swagger_node_key, swagger_node = self._convert_to_swagger_node(source_preferred_key)
-                    final_kg.add_node(swagger_node_key, swagger_node, source_dict[source_preferred_key])
-            if len(target_dict) != 0:
-                for target_preferred_key in target_dict:
-                    swagger_node_key, swagger_node = self._convert_to_swagger_node(target_preferred_key)
-                    final_kg.add_node(swagger_node_key, swagger_node, target_dict[target_preferred_key])
-
-            if count != 0:
-                log.info(f"The average threshold based on {COHD_method_percentile}th percentile of chi square pvalue is {threshold/count}")
+                pinned_partners[pinned_preferred_key] = [(partner_omop_id, value) for partner_omop_id, value in self.cohdindex.get_partner_values(omop_ids, metric, dataset_id=3)
+                                                         if value is not None and self._passes_threshold(value, threshold, higher_is_better)]
+
+            # Map all of the partner concepts back to curies at once
+            partner_omop_ids = {partner_omop_id for partners in pinned_partners.values() for partner_omop_id, _ in partners}
+            omop_id_to_curies = self.cohdindex.get_curies_from_concept_ids(list(partner_omop_ids))
+            if other_qnode.category is not None:
+                partner_curies = list({curie for curies in omop_id_to_curies.values() for curie in curies})
+                partner_canonical_curies = self.synonymizer.get_canonical_curies(partner_curies) if len(partner_curies) != 0 else dict()
+                omop_id_to_curies = {omop_id: [curie for curie in curies if self._matches_category(curie, other_qnode, partner_canonical_curies)]
+                                     for omop_id, curies in omop_id_to_curies.items()}
+
+            for pinned_preferred_key, partners in pinned_partners.items():
+                for partner_omop_id, value in partners:
+                    for partner_preferred_key in omop_id_to_curies[partner_omop_id]:
+                        pair = (pinned_preferred_key, partner_preferred_key) if source_is_pinned else (partner_preferred_key, pinned_preferred_key)
+                        if pair not in new_edge or self._passes_threshold(value, new_edge[pair], higher_is_better):
+                            new_edge[pair] = value
+
+        source_dict = dict()
+        target_dict = dict()
+        for (source_preferred_key, target_preferred_key), value in new_edge.items():
+            swagger_edge_key, swagger_edge = self._convert_to_swagger_edge(source_preferred_key, target_preferred_key, edge_name, value)
+
+            source_dict[source_preferred_key] = source_qnode_key
+            target_dict[target_preferred_key] = target_qnode_key
+
+            # Record which of this edge's nodes correspond to which qnode_key
+            if swagger_edge_key not in edge_to_nodes_map:
+                edge_to_nodes_map[swagger_edge_key] = dict()
+            edge_to_nodes_map[swagger_edge_key][source_qnode_key] = source_preferred_key
+            edge_to_nodes_map[swagger_edge_key][target_qnode_key] = target_preferred_key
+
+            # Finally add the current edge to our answer knowledge graph
+            final_kg.add_edge(swagger_edge_key, swagger_edge, qedge_key)
+
+        # Add the nodes to our answer knowledge graph
+        node_keys = list(set(source_dict) | set(target_dict))
+        node_canonical_curies = self.synonymizer.get_canonical_curies(node_keys) if len(node_keys) != 0 else dict()
+        for source_preferred_key in source_dict:
+            swagger_node_key, swagger_node = self._convert_to_swagger_node(source_preferred_key, node_canonical_curies)
+            final_kg.add_node(swagger_node_key, swagger_node, source_dict[source_preferred_key])
+        for target_preferred_key in target_dict:
+            swagger_node_key, swagger_node = self._convert_to_swagger_node(target_preferred_key, node_canonical_curies)
+            final_kg.add_node(swagger_node_key, swagger_node, target_dict[target_preferred_key])
+
+        if count != 0:
+            log.info(f"The average threshold based on {percentile}th percentile of {metric_description} is {average_threshold/count}")
 
-            return final_kg, edge_to_nodes_map
+        return final_kg, edge_to_nodes_map
+
+    def _get_usable_omop_ids(self, qnode_omop_ids: Dict[str, list], qnode: QNode, canonical_curies: Dict[str, dict], end: str, qnode_key: str, log: ARAXResponse) -> Dict[str, list]:
+        usable_omop_ids = dict()
+        for preferred_key, omop_ids in qnode_omop_ids.items():
+            if not self._matches_category(preferred_key, qnode, canonical_curies):
+                log.warning(f"The preferred type of {end} preferred id '{preferred_key}' can't match to the given {end} type '{qnode.category}''")
+            elif len(omop_ids) == 0:
+                log.warning(f"No OMOP concept id was found for {end} preferred id '{preferred_key}'' with qnode id '{qnode_key}'")
+            else:
+                usable_omop_ids[preferred_key] = omop_ids
+        return usable_omop_ids
+
+    @staticmethod
+    def _remove_curies_without_pairs(qnode_omop_ids: Dict[str, list], thresholds: Dict[str, float], end: str, qnode_key: str, log: ARAXResponse) -> Dict[str, list]:
+        for preferred_key in qnode_omop_ids:
+            if preferred_key not in thresholds:
+                log.warning(f"No paired concept ids was found from COHD database for {end} preferred id '{preferred_key}'' with qnode id '{qnode_key}'")
+        return {preferred_key: omop_ids for preferred_key, omop_ids in qnode_omop_ids.items() if preferred_key in thresholds}
+
+    @staticmethod
+    def _matches_category(curie: str, qnode: QNode, canonical_curies: Dict[str, dict]) -> bool:
+        if qnode.category is None:
+            return True
+        canonical_info = canonical_curies.get(curie)
+        return canonical_info is not None and canonical_info['preferred_type'] == qnode.category
+
+    @staticmethod
+    def _passes_threshold(value: float, threshold: float, higher_is_better: bool) -> bool:
+        return value >= threshold if higher_is_better else value <= threshold
 
     def _get_omop_id_from_curies(self, qnode_key: str, qg: QueryGraph, log: ARAXResponse) -> Dict[str, list]:
         log.info(f"Getting the OMOP id for {qnode_key}")
@@ -909,41 +274,14 @@ class COHDQuerier:
             log.error(f"{qnode_key} has no curie id", error_code="NoCurie")
             return {}
 
-        res_dict = {}
-        if isinstance(qnode.id, str):
-            # res = self.synonymizer.get_canonical_curies(curies=qnode.id)
-            # if res[qnode.id] is None:
-            #     log.error("Can't find the preferred curie for {qnode.id}", error_code="NoPreferredCurie")
-            #     return {}
-            # else:
-            #     preferred_curie = res[qnode.id]['preferred_curie']
-            try:
-                omop_ids = self.cohdindex.get_concept_ids(qnode.id)
-            except:
-                log.error(f"Internal error accessing local COHD database.", error_code="DatabaseError")
-                return {}
-            res_dict[qnode.id] = omop_ids
+        curies = [qnode.id] if isinstance(qnode.id, str) else qnode.id
+        try:
+            omop_ids_by_curie = self.cohdindex.get_concept_ids_batch(curies)
+        except:
+            log.error(f"Internal error accessing local COHD database.", error_code="DatabaseError")
+            return {}
 
-        else:
-            # classify the curies based on the preferred curie
-            # res = self.synonymizer.get_canonical_curies(curies=qnode.id)
-            # for curie in res:
-            #     if res[curie] is None:
-            #         log.error("Can't find the preferred curie for {curie}", error_code="NoPreferredCurie")
-            #         return {}
-            #     else:
-            #         if res[curie]['preferred_curie'] not in res_dict:
-            #             res_dict[res[curie]['preferred_curie']] = []
-
-            for curie in qnode.id:
-                try:
-                    omop_ids = self.cohdindex.get_concept_ids(curie)
-                except:
-                    log.error(f"Internal error accessing local COHD database.", error_code="DatabaseError")
-                    return {}
-                res_dict[curie] = omop_ids
-
-        return res_dict
+        return {curie: omop_ids_by_curie[curie] for curie in curies}
 
     def _convert_to_swagger_edge(self, subject: str, object: str, name: str, value: float) -> Tuple[str, Edge]:
         swagger_edge = Edge()
@@ -963,11 +301,11 @@ class COHDQuerier:
 
         return swagger_edge_key, swagger_edge
 
-    def _convert_to_swagger_node(self, node_key: str) -> Tuple[str, Node]:
+    def _convert_to_swagger_node(self, node_key: str, canonical_curies: Dict[str, dict]) -> Tuple[str, Node]:
         swagger_node = Node()
         swagger_node_key = node_key
-        swagger_node.name = self.synonymizer.get_canonical_curies(node_key)[node_key]['preferred_name']
+        swagger_node.name = canonical_curies[node_key]['preferred_name']
         swagger_node.description = None
-        swagger_node.category = self.synonymizer.get_canonical_curies(node_key)[node_key]['preferred_type']
+        swagger_node.category = canonical_curies[node_key]['preferred_type']
 
         return swagger_node_key, swagger_node
@@ -6,7 +6,6 @@ import ast
 import itertools
 import numpy as np
 from typing import List, Dict, Tuple
-from neo4j import GraphDatabase
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 import expand_utilities as eu
@@ -14,7 +13,7 @@ from expand_utilities import QGOrganizedKnowledgeGraph
 sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../")  # ARAXQuery directory
 from ARAX_response import ARAXResponse
 sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/../../../")  # code directory
-from RTXConfiguration import RTXConfiguration
+import neo4j_driver_pool
 sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/../../../UI/OpenAPI/python-flask-server/")
 from openapi_server.models.node import Node
 from openapi_server.models.edge import Edge
@@ -543,25 +542,20 @@ class DTDQuerier:
                 log.error(f"The query nodes in both ends of edge are the same type which is {source_category_temp}", error_code="CategoryError")
                 return final_kg, edge_to_nodes_map
             else:
-                for (source_curie, target_curie) in itertools.product(source_pass_nodes, target_pass_nodes):
+                # Canonicalize all curies at once and score every drug x disease pair with one matrix operation
+                normalizer_result = self.synonymizer.get_canonical_curies(list(set(source_pass_nodes).union(target_pass_nodes)))
+                converted_source_curies = [normalizer_result[source_curie]['preferred_curie'] for source_curie in source_pass_nodes]
+                converted_target_curies = [normalizer_result[target_curie]['preferred_curie'] for target_curie in target_pass_nodes]
+                if source_category_temp == 'drug':
+                    probability_matrix = self.pred.prob_matrix(converted_source_curies, converted_target_curies)
+                else:
+                    probability_matrix = self.pred.prob_matrix(converted_target_curies, converted_source_curies).T
+                for (source_index, source_curie), (target_index, target_curie) in itertools.product(enumerate(source_pass_nodes), enumerate(target_pass_nodes)):
 
                     max_probability = -1
-                    normalizer_result = self.synonymizer.get_canonical_curies(source_curie)
-                    converted_source_curie = normalizer_result[source_curie]
-                    normalizer_result = self.synonymizer.get_canonical_curies(target_curie)
-                    converted_target_curie = normalizer_result[target_curie]
-                    if source_category_temp == 'drug':
-                        converted_source_curie = converted_source_curie['preferred_curie']
-                        converted_target_curie = converted_target_curie['preferred_curie']
-                    else:
-                        temp = converted_source_curie['preferred_curie']
-                        converted_source_curie = converted_target_curie['preferred_curie']
-                        converted_target_curie = temp
-                    probability = self.pred.prob_single(converted_source_curie, converted_target_curie)
-                    if probability is not None:
-                        probability = probability[0]
-                        if np.isfinite(probability):
-                            max_probability = probability
+                    probability = probability_matrix[source_index, target_index]
+                    if np.isfinite(probability):
+                        max_probability = probability
 
                     if max_probability >= self.DTD_threshold:
                         if source_category_temp == 'drug':
@@ -893,14 +887,11 @@ class DTDQuerier:
 
     @staticmethod
     def _run_cypher_query(cypher_query: str, kg_name: str, log: ARAXResponse) -> List[Dict[str, any]]:
-        rtxc = RTXConfiguration()
-        if "KG2" in kg_name:  # Flip into KG2 mode if that's our KP (rtx config is set to KG1 info by default)
-            rtxc.live = kg_name.upper()  # TODO: Eventually change config file to "KG2c" vs. "KG2C" (then won't need to convert case here)
+        # Flip into KG2 mode if that's our KP (rtx config is set to KG1 info by default)
+        # TODO: Eventually change config file to "KG2c" vs. "KG2C" (then won't need to convert case here)
+        live = kg_name.upper() if "KG2" in kg_name else None
         try:
-            driver = GraphDatabase.driver(rtxc.neo4j_bolt, auth=(rtxc.neo4j_username, rtxc.neo4j_password))
-            with driver.session() as session:
-                query_results = session.run(cypher_query).data()
-            driver.close()
+            query_results = neo4j_driver_pool.run_read_query(cypher_query, live=live)
         except Exception:
             tb = traceback.format_exc()
             error_type, error, _ = sys.exc_info()
@@ -3,17 +3,15 @@ import sys
 import os
 import traceback
 import ast
-from typing import List, Dict, Tuple
-
-from neo4j import GraphDatabase
+from typing import List, Dict, Tuple, Optional
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 import expand_utilities as eu
 from expand_utilities import QGOrganizedKnowledgeGraph
 sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../")  # ARAXQuery directory
 from ARAX_response import ARAXResponse
-sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../../")  # code directory
-from RTXConfiguration import RTXConfiguration
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../../../")  # code directory
+import neo4j_driver_pool
 sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../../UI/OpenAPI/python-flask-server/")
 from openapi_server.models.node import Node
 from openapi_server.models.edge import Edge
@@ -29,6 +27,8 @@ class KGQuerier:
         self.response = response_object
         self.enforce_directionality = self.response.data['parameters'].get('enforce_directionality')
         self.use_synonyms = self.response.data['parameters'].get('use_synonyms')
+        self.stream_results = self.response.data['parameters'].get('stream_results')
+        self.max_edges = self.response.data['parameters'].get('max_edges')
         if input_kp == "ARAX/KG2":
             if self.use_synonyms:
                 self.kg_name = "KG2c"
@@ -36,6 +36,7 @@ class KGQuerier:
                 self.kg_name = "KG2"
         else:
             self.kg_name = "KG1"
+        self.unwind_curie_threshold = 1000
 
     def answer_one_hop_query(self, query_graph: QueryGraph) -> Tuple[QGOrganizedKnowledgeGraph, Dict[str, Dict[str, str]]]:
         """
@@ -79,13 +80,21 @@ class KGQuerier:
             qnode.category = None  # Important to clear this, otherwise results are limited (#889)
 
         # Run the actual query and process results
-        cypher_query = self._convert_one_hop_query_graph_to_cypher_query(query_graph, enforce_directionality, kg_name, log)
+        max_edges = self._get_max_edges(log)
         if log.status != 'OK':
             return final_kg, edge_to_nodes_map
-        neo4j_results = self._answer_query_using_neo4j(cypher_query, qedge_key, kg_name, log)
+        cypher_query, cypher_parameters = self._convert_one_hop_query_graph_to_cypher_query(query_graph, enforce_directionality,
+                                                                                            kg_name, log, self.stream_results, max_edges)
         if log.status != 'OK':
             return final_kg, edge_to_nodes_map
-        final_kg, edge_to_nodes_map = self._load_answers_into_kg(neo4j_results, kg_name, query_graph, log)
+        if self.stream_results:
+            final_kg, edge_to_nodes_map = self._stream_answers_into_kg(cypher_query, cypher_parameters, kg_name, query_graph,
+                                                                       max_edges, log)
+        else:
+            neo4j_results = self._answer_query_using_neo4j(cypher_query, cypher_parameters, qedge_key, kg_name, log)
+            if log.status != 'OK':
+                return final_kg, edge_to_nodes_map
+            final_kg, edge_to_nodes_map = self._load_answers_into_kg(neo4j_results, kg_name, query_graph, log)
         if log.status != 'OK':
             return final_kg, edge_to_nodes_map
 
@@ -113,10 +122,11 @@ class KGQuerier:
                 qnode.category = None  # Important to clear this to avoid discrepancies in types for particular concepts
 
         # Build and run a cypher query to get this node/nodes
-        where_clause = f"{qnode_key}.id='{qnode.id}'" if type(qnode.id) is str else f"{qnode_key}.id in {qnode.id}"
-        cypher_query = f"MATCH {self._get_cypher_for_query_node(qnode_key, single_node_qg, kg_name)} WHERE {where_clause} RETURN {qnode_key}"
+        cypher_parameters = self._get_curie_parameters(qnode_key, single_node_qg)
+        where_clause = f" WHERE {qnode_key}.id in $curies_{qnode_key}" if f"curies_{qnode_key}" in cypher_parameters else ""
+        cypher_query = f"MATCH {self._get_cypher_for_query_node(qnode_key, single_node_qg, kg_name)}{where_clause} RETURN {qnode_key}"
         log.info(f"Sending cypher query for node {qnode_key} to {kg_name} neo4j")
-        results = self._run_cypher_query(cypher_query, kg_name, log)
+        results = self._run_cypher_query(cypher_query, kg_name, log, cypher_parameters)
 
         # Load the results into swagger object model and add to our answer knowledge graph
         for result in results:
@@ -130,11 +140,20 @@ class KGQuerier:
         return final_kg
 
     def _convert_one_hop_query_graph_to_cypher_query(self, qg: QueryGraph, enforce_directionality: bool,
-                                                     kg_name: str, log: ARAXResponse) -> str:
+                                                     kg_name: str, log: ARAXResponse, stream_results: bool = False,
+                                                     max_edges: Optional[int] = None) -> Tuple[str, Dict[str, any]]:
+        """
+        This function generates a parameterized cypher query for the given one-hop query graph: qnode curies and
+        categories are passed in as parameters (e.g., $curies_n00, $categories_n01) rather than inlined, so that
+        structurally identical queries can reuse neo4j's cached query plans. Very large curie lists are unwound.
+        By default all answers are collected into a single row; if stream_results is True, one row is returned per
+        edge instead (optionally limited to max_edges rows), so results can be processed as they arrive.
+        """
         qedge_key = next(qedge_key for qedge_key in qg.edges)
         qedge = qg.edges[qedge_key]
         log.debug(f"Generating cypher for edge {qedge_key} query graph")
         try:
+            cypher_parameters = dict()
             # Build the match clause
             source_qnode_key = qedge.subject
             target_qnode_key = qedge.object
@@ -142,38 +161,60 @@ class KGQuerier:
             source_qnode_cypher = self._get_cypher_for_query_node(source_qnode_key, qg, kg_name)
             target_qnode_cypher = self._get_cypher_for_query_node(target_qnode_key, qg, kg_name)
             match_clause = f"MATCH {source_qnode_cypher}{qedge_cypher}{target_qnode_cypher}"
+            for qnode_key in [source_qnode_key, target_qnode_key]:
+                cypher_parameters.update(self._get_curie_parameters(qnode_key, qg))
+
+            # Unwind the largest curie list (if it's big enough), so neo4j can do an index lookup per curie
+            unwind_clause = ""
+            qnode_keys_with_curie_lists = [qnode_key for qnode_key in [source_qnode_key, target_qnode_key]
+                                           if f"curies_{qnode_key}" in cypher_parameters]
+            largest_curie_list_qnode_key = max(qnode_keys_with_curie_lists, default=None,
+                                               key=lambda qnode_key: len(cypher_parameters[f"curies_{qnode_key}"]))
+            if largest_curie_list_qnode_key and len(cypher_parameters[f"curies_{largest_curie_list_qnode_key}"]) >= self.unwind_curie_threshold:
+                unwind_qnode_key = largest_curie_list_qnode_key
+                unwind_clause = f"UNWIND $curies_{unwind_qnode_key} AS {unwind_qnode_key}_curie "
+            else:
+                unwind_qnode_key = None
 
             # Build the where clause
             where_fragments = []
             for qnode_key in [source_qnode_key, target_qnode_key]:
                 qnode = qg.nodes[qnode_key]
-                if qnode.id and isinstance(qnode.id, list) and len(qnode.id) > 1:
-                    where_fragments.append(f"{qnode_key}.id in {qnode.id}")
+                if qnode_key == unwind_qnode_key:
+                    where_fragments.append(f"{qnode_key}.id = {qnode_key}_curie")
+                elif qnode_key in qnode_keys_with_curie_lists:
+                    where_fragments.append(f"{qnode_key}.id in $curies_{qnode_key}")
                 if qnode.category:
                     if kg_name == "KG2c":
-                        qnode_categories = eu.convert_string_or_list_to_list(qnode.category)
-                        category_fragments = [f"'{qnode_category}' in {qnode_key}.types" for qnode_category in qnode_categories]
-                        joined_category_fragments = " OR ".join(category_fragments)
-                        category_where_clause = joined_category_fragments if len(category_fragments) < 2 else f"({joined_category_fragments})"
-                        where_fragments.append(category_where_clause)
+                        cypher_parameters[f"categories_{qnode_key}"] = eu.convert_string_or_list_to_list(qnode.category)
+                        where_fragments.append(f"any(category in $categories_{qnode_key} where category in {qnode_key}.types)")
                     elif isinstance(qnode.category, list):
                         if kg_name == "KG2":
                             node_category_property = "category_label"
                         else:
                             node_category_property = "category"
-                        where_fragments.append(f"{qnode_key}.{node_category_property} in {qnode.category}")
+                        cypher_parameters[f"categories_{qnode_key}"] = qnode.category
+                        where_fragments.append(f"{qnode_key}.{node_category_property} in $categories_{qnode_key}")
 
             if where_fragments:
                 where_clause = f"WHERE {' AND '.join(where_fragments)}"
             else:
                 where_clause = ""
 
+            # This grabs the edge's ID and a record of which of its nodes correspond to which qnode ID
+            extra_edge_properties = "{.*, " + f"id:ID({qedge_key}), {source_qnode_key}:{source_qnode_key}.id, {target_qnode_key}:{target_qnode_key}.id" + "}"
+            if stream_results:
+                return_clause = f"RETURN {source_qnode_key}, {target_qnode_key}, {qedge_key}{extra_edge_properties} as {qedge_key}"
+                if max_edges:
+                    cypher_parameters["max_edges"] = max_edges
+                    return_clause += " LIMIT $max_edges"
+                cypher_query = f"{unwind_clause}{match_clause} {where_clause} {return_clause}"
+                return cypher_query, cypher_parameters
+
             # Build the with clause
             source_qnode_col_name = f"nodes_{source_qnode_key}"
             target_qnode_col_name = f"nodes_{target_qnode_key}"
             qedge_col_name = f"edges_{qedge_key}"
-            # This line grabs the edge's ID and a record of which of its nodes correspond to which qnode ID
-            extra_edge_properties = "{.*, " + f"id:ID({qedge_key}), {source_qnode_key}:{source_qnode_key}.id, {target_qnode_key}:{target_qnode_key}.id" + "}"
             with_clause = f"WITH collect(distinct {source_qnode_key}) as {source_qnode_col_name}, " \
                           f"collect(distinct {target_qnode_key}) as {target_qnode_col_name}, " \
                           f"collect(distinct {qedge_key}{extra_edge_properties}) as {qedge_col_name}"
@@ -181,17 +222,18 @@ class KGQuerier:
             # Build the return clause
             return_clause = f"RETURN {source_qnode_col_name}, {target_qnode_col_name}, {qedge_col_name}"
 
-            cypher_query = f"{match_clause} {where_clause} {with_clause} {return_clause}"
-            return cypher_query
+            cypher_query = f"{unwind_clause}{match_clause} {where_clause} {with_clause} {return_clause}"
+            return cypher_query, cypher_parameters
         except Exception:
             tb = traceback.format_exc()
             error_type, error, _ = sys.exc_info()
             log.error(f"Problem generating cypher for query. {tb}", error_code=error_type.__name__)
-            return ""
+            return "", dict()
 
-    def _answer_query_using_neo4j(self, cypher_query: str, qedge_key: str, kg_name: str, log: ARAXResponse) -> List[Dict[str, List[Dict[str, any]]]]:
+    def _answer_query_using_neo4j(self, cypher_query: str, cypher_parameters: Dict[str, any], qedge_key: str,
+                                  kg_name: str, log: ARAXResponse) -> List[Dict[str, List[Dict[str, any]]]]:
         log.info(f"Sending cypher query for edge {qedge_key} to {kg_name} neo4j")
-        results_from_neo4j = self._run_cypher_query(cypher_query, kg_name, log)
+        results_from_neo4j = self._run_cypher_query(cypher_query, kg_name, log, cypher_parameters)
         if log.status == 'OK':
             columns_with_lengths = dict()
             for column in results_from_neo4j[0]:
@@ -218,19 +260,75 @@ class KGQuerier:
             elif column_name.startswith('edges'):  # Example column name: 'edges_e01'
                 column_qedge_key = column_name.replace("edges_", "", 1)
                 for neo4j_edge in results_table.get(column_name):
-                    swagger_edge_key, swagger_edge = self._convert_neo4j_edge_to_swagger_edge(neo4j_edge, node_uuid_to_curie_dict, kg_name)
-
-                    # Record which of this edge's nodes correspond to which qnode_key
-                    if swagger_edge_key not in edge_to_nodes_map:
-                        edge_to_nodes_map[swagger_edge_key] = dict()
-                    for qnode_key in qg.nodes:
-                        edge_to_nodes_map[swagger_edge_key][qnode_key] = neo4j_edge.get(qnode_key)
+                    self._add_neo4j_edge_to_kg(neo4j_edge, column_qedge_key, node_uuid_to_curie_dict, kg_name, qg,
+                                               final_kg, edge_to_nodes_map)
 
-                    # Finally add the current edge to our answer knowledge graph
-                    final_kg.add_edge(swagger_edge_key, swagger_edge, column_qedge_key)
+        return final_kg, edge_to_nodes_map
 
+    def _stream_answers_into_kg(self, cypher_query: str, cypher_parameters: Dict[str, any], kg_name: str,
+                                qg: QueryGraph, max_edges: Optional[int],
+                                log: ARAXResponse) -> Tuple[QGOrganizedKnowledgeGraph, Dict[str, Dict[str, str]]]:
+        # This function loads results into the KG as neo4j streams them back (one row per edge), deduplicating nodes
+        qedge_key = next(qedge_key for qedge_key in qg.edges)
+        final_kg = QGOrganizedKnowledgeGraph()
+        edge_to_nodes_map = dict()
+        node_uuid_to_curie_dict = dict()
+        num_edges = 0
+        log.info(f"Streaming results for edge {qedge_key} from {kg_name} neo4j")
+        try:
+            for record in neo4j_driver_pool.stream_read_query(cypher_query, live=self._get_live_setting(kg_name),
+                                                              parameters=cypher_parameters):
+                for qnode_key in qg.nodes:
+                    neo4j_node = record.get(qnode_key)
+                    node_key = neo4j_node.get('id')
+                    if kg_name == "KG1":
+                        node_uuid_to_curie_dict[neo4j_node.get('UUID')] = node_key
+                    if node_key not in final_kg.nodes_by_qg_id.get(qnode_key, dict()):
+                        swagger_node_key, swagger_node = self._convert_neo4j_node_to_swagger_node(neo4j_node, kg_name)
+                        final_kg.add_node(swagger_node_key, swagger_node, qnode_key)
+                self._add_neo4j_edge_to_kg(record.get(qedge_key), qedge_key, node_uuid_to_curie_dict, kg_name, qg,
+                                           final_kg, edge_to_nodes_map)
+                num_edges += 1
+                if max_edges and num_edges >= max_edges:
+                    log.warning(f"Stopped loading {qedge_key} results from {kg_name} after reaching max_edges={max_edges}")
+                    break
+        except Exception:
+            tb = traceback.format_exc()
+            error_type, error, _ = sys.exc_info()
+            log.error(f"Encountered an error interacting with {kg_name} neo4j. {tb}", error_code=error_type.__name__)
+        log.debug(f"Streamed {num_edges} rows for edge {qedge_key} from {kg_name}")
         return final_kg, edge_to_nodes_map
 
+    def _add_neo4j_edge_to_kg(self, neo4j_edge: Dict[str, any], qedge_key: str, node_uuid_to_curie_dict: Dict[str, str],
+                              kg_name: str, qg: QueryGraph, final_kg: QGOrganizedKnowledgeGraph,
+                              edge_to_nodes_map: Dict[str, Dict[str, str]]):
+        swagger_edge_key, swagger_edge = self._convert_neo4j_edge_to_swagger_edge(neo4j_edge, node_uuid_to_curie_dict, kg_name)
+
+        # Record which of this edge's nodes correspond to which qnode_key
+        if swagger_edge_key not in edge_to_nodes_map:
+            edge_to_nodes_map[swagger_edge_key] = dict()
+        for qnode_key in qg.nodes:
+            edge_to_nodes_map[swagger_edge_key][qnode_key] = neo4j_edge.get(qnode_key)
+
+        # Finally add the current edge to our answer knowledge graph
+        final_kg.add_edge(swagger_edge_key, swagger_edge, qedge_key)
+
+    def _get_max_edges(self, log: ARAXResponse) -> Optional[int]:
+        if self.max_edges is None:
+            return None
+        try:
+            max_edges = int(self.max_edges)
+        except ValueError:
+            log.error(f"The 'max_edges' parameter must be an integer; got {self.max_edges}", error_code="ParameterError")
+            return None
+        if max_edges < 1:
+            log.error(f"The 'max_edges' parameter must be at least 1; got {max_edges}", error_code="ParameterError")
+            return None
+        if not self.stream_results:
+            log.warning("The 'max_edges' parameter only applies when stream_results=true; ignoring it")
+            return None
+        return max_edges
+
     def _convert_neo4j_node_to_swagger_node(self, neo4j_node: Dict[str, any], kp: str) -> Tuple[str, Node]:
         if kp == "KG2":
             return self._convert_kg2_node_to_swagger_node(neo4j_node)
@@ -348,15 +446,11 @@ class KGQuerier:
         return new_attributes
 
     @staticmethod
-    def _run_cypher_query(cypher_query: str, kg_name: str, log: ARAXResponse) -> List[Dict[str, any]]:
-        rtxc = RTXConfiguration()
-        if "KG2" in kg_name:  # Flip into KG2 mode if that's our KP (rtx config is set to KG1 info by default)
-            rtxc.live = kg_name.upper()  # TODO: Eventually change config file to "KG2c" vs. "KG2C" (then won't need to convert case here)
+    def _run_cypher_query(cypher_query: str, kg_name: str, log: ARAXResponse,
+                          parameters: Dict[str, any] = None) -> List[Dict[str, any]]:
         try:
-            driver = GraphDatabase.driver(rtxc.neo4j_bolt, auth=(rtxc.neo4j_username, rtxc.neo4j_password))
-            with driver.session() as session:
-                query_results = session.run(cypher_query).data()
-            driver.close()
+            query_results = neo4j_driver_pool.run_read_query(cypher_query, live=KGQuerier._get_live_setting(kg_name),
+                                                             parameters=parameters)
         except Exception:
             tb = traceback.format_exc()
             error_type, error, _ = sys.exc_info()
@@ -365,6 +459,12 @@ class KGQuerier:
         else:
             return query_results
 
+    @staticmethod
+    def _get_live_setting(kg_name: str) -> Optional[str]:
+        # Flip into KG2 mode if that's our KP (rtx config is set to KG1 info by default)
+        # TODO: Eventually change config file to "KG2c" vs. "KG2C" (then won't need to convert case here)
+        return kg_name.upper() if "KG2" in kg_name else None
+
     @staticmethod
     def _build_node_uuid_to_curie_dict(results_table: Dict[str, List[Dict[str, any]]]) -> Dict[str, str]:
         node_uuid_to_curie_dict = dict()
@@ -387,13 +487,23 @@ class KGQuerier:
         qnode = qg.nodes[qnode_key]
         type_cypher = f":{qnode.category}" if qnode.category and isinstance(qnode.category, str) and kg_name != "KG2c" else ""
         if qnode.id and (isinstance(qnode.id, str) or len(qnode.id) == 1):
-            curie = qnode.id if isinstance(qnode.id, str) else qnode.id[0]
-            curie_cypher = f" {{id:'{curie}'}}"
+            curie_cypher = f" {{id:$curie_{qnode_key}}}"
         else:
             curie_cypher = ""
         qnode_cypher = f"({qnode_key}{type_cypher}{curie_cypher})"
         return qnode_cypher
 
+    @staticmethod
+    def _get_curie_parameters(qnode_key: str, qg: QueryGraph) -> Dict[str, any]:
+        # Single curies are matched in the node pattern ($curie_n00); lists are matched in the where clause ($curies_n00)
+        curies = eu.convert_string_or_list_to_list(qg.nodes[qnode_key].id) if qg.nodes[qnode_key].id else []
+        if len(curies) == 1:
+            return {f"curie_{qnode_key}": curies[0]}
+        elif curies:
+            return {f"curies_{qnode_key}": curies}
+        else:
+            return dict()
+
     @staticmethod
     def _get_cypher_for_query_edge(qedge_key: str, qg: QueryGraph, enforce_directionality: bool) -> str:
         qedge = qg.edges[qedge_key]
@@ -84,8 +84,8 @@ class NGDQuerier:
         log.debug(f"Calculating NGD between each potential node pair")
         kg2_answer_kg = kg2_message.knowledge_graph
         cngd = ComputeNGD(log, kg2_message, None)
-        cngd.load_curie_to_pmids_data(kg2_answer_kg.nodes)
         kg2_edge_ngd_map = dict()
+        ngd_pairs = dict()
         for kg2_edge_key, kg2_edge in kg2_answer_kg.edges.items():
             kg2_node_1_key = kg2_edge.subject
             kg2_node_2_key = kg2_edge.object
@@ -98,8 +98,10 @@ class NGDQuerier:
             else:
                 ngd_subject = kg2_node_2_key
                 ngd_object = kg2_node_1_key
-            ngd_value = cngd.calculate_ngd_fast(ngd_subject, ngd_object)
-            kg2_edge_ngd_map[kg2_edge_key] = {"ngd_value": ngd_value, "subject": ngd_subject, "object": ngd_object}
+            ngd_pairs[kg2_edge_key] = (ngd_subject, ngd_object)
+        ngd_values = cngd.get_ngd_values(list(ngd_pairs.values()))
+        for (kg2_edge_key, (ngd_subject, ngd_object)), ngd_value in zip(ngd_pairs.items(), ngd_values):
+            kg2_edge_ngd_map[kg2_edge_key] = {"ngd_value": float(ngd_value), "subject": ngd_subject, "object": ngd_object}
 
         # Create edges for those from KG2 found to have a low enough ngd value
         threshold = 0.5
@@ -6,16 +6,20 @@ import math
 import subprocess
 import sys
 import os
-import sqlite3
 import traceback
 import numpy as np
 from datetime import datetime
-from typing import List
+from typing import Dict, List, Tuple
+from scipy import sparse
 
 import random
 import time
 random.seed(time.time())
 
+PMID_DTYPE = np.dtype('<u4')  # How PMIDs are stored in curie_to_pmids.sqlite (see ngd/build_ngd_database.py)
+MAX_NGD_MATRIX_CELLS = 25_000_000  # Largest (dense) subjects x objects joint-count matrix to batch NGD with
+NGD_PAIRS_TABLE = "ngd_pairs"  # Optional table of precomputed counts for common curie pairs (see ngd/build_ngd_database.py)
+
 # relative imports
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 import overlay_utilities as ou
@@ -25,6 +29,35 @@ from openapi_server.models.edge import Edge
 from openapi_server.models.q_edge import QEdge
 sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../NodeSynonymizer/")
 from node_synonymizer import NodeSynonymizer
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../../../")
+import sqlite_connection_pool
+import database_lru_cache
+
+
+class NGDPairCache(database_lru_cache.DatabaseLRUCache):
+    """
+    A bounded, process-wide LRU cache of NGD values computed at query time, keyed by (sorted) canonical curie pair
+    (NGD is symmetric). It also tallies where the pairs requested from ComputeNGD.get_ngd_values() were served from.
+    """
+
+    def __init__(self, max_size=500000):
+        super().__init__(max_size)
+        self.stats.update({'lru_hits': 0, 'table_hits': 0, 'computed': 0})
+
+    def record_lookups(self, lru_hits: int, table_hits: int, computed: int):
+        with self.lock:
+            self.stats['lru_hits'] += lru_hits
+            self.stats['table_hits'] += table_hits
+            self.stats['computed'] += computed
+
+    def get_stats(self) -> Dict[str, any]:
+        stats = super().get_stats()
+        num_pairs = stats['lru_hits'] + stats['table_hits'] + stats['computed']
+        stats['fraction_from_cache'] = (stats['lru_hits'] + stats['table_hits']) / num_pairs if num_pairs else 0.0
+        return stats
+
+
+ngd_pair_cache = NGDPairCache()
 
 
 class ComputeNGD:
@@ -36,7 +69,9 @@ class ComputeNGD:
         self.parameters = parameters
         self.global_iter = 0
         self.ngd_database_name = "curie_to_pmids.sqlite"
+        self.ngd_database_path = f"{os.path.dirname(os.path.abspath(__file__))}/ngd/{self.ngd_database_name}"
         self.connection, self.cursor = self._setup_ngd_database()
+        self.has_ngd_pairs_table = self._check_for_ngd_pairs_table()
         self.curie_to_pmids_map = dict()
         self.ngd_normalizer = 2.2e+7 * 20  # From PubMed home page there are 27 million articles; avg 20 MeSH terms per article
 
@@ -70,17 +105,16 @@ class ComputeNGD:
             # Grab PMID lists for all involved nodes
             involved_curies = {curie for node_pair in node_pairs_to_evaluate for curie in node_pair}
             canonicalized_curie_lookup = self._get_canonical_curies_map(list(involved_curies))
-            self.load_curie_to_pmids_data(canonicalized_curie_lookup.values())
             added_flag = False  # check to see if any edges where added
-            self.response.debug(f"Looping through {len(node_pairs_to_evaluate)} node pairs and calculating NGD values")
+            self.response.debug(f"Calculating NGD values for {len(node_pairs_to_evaluate)} node pairs")
+            node_pairs_to_evaluate = list(node_pairs_to_evaluate)
+            ngd_values = self.get_ngd_values([(canonicalized_curie_lookup.get(subject_curie, subject_curie),
+                                                    canonicalized_curie_lookup.get(object_curie, object_curie))
+                                                   for subject_curie, object_curie in node_pairs_to_evaluate])
             # iterate over all pairs of these nodes, add the virtual edge, decorate with the correct attribute
-            for (subject_curie, object_curie) in node_pairs_to_evaluate:
+            for (subject_curie, object_curie), ngd_value in zip(node_pairs_to_evaluate, ngd_values):
                 # create the edge attribute if it can be
-                canonical_subject_curie = canonicalized_curie_lookup.get(subject_curie, subject_curie)
-                canonical_object_curie = canonicalized_curie_lookup.get(object_curie, object_curie)
-                ngd_value = self.calculate_ngd_fast(canonical_subject_curie, canonical_object_curie)
-                if np.isfinite(ngd_value):  # if ngd is finite, that's ok, otherwise, stay with default
-                    value = ngd_value
+                value = ngd_value if np.isfinite(ngd_value) else self.parameters['default_value']  # otherwise use default
                 edge_attribute = EdgeAttribute(type=type, name=name, value=str(value), url=url)  # populate the NGD edge attribute
                 if edge_attribute:
                     added_flag = True
@@ -144,20 +178,16 @@ class ComputeNGD:
             try:
                 # Map all nodes to their canonicalized curies in one batch (need canonical IDs for the local NGD system)
                 canonicalized_curie_map = self._get_canonical_curies_map([key for key in self.message.knowledge_graph.nodes.keys()])
-                self.load_curie_to_pmids_data(canonicalized_curie_map.values())
-                self.response.debug(f"Looping through edges and calculating NGD values")
-                for edge in self.message.knowledge_graph.edges.values():
+                self.response.debug("Calculating NGD values for all edges")
+                edges = list(self.message.knowledge_graph.edges.values())
+                ngd_values = self.get_ngd_values([(canonicalized_curie_map.get(edge.subject, edge.subject),
+                                                        canonicalized_curie_map.get(edge.object, edge.object))
+                                                       for edge in edges])
+                for edge, ngd_value in zip(edges, ngd_values):
                     # Make sure the attributes are not None
                     if not edge.attributes:
                         edge.attributes = []  # should be an array, but why not a list?
-                    # now go and actually get the NGD
-                    subject_curie = edge.subject
-                    object_curie = edge.object
-                    canonical_subject_curie = canonicalized_curie_map.get(subject_curie, subject_curie)
-                    canonical_object_curie = canonicalized_curie_map.get(object_curie, object_curie)
-                    ngd_value = self.calculate_ngd_fast(canonical_subject_curie, canonical_object_curie)
-                    if np.isfinite(ngd_value):  # if ngd is finite, that's ok, otherwise, stay with default
-                        value = ngd_value
+                    value = ngd_value if np.isfinite(ngd_value) else self.parameters['default_value']  # otherwise use default
                     ngd_edge_attribute = EdgeAttribute(type=type, name=name, value=str(value), url=url)  # populate the NGD edge attribute
                     edge.attributes.append(ngd_edge_attribute)  # append it to the list of attributes
             except:
@@ -170,6 +200,61 @@ class ComputeNGD:
             self._close_database()
             return self.response
 
+    def get_ngd_values(self, curie_pairs: List[Tuple[str, str]]) -> np.ndarray:
+        """
+        Returns NGD values (NaN where NGD is undefined) for the given (canonical) curie pairs. Pairs are looked up in the
+        process-wide LRU cache first, then in the database's precomputed ngd_pairs table (if it has one), and only the
+        rest are computed from PMID lists (see calculate_ngd_batch()); values computed here are added to the LRU cache.
+        """
+        ngd_pair_cache.check_database(self.ngd_database_path)
+        pair_keys = [tuple(sorted(curie_pair)) for curie_pair in curie_pairs]
+        unique_keys = set(pair_keys)
+        ngd_map = ngd_pair_cache.get_many(unique_keys)
+        num_lru_hits = len(ngd_map)
+        remaining_keys = unique_keys.difference(ngd_map)
+        if remaining_keys and self.has_ngd_pairs_table:
+            ngd_map.update(self._get_precomputed_ngd_values(remaining_keys))
+        num_table_hits = len(ngd_map) - num_lru_hits
+        remaining_keys = sorted(unique_keys.difference(ngd_map))
+        if remaining_keys:
+            self.load_curie_to_pmids_data({curie for key in remaining_keys for curie in key
+                                           if curie not in self.curie_to_pmids_map})
+            computed_ngd_values = self.calculate_ngd_batch(remaining_keys)
+            computed_ngd_map = {key: float(ngd_value) for key, ngd_value in zip(remaining_keys, computed_ngd_values)}
+            ngd_pair_cache.put_many(computed_ngd_map.items())
+            ngd_map.update(computed_ngd_map)
+        ngd_pair_cache.record_lookups(num_lru_hits, num_table_hits, len(remaining_keys))
+        if unique_keys:
+            self.response.debug(f"Of {len(unique_keys)} unique curie pairs, {num_lru_hits} had cached NGD values, "
+                                f"{num_table_hits} were precomputed, and {len(remaining_keys)} were computed "
+                                f"(process-wide fraction served from cache: "
+                                f"{round(ngd_pair_cache.get_stats()['fraction_from_cache'], 3)})")
+        return np.array([ngd_map[key] for key in pair_keys], dtype=float)
+
+    @staticmethod
+    def get_ngd_cache_stats() -> Dict[str, any]:
+        return ngd_pair_cache.get_stats()
+
+    def _get_precomputed_ngd_values(self, pair_keys) -> Dict[Tuple[str, str], float]:
+        # Rows in the ngd_pairs table are stored with curie_1 < curie_2, which is how pair keys are sorted too
+        first_curies = sorted({curie_1 for curie_1, _ in pair_keys})
+        found_keys = []
+        found_counts = []
+        for start_index in range(0, len(first_curies), sqlite_connection_pool.MAX_SQL_PARAMETERS):
+            batch = first_curies[start_index:start_index + sqlite_connection_pool.MAX_SQL_PARAMETERS]
+            placeholders = ",".join("?" * len(batch))
+            self.cursor.execute(f"SELECT curie_1, curie_2, count_1, count_2, joint_count FROM {NGD_PAIRS_TABLE} "
+                                f"WHERE curie_1 IN ({placeholders})", batch)
+            for curie_1, curie_2, count_1, count_2, joint_count in self.cursor:
+                if (curie_1, curie_2) in pair_keys:
+                    found_keys.append((curie_1, curie_2))
+                    found_counts.append((count_1, count_2, joint_count))
+        if not found_keys:
+            return dict()
+        counts = np.array(found_counts, dtype=float)
+        ngd_values = self._compute_ngds_from_counts(counts[:, :2], counts[:, 2])
+        return {key: float(ngd_value) for key, ngd_value in zip(found_keys, ngd_values)}
+
     def load_curie_to_pmids_data(self, canonicalized_curies):
         self.response.debug(f"Extracting PMID lists from sqlite database for relevant nodes")
         curies = list(set(canonicalized_curies))
@@ -183,10 +268,17 @@ class ComputeNGD:
             self.cursor.execute(f"SELECT * FROM curie_to_pmids WHERE curie in ({curie_list_str})")
             rows = self.cursor.fetchall()
             for row in rows:
-                self.curie_to_pmids_map[row[0]] = json.loads(row[1])  # PMID list is stored as JSON string in sqlite db
+                self.curie_to_pmids_map[row[0]] = self._parse_pmids(row[1])
             start_index += chunk_size
             stop_index += chunk_size
 
+    @staticmethod
+    def _parse_pmids(stored_pmids) -> np.ndarray:
+        # Newer databases store each PMID list as a blob of sorted, unique uint32s; older ones as a JSON string
+        if isinstance(stored_pmids, bytes):
+            return np.frombuffer(stored_pmids, dtype=PMID_DTYPE)
+        return np.unique(np.array(json.loads(stored_pmids), dtype=PMID_DTYPE))
+
     def calculate_ngd_fast(self, subject_curie, object_curie):
         if subject_curie in self.curie_to_pmids_map and object_curie in self.curie_to_pmids_map:
             pubmed_ids_for_curies = [self.curie_to_pmids_map.get(subject_curie),
@@ -196,11 +288,64 @@ class ComputeNGD:
         else:
             return math.nan
 
+    def calculate_ngd_batch(self, curie_pairs: List[Tuple[str, str]]) -> np.ndarray:
+        """
+        Computes NGD for many (canonical) curie pairs at once. Joint counts come from a single sparse product of the
+        subject and object curies' curie-by-PMID incidence matrices, rather than from set intersections per pair. Pairs
+        involving curies without PMIDs (or that never co-occur) get NaN.
+        """
+        ngd_values = np.full(len(curie_pairs), np.nan)
+        pair_indices = [index for index, (subject_curie, object_curie) in enumerate(curie_pairs)
+                        if subject_curie in self.curie_to_pmids_map and object_curie in self.curie_to_pmids_map]
+        if not pair_indices:
+            return ngd_values
+        subject_curies = sorted({curie_pairs[index][0] for index in pair_indices})
+        object_curies = sorted({curie_pairs[index][1] for index in pair_indices})
+        if len(subject_curies) * len(object_curies) > MAX_NGD_MATRIX_CELLS:
+            # The pairs are too sparse for an all-by-all product to pay off; intersect them one by one instead
+            for index in pair_indices:
+                ngd_values[index] = self.calculate_ngd_fast(*curie_pairs[index])
+            return ngd_values
+
+        # Renumber the involved PMIDs to 0..n-1 so they can serve as matrix columns
+        involved_curies = sorted(set(subject_curies).union(object_curies))
+        pmid_arrays = [self.curie_to_pmids_map[curie] for curie in involved_curies]
+        all_pmids, column_indices = np.unique(np.concatenate(pmid_arrays), return_inverse=True)
+        row_offsets = np.concatenate([[0], np.cumsum([len(pmids) for pmids in pmid_arrays])])
+        incidence_matrix = sparse.csr_matrix((np.ones(len(column_indices), dtype=np.int32), column_indices, row_offsets),
+                                             shape=(len(involved_curies), len(all_pmids)))
+        curie_row_map = {curie: row for row, curie in enumerate(involved_curies)}
+        subject_matrix = incidence_matrix[[curie_row_map[curie] for curie in subject_curies]]
+        object_matrix = incidence_matrix[[curie_row_map[curie] for curie in object_curies]]
+        joint_count_matrix = (subject_matrix @ object_matrix.T).toarray()
+
+        # Look up the counts for just the requested pairs and compute their NGDs all at once
+        subject_index_map = {curie: index for index, curie in enumerate(subject_curies)}
+        object_index_map = {curie: index for index, curie in enumerate(object_curies)}
+        subject_rows = np.array([subject_index_map[curie_pairs[index][0]] for index in pair_indices])
+        object_columns = np.array([object_index_map[curie_pairs[index][1]] for index in pair_indices])
+        joint_counts = joint_count_matrix[subject_rows, object_columns].astype(float)
+        subject_pmid_counts = np.array([len(self.curie_to_pmids_map[curie]) for curie in subject_curies], dtype=float)
+        object_pmid_counts = np.array([len(self.curie_to_pmids_map[curie]) for curie in object_curies], dtype=float)
+        marginal_counts = np.column_stack([subject_pmid_counts[subject_rows], object_pmid_counts[object_columns]])
+        ngd_values[pair_indices] = self._compute_ngds_from_counts(marginal_counts, joint_counts)
+        return ngd_values
+
+    def _compute_ngds_from_counts(self, marginal_counts: np.ndarray, joint_counts: np.ndarray) -> np.ndarray:
+        # Vectorized version of _compute_multiway_ngd_from_counts() for pairs (marginal_counts has shape (n, 2))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            log_marginals = np.log(marginal_counts)
+            ngds = (log_marginals.max(axis=1) - np.log(joint_counts)) / \
+                   (math.log(self.ngd_normalizer) - log_marginals.min(axis=1))
+        ngds[(joint_counts == 0) | (marginal_counts == 0).any(axis=1)] = np.nan
+        return ngds
+
     @staticmethod
-    def _compute_marginal_and_joint_counts(concept_pubmed_ids: List[List[int]]) -> list:
-        return [list(map(lambda pmid_list: len(set(pmid_list)), concept_pubmed_ids)),
+    def _compute_marginal_and_joint_counts(concept_pubmed_ids: List[np.ndarray]) -> list:
+        # PMID arrays are sorted and unique (see _parse_pmids())
+        return [[len(pmids) for pmids in concept_pubmed_ids],
                 len(functools.reduce(lambda pmids_intersec_cumul, pmids_next:
-                                     set(pmids_next).intersection(pmids_intersec_cumul),
+                                     np.intersect1d(pmids_intersec_cumul, pmids_next, assume_unique=True),
                                      concept_pubmed_ids))]
 
     def _compute_multiway_ngd_from_counts(self, marginal_counts: List[int],
@@ -241,7 +386,7 @@ class ComputeNGD:
 
     def _setup_ngd_database(self):
         # Download the ngd database if there isn't already a local copy or if a newer version is available
-        db_path_local = f"{os.path.dirname(os.path.abspath(__file__))}/ngd/{self.ngd_database_name}"
+        db_path_local = self.ngd_database_path
         db_path_remote = f"/data/orangeboard/databases/KG2.3.4/{self.ngd_database_name}"
         if not os.path.exists(f"{db_path_local}"):
             self.response.debug(f"Downloading fast NGD database because no copy exists... (will take a few minutes)")
@@ -257,7 +402,7 @@ class ComputeNGD:
                 self.response.debug(f"Confirmed local NGD database is current")
         # Set up a connection to the database so it's ready for use
         try:
-            connection = sqlite3.connect(db_path_local)
+            connection = sqlite_connection_pool.get_connection(db_path_local)
             cursor = connection.cursor()
         except Exception:
             self.response.error(f"Encountered an error connecting to ngd sqlite database", error_code="DatabaseSetupIssue")
@@ -265,9 +410,14 @@ class ComputeNGD:
         else:
             return connection, cursor
 
+    def _check_for_ngd_pairs_table(self) -> bool:
+        if not self.cursor:
+            return False
+        self.cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (NGD_PAIRS_TABLE,))
+        return self.cursor.fetchone() is not None
+
     def _close_database(self):
+        # The connection itself is shared with other users of this thread, so it stays open
         if self.cursor:
             self.cursor.close()
-        if self.connection:
-            self.connection.close()
 
@@ -8,23 +8,29 @@ import traceback
 import sys
 import os
 import multiprocessing
+import numpy as np
 import pandas as pd
 from datetime import datetime
-from neo4j import GraphDatabase, basic_auth
 sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../../../")
-from RTXConfiguration import RTXConfiguration
+import neo4j_driver_pool
 sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../")
 from ARAX_query import ARAXQuery
 sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../../UI/OpenAPI/python-flask-server/")
 from openapi_server.models.attribute import Attribute as EdgeAttribute
 from openapi_server.models.edge import Edge
 from openapi_server.models.q_edge import QEdge
+from openapi_server.models.q_node import QNode
+from openapi_server.models.query_graph import QueryGraph
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../Expand/")
+import expand_utilities as eu
 sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../../NodeSynonymizer/")
 from node_synonymizer import NodeSynonymizer
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 import overlay_utilities as ou
 import collections
 
+MAX_FET_GRID_CELLS = 10_000_000  # Largest (tables x support) grid of hypergeometric probabilities to compute at once
+
 
 class ComputeFTEST:
 
@@ -275,18 +281,23 @@ class ComputeFTEST:
         use_parallel = False
 
         if not use_parallel:
-            # query adjacent node in one DSL command by providing a list of query nodes to add_qnode()
+            # count adjacent nodes for all object nodes at once (with one grouped cypher query if possible)
             if rel_edge_key:
                 if len(rel_edge_type) == 1:  # if the edge with rel_edge_key has only type, we use this rel_edge_predicate to find all subject nodes in KP
                     self.response.debug(f"{kp} and edge relation type {list(rel_edge_type)[0]} were used to calculate total object nodes in Fisher's Exact Test")
-                    result = self.query_size_of_adjacent_nodes(node_curie=list(object_node_dict.keys()), source_type=object_node_category, adjacent_type=subject_node_category, kp = kp, rel_type=list(rel_edge_type)[0], use_cypher_command=False)
+                    rel_type = list(rel_edge_type)[0]
                 else:  # if the edge with rel_edge_key has more than one type, we ignore the edge predicate and use all categories to find all subject nodes in KP
                     self.response.warning(f"The edges with specified qedge key {rel_edge_key} have more than one category, we ignore the edge predicate and use all categories to calculate Fisher's Exact Test")
                     self.response.debug(f"{kp} was used to calculate total object nodes in Fisher's Exact Test")
-                    result = self.query_size_of_adjacent_nodes(node_curie=list(object_node_dict.keys()), source_type=object_node_category, adjacent_type=subject_node_category, kp=kp, rel_type=None, use_cypher_command=False)
+                    rel_type = None
             else:  # if no rel_edge_key is specified, we ignore the edge predicate and use all categories to find all subject nodes in KP
                 self.response.debug(f"{kp} was used to calculate total object nodes in Fisher's Exact Test")
-                result = self.query_size_of_adjacent_nodes(node_curie=list(object_node_dict.keys()), source_type=object_node_category, adjacent_type=subject_node_category, kp=kp, rel_type=None, use_cypher_command=False)
+                rel_type = None
+            result = self.query_size_of_adjacent_nodes_batch(node_curies=list(object_node_dict.keys()), source_type=object_node_category, adjacent_type=subject_node_category, kp=kp, rel_type=rel_type)
+            if result is None:
+                # query adjacent node in one DSL command by providing a list of query nodes to add_qnode()
+                self.response.warning("Couldn't count adjacent nodes with a single cypher query; falling back to Expand")
+                result = self.query_size_of_adjacent_nodes(node_curie=list(object_node_dict.keys()), source_type=object_node_category, adjacent_type=subject_node_category, kp=kp, rel_type=rel_type, use_cypher_command=False)
 
             if result is None:
                 return self.response ## Something wrong happened for querying the adjacent nodes
@@ -368,40 +379,37 @@ class ComputeFTEST:
             size_of_query_sample = len(subject_node_list)
 
             self.response.debug(f"Computing Fisher's Exact Test P-value")
-            # calculate FET p-value for each target node in parallel
+            # calculate FET p-values for all target nodes at once
             del_list = []
-            parameter_list = []
+            node_list = []
+            contingency_tables = []
             for node in object_node_dict:
                 if size_of_object[node]-len(object_node_dict[node]) < 0:
                     del_list.append(node)
                     self.response.warning(f"Skipping node {node} to calculate FET p-value due to issue897 (which causes negative value).")
                     continue
                 else:
-                    parameter_list += [(node, len(object_node_dict[node]), size_of_object[node]-len(object_node_dict[node]), size_of_query_sample - len(object_node_dict[node]), (size_of_total - size_of_object[node]) - (size_of_query_sample - len(object_node_dict[node])))]
+                    node_list.append(node)
+                    contingency_tables.append((len(object_node_dict[node]), size_of_object[node]-len(object_node_dict[node]), size_of_query_sample - len(object_node_dict[node]), (size_of_total - size_of_object[node]) - (size_of_query_sample - len(object_node_dict[node]))))
 
             for del_node in del_list:
                 del object_node_dict[del_node]
-            # parameter_list = [(node, len(target_node_dict[node]), size_of_target[node]-len(target_node_dict[node]), size_of_query_sample - len(target_node_dict[node]), (size_of_total - size_of_target[node]) - (size_of_query_sample - len(target_node_dict[node]))) for node in target_node_dict]
 
+            contingency_tables = np.array(contingency_tables, dtype=np.int64).reshape(-1, 4)
+            if (contingency_tables < 0).any():
+                for node in np.array(node_list)[(contingency_tables < 0).any(axis=1)]:
+                    self.response.error(f"Something went wrong for target node {node} to calculate FET p-value (its contingency table has negative counts)")
+                return self.response
             try:
-                with multiprocessing.Pool() as executor:
-                    FETpvalue_list = [elem for elem in executor.map(self._calculate_FET_pvalue_parallel, parameter_list)]
+                FETpvalues = self._calculate_FET_pvalues(contingency_tables)
             except:
                 tb = traceback.format_exc()
                 error_type, error, _ = sys.exc_info()
                 self.response.error(tb, error_code=error_type.__name__)
                 self.response.error(f"Something went wrong with computing Fisher's Exact Test P-value")
                 return self.response
-
-            if any([type(elem) is list for elem in FETpvalue_list]):
-                for msg in [elem2 for elem1 in FETpvalue_list if type(elem1) is list for elem2 in elem1]:
-                    if type(msg) is tuple:
-                        self.response.error(msg[0], error_code=msg[1])
-                    else:
-                        self.response.error(msg)
-                return self.response
             else:
-                output = dict(FETpvalue_list)
+                output = {node: float(pvalue) for node, pvalue in zip(node_list, FETpvalues)}
 
             # check if the results need to be filtered
             output = dict(sorted(output.items(), key=lambda x: x[1]))
@@ -473,20 +481,15 @@ class ComputeFTEST:
 
         if use_cypher_command is True:
 
-            #create the RTXConfiguration object
-            rtxConfig = RTXConfiguration()
-            # Connection information for the neo4j server, populated with orangeboard
+            # Connection information for the neo4j server comes from RTXConfiguration (via the shared driver pool)
             if kp=="ARAX/KG1":
-                driver = GraphDatabase.driver(rtxConfig.neo4j_bolt, auth=basic_auth(rtxConfig.neo4j_username, rtxConfig.neo4j_password))
+                live = None
             elif kp=="ARAX/KG2":
-                rtxConfig.live = "KG2"
-                driver = GraphDatabase.driver(rtxConfig.neo4j_bolt, auth=basic_auth(rtxConfig.neo4j_username, rtxConfig.neo4j_password))
+                live = "KG2"
             else:
                 self.response.error(f"The 'kp' argument of 'query_size_of_adjacent_nodes' method within FET only accepts 'ARAX/KG1' or 'ARAX/KG2' for cypher query right now")
                 return res
 
-            session = driver.session()
-
             # check if node_curie is a str or a list
             if type(node_curie) is str:
                 if not rel_type:
@@ -503,8 +506,8 @@ class ComputeFTEST:
                 return res
 
             try:
-                cypher_res = session.run(query)
-                result = pd.DataFrame(cypher_res.data())
+                cypher_res = neo4j_driver_pool.run_read_query(query, live=live)
+                result = pd.DataFrame(cypher_res)
                 if result.shape[0] == 0:
                     self.response.error(f"Fail to query adjacent nodes from {kp} for {node_curie}")
                     return res
@@ -620,6 +623,68 @@ class ComputeFTEST:
                 return res
 
 
+    def query_size_of_adjacent_nodes_batch(self, node_curies, source_type, adjacent_type, kp="ARAX/KG1", rel_type=None):
+        """
+        Count the edges to adjacent nodes (of a given type) of many query nodes using one grouped cypher query. The counts
+        are the same as those query_size_of_adjacent_nodes() gets from Expand: the number of distinct edges (in either
+        direction) between each query node and nodes of adjacent_type, with protein and gene categories each widened to
+        both, as Expand does.
+        :param node_curies: (required) a list of curie ids of query nodes eg. ['UniProtKB:P02675', 'UniProtKB:P01903']
+        :param source_type: (required) the type(s) of the query nodes, eg. "biolink:Protein"
+        :param adjacent_type: (required) the type(s) of adjacent node, eg. "biolink:BiologicalProcess"
+        :param kp: (optional) the knowledge provider the query nodes came from: 'ARAX/KG1'(default), 'ARAX/KG2' or 'ARAX/KG2c'
+        :param rel_type: (optional) edge type to consider, eg. "biolink:involved_in"
+        :return a tuple with a dict containing the number of adjacent edges for each query node and a list of query nodes that have none, or None if the query failed
+        """
+        kg_name = {'ARAX/KG1': 'KG1', 'ARAX/KG2': 'KG2', 'ARAX/KG2c': 'KG2c'}.get(kp)
+        if not kg_name:
+            self.response.warning(f"Adjacent nodes can only be counted with cypher for ARAX/KG1 or ARAX/KG2, not {kp}")
+            return None
+
+        # Consider both protein and gene if a category is one of those, like Expand does
+        query_graph = QueryGraph(nodes={'FET_n00': QNode(category=source_type), 'FET_n01': QNode(category=adjacent_type)},
+                                 edges={'FET_e00': QEdge(subject='FET_n00', object='FET_n01', predicate=rel_type)})
+        for qnode in query_graph.nodes.values():
+            if qnode.category in {"biolink:Protein", "biolink:Gene", "protein", "gene"}:
+                qnode.category = ["biolink:Protein", "biolink:Gene"]
+
+        # KG1/KG2 neo4j use the old (non-biolink) category and predicate formats. Categories are matched the way Expand's
+        # kg_querier matches them: a single one by node label, several by node property (or always by types in KG2c)
+        old_types_qg = eu.make_qg_use_old_types(query_graph)
+        node_cypher = dict()
+        where_fragments = ["FET_n00.id in $curies"]
+        parameters = {'curies': list(node_curies)}
+        for qnode_key, qnode in old_types_qg.nodes.items():
+            node_cypher[qnode_key] = qnode_key
+            if not qnode.category:
+                continue
+            if kg_name == 'KG2c':
+                parameters[f"categories_{qnode_key}"] = eu.convert_string_or_list_to_list(qnode.category)
+                where_fragments.append(f"any(category in $categories_{qnode_key} where category in {qnode_key}.types)")
+            elif isinstance(qnode.category, str):
+                node_cypher[qnode_key] = f"{qnode_key}:`{qnode.category}`"
+            else:
+                parameters[f"categories_{qnode_key}"] = qnode.category
+                category_property = 'category_label' if kg_name == 'KG2' else 'category'
+                where_fragments.append(f"{qnode_key}.{category_property} in $categories_{qnode_key}")
+        predicate = old_types_qg.edges['FET_e00'].predicate
+        rel_type_cypher = f":`{predicate}`" if predicate else ""
+        query = f"match ({node_cypher['FET_n00']})-[FET_e00{rel_type_cypher}]-({node_cypher['FET_n01']}) " \
+                f"where {' and '.join(where_fragments)} return FET_n00.id as curie, count(distinct FET_e00) as count"
+
+        try:
+            cypher_res = neo4j_driver_pool.run_read_query(query, live=kg_name.upper() if kg_name != 'KG1' else None,
+                                                          parameters=parameters)
+        except:
+            tb = traceback.format_exc()
+            self.response.warning(f"Something went wrong with counting adjacent nodes from {kp} using cypher: {tb}")
+            return None
+        res_dict = {row['curie']: row['count'] for row in cypher_res if row['count'] > 0}
+        failure_node = [node for node in node_curies if node not in res_dict]
+        for node in failure_node:
+            self.response.warning(f"Fail to query adjacent nodes from {kp} for {node} in FET probably because its category doesn't match the adjacent node category {adjacent_type}. For more details, please see issue897.")
+        return (res_dict, failure_node)
+
     def _query_size_of_adjacent_nodes_parallel(self, this):
         # This method is expected to be run within this class
         """
@@ -723,14 +788,9 @@ class ComputeFTEST:
 
         if kg == 'KG1':
             if use_cypher_command:
-                rtxConfig = RTXConfiguration()
-                # Connection information for the neo4j server, populated with orangeboard
-                driver = GraphDatabase.driver(rtxConfig.neo4j_bolt, auth=basic_auth(rtxConfig.neo4j_username, rtxConfig.neo4j_password))
-                session = driver.session()
-
                 query = "MATCH (n:%s) return count(distinct n)" % (node_type)
-                res = session.run(query)
-                size_of_total = res.single()["count(distinct n)"]
+                res = neo4j_driver_pool.run_read_query(query)
+                size_of_total = res[0]["count(distinct n)"]
                 return size_of_total
             else:
                 nodesynonymizer = NodeSynonymizer()
@@ -748,31 +808,39 @@ class ComputeFTEST:
                 size_of_total = nodesynonymizer.get_total_entity_count(node_type, kg_name=kg)
                 return size_of_total
 
-    def _calculate_FET_pvalue_parallel(self, this):
-        # *Note*: The arugment 'this' is a list containing five sub-arguments below since this function is exectued in parallel.
-        # This method is expected to be run within this class
+    @staticmethod
+    def _calculate_FET_pvalues(contingency_tables):
         """
-        Calculate Fisher Exact Test' p-value.
-        *param this is a list containing five sub-arguments below since this function is exectued in parallel.
-        :return a list of FET p-values
+        Calculate two-sided Fisher Exact Test p-values (the same as stats.fisher_exact(table)[1]) for many 2x2 tables at once.
+        :param contingency_tables: (required) an array of shape (n, 4) with one [a, b, c, d] row per table, where
+            a = count of in_sample and in_pathway, b = count of not_in_sample but in_pathway,
+            c = count of in_sample but not in_pathway, d = count of not in_sample and not in_pathway
+        :return an array of the n FET p-values
         """
-        #:sub-argument node: (required) the curie name of node, eg. "UniProtKB:Q13330"
-        #:sub-argument a: (required) count of in_sample and in_pathway
-        #:sub-argument b: (required) count of not_in_sample but in_pathway
-        #:sub-argument c: (required) count of in_sample but not in_pathway
-        #:sub-argument d: (required) count of not in_sample and not in_pathway
-
-        # this should contain five variables and assign them to different variables
-        node, a, b, c, d = this
-        error_message = []
-
-        try:
-            contingency_table = [[a, b],[c,d]]
-            pvalue = stats.fisher_exact(contingency_table)[1]
-            return (node, pvalue)
-        except:
-            tb = traceback.format_exc()
-            error_type, error, _ = sys.exc_info()
-            error_message.append((tb, error_type.__name__))
-            error_message.append(f"Something went wrong for target node {node} to calculate FET p-value")
-            return error_message
+        # Each table's a is hypergeometric (population a+b+c+d, a+b successes, a+c draws); its two-sided p-value is the
+        # total probability of all a's (within the support) that are no more likely than the observed one
+        tables = np.asarray(contingency_tables, dtype=np.int64).reshape(-1, 4)
+        pvalues = np.ones(len(tables))
+        if len(tables) == 0:
+            return pvalues
+        # Like stats.fisher_exact, tables with an empty row or column get a p-value of 1
+        degenerate = (tables[:, [0, 2]].sum(axis=1) == 0) | (tables[:, [1, 3]].sum(axis=1) == 0) | \
+                     (tables[:, [0, 1]].sum(axis=1) == 0) | (tables[:, [2, 3]].sum(axis=1) == 0)
+        a = tables[:, 0]
+        population = tables.sum(axis=1)
+        successes = tables[:, 0] + tables[:, 1]
+        draws = tables[:, 0] + tables[:, 2]
+        max_support = int(np.minimum(successes, draws).max()) + 1
+        chunk_size = max(1, MAX_FET_GRID_CELLS // max_support)
+        k = np.arange(max_support)
+        for start in range(0, len(tables), chunk_size):
+            rows = slice(start, start + chunk_size)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                log_pmf = stats.hypergeom.logpmf(k[np.newaxis, :], population[rows, np.newaxis],
+                                                 successes[rows, np.newaxis], draws[rows, np.newaxis])
+                log_pmf_observed = stats.hypergeom.logpmf(a[rows], population[rows], successes[rows], draws[rows])
+            # Same relative tolerance scipy uses to decide which tables are 'as extreme' as the observed one
+            as_extreme = log_pmf <= (log_pmf_observed + np.log1p(1e-7))[:, np.newaxis]
+            pvalues[rows] = np.where(as_extreme, np.exp(log_pmf), 0.0).sum(axis=1)
+        pvalues[degenerate] = 1.0
+        return np.minimum(pvalues, 1.0)
@@ -12,13 +12,16 @@ There are two halves to the (full) build process:
      - Contains mappings from canonicalized curies to their list of PMIDs based on the data scraped from Pubmed AND
        from KG2 data (node.publications and edge.publications)
      - The NodeSynonymizer is used to link curies to concept names from step 1
+Optionally, the final file can also get an "ngd_pairs" table holding PMID counts for the most frequently co-occurring
+pairs among the N curies with the most PMIDs, which ComputeNGD consults before computing NGD on the fly.
 Usage: python build_ngd_database.py <path to directory containing PubMed xml files> [--test] [--full]
-       By default, only step 2 above will be performed. To do a "full" build, use the --full flag.
+                                    [--precompute_pairs N] [--min_cooccurrence M]
+       By default, only step 2 above will be performed. To do a "full" build, use the --full flag. To (re)build only the
+       ngd_pairs table of an existing curie_to_pmids.sqlite, use --precompute_pairs with --pairs_only.
 """
 import argparse
 import ast
 import gzip
-import json
 import os
 import sqlite3
 import sys
@@ -26,9 +29,11 @@ import time
 import traceback
 from typing import List, Dict, Set, Union
 
+import numpy as np
 from lxml import etree
 import pickledb
 from neo4j import GraphDatabase
+from scipy import sparse
 
 sys.path.append(f"{os.path.dirname(os.path.abspath(__file__))}/../../../NodeSynonymizer/")
 from node_synonymizer import NodeSynonymizer
@@ -37,13 +42,15 @@ from RTXConfiguration import RTXConfiguration
 
 
 class NGDDatabaseBuilder:
-    def __init__(self, pubmed_directory_path, is_test):
+    def __init__(self, pubmed_directory_path, is_test, num_curies_to_pair=0, min_cooccurrence=10):
         self.pubmed_directory_path = pubmed_directory_path
         self.conceptname_to_pmids_db_path = "conceptname_to_pmids.db"
         self.curie_to_pmids_db_path = "curie_to_pmids.sqlite"
         self.status = 'OK'
         self.synonymizer = NodeSynonymizer()
         self.is_test = is_test
+        self.num_curies_to_pair = num_curies_to_pair
+        self.min_cooccurrence = min_cooccurrence
 
     def build_conceptname_to_pmids_db(self):
         # This function extracts curie -> PMIDs mappings from a Pubmed XML download (saves data in a pickledb)
@@ -106,8 +113,54 @@ class NGDDatabaseBuilder:
         self._add_pmids_from_kg2_nodes(curie_to_pmids_map)
         print(f"  In the end, found PMID lists for {len(curie_to_pmids_map)} (canonical) curies")
         self._save_data_in_sqlite_db(curie_to_pmids_map)
+        if self.num_curies_to_pair:
+            self.build_ngd_pairs_table()
         print(f"Done! Building {self.curie_to_pmids_db_path} took {round((time.time() - start) / 60)} minutes.")
 
+    def build_ngd_pairs_table(self):
+        # This function adds a table of marginal/joint PMID counts for frequently co-occurring pairs among the curies
+        # with the most PMIDs (which are the pairs most likely to come up in queries) to curie_to_pmids.sqlite
+        print(f"  Precomputing co-occurrence counts for pairs among the {self.num_curies_to_pair} curies with the most "
+              f"PMIDs (keeping pairs that co-occur in at least {self.min_cooccurrence} articles)..")
+        start = time.time()
+        connection = sqlite3.connect(self.curie_to_pmids_db_path)
+        cursor = connection.cursor()
+        cursor.execute("SELECT curie, pmids FROM curie_to_pmids ORDER BY length(pmids) DESC LIMIT ?",
+                       (self.num_curies_to_pair,))
+        # Sort so that for each stored pair curie_1 < curie_2 (ComputeNGD looks pairs up that way)
+        rows = sorted(cursor.fetchall())
+        if not rows:
+            print(f"  No curies to pair up in {self.curie_to_pmids_db_path}; not building the ngd_pairs table")
+            cursor.close()
+            connection.close()
+            return
+        curies = [row[0] for row in rows]
+        pmid_arrays = [np.frombuffer(row[1], dtype='<u4') for row in rows]
+        pmid_counts = np.array([len(pmids) for pmids in pmid_arrays])
+        # Build a curie-by-PMID incidence matrix; its product with itself gives every pair's joint count
+        all_pmids, column_indices = np.unique(np.concatenate(pmid_arrays), return_inverse=True)
+        row_offsets = np.concatenate([[0], np.cumsum(pmid_counts)])
+        incidence_matrix = sparse.csr_matrix((np.ones(len(column_indices), dtype=np.int32), column_indices, row_offsets),
+                                             shape=(len(curies), len(all_pmids)))
+        joint_count_matrix = sparse.triu(incidence_matrix @ incidence_matrix.T, k=1).tocoo()
+        frequent = joint_count_matrix.data >= self.min_cooccurrence
+        rows_1 = joint_count_matrix.row[frequent]
+        rows_2 = joint_count_matrix.col[frequent]
+        joint_counts = joint_count_matrix.data[frequent]
+        print(f"  Found {len(joint_counts)} frequently co-occurring pairs; inserting them into database..")
+        cursor.execute("DROP TABLE IF EXISTS ngd_pairs")
+        cursor.execute("CREATE TABLE ngd_pairs (curie_1 TEXT, curie_2 TEXT, count_1 INTEGER, count_2 INTEGER, "
+                       "joint_count INTEGER)")
+        pair_rows = ((curies[row_1], curies[row_2], int(pmid_counts[row_1]), int(pmid_counts[row_2]), int(joint_count))
+                     for row_1, row_2, joint_count in zip(rows_1, rows_2, joint_counts))
+        cursor.executemany("INSERT INTO ngd_pairs (curie_1, curie_2, count_1, count_2, joint_count) VALUES (?, ?, ?, ?, ?)",
+                           pair_rows)
+        cursor.execute("CREATE UNIQUE INDEX unique_ngd_pair ON ngd_pairs (curie_1, curie_2)")
+        connection.commit()
+        cursor.close()
+        connection.close()
+        print(f"  Done precomputing pairs; took {round((time.time() - start) / 60, 2)} minutes.")
+
     # Helper methods
 
     def _add_pmids_from_kg2_edges(self, curie_to_pmids_map):
@@ -185,11 +238,11 @@ class NGDDatabaseBuilder:
             os.remove(self.curie_to_pmids_db_path)
         connection = sqlite3.connect(self.curie_to_pmids_db_path)
         cursor = connection.cursor()
-        cursor.execute("CREATE TABLE curie_to_pmids (curie TEXT, pmids TEXT)")
+        cursor.execute("CREATE TABLE curie_to_pmids (curie TEXT, pmids BLOB)")
         cursor.execute("CREATE UNIQUE INDEX unique_curie ON curie_to_pmids (curie)")
         print(f"  Gathering row data..")
-        rows = [[curie, json.dumps(list(filter(None, {self._get_local_id_as_int(pmid) for pmid in pmids})))]
-                for curie, pmids in curie_to_pmids_map.items()]
+        # Each PMID list is stored as a sorted array of unique uint32s (the format ComputeNGD loads directly)
+        rows = [[curie, self._convert_pmids_to_array_bytes(pmids)] for curie, pmids in curie_to_pmids_map.items()]
         rows_in_chunks = self._divide_list_into_chunks(rows, 5000)
         print(f"  Inserting row data into database..")
         for chunk in rows_in_chunks:
@@ -228,6 +281,10 @@ class NGDDatabaseBuilder:
         else:
             mappings_dict[key].append(value_to_append)
 
+    def _convert_pmids_to_array_bytes(self, pmids: List[str]) -> bytes:
+        local_ids = {self._get_local_id_as_int(pmid) for pmid in pmids}
+        return np.array(sorted(filter(None, local_ids)), dtype='<u4').tobytes()
+
     @staticmethod
     def _create_pmid_curie_from_local_id(pmid):
         return f"PMID:{pmid}"
@@ -295,10 +352,20 @@ def main():
     arg_parser.add_argument("pubmedDirectory", type=str, nargs='?', default=os.getcwd())
     arg_parser.add_argument("--full", dest="full", action="store_true", default=False)
     arg_parser.add_argument("--test", dest="test", action="store_true", default=False)
+    arg_parser.add_argument("--precompute_pairs", dest="precompute_pairs", type=int, default=0,
+                            help="Number of curies (those with the most PMIDs) to precompute pairwise counts among")
+    arg_parser.add_argument("--min_cooccurrence", dest="min_cooccurrence", type=int, default=10,
+                            help="Minimum number of shared PMIDs for a pair to be stored in the ngd_pairs table")
+    arg_parser.add_argument("--pairs_only", dest="pairs_only", action="store_true", default=False)
     args = arg_parser.parse_args()
+    if args.pairs_only and args.precompute_pairs <= 0:
+        arg_parser.error("--pairs_only needs --precompute_pairs N with N > 0")
 
     # Build the database(s)
-    database_builder = NGDDatabaseBuilder(args.pubmedDirectory, args.test)
+    database_builder = NGDDatabaseBuilder(args.pubmedDirectory, args.test, args.precompute_pairs, args.min_cooccurrence)
+    if args.pairs_only:
+        database_builder.build_ngd_pairs_table()
+        return
     if args.full:
         database_builder.build_conceptname_to_pmids_db()
     if database_builder.status == 'OK':
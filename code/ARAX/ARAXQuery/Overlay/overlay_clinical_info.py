@@ -39,7 +39,7 @@ class OverlayClinicalInfo:
         self.node_curie_to_type = dict()
         self.global_iter = 0
         try:
-            self.cohdIndex = COHDIndex()
+            self.cohdIndex = COHDIndex(use_columnar_index=self.parameters.get('use_COHD_index') == 'true')
         except:
             tb = traceback.format_exc()
             error_type, error, _ = sys.exc_info()
@@ -159,7 +159,14 @@ class OverlayClinicalInfo:
                 # object_OMOPs = list(set(object_OMOPs))
 
                 # Decide how to handle the response from the KP
-                if name == 'paired_concept_frequency':
+                if self.cohdIndex.columnar_index is not None:
+                    # Look up all of the OMOP pairs at once in the columnar index; as below, keep the best value
+                    cohd_metric = {'paired_concept_frequency': 'paired_concept_freq', 'observed_expected_ratio': 'observed_expected_ratio', 'chi_square': 'chi_square'}[name]
+                    value = {'paired_concept_frequency': default, 'observed_expected_ratio': float("-inf"), 'chi_square': float("inf")}[name]
+                    pair_values = self.cohdIndex.get_best_pair_values({subject_curie: subject_OMOPs}, {object_curie: object_OMOPs}, cohd_metric, dataset_id=3)  # use the hierarchical dataset
+                    value = pair_values.get((subject_curie, object_curie), value)
+
+                elif name == 'paired_concept_frequency':
                     # sum up all frequencies  #TODO check with COHD people to see if this is kosher
                     frequency = default
                     # for (omop1, omop2) in itertools.product(subject_OMOPs, object_OMOPs):
@@ -114,6 +114,39 @@ class PredictDrugTreatsDisease:
         #         curies_in_model.add(curie)
         return curies_in_model
 
+    def get_treats_probabilities(self, drug_disease_pairs):
+        """
+        Takes (drug, disease) pairs of KG curies, canonicalizes all of the curies at once, and looks up the treatment
+        probabilities of all pairs at once (in the DTD probability database, or with the model)
+        :return: a dict mapping each pair that has a (finite) probability to that probability
+        """
+        drug_disease_pairs = set(drug_disease_pairs)
+        if not drug_disease_pairs:
+            return dict()
+        normalizer_results = self.synonymizer.get_canonical_curies(list({curie for pair in drug_disease_pairs for curie in pair}))
+        drug_types = {"drug", "chemical_substance", "biolink:Drug", "biolink:ChemicalSubstance"}
+        disease_types = {"disease", "phenotypic_feature", "biolink:Disease", "biolink:PhenotypicFeature"}
+        converted_pairs = dict()
+        for drug_curie, disease_curie in drug_disease_pairs:
+            converted_drug = normalizer_results.get(drug_curie)
+            converted_disease = normalizer_results.get(disease_curie)
+            if converted_drug and converted_disease and converted_drug['preferred_type'] in drug_types and converted_disease['preferred_type'] in disease_types:
+                converted_pairs[(drug_curie, disease_curie)] = (converted_drug['preferred_curie'], converted_disease['preferred_curie'])
+        self.response.debug(f"Predicting treatment probabilities for {len(converted_pairs)} drug/disease pairs")
+        if not converted_pairs:
+            return dict()
+        if self.use_prob_db is True:
+            converted_probabilities = self.pred.get_probs_from_DTD_db_based_on_pairs(list(set(converted_pairs.values())))
+        else:
+            res = self.pred.prob_all(list(set(converted_pairs.values())))
+            converted_probabilities = dict(zip(*res)) if res is not None else dict()
+        probabilities = dict()
+        for pair, converted_pair in converted_pairs.items():
+            probability = converted_probabilities.get(converted_pair)
+            if probability is not None and np.isfinite(probability):
+                probabilities[pair] = probability
+        return probabilities
+
     def predict_drug_treats_disease(self):
         """
         Iterate over all the edges in the knowledge graph, add the drug-disease treatment probability for appropriate edges
@@ -149,45 +182,10 @@ class PredictDrugTreatsDisease:
             added_flag = False  # check to see if any edges where added
             # iterate over all pairs of these nodes, add the virtual edge, decorate with the correct attribute
 
+            probabilities = self.get_treats_probabilities(itertools.product(source_curies_to_decorate, target_curies_to_decorate))
             for (source_curie, target_curie) in itertools.product(source_curies_to_decorate, target_curies_to_decorate):
-                self.response.debug(f"Predicting probability that {curie_to_name[source_curie]} treats {curie_to_name[target_curie]}")
                 # create the edge attribute if it can be
-                # loop over all equivalent curies and take the highest probability
-
-                max_probability = 0
-                converted_source_curie = self.convert_to_trained_curies(source_curie)
-                if converted_source_curie is None:
-                    continue
-                else:
-                    preferred_type = converted_source_curie['preferred_type']
-                    if preferred_type == "drug" or preferred_type == "chemical_substance" or preferred_type == "biolink:Drug" or preferred_type == "biolink:ChemicalSubstance":
-                        converted_source_curie = converted_source_curie['preferred_curie']
-                    else:
-                        continue
-                converted_target_curie = self.convert_to_trained_curies(target_curie)
-                if converted_target_curie is None:
-                    continue
-                else:
-                    preferred_type = converted_target_curie['preferred_type']
-                    if preferred_type == "disease" or preferred_type == "phenotypic_feature" or preferred_type == "biolink:Disease" or preferred_type == "biolink:PhenotypicFeature":
-                        converted_target_curie = converted_target_curie['preferred_curie']
-                    else:
-                        continue
-                if self.use_prob_db is True:
-                    probability = self.pred.get_prob_from_DTD_db(converted_source_curie, converted_target_curie)
-                    if probability is not None:
-                        if np.isfinite(probability):
-                            max_probability = probability
-                else:
-                    probability = self.pred.prob_single(converted_source_curie, converted_target_curie)
-                    if probability is not None:
-                        probability = probability[0]
-                        if np.isfinite(probability):
-                            max_probability = probability
-                # if len(res) != 0:
-                #     all_probabilities = self.pred.prob_all(res)
-                #     if isinstance(all_probabilities, list):
-                #         max_probability = max([value for value in all_probabilities if np.isfinite(value)])
+                max_probability = probabilities.get((source_curie, target_curie), 0)
 
                 value = max_probability
 
@@ -248,6 +246,16 @@ class PredictDrugTreatsDisease:
                 for node_key, node in self.message.knowledge_graph.nodes.items():
                     curie_to_type[node_key] = node.category
                     curie_to_name[node_key] = node.name
+                # look up the probabilities for all drug/disease edges at once
+                drug_disease_pairs = set()
+                for edge in self.message.knowledge_graph.edges.values():
+                    source_types = curie_to_type[edge.subject]
+                    target_types = curie_to_type[edge.object]
+                    if (("drug" in source_types) or ("chemical_substance" in source_types) or ("biolink:Drug" in source_types) or ("biolink:ChemicalSubstance" in source_types)) and (("disease" in target_types) or ("phenotypic_feature" in target_types) or ("biolink:Disease" in target_types) or ("biolink:PhenotypicFeature" in target_types)):
+                        drug_disease_pairs.add((edge.subject, edge.object))
+                    elif (("drug" in target_types) or ("chemical_substance" in target_types) or ("biolink:Drug" in target_types) or ("biolink:ChemicalSubstance" in target_types)) and (("disease" in source_types) or ("phenotypic_feature" in source_types) or ("biolink:Disease" in source_types) or ("biolink:PhenotypicFeature" in source_types)):
+                        drug_disease_pairs.add((edge.object, edge.subject))
+                probabilities = self.get_treats_probabilities(drug_disease_pairs)
                 # then iterate over the edges and decorate if appropriate
                 for edge_key, edge in self.message.knowledge_graph.edges.items():
                     # Make sure the edge_attributes are not None
@@ -259,38 +267,7 @@ class PredictDrugTreatsDisease:
                     source_types = curie_to_type[source_curie]
                     target_types = curie_to_type[target_curie]
                     if (("drug" in source_types) or ("chemical_substance" in source_types) or ("biolink:Drug" in source_types) or ("biolink:ChemicalSubstance" in source_types)) and (("disease" in target_types) or ("phenotypic_feature" in target_types) or ("biolink:Disease" in target_types) or ("biolink:PhenotypicFeature" in target_types)):
-                        # loop over all pairs of equivalent curies and take the highest probability
-                        self.response.debug(f"Predicting treatment probability between {curie_to_name[source_curie]} and {curie_to_name[target_curie]}")
-                        max_probability = 0
-                        converted_source_curie = self.convert_to_trained_curies(source_curie)
-                        if converted_source_curie is None:
-                            continue
-                        else:
-                            preferred_type = converted_source_curie['preferred_type']
-                            if preferred_type == "drug" or preferred_type == "chemical_substance" or preferred_type == "biolink:Drug" or preferred_type == "biolink:ChemicalSubstance":
-                                converted_source_curie = converted_source_curie['preferred_curie']
-                            else:
-                                continue
-                        converted_target_curie = self.convert_to_trained_curies(target_curie)
-                        if converted_target_curie is None:
-                            continue
-                        else:
-                            preferred_type = converted_target_curie['preferred_type']
-                            if preferred_type == "disease" or preferred_type == "phenotypic_feature" or preferred_type == "biolink:Disease" or preferred_type == "biolink:PhenotypicFeature":
-                                converted_target_curie = converted_target_curie['preferred_curie']
-                            else:
-                                continue
-                        if self.use_prob_db is True:
-                            probability = self.pred.get_prob_from_DTD_db(converted_source_curie, converted_target_curie)
-                            if probability is not None:
-                                if np.isfinite(probability):
-                                    max_probability = probability
-                        else:
-                            probability = self.pred.prob_single(converted_source_curie, converted_target_curie)
-                            if probability is not None:
-                                probability = probability[0]
-                                if np.isfinite(probability):
-                                    max_probability = probability
+                        max_probability = probabilities.get((source_curie, target_curie), 0)
                         # res = list(itertools.product(converted_source_curie, converted_target_curie))
                         # if len(res) != 0:
                         #     all_probabilities = self.pred.prob_all(res)
@@ -306,38 +283,7 @@ class PredictDrugTreatsDisease:
                         #probability = self.pred.prob_single('ChEMBL:' + target_curie[22:], source_curie)  # FIXME: when this was trained, it was ChEMBL:123, not CHEMBL.COMPOUND:CHEMBL123
                         #if probability and np.isfinite(probability):  # finite, that's ok, otherwise, stay with default
                         #    value = probability[0]
-                        self.response.debug(f"Predicting treatment probability between {curie_to_name[source_curie]} and {curie_to_name[target_curie]}")
-                        max_probability = 0
-                        converted_source_curie = self.convert_to_trained_curies(source_curie)
-                        if converted_source_curie is None:
-                            continue
-                        else:
-                            preferred_type = converted_source_curie['preferred_type']
-                            if preferred_type == "disease" or preferred_type == "phenotypic_feature" or preferred_type == "biolink:Disease" or preferred_type == "biolink:PhenotypicFeature":
-                                converted_source_curie = converted_source_curie['preferred_curie']
-                            else:
-                                continue
-                        converted_target_curie = self.convert_to_trained_curies(target_curie)
-                        if converted_target_curie is None:
-                            continue
-                        else:
-                            preferred_type = converted_target_curie['preferred_type']
-                            if preferred_type == "drug" or preferred_type == "chemical_substance" or preferred_type == "biolink:Drug" or preferred_type == "biolink:ChemicalSubstance":
-                                converted_target_curie = converted_target_curie['preferred_curie']
-                            else:
-                                continue
-
-                        if self.use_prob_db is True:
-                            probability = self.pred.get_prob_from_DTD_db(converted_target_curie, converted_source_curie)
-                            if probability is not None:
-                                if np.isfinite(probability):
-                                    max_probability = probability
-                        else:
-                            probability = self.pred.prob_single(converted_target_curie, converted_source_curie)
-                            if probability is not None:
-                                probability = probability[0]
-                                if np.isfinite(probability):
-                                    max_probability = probability
+                        max_probability = probabilities.get((target_curie, source_curie), 0)
                         # res = list(itertools.product(converted_target_curie, converted_source_curie))
                         # if len(res) != 0:
                         #     all_probabilities = self.pred.prob_all(res)
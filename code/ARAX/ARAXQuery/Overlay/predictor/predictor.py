@@ -1,7 +1,9 @@
 import os
+import sys
 import pandas as pd
 import numpy as np
-import sqlite3
+from scipy.special import expit
+from sklearn.linear_model import LogisticRegression
 try:
     from sklearn.externals import joblib
 except:
@@ -9,6 +11,10 @@ except:
         from sklearn.utils import _joblib as joblib
     except:
         import joblib
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../../../../")
+import sqlite_connection_pool
+
+MAX_FEATURE_BATCH_ROWS = 100000  # Largest number of Hadamard feature rows to build at once for non-linear models
 
 
 class predictor():
@@ -17,11 +23,13 @@ class predictor():
 
         self.use_prob_db = use_prob_db
         if self.use_prob_db is True:
-            self.connection = sqlite3.connect(DTD_prob_file)
+            self.connection = sqlite_connection_pool.get_connection(DTD_prob_file)
         else:
             self.model = joblib.load(model_file)
             self.graph_cur = None
             self.X = None
+            self.embedding_matrix = None  # float32 (num curies x embedding dimension); may be memory-mapped
+            self.curie_to_row = None
 
     def prob(self, X):
         """
@@ -59,18 +67,111 @@ class predictor():
         res.pop(0)
         return res
 
-    def import_file(self, file, graph_database=os.path.dirname(os.path.abspath(__file__))+'/retrain_data/GRAPH.sqlite'):
+    def get_features(self, curie_list):
+        """
+        Retrieve the features of many curie ids at once (from the embedding matrix if one was loaded, otherwise with batched database queries)
+
+        :param curie_list: a list of curie names
+        return a tuple of a float32 matrix with one row of features per found curie and a dict mapping each found curie to its row
+        """
+        curies = list(dict.fromkeys(curie_list))
+        if self.embedding_matrix is not None:
+            found_curies = [curie for curie in curies if curie in self.curie_to_row]
+            rows = np.array([self.curie_to_row[curie] for curie in found_curies], dtype=np.int64)
+            return np.asarray(self.embedding_matrix[rows], dtype=np.float32), {curie: row for row, curie in enumerate(found_curies)}
+
+        found_curies = []
+        feature_rows = []
+        for start in range(0, len(curies), sqlite_connection_pool.MAX_SQL_PARAMETERS):
+            batch = curies[start:start + sqlite_connection_pool.MAX_SQL_PARAMETERS]
+            placeholders = ",".join("?" * len(batch))
+            for row in self.graph_cur.execute(f"select * from GRAPH where curie in ({placeholders})", batch):
+                found_curies.append(row[0])
+                feature_rows.append(row[1:])
+        features = np.array(feature_rows, dtype=np.float32) if feature_rows else np.zeros((0, 0), dtype=np.float32)
+        return features, {curie: row for row, curie in enumerate(found_curies)}
+
+    def load_embedding_file(self, embedding_file):
+        """
+        Memory-maps a float32 embedding matrix saved by build_embedding_file() so that features are looked up by row instead of queried from GRAPH.sqlite.
+        The matrix is only used if it matches the GRAPH table of the imported graph database; otherwise features keep being queried from the database
+
+        :param embedding_file: A string containing the path of the .npy file (its curies are read from '<embedding_file>.curies')
+        return True if the embedding matrix is used
+        """
+        embedding_matrix = np.load(embedding_file, mmap_mode='r')
+        with open(f"{embedding_file}.curies") as curies_file:
+            curies = [line.rstrip('\n') for line in curies_file]
+        mismatch = self._get_embedding_mismatch(embedding_matrix, curies)
+        if mismatch is not None:
+            print(f"WARNING: Not using the embedding file {embedding_file} since {mismatch}; features will be queried from the graph database instead")
+            self.embedding_matrix = None
+            self.curie_to_row = None
+            return False
+        self.embedding_matrix = embedding_matrix
+        self.curie_to_row = {curie: row for row, curie in enumerate(curies)}
+        return True
+
+    def _get_embedding_mismatch(self, embedding_matrix, curies):
+        # Returns why the embedding matrix wasn't built from the imported GRAPH table (or None if it appears to have been)
+        if self.graph_cur is None:
+            return "no graph database has been imported to check it against"
+        if embedding_matrix.ndim != 2 or len(curies) != embedding_matrix.shape[0]:
+            return f"its shape {embedding_matrix.shape} doesn't match its {len(curies)} curies"
+        num_columns = len(self.graph_cur.execute("select * from GRAPH limit 1").description) - 1
+        if embedding_matrix.shape[1] != num_columns:
+            return f"it has {embedding_matrix.shape[1]} features per curie while the graph database has {num_columns}"
+        num_rows = self.graph_cur.execute("select count(*) from GRAPH").fetchone()[0]
+        if embedding_matrix.shape[0] != num_rows:
+            return f"it has {embedding_matrix.shape[0]} curies while the graph database has {num_rows}"
+        # Spot-check that the first and last rows hold the same features as the database does
+        for row in {0, num_rows - 1} if num_rows else set():
+            res = self.graph_cur.execute("select * from GRAPH where curie=?", (curies[row],)).fetchone()
+            if res is None or not np.array_equal(np.array(res[1:], dtype=np.float32), embedding_matrix[row], equal_nan=True):
+                return f"its features for {curies[row]} differ from the graph database's"
+        return None
+
+    @staticmethod
+    def build_embedding_file(graph_database, embedding_file, batch_size=100000):
+        """
+        Writes the GRAPH table of the given sqlite file to a contiguous float32 .npy matrix (plus a '<embedding_file>.curies' file listing the curie of each row)
+
+        :param graph_database: A string containing the filename or path of the sqlite file containing the feature vectors for each node
+        :param embedding_file: A string containing the path of the .npy file to create
+        """
+        cursor = sqlite_connection_pool.get_connection(graph_database).cursor()
+        num_rows = cursor.execute("select count(*) from GRAPH").fetchone()[0]
+        num_columns = len(cursor.execute("select * from GRAPH limit 1").description) - 1
+        matrix = np.lib.format.open_memmap(embedding_file, mode='w+', dtype=np.float32, shape=(num_rows, num_columns))
+        cursor.execute("select * from GRAPH")
+        with open(f"{embedding_file}.curies", 'w') as curies_file:
+            start = 0
+            rows = cursor.fetchmany(batch_size)
+            while rows:
+                curies_file.write("".join(f"{row[0]}\n" for row in rows))
+                matrix[start:start + len(rows)] = np.array([row[1:] for row in rows], dtype=np.float32)
+                start += len(rows)
+                rows = cursor.fetchmany(batch_size)
+        matrix.flush()
+        del matrix
+
+    def import_file(self, file, graph_database=os.path.dirname(os.path.abspath(__file__))+'/retrain_data/GRAPH.sqlite', embedding_file=None):
         """
         Imports all necisary files to take curie ids and extract their feature vectors.
 
         :param file: A string containing the filename or path of a csv containing the source and target curie ids to make predictions on (If set to None will just import the graph and map files)
         :param graph_database: A string containing the filename or path of the sqlite file containing the feature vectors for each node
+        :param embedding_file: A string containing the path of a .npy embedding matrix to memory-map (see build_embedding_file()); defaults to the graph database's path with a .npy extension, if that file exists. It is only used if it matches the graph database (see load_embedding_file())
         """
         #graph = pd.read_csv(graph_file, sep=' ', skiprows=1, header=None, index_col=None)
         #self.graph = graph.sort_values(0).reset_index(drop=True)
         if self.use_prob_db is not True:
-            conn = sqlite3.connect(graph_database)
+            conn = sqlite_connection_pool.get_connection(graph_database)
             self.graph_cur = conn.cursor()
+            if embedding_file is None:
+                embedding_file = os.path.splitext(graph_database)[0] + '.npy'
+            if os.path.exists(embedding_file) and os.path.exists(f"{embedding_file}.curies"):
+                self.load_embedding_file(embedding_file)
 
             if file is not None:
                 data = pd.read_csv(file, index_col=None)
@@ -209,22 +310,12 @@ class predictor():
             if self.graph_cur is None:
                 self.import_file(None)
 
-            source_feature = self.get_feature(source_curie)
-            target_feature = self.get_feature(target_curie)
-            if source_feature is not None and target_feature is not None:
-                X = np.array([[a * b for a, b in zip(source_feature, target_feature)]])  # use 'Hadamard product' method instead of 'Concatenate' method
-                # X = np.array([list(self.graph.iloc[source_id, 1:]) + list(self.graph.iloc[target_id, 1:])])
-                return self.prob(X)[:, 1]
-            elif source_feature is not None:
-                # print(target_curie + ' was not in the largest connected component of graph.')
-                pass
-            elif target_feature is not None:
-                # print(source_curie + ' was not in the largest connected component of graph.')
-                pass
+            res = self.prob_all([(source_curie, target_curie)])
+            if res is not None:
+                return np.array(res[1])
             else:
-                # print(source_curie + ' and ' + target_curie + ' were not in the largest connected component of graph.')
-                pass
-            return None
+                # print(source_curie + ' and/or ' + target_curie + ' were not in the largest connected component of graph.')
+                return None
 
     def prob_all(self, source_target_curie_list):
         """
@@ -238,26 +329,66 @@ class predictor():
 
             if isinstance(source_target_curie_list, list):
 
-                X_list = []
-                out_source_target_curie_list = list()
-                for (equiv_source_curie, equiv_target_curie) in source_target_curie_list:
-
-                    source_feature = self.get_feature(equiv_source_curie)
-                    target_feature = self.get_feature(equiv_target_curie)
-
-                    if source_feature is not None and target_feature is not None:
-                        out_source_target_curie_list += [(equiv_source_curie, equiv_target_curie)]
-                        X_list += [[a * b for a, b in zip(source_feature, target_feature)]]
-                    else:
-                        continue
-                if len(X_list)!=0:
-                    X = np.array(X_list)
-                    return [out_source_target_curie_list, list(self.prob(X)[:, 1])]
+                features, curie_to_row = self.get_features([curie for pair in source_target_curie_list for curie in pair])
+                out_source_target_curie_list = [(equiv_source_curie, equiv_target_curie) for (equiv_source_curie, equiv_target_curie) in source_target_curie_list
+                                                if equiv_source_curie in curie_to_row and equiv_target_curie in curie_to_row]
+                if len(out_source_target_curie_list) != 0:
+                    source_rows = np.array([curie_to_row[source_curie] for source_curie, _ in out_source_target_curie_list])
+                    target_rows = np.array([curie_to_row[target_curie] for _, target_curie in out_source_target_curie_list])
+                    return [out_source_target_curie_list, list(self._prob_of_pairs(features[source_rows], features[target_rows]))]
                 else:
                     return None
             else:
                 return None
 
+    def prob_matrix(self, source_curie_list, target_curie_list):
+        """
+        Generates the probabilities of all source x target pairs of curie ids being classified as the positive class, with a single matrix product for logistic regression models
+
+        :param source_curie_list: A list containing the curie ids of the N source nodes
+        :param target_curie_list: A list containing the curie ids of the M target nodes
+        return a N x M numpy array of probabilities (NaN for pairs where either curie was not in the largest connected component of graph)
+        """
+        if self.use_prob_db is not True:
+            if self.graph_cur is None:
+                self.import_file(None)
+
+            probabilities = np.full((len(source_curie_list), len(target_curie_list)), np.nan)
+            features, curie_to_row = self.get_features(list(source_curie_list) + list(target_curie_list))
+            source_indices = [index for index, curie in enumerate(source_curie_list) if curie in curie_to_row]
+            target_indices = [index for index, curie in enumerate(target_curie_list) if curie in curie_to_row]
+            if len(source_indices) == 0 or len(target_indices) == 0:
+                return probabilities
+            source_features = features[[curie_to_row[source_curie_list[index]] for index in source_indices]]
+            target_features = features[[curie_to_row[target_curie_list[index]] for index in target_indices]]
+            if self._is_binary_logistic_regression():
+                # w . (s * t) = (s * w) . t, so the whole grid of Hadamard-product features never has to be built
+                logits = (source_features * self.model.coef_[0]) @ target_features.T + self.model.intercept_[0]
+                grid_probabilities = expit(logits)
+            else:
+                grid_probabilities = np.empty((len(source_indices), len(target_indices)))
+                sources_per_batch = max(1, MAX_FEATURE_BATCH_ROWS // len(target_indices))
+                for start in range(0, len(source_indices), sources_per_batch):
+                    batch_features = source_features[start:start + sources_per_batch, np.newaxis, :] * target_features[np.newaxis, :, :]
+                    batch_probabilities = self.prob(batch_features.reshape(-1, features.shape[1]))[:, 1]
+                    grid_probabilities[start:start + sources_per_batch] = batch_probabilities.reshape(-1, len(target_indices))
+            probabilities[np.ix_(source_indices, target_indices)] = grid_probabilities
+            return probabilities
+
+    def _is_binary_logistic_regression(self):
+        return isinstance(self.model, LogisticRegression) and self.model.coef_.shape[0] == 1
+
+    def _prob_of_pairs(self, source_features, target_features):
+        # The model's features are the 'Hadamard product' of the source and target features (instead of 'Concatenate')
+        if self._is_binary_logistic_regression():
+            logits = np.einsum('ij,ij->i', source_features * self.model.coef_[0], target_features) + self.model.intercept_[0]
+            return expit(logits)
+        probabilities = np.empty(len(source_features))
+        for start in range(0, len(source_features), MAX_FEATURE_BATCH_ROWS):
+            rows = slice(start, start + MAX_FEATURE_BATCH_ROWS)
+            probabilities[rows] = self.prob(source_features[rows] * target_features[rows])[:, 1]
+        return probabilities
+
     def get_prob_from_DTD_db(self, source_curie, target_curie):
         """
         Get the probability of a single pair of source and target curie ids from DTD probability database
@@ -278,6 +409,36 @@ class predictor():
             else:
                 return res[2]
 
+    def get_probs_from_DTD_db_based_on_pairs(self, drug_disease_pair_list):
+        """
+        Get the probabilities of many pairs of drug and disease curie ids from DTD probability database at once
+
+        :param drug_disease_pair_list: A list containing a bunch of tuples which contain the curie ids of the drug and disease nodes
+        return a dict mapping each pair found in the database to its probability
+        """
+
+        if self.use_prob_db is True:
+            cursor = self.connection.cursor()
+            wanted_pairs = set(drug_disease_pair_list)
+            if not wanted_pairs:
+                return dict()
+            drugs = sorted({drug for drug, _ in wanted_pairs})
+            diseases = sorted({disease for _, disease in wanted_pairs})
+            # Typically a few diseases and many drugs, so query each chunk of diseases against chunks of the drugs
+            diseases_per_query = min(len(diseases), sqlite_connection_pool.MAX_SQL_PARAMETERS // 10)
+            drugs_per_query = sqlite_connection_pool.MAX_SQL_PARAMETERS - diseases_per_query
+            probabilities = dict()
+            for disease_start in range(0, len(diseases), diseases_per_query):
+                disease_batch = diseases[disease_start:disease_start + diseases_per_query]
+                for drug_start in range(0, len(drugs), drugs_per_query):
+                    drug_batch = drugs[drug_start:drug_start + drugs_per_query]
+                    rows = cursor.execute(f"select drug, disease, probability from DTD_PROBABILITY where disease in ({','.join('?' * len(disease_batch))}) "
+                                          f"and drug in ({','.join('?' * len(drug_batch))})", disease_batch + drug_batch)
+                    for drug, disease, probability in rows:
+                        if (drug, disease) in wanted_pairs:
+                            probabilities[(drug, disease)] = probability
+            return probabilities
+
     def get_probs_from_DTD_db_based_on_disease(self, disease_id_list):
         """
         Get the probabilities of all pairs of source and target curie ids from DTD probability database based on given disease ids
@@ -8,9 +8,11 @@ import sys
 import re
 import timeit
 import argparse
-import sqlite3
 import pickle
 import itertools
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+import numpy as np
 
 # import internal modules
 pathlist = os.path.realpath(__file__).split(os.path.sep)
@@ -18,20 +20,41 @@ RTXindex = pathlist.index("RTX")
 sys.path.append(os.path.sep.join([*pathlist[:(RTXindex + 1)], 'code', 'reasoningtool', 'QuestionAnswering']))
 sys.path.append(os.path.sep.join([*pathlist[:(RTXindex + 1)], 'code', 'ARAX', 'NodeSynonymizer']))
 from node_synonymizer import NodeSynonymizer
+sys.path.append(os.path.sep.join([*pathlist[:(RTXindex + 1)], 'code']))
+import sqlite_connection_pool
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from COHD_columnar_index import get_columnar_index
 
 DEBUG = True
 
+PERCENTILE_TABLE = "CONCEPT_PERCENTILES"
+STORED_PERCENTILES = (1, 5, 10, 25, 50, 75, 90, 95, 99)  # Percentiles stored in CONCEPT_PERCENTILES (as p1, p5, ..)
+COHD_DATASET_IDS = (1, 2, 3)
+# How each COHD method is scored: the PAIRED_CONCEPT_COUNTS_ASSOCIATIONS column holding its value, the extreme value
+# that is left out when calculating percentiles (e.g., -inf for ln_ratio) and whether larger values are better
+COHD_METRICS = {
+    'paired_concept_freq': {'column': 'concept_prevalence', 'excluded_value': 0, 'higher_is_better': True},
+    'observed_expected_ratio': {'column': 'ln_ratio', 'excluded_value': float("-inf"), 'higher_is_better': True},
+    'chi_square': {'column': 'chi_square_p', 'excluded_value': 0, 'higher_is_better': False},
+}
+
 
 class COHDIndex:
 
     # Constructor
-    def __init__(self):
+    def __init__(self, use_columnar_index=False):
         filepath = os.path.sep.join([*pathlist[:(RTXindex + 1)], 'code', 'ARAX', 'KnowledgeSources', 'COHD_local', 'data'])
         self.databaseLocation = filepath
         lastest_version = "v2.0"
         self.databaseName = f"COHDdatabase_{lastest_version}.db"
         self.success_con = self.connect()
         self.synonymizer = NodeSynonymizer()
+        self.has_percentile_table = self._check_for_percentile_table() if self.success_con is True else False
+        # The batch lookups (get_best_pair_values, get_partner_values, ..) can use the memory-mapped columnar index
+        # (see COHD_columnar_index.py) instead of sqlite, if it has been built
+        self.columnar_index = get_columnar_index() if use_columnar_index else None
+        if use_columnar_index and self.columnar_index is None:
+            print("WARNING: The COHD columnar index hasn't been built, so using the COHD database instead", flush=True)
 
     # Destructor
     def __del__(self):
@@ -43,7 +66,7 @@ class COHDIndex:
         database = f"{self.databaseLocation}/{self.databaseName}"
 
         if os.path.exists(database):
-            self.connection = sqlite3.connect(database)
+            self.connection = sqlite_connection_pool.get_connection(database)
             print("INFO: Connecting to database", flush=True)
             return True
         else:
@@ -63,7 +86,7 @@ class COHDIndex:
             # copy the database file to local if it doesn't exist
             os.system(f"scp rtxconfig@arax.ncats.io:/data/orangeboard/databases/KG2.3.4/{self.databaseName} {database}")
 
-            self.connection = sqlite3.connect(database)
+            self.connection = sqlite_connection_pool.get_connection(database)
             print("INFO: Connecting to database", flush=True)
             return True
 
@@ -71,8 +94,8 @@ class COHDIndex:
     def disconnect(self):
 
         if self.success_con is True:
-            self.connection.commit()
-            self.connection.close()
+            # The connection is shared (and read-only), so just let go of it rather than committing/closing it
+            self.connection = None
             print("INFO: Disconnecting from database", flush=True)
             self.success_con = False
         else:
@@ -232,6 +255,59 @@ class COHDIndex:
 
         #     print(f"INFO: Creating INDEXes is completed", flush=True)
 
+    ## store per-concept percentiles of each COHD metric, so that queries don't have to calculate them on the fly
+    def build_percentile_table(self):
+
+        if self.success_con is not True:
+            print(f"Error: no database was connected! So skip building the {PERCENTILE_TABLE} table.", flush=True)
+            return
+
+        database = f"{self.databaseLocation}/{self.databaseName}"
+        # Our shared connection is read-only, so write through a separate one
+        write_connection = sqlite3.connect(database)
+        percentile_columns = [f"p{percentile}" for percentile in STORED_PERCENTILES]
+        print(f"INFO: Creating the {PERCENTILE_TABLE} table", flush=True)
+        write_connection.execute(f"DROP TABLE IF EXISTS {PERCENTILE_TABLE}")
+        write_connection.execute(f"CREATE TABLE {PERCENTILE_TABLE}( preferred_curie VARCHAR(255), dataset_id TINYINT, metric VARCHAR(255), num_pairs INT, num_values INT, "
+                                 f"{', '.join(f'{column} FLOAT' for column in percentile_columns)} )")
+
+        cursor = write_connection.cursor()
+        cursor.execute("select distinct t1.preferred_curie, t1.concept_id from CURIE_TO_OMOP_MAPPING t1 inner join CONCEPTS t2 on t1.concept_id = t2.concept_id;")
+        curie_to_concept_ids = dict()
+        for preferred_curie, concept_id in cursor.fetchall():
+            curie_to_concept_ids.setdefault(preferred_curie, []).append(concept_id)
+
+        insert_statement = f"INSERT INTO {PERCENTILE_TABLE} VALUES ({','.join('?' * (5 + len(percentile_columns)))})"
+        rows_to_insert = []
+        count = 0
+        for preferred_curie, concept_ids in curie_to_concept_ids.items():
+            partner_rows = self._get_partner_rows(concept_ids, connection=write_connection)
+            for dataset_id in COHD_DATASET_IDS:
+                dataset_rows = [row for row in partner_rows if row[0] == dataset_id]
+                if len(dataset_rows) == 0:
+                    continue
+                for metric, metric_info in COHD_METRICS.items():
+                    values = self._get_metric_values(dataset_rows, metric)
+                    percentiles = list(np.percentile(values, STORED_PERCENTILES)) if len(values) != 0 else [None] * len(STORED_PERCENTILES)
+                    rows_to_insert.append((preferred_curie, dataset_id, metric, len(dataset_rows), len(values), *percentiles))
+            count += 1
+            if count % 10000 == 0:
+                write_connection.executemany(insert_statement, rows_to_insert)
+                write_connection.commit()
+                rows_to_insert = []
+                percentage = round((count * 100.0 / len(curie_to_concept_ids)), 2)
+                print(str(percentage) + "%..", end='', flush=True)
+
+        write_connection.executemany(insert_statement, rows_to_insert)
+        write_connection.execute(f"CREATE INDEX idx_{PERCENTILE_TABLE}_preferred_curie ON {PERCENTILE_TABLE}(preferred_curie, dataset_id, metric)")
+        write_connection.commit()
+        write_connection.close()
+        print(f"INFO: Building the {PERCENTILE_TABLE} table is completed", flush=True)
+
+        # The file changed, so pick up a fresh connection to it
+        self.connection = sqlite_connection_pool.get_connection(database)
+        self.has_percentile_table = self._check_for_percentile_table()
+
     def get_concept_ids(self, curie):
         """Search for OMOP concept ids by curie id.
 
@@ -292,6 +368,218 @@ class COHDIndex:
 
         return results_list
 
+    def get_concept_ids_batch(self, curies: List[str]) -> Dict[str, List[int]]:
+        """Search for OMOP concept ids for many curie ids at once (a batch version of get_concept_ids).
+
+        Args:
+            curies (required, list): curie ids of the concepts to map, e.g., ["DOID:8398", "DOID:9053"]
+
+        Returns:
+            dict: a dictionary mapping each given curie to a list of its OMOP concept ids (an empty list if it has none)
+            example:
+                {'DOID:8398': [75617, 80180, 1570333, ..], 'DOID:9053': [192855, ..]}
+        """
+        curies = list(set(curies))
+        canonical_curies = self.synonymizer.get_canonical_curies(curies) if len(curies) != 0 else dict()
+        curie_to_preferred_curie = {curie: canonical_curies[curie]['preferred_curie'] for curie in curies
+                                    if canonical_curies.get(curie) is not None}
+        preferred_curies = list(set(curie_to_preferred_curie.values()))
+
+        preferred_curie_to_concept_ids = dict()
+        cursor = self.connection.cursor()
+        for start in range(0, len(preferred_curies), sqlite_connection_pool.MAX_SQL_PARAMETERS):
+            batch = preferred_curies[start:start + sqlite_connection_pool.MAX_SQL_PARAMETERS]
+            cursor.execute(f"select distinct t1.preferred_curie, t1.concept_id from CURIE_TO_OMOP_MAPPING t1 inner join CONCEPTS t2 on t1.concept_id = t2.concept_id "
+                           f"where t1.preferred_curie in ({','.join('?' * len(batch))});", batch)
+            for preferred_curie, concept_id in cursor.fetchall():
+                preferred_curie_to_concept_ids.setdefault(preferred_curie, []).append(concept_id)
+
+        return {curie: preferred_curie_to_concept_ids.get(curie_to_preferred_curie.get(curie), []) for curie in curies}
+
+    def get_curies_from_concept_ids(self, concept_ids: List[int]) -> Dict[int, List[str]]:
+        """Search for curie ids for many OMOP concept ids at once (a batch version of get_curies_from_concept_id).
+
+        Args:
+            concept_ids (required, list): OMOP concept ids, e.g., [192855, 2008271]
+
+        Returns:
+            dict: a dictionary mapping each given concept id to a list of its curies (an empty list if it has none)
+        """
+        concept_ids = list(set(concept_ids))
+        concept_id_to_curies = {concept_id: set() for concept_id in concept_ids}
+        cursor = self.connection.cursor()
+        for start in range(0, len(concept_ids), sqlite_connection_pool.MAX_SQL_PARAMETERS):
+            batch = concept_ids[start:start + sqlite_connection_pool.MAX_SQL_PARAMETERS]
+            cursor.execute(f"select distinct preferred_curie, concept_id from CURIE_TO_OMOP_MAPPING where concept_id in ({','.join('?' * len(batch))});", batch)
+            for preferred_curie, concept_id in cursor.fetchall():
+                concept_id_to_curies[concept_id].add(preferred_curie)
+
+        return {concept_id: list(curies) for concept_id, curies in concept_id_to_curies.items()}
+
+    def get_percentile_thresholds(self, concept_ids_by_curie: Dict[str, List[int]], metric: str, percentile: float, dataset_id=1) -> Dict[str, float]:
+        """Get the given percentile of a COHD metric over all pairs that each curie's OMOP concepts are part of.
+
+            Percentiles are read from the CONCEPT_PERCENTILES table (see build_percentile_table()) when it exists and
+            stores the requested percentile; otherwise they're calculated from the curie's paired concepts. As in the
+            COHD querier, the extreme values of each metric (e.g., a frequency of 0) are left out.
+
+        Args:
+            concept_ids_by_curie (required, dict): a dictionary mapping curies to their OMOP concept ids (as returned by get_concept_ids_batch)
+            metric (required, str): 'paired_concept_freq', 'observed_expected_ratio' or 'chi_square'
+            percentile (required, float): the percentile to get, between 0 and 100
+            dataset_id (optional, int): The dataset_id of the dataset to query. Default dataset is the 5-year dataset e.g. 1,2,3
+
+        Returns:
+            dict: a dictionary mapping each curie to its threshold; curies without any paired concepts (or concept ids) are left out
+        """
+        if metric not in COHD_METRICS:
+            print(f"The 'metric' in get_percentile_thresholds should be one of {list(COHD_METRICS)}", flush=True)
+            return dict()
+
+        concept_ids_by_curie = {curie: concept_ids for curie, concept_ids in concept_ids_by_curie.items() if len(concept_ids) != 0}
+        thresholds = dict()
+        curies_in_table = set()
+        if self.has_percentile_table and float(percentile) in STORED_PERCENTILES:
+            column = f"p{int(percentile)}"
+            canonical_curies = self.synonymizer.get_canonical_curies(list(concept_ids_by_curie)) if len(concept_ids_by_curie) != 0 else dict()
+            preferred_curie_to_curies = dict()
+            for curie in concept_ids_by_curie:
+                if canonical_curies.get(curie) is not None:
+                    preferred_curie_to_curies.setdefault(canonical_curies[curie]['preferred_curie'], []).append(curie)
+            preferred_curies = list(preferred_curie_to_curies)
+            cursor = self.connection.cursor()
+            for start in range(0, len(preferred_curies), sqlite_connection_pool.MAX_SQL_PARAMETERS - 2):
+                batch = preferred_curies[start:start + sqlite_connection_pool.MAX_SQL_PARAMETERS - 2]
+                cursor.execute(f"select preferred_curie, {column} from {PERCENTILE_TABLE} where dataset_id = ? and metric = ? "
+                               f"and preferred_curie in ({','.join('?' * len(batch))});", [dataset_id, metric, *batch])
+                for preferred_curie, threshold in cursor.fetchall():
+                    for curie in preferred_curie_to_curies[preferred_curie]:
+                        curies_in_table.add(curie)
+                        if threshold is not None:
+                            thresholds[curie] = threshold
+
+        # Fall back to calculating percentiles for curies that the table doesn't cover
+        for curie in [curie for curie in concept_ids_by_curie if curie not in curies_in_table]:
+            partner_rows = self._get_partner_rows(concept_ids_by_curie[curie], dataset_id=dataset_id)
+            values = self._get_metric_values(partner_rows, metric)
+            if len(values) != 0:
+                thresholds[curie] = float(np.percentile(values, percentile))
+
+        return thresholds
+
+    def get_best_pair_values(self, concept_ids_by_curie_1: Dict[str, List[int]], concept_ids_by_curie_2: Dict[str, List[int]], metric: str, dataset_id=1) -> Dict[Tuple[str, str], float]:
+        """Get the best value of a COHD metric for every pair of curies (over all pairs of their OMOP concepts) at once.
+
+        Args:
+            concept_ids_by_curie_1 (required, dict): a dictionary mapping curies to their OMOP concept ids
+            concept_ids_by_curie_2 (required, dict): a dictionary mapping curies to their OMOP concept ids
+            metric (required, str): 'paired_concept_freq', 'observed_expected_ratio' or 'chi_square'
+            dataset_id (optional, int): The dataset_id of the dataset to query. Default dataset is the 5-year dataset e.g. 1,2,3
+
+        Returns:
+            dict: a dictionary mapping (curie_1, curie_2) tuples to the largest value of the metric (or the smallest, for
+                chi-square p-values); pairs that were never observed together are left out
+        """
+        if metric not in COHD_METRICS:
+            print(f"The 'metric' in get_best_pair_values should be one of {list(COHD_METRICS)}", flush=True)
+            return dict()
+        metric_info = COHD_METRICS[metric]
+
+        concept_id_to_curies_1 = dict()
+        for curie, concept_ids in concept_ids_by_curie_1.items():
+            for concept_id in concept_ids:
+                concept_id_to_curies_1.setdefault(concept_id, []).append(curie)
+        concept_id_to_curies_2 = dict()
+        for curie, concept_ids in concept_ids_by_curie_2.items():
+            for concept_id in concept_ids:
+                concept_id_to_curies_2.setdefault(concept_id, []).append(curie)
+        concept_ids_1 = list(concept_id_to_curies_1)
+        concept_ids_2 = list(concept_id_to_curies_2)
+
+        best_values = dict()
+
+        def record_value(concept_id_1, concept_id_2, value):
+            for curie_pair in itertools.product(concept_id_to_curies_1[concept_id_1], concept_id_to_curies_2[concept_id_2]):
+                if curie_pair not in best_values:
+                    best_values[curie_pair] = value
+                elif metric_info['higher_is_better']:
+                    best_values[curie_pair] = max(best_values[curie_pair], value)
+                else:
+                    best_values[curie_pair] = min(best_values[curie_pair], value)
+
+        if self.columnar_index is not None:
+            # The columnar index stores every pair in both orientations, so one lookup covers both
+            pairs = self.columnar_index.get_pairs_between(concept_ids_1, concept_ids_2, dataset_id=dataset_id)
+            for concept_id_1, concept_id_2, value in zip(pairs['concept_id_1'].tolist(), pairs['concept_id_2'].tolist(), pairs[metric_info['column']].tolist()):
+                record_value(concept_id_1, concept_id_2, value)
+            return best_values
+
+        cursor = self.connection.cursor()
+        batch_size = (sqlite_connection_pool.MAX_SQL_PARAMETERS - 1) // 2
+        for start_1 in range(0, len(concept_ids_1), batch_size):
+            batch_1 = concept_ids_1[start_1:start_1 + batch_size]
+            for start_2 in range(0, len(concept_ids_2), batch_size):
+                batch_2 = concept_ids_2[start_2:start_2 + batch_size]
+                # Pairs are stored in only one orientation, so look for both
+                for column_1, column_2 in [('concept_id_1', 'concept_id_2'), ('concept_id_2', 'concept_id_1')]:
+                    cursor.execute(f"select {column_1}, {column_2}, {metric_info['column']} from PAIRED_CONCEPT_COUNTS_ASSOCIATIONS where dataset_id = ? "
+                                   f"and {column_1} in ({','.join('?' * len(batch_1))}) and {column_2} in ({','.join('?' * len(batch_2))});",
+                                   [dataset_id, *batch_1, *batch_2])
+                    for concept_id_1, concept_id_2, value in cursor.fetchall():
+                        record_value(concept_id_1, concept_id_2, value)
+
+        return best_values
+
+    def get_partner_values(self, concept_ids: List[int], metric: str, dataset_id=1) -> List[Tuple[int, float]]:
+        """Get the value of a COHD metric for all pairs that the given OMOP concepts are part of, in one lookup.
+
+        Args:
+            concept_ids (required, list): OMOP concept ids, e.g., [192855, 8507]
+            metric (required, str): 'paired_concept_freq', 'observed_expected_ratio' or 'chi_square'
+            dataset_id (optional, int): The dataset_id of the dataset to query. Default dataset is the 5-year dataset e.g. 1,2,3
+
+        Returns:
+            list: a list of (paired concept id, value) tuples
+        """
+        if metric not in COHD_METRICS:
+            print(f"The 'metric' in get_partner_values should be one of {list(COHD_METRICS)}", flush=True)
+            return []
+        value_index = 3 + list(COHD_METRICS).index(metric)
+        return [(row[2], row[value_index]) for row in self._get_partner_rows(concept_ids, dataset_id=dataset_id)]
+
+    def _get_partner_rows(self, concept_ids: List[int], dataset_id: Optional[int] = None, connection: Optional[sqlite3.Connection] = None) -> List[tuple]:
+        # Returns (dataset_id, concept_id, paired concept_id, <one value per COHD_METRICS entry>) for all pairs that
+        # include any of the given concepts, in either position (in all datasets, unless one is given)
+        concept_ids = list(set(concept_ids))
+        if self.columnar_index is not None and connection is None and dataset_id is not None:
+            partners = self.columnar_index.get_partners(concept_ids, dataset_id=dataset_id)
+            value_lists = [[value if value == value else None for value in partners[metric_info['column']].tolist()]  # NaN -> None, as from sqlite
+                           for metric_info in COHD_METRICS.values()]
+            return [(dataset_id, *row) for row in zip(partners['concept_id_1'].tolist(), partners['concept_id_2'].tolist(), *value_lists)]
+
+        value_columns = ','.join(metric_info['column'] for metric_info in COHD_METRICS.values())
+        dataset_condition = "" if dataset_id is None else f" and dataset_id = {int(dataset_id)}"
+        cursor = (connection if connection is not None else self.connection).cursor()
+        rows = []
+        for start in range(0, len(concept_ids), sqlite_connection_pool.MAX_SQL_PARAMETERS):
+            batch = concept_ids[start:start + sqlite_connection_pool.MAX_SQL_PARAMETERS]
+            for column_1, column_2 in [('concept_id_1', 'concept_id_2'), ('concept_id_2', 'concept_id_1')]:
+                cursor.execute(f"select distinct dataset_id,{column_1},{column_2},{value_columns} from PAIRED_CONCEPT_COUNTS_ASSOCIATIONS "
+                               f"where {column_1} in ({','.join('?' * len(batch))}){dataset_condition};", batch)
+                rows += cursor.fetchall()
+        return rows
+
+    @staticmethod
+    def _get_metric_values(partner_rows: List[tuple], metric: str) -> List[float]:
+        value_index = 3 + list(COHD_METRICS).index(metric)
+        excluded_value = COHD_METRICS[metric]['excluded_value']
+        return [row[value_index] for row in partner_rows if row[value_index] is not None and row[value_index] != excluded_value]
+
+    def _check_for_percentile_table(self) -> bool:
+        cursor = self.connection.cursor()
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?;", [PERCENTILE_TABLE])
+        return len(cursor.fetchall()) != 0
+
     def get_paired_concept_freq(self, concept_id_1=[], concept_id_2=[], concept_id_pair=None, dataset_id=1):
         """Retrieve observed clinical frequencies of a pair of concepts.
 
@@ -2588,10 +2876,11 @@ def main():
 
     parser = argparse.ArgumentParser(description="Tests or rebuilds the COHD Node Index", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
     parser.add_argument('-b', '--build', action="store_true", help="If set, (re)build the index from scratch", default=False)
+    parser.add_argument('-p', '--percentiles', action="store_true", help=f"If set, (re)build the {PERCENTILE_TABLE} table of per-concept percentiles", default=False)
     parser.add_argument('-t', '--test', action="store_true", help="If set, run a test of the index by doing several lookups", default=False)
     args = parser.parse_args()
 
-    if not args.build and not args.test:
+    if not args.build and not args.percentiles and not args.test:
         parser.print_help()
         sys.exit(2)
 
@@ -2603,6 +2892,9 @@ def main():
         cohdIndex.populate_table()
         cohdIndex.create_indexes()
 
+    if args.build or args.percentiles:
+        cohdIndex.build_percentile_table()
+
     # Exit here if tests are not requested
     if not args.test:
         return
@@ -0,0 +1,309 @@
+"""This script builds and queries a columnar, memory-mapped index of COHD's PAIRED_CONCEPT_COUNTS_ASSOCIATIONS table.
+
+Each column (concept_id_1, concept_id_2, dataset_id, concept_count, concept_prevalence, chi_square_p, ln_ratio, plus
+the domain of concept_id_2) is stored as a NumPy .npy file. Every pair is stored in both orientations and rows are
+sorted by (concept_id_1, dataset_id, concept_id_2), so the rows for a concept in a dataset are one contiguous slice
+found through a CSR-style offsets array. The files are memory-mapped, so only the pages that queries touch are read
+and they're shared between processes via the OS page cache.
+Usage:
+    python COHD_columnar_index.py --build [--database path/to/COHDdatabase_v2.0.db] [--index_directory path]
+    python COHD_columnar_index.py --test
+"""
+
+import os
+import sys
+import json
+import shutil
+import sqlite3
+import tempfile
+import argparse
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+pathlist = os.path.realpath(__file__).split(os.path.sep)
+RTXindex = pathlist.index("RTX")
+COHD_DATA_DIRECTORY = os.path.sep.join([*pathlist[:(RTXindex + 1)], 'code', 'ARAX', 'KnowledgeSources', 'COHD_local', 'data'])
+DEFAULT_INDEX_DIRECTORY = os.path.sep.join([COHD_DATA_DIRECTORY, 'COHD_columnar_index_v2.0'])
+DEFAULT_DATABASE_PATH = os.path.sep.join([COHD_DATA_DIRECTORY, 'COHDdatabase_v2.0.db'])
+
+METADATA_FILE_NAME = "metadata.json"
+BUILD_BATCH_SIZE = 1000000
+NUM_DATASET_SLOTS = 8  # Row keys are concept_id * NUM_DATASET_SLOTS + dataset_id (COHD's dataset ids are 1-3)
+# Column name -> dtype; 'domain_id_2' holds codes into the metadata's list of OMOP domains (-1 if unknown)
+COLUMN_DTYPES = {
+    'concept_id_1': np.int32,
+    'concept_id_2': np.int32,
+    'dataset_id': np.int8,
+    'concept_count': np.int64,
+    'concept_prevalence': np.float64,
+    'chi_square_p': np.float64,
+    'ln_ratio': np.float64,
+    'domain_id_2': np.int8,
+}
+VALUE_COLUMNS = ['concept_count', 'concept_prevalence', 'chi_square_p', 'ln_ratio']
+# Metrics that are better the smaller they are (used for top-k)
+ASCENDING_METRICS = {'chi_square_p'}
+
+
+class COHDColumnarIndex:
+
+    def __init__(self, index_directory: Optional[str] = None):
+        self.index_directory = index_directory if index_directory else DEFAULT_INDEX_DIRECTORY
+        self.columns = dict()
+        self.row_keys = None  # Sorted concept_id_1 * NUM_DATASET_SLOTS + dataset_id for each (concept, dataset) slice
+        self.indptr = None  # Slice i spans rows indptr[i]:indptr[i+1]
+        self.domains = []
+        self.is_loaded = self.load()
+
+    def load(self) -> bool:
+        metadata_path = os.path.join(self.index_directory, METADATA_FILE_NAME)
+        if not os.path.exists(metadata_path):
+            return False
+        with open(metadata_path) as metadata_file:
+            metadata = json.load(metadata_file)
+        self.domains = metadata['domains']
+        for column in COLUMN_DTYPES:
+            self.columns[column] = np.load(os.path.join(self.index_directory, f"{column}.npy"), mmap_mode='r')
+        self.row_keys = np.load(os.path.join(self.index_directory, "row_keys.npy"), mmap_mode='r')
+        self.indptr = np.load(os.path.join(self.index_directory, "indptr.npy"), mmap_mode='r')
+        return True
+
+    def get_partners(self, concept_ids: List[int], dataset_id: int = 1, domain: str = "") -> Dict[str, np.ndarray]:
+        """Get all pairs that the given concepts are part of (in either position), optionally restricted to pairs whose
+        other concept belongs to the given OMOP domain (e.g., "Condition", "Drug").
+
+        Returns:
+            dict: a dictionary of equal-length arrays: 'concept_id_1' (one of the given concepts), 'concept_id_2' (its
+                partner), 'concept_count', 'concept_prevalence', 'chi_square_p' and 'ln_ratio'
+        """
+        rows = self._get_rows(concept_ids, dataset_id)
+        if domain != "":
+            domain_code = self.domains.index(domain) if domain in self.domains else -2
+            rows = rows[self.columns['domain_id_2'][rows] == domain_code]
+        return self._get_columns(rows)
+
+    def get_pairs_between(self, concept_ids_1: List[int], concept_ids_2: List[int], dataset_id: int = 1) -> Dict[str, np.ndarray]:
+        """Get all pairs made of one concept from each of the given lists (in the same format as get_partners())."""
+        rows = self._get_rows(concept_ids_1, dataset_id)
+        rows = rows[np.isin(self.columns['concept_id_2'][rows], np.asarray(concept_ids_2, dtype=np.int64))]
+        return self._get_columns(rows)
+
+    def get_pair_stats(self, concept_id_pairs: List[Tuple[int, int]], dataset_id: int = 1) -> Dict[str, np.ndarray]:
+        """Get the stats of the given (concept_id_1, concept_id_2) pairs, aligned with the input.
+
+        Returns:
+            dict: 'found' (a boolean array marking which pairs COHD has) plus one array per value column; values for
+                pairs that weren't found are 0 (counts) or NaN
+        """
+        pairs = np.asarray(concept_id_pairs, dtype=np.int64).reshape(-1, 2)
+        results = {'found': np.zeros(len(pairs), dtype=bool)}
+        for column in VALUE_COLUMNS:
+            results[column] = np.zeros(len(pairs), dtype=np.int64) if column == 'concept_count' else np.full(len(pairs), np.nan)
+        if len(pairs) == 0 or not self.is_loaded:
+            return results
+
+        slice_positions = self._get_slice_positions(pairs[:, 0], dataset_id)
+        has_slice = slice_positions >= 0
+        concept_id_2_column = self.columns['concept_id_2']
+        for pair_index in np.flatnonzero(has_slice):
+            start = self.indptr[slice_positions[pair_index]]
+            end = self.indptr[slice_positions[pair_index] + 1]
+            # Partners within a slice are sorted, so find this one by binary search
+            offset = np.searchsorted(concept_id_2_column[start:end], pairs[pair_index, 1])
+            if start + offset < end and concept_id_2_column[start + offset] == pairs[pair_index, 1]:
+                results['found'][pair_index] = True
+                for column in VALUE_COLUMNS:
+                    results[column][pair_index] = self.columns[column][start + offset]
+        return results
+
+    def get_top_k(self, concept_ids: List[int], metric: str, k: int, dataset_id: int = 1, domain: str = "") -> Dict[str, np.ndarray]:
+        """Get the k pairs with the best value of a metric ('concept_count', 'concept_prevalence', 'chi_square_p' or
+        'ln_ratio') among all pairs the given concepts are part of (in the same format as get_partners(), sorted from
+        best to worst). Smaller chi-square p-values are better; for the other metrics, larger values are."""
+        if metric not in VALUE_COLUMNS:
+            raise ValueError(f"metric should be one of {VALUE_COLUMNS}, not {metric}")
+        partners = self.get_partners(concept_ids, dataset_id=dataset_id, domain=domain)
+        values = partners[metric] if metric in ASCENDING_METRICS else -partners[metric]
+        if k < len(values):
+            top_k = np.argpartition(values, k)[:k]
+            top_k = top_k[np.argsort(values[top_k], kind='stable')]
+        else:
+            top_k = np.argsort(values, kind='stable')
+        return {column: column_values[top_k] for column, column_values in partners.items()}
+
+    def _get_slice_positions(self, concept_ids: np.ndarray, dataset_id: int) -> np.ndarray:
+        # Returns the position of each concept's slice for the dataset in row_keys/indptr, or -1 if it has no pairs
+        keys = np.asarray(concept_ids, dtype=np.int64) * NUM_DATASET_SLOTS + dataset_id
+        positions = np.searchsorted(self.row_keys, keys)
+        in_bounds = positions < len(self.row_keys)
+        found = np.zeros(len(keys), dtype=bool)
+        found[in_bounds] = self.row_keys[positions[in_bounds]] == keys[in_bounds]
+        return np.where(found, positions, -1)
+
+    def _get_rows(self, concept_ids: List[int], dataset_id: int) -> np.ndarray:
+        if not self.is_loaded or len(concept_ids) == 0:
+            return np.zeros(0, dtype=np.int64)
+        slice_positions = self._get_slice_positions(np.unique(np.asarray(concept_ids, dtype=np.int64)), dataset_id)
+        slice_positions = slice_positions[slice_positions >= 0]
+        starts = np.asarray(self.indptr[slice_positions], dtype=np.int64)
+        lengths = np.asarray(self.indptr[slice_positions + 1], dtype=np.int64) - starts
+        # Concatenate the row ranges [start, start + length) without a Python loop
+        offsets_within_slices = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        return np.repeat(starts, lengths) + offsets_within_slices
+
+    def _get_columns(self, rows: np.ndarray) -> Dict[str, np.ndarray]:
+        columns = ['concept_id_1', 'concept_id_2'] + VALUE_COLUMNS
+        if not self.is_loaded:
+            return {column: np.zeros(0, dtype=COLUMN_DTYPES[column]) for column in columns}
+        return {column: np.asarray(self.columns[column][rows]) for column in columns}
+
+    @staticmethod
+    def build(database_path: str, index_directory: str):
+        """Builds the index files from a COHD sqlite database."""
+        print(f"INFO: Building the COHD columnar index in {index_directory} from {database_path}", flush=True)
+        connection = sqlite3.connect(f"file:{database_path}?mode=ro", uri=True)
+        cursor = connection.cursor()
+        cursor.execute("select concept_id, domain_id from CONCEPTS;")
+        concept_domains = cursor.fetchall()
+        domains = sorted({domain for _, domain in concept_domains if domain is not None})
+        domain_concept_ids = np.array([concept_id for concept_id, _ in concept_domains], dtype=np.int64)
+        domain_codes = np.array([domains.index(domain) if domain is not None else -1 for _, domain in concept_domains], dtype=np.int8)
+        domain_order = np.argsort(domain_concept_ids)
+        domain_concept_ids = domain_concept_ids[domain_order]
+        domain_codes = domain_codes[domain_order]
+
+        num_rows = cursor.execute("select count(*) from PAIRED_CONCEPT_COUNTS_ASSOCIATIONS;").fetchone()[0]
+        source_columns = ['concept_id_1', 'concept_id_2', 'dataset_id', 'concept_count', 'concept_prevalence', 'chi_square_p', 'ln_ratio']
+        arrays = {column: np.empty(num_rows, dtype=COLUMN_DTYPES[column]) for column in source_columns}
+        cursor.execute(f"select {','.join(source_columns)} from PAIRED_CONCEPT_COUNTS_ASSOCIATIONS;")
+        num_loaded = 0
+        while True:
+            batch = cursor.fetchmany(BUILD_BATCH_SIZE)
+            if len(batch) == 0:
+                break
+            for column_index, column in enumerate(source_columns):
+                values = [row[column_index] for row in batch]
+                if COLUMN_DTYPES[column] == np.float64:
+                    values = [value if value is not None else np.nan for value in values]
+                arrays[column][num_loaded:num_loaded + len(batch)] = values
+            num_loaded += len(batch)
+            print(f"{round(num_loaded * 100.0 / max(num_rows, 1), 2)}%..", end='', flush=True)
+        connection.close()
+        print("", flush=True)
+
+        # Store each pair in both orientations, so that a concept's partners are one slice regardless of position
+        both_orientations = {column: np.concatenate([values, values]) for column, values in arrays.items()}
+        both_orientations['concept_id_1'][num_rows:] = arrays['concept_id_2']
+        both_orientations['concept_id_2'][num_rows:] = arrays['concept_id_1']
+        del arrays
+        order = np.lexsort((both_orientations['concept_id_2'], both_orientations['dataset_id'], both_orientations['concept_id_1']))
+        sorted_columns = {column: values[order] for column, values in both_orientations.items()}
+        del both_orientations
+        # Drop pairs that were stored in both orientations in COHD (or pair a concept with itself)
+        is_duplicate = np.zeros(len(order), dtype=bool)
+        is_duplicate[1:] = ((sorted_columns['concept_id_1'][1:] == sorted_columns['concept_id_1'][:-1]) &
+                            (sorted_columns['dataset_id'][1:] == sorted_columns['dataset_id'][:-1]) &
+                            (sorted_columns['concept_id_2'][1:] == sorted_columns['concept_id_2'][:-1]))
+        sorted_columns = {column: values[~is_duplicate] for column, values in sorted_columns.items()}
+
+        if len(domain_concept_ids) != 0:
+            domain_positions = np.minimum(np.searchsorted(domain_concept_ids, sorted_columns['concept_id_2']), len(domain_concept_ids) - 1)
+            has_domain = domain_concept_ids[domain_positions] == sorted_columns['concept_id_2']
+            sorted_columns['domain_id_2'] = np.where(has_domain, domain_codes[domain_positions], -1)
+        else:
+            sorted_columns['domain_id_2'] = np.full(len(sorted_columns['concept_id_2']), -1)
+
+        all_keys = sorted_columns['concept_id_1'].astype(np.int64) * NUM_DATASET_SLOTS + sorted_columns['dataset_id']
+        row_keys, slice_starts = np.unique(all_keys, return_index=True)
+        indptr = np.append(slice_starts, len(all_keys)).astype(np.int64)
+
+        # Write the new index into a temporary directory next to the old one and only then move it into place, since
+        # running processes may have the old index's files memory-mapped (they keep reading the old files until reloading)
+        index_directory = os.path.abspath(index_directory)
+        os.makedirs(os.path.dirname(index_directory), exist_ok=True)
+        build_directory = tempfile.mkdtemp(prefix=f"{os.path.basename(index_directory)}.building-", dir=os.path.dirname(index_directory))
+        try:
+            for column, values in sorted_columns.items():
+                np.save(os.path.join(build_directory, f"{column}.npy"), values.astype(COLUMN_DTYPES[column]))
+            np.save(os.path.join(build_directory, "row_keys.npy"), row_keys)
+            np.save(os.path.join(build_directory, "indptr.npy"), indptr)
+            # Write the metadata last, since its presence marks the index as complete
+            with open(os.path.join(build_directory, METADATA_FILE_NAME), 'w') as metadata_file:
+                json.dump({'domains': domains, 'num_rows': int(len(all_keys)), 'source_database': os.path.basename(database_path)}, metadata_file)
+            os.chmod(build_directory, 0o755)
+            COHDColumnarIndex._replace_index_directory(build_directory, index_directory)
+        except Exception:
+            shutil.rmtree(build_directory, ignore_errors=True)
+            raise
+        print(f"INFO: Building the COHD columnar index is completed ({len(all_keys)} rows)", flush=True)
+
+    @staticmethod
+    def _replace_index_directory(build_directory: str, index_directory: str):
+        # A directory can only be renamed over a missing or empty one, so the old index is first moved aside (and then
+        # deleted; processes that still have its files memory-mapped keep them until they let go)
+        old_directory = None
+        if os.path.exists(index_directory):
+            old_directory = tempfile.mkdtemp(prefix=f"{os.path.basename(index_directory)}.old-", dir=os.path.dirname(index_directory))
+            os.replace(index_directory, os.path.join(old_directory, "index"))
+        os.replace(build_directory, index_directory)
+        if old_directory is not None:
+            shutil.rmtree(old_directory, ignore_errors=True)
+
+
+_loaded_indexes = dict()  # Maps index directory to (COHDColumnarIndex, metadata file signature)
+_loaded_indexes_lock = threading.Lock()
+
+
+def get_columnar_index(index_directory: Optional[str] = None) -> Optional[COHDColumnarIndex]:
+    """
+    Returns this process's COHDColumnarIndex for the given directory (loading it if needed, or again if it has been
+    rebuilt since), or None if no index has been built there.
+    """
+    index_directory = os.path.abspath(index_directory if index_directory else DEFAULT_INDEX_DIRECTORY)
+    try:
+        metadata_stat = os.stat(os.path.join(index_directory, METADATA_FILE_NAME))
+    except OSError:
+        return None
+    signature = (metadata_stat.st_ino, metadata_stat.st_mtime_ns)
+    with _loaded_indexes_lock:
+        index_info = _loaded_indexes.get(index_directory)
+        if index_info is None or index_info[1] != signature:
+            index_info = (COHDColumnarIndex(index_directory), signature)
+            _loaded_indexes[index_directory] = index_info
+        return index_info[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Builds or tests the columnar COHD index", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('-b', '--build', action="store_true", help="If set, (re)build the index from the COHD database", default=False)
+    parser.add_argument('-t', '--test', action="store_true", help="If set, run a test of the index by doing several lookups", default=False)
+    parser.add_argument('--database', help="Path to the COHD sqlite database", default=DEFAULT_DATABASE_PATH)
+    parser.add_argument('--index_directory', help="Directory to store the index files in", default=DEFAULT_INDEX_DIRECTORY)
+    args = parser.parse_args()
+
+    if not args.build and not args.test:
+        parser.print_help()
+        sys.exit(2)
+
+    if args.build:
+        COHDColumnarIndex.build(args.database, args.index_directory)
+
+    if args.test:
+        index = get_columnar_index(args.index_directory)
+        if index is None:
+            print(f"No index found in {args.index_directory}", flush=True)
+            sys.exit(1)
+        print("==== All partners of 192855 in the hierarchical dataset ====", flush=True)
+        print(len(index.get_partners([192855], dataset_id=3)['concept_id_2']))
+        print("==== Partners of 192855 in the Drug domain ====", flush=True)
+        print(len(index.get_partners([192855], dataset_id=3, domain="Drug")['concept_id_2']))
+        print("==== Stats for the pair (192855, 2008271) ====", flush=True)
+        print(index.get_pair_stats([(192855, 2008271)], dataset_id=3))
+        print("==== Top 10 partners of 192855 by ln_ratio ====", flush=True)
+        print(index.get_top_k([192855], 'ln_ratio', 10, dataset_id=3))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,2 +1,6 @@
 # python generate_synoym_pkl.py --NodeDescriptionFile ~/work/RTX/data/KGmetadata/NodeNamesDescriptions_KG2.tsv --CurieType "['biolink:Disease', 'biolink:PhenotypicFeature', 'biolink:ChemicalSubstance', 'biolink:Drug', 'biolink:DiseaseOrPhenotypicFeature']" --OutFile ~/work/RTX/code/ARAX/KnowledgeSources/COHD_local/data/backup/preferred_synonyms_kg2_5_0.pkl
-python OMOP_mapping_parallel.py --PKLfile ~/work/RTX/code/ARAX/KnowledgeSources/COHD_local/data/backup/preferred_synonyms_kg2_5_0.pkl --OutFile ~/work/RTX/code/ARAX/KnowledgeSources/COHD_local/data/backup/preferred_synonyms_kg2_5_0_with_concepts.pkl
\ No newline at end of file
+python OMOP_mapping_parallel.py --PKLfile ~/work/RTX/code/ARAX/KnowledgeSources/COHD_local/data/backup/preferred_synonyms_kg2_5_0.pkl --OutFile ~/work/RTX/code/ARAX/KnowledgeSources/COHD_local/data/backup/preferred_synonyms_kg2_5_0_with_concepts.pkl
+# store per-concept percentiles of paired concept frequency, ln_ratio and chi-square p-values in the COHD database (used as thresholds by the COHD querier)
+python COHDIndex.py --percentiles
+# build the memory-mapped columnar index of paired concept counts/associations (used when use_COHD_index=true)
+python COHD_columnar_index.py --build
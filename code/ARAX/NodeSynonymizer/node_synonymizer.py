@@ -13,7 +13,9 @@ import pickle
 import platform
 def eprint(*args, **kwargs): print(*args, file=sys.stderr, **kwargs)
 
-#sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../../")
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../../")
+import sqlite_connection_pool
+import database_lru_cache
 #sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/../QuestionAnswering")
 
 #import ReasoningUtilities as RU
@@ -23,6 +25,7 @@ from sri_node_normalizer import SriNodeNormalizer
 
 # Testing and debugging flags
 DEBUG = False
+
 TESTSUFFIX = ''
 #TESTSUFFIX = '_test2'
 
@@ -33,6 +36,26 @@ def sizeof(obj):
     return size
 
 
+# ################################################################################################
+# Process-wide LRU cache of get_canonical_curies() results, keyed by (uc_curie, return_type, return_all_types, kg_name).
+# Since NodeSynonymizer objects are created all over the place, the cache lives at module level so every instance
+# shares it. It is cleared automatically whenever the underlying sqlite database file changes.
+class CanonicalCuriesCache(database_lru_cache.DatabaseLRUCache):
+
+    def __init__(self, max_size=200000):
+        super().__init__(max_size)
+
+
+# Results are small nested dicts that callers sometimes modify, so hand out copies rather than the cached objects
+def copy_cached_result(value):
+    if value is None:
+        return None
+    return { key: dict(subvalue) if isinstance(subvalue, dict) else subvalue for key, subvalue in value.items() }
+
+
+canonical_curies_cache = CanonicalCuriesCache()
+
+
 # ################################################################################################
 # Main class
 class NodeSynonymizer:
@@ -54,12 +77,14 @@ class NodeSynonymizer:
         self.engine_type = "sqlite"
 
         self.connection = None
+        self.is_shared_connection = False
         self.connect()
 
 
     # ############################################################################################
-    # Create and store a database connection
-    def connect(self):
+    # Create and store a database connection. Unless a writable connection is requested (for building), use this
+    # thread's shared read-only connection to the database
+    def connect(self, read_only=True):
 
         # If already connected, don't need to do it again
         if self.connection is not None:
@@ -69,7 +94,13 @@ class NodeSynonymizer:
         if DEBUG is True:
             print("INFO: Connecting to database")
 
-        self.connection = sqlite3.connect(f"{self.databaseLocation}/{self.databaseName}")
+        database_path = f"{self.databaseLocation}/{self.databaseName}"
+        if read_only and os.path.exists(database_path):
+            self.connection = sqlite_connection_pool.get_connection(database_path)
+            self.is_shared_connection = True
+        else:
+            self.connection = sqlite3.connect(database_path)
+            self.is_shared_connection = False
 
 
     # ############################################################################################
@@ -84,7 +115,9 @@ class NodeSynonymizer:
         if DEBUG is True:
             print("INFO: Disconnecting from database")
 
-        self.connection.close()
+        # Shared connections stay open for the next NodeSynonymizer in this thread
+        if not self.is_shared_connection:
+            self.connection.close()
         self.connection = None
 
 
@@ -1270,7 +1303,7 @@ class NodeSynonymizer:
 
 
     # ############################################################################################
-    def get_canonical_curies(self, curies=None, names=None, return_all_types=False, return_type='canonical_curies', kg_name='KG2'):
+    def get_canonical_curies(self, curies=None, names=None, return_all_types=False, return_type='canonical_curies', kg_name='KG2', use_cache=True):
 
         # If the provided curies or names is just a string, turn it into a list
         if isinstance(curies,str):
@@ -1282,47 +1315,54 @@ class NodeSynonymizer:
         batches = []
         results = {}
 
-        # Make sets of comma-separated list strings for the curies and set up the results dict with all the input values
+        # Fill in whatever curies we've already looked up from the cache
+        cache_keys = {}
+        if curies is not None and use_cache:
+            canonical_curies_cache.check_database(f"{self.databaseLocation}/{self.databaseName}")
+            for curie in curies:
+                if curie is not None:
+                    cache_keys[curie] = (curie.upper(), return_type, return_all_types, kg_name)
+            cached_results = canonical_curies_cache.get_many(set(cache_keys.values()))
+            for curie, cache_key in cache_keys.items():
+                if cache_key in cached_results:
+                    results[curie] = copy_cached_result(cached_results[cache_key])
+            curies = [ curie for curie in cache_keys if curie not in results ]
+
+        # Make batches of bound-parameter values for the curies and set up the results dict with all the input values
         uc_curies = []
         curie_map = {}
-        batch_size = 0
         if curies is not None:
             for curie in curies:
                 if curie is None:
                     continue
                 results[curie] = None
                 uc_curie = curie.upper()
+                if uc_curie not in curie_map:
+                    uc_curies.append(uc_curie)
                 curie_map[uc_curie] = curie
-                uc_curie = re.sub(r"'","''",uc_curie)   # Replace embedded ' characters with ''
-                uc_curies.append(uc_curie)
-                batch_size += 1
-                if batch_size > 5000:
-                    batches.append( { 'batch_type': 'curies', 'batch_str': "','".join(uc_curies) } )
+                if len(uc_curies) == sqlite_connection_pool.MAX_SQL_PARAMETERS:
+                    batches.append( { 'batch_type': 'curies', 'batch_values': uc_curies } )
                     uc_curies = []
-                    batch_size = 0
-            if batch_size > 0:
-                batches.append( { 'batch_type': 'curies', 'batch_str': "','".join(uc_curies) } )
+            if len(uc_curies) > 0:
+                batches.append( { 'batch_type': 'curies', 'batch_values': uc_curies } )
 
-        # Make sets of comma-separated list strings for the names
+        # Make batches of bound-parameter values for the names
         lc_names = []
         name_map = {}
-        batch_size = 0
         if names is not None:
             for name in names:
                 if name is None:
                     continue
                 results[name] = None
                 lc_name = name.lower()
+                if lc_name not in name_map:
+                    lc_names.append(lc_name)
                 name_map[lc_name] = name
-                lc_name = re.sub(r"'","''",lc_name)   # Replace embedded ' characters with ''
-                lc_names.append(lc_name)
-                batch_size += 1
-                if batch_size > 5000:
-                    batches.append( { 'batch_type': 'names', 'batch_str': "','".join(lc_names) } )
+                if len(lc_names) == sqlite_connection_pool.MAX_SQL_PARAMETERS:
+                    batches.append( { 'batch_type': 'names', 'batch_values': lc_names } )
                     lc_names = []
-                    batch_size = 0
-            if batch_size > 0:
-                batches.append( { 'batch_type': 'names', 'batch_str': "','".join(lc_names) } )
+            if len(lc_names) > 0:
+                batches.append( { 'batch_type': 'names', 'batch_values': lc_names } )
 
         # Search the curie table for the provided curie
         kg_prefix = 'kg2'
@@ -1331,33 +1371,33 @@ class NodeSynonymizer:
         for batch in batches:
             #print(f"INFO: Batch {i_batch} of {batch['batch_type']}")
             #i_batch += 1
+            placeholders = ','.join( [ '?' ] * len(batch['batch_values']) )
             if batch['batch_type'] == 'curies':
                 if return_type == 'equivalent_nodes':
                     sql = f"""
                         SELECT C.curie,C.unique_concept_curie,N.curie,N.kg_presence
                           FROM {kg_prefix}_curie{TESTSUFFIX} AS C
                          INNER JOIN {kg_prefix}_node{TESTSUFFIX} AS N ON C.unique_concept_curie == N.unique_concept_curie
-                         WHERE C.uc_curie in ( '{batch['batch_str']}' )"""
+                         WHERE C.uc_curie in ( {placeholders} )"""
                 else:
                     sql = f"""
                         SELECT C.curie,C.unique_concept_curie,U.kg2_best_curie,U.name,U.type
                           FROM {kg_prefix}_curie{TESTSUFFIX} AS C
                          INNER JOIN {kg_prefix}_unique_concept{TESTSUFFIX} AS U ON C.unique_concept_curie == U.uc_curie
-                         WHERE C.uc_curie in ( '{batch['batch_str']}' )"""
+                         WHERE C.uc_curie in ( {placeholders} )"""
             else:
                 sql = f"""
                     SELECT S.name,S.unique_concept_curie,U.kg2_best_curie,U.name,U.type
                       FROM {kg_prefix}_synonym{TESTSUFFIX} AS S
                      INNER JOIN {kg_prefix}_unique_concept{TESTSUFFIX} AS U ON S.unique_concept_curie == U.uc_curie
-                     WHERE S.lc_name in ( '{batch['batch_str']}' )"""
-            #print(f"INFO: Processing {batch['batch_type']} batch: {batch['batch_str']}")
+                     WHERE S.lc_name in ( {placeholders} )"""
+            #print(f"INFO: Processing {batch['batch_type']} batch: {batch['batch_values']}")
             cursor = self.connection.cursor()
-            cursor.execute( sql )
-            rows = cursor.fetchall()
+            cursor.execute( sql, batch['batch_values'] )
 
             # Loop through all rows, building the list
             batch_curie_map = {}
-            for row in rows:
+            for row in cursor:
 
                 # If the curie or name is not found in results, try to use the curie_map{}/name_map{} to resolve capitalization issues
                 entity = row[0]
@@ -1398,21 +1438,19 @@ class NodeSynonymizer:
             # If all_types were requested, do another query for those
             if return_all_types:
 
-                # Create the SQL IN list
-                uc_curies_list = []
-                for uc_curie in batch_curie_map:
-                    uc_curie = re.sub(r"'","''",uc_curie)   # Replace embedded ' characters with ''
-                    uc_curies_list.append(uc_curie)
-                curies_list_str = "','".join(uc_curies_list)
-
-                # Get all the curies for these concepts and their types
-                sql = f"""
-                    SELECT curie,unique_concept_curie,type
-                      FROM {kg_prefix}_curie{TESTSUFFIX}
-                     WHERE unique_concept_curie IN ( '{curies_list_str}' )"""
-                cursor = self.connection.cursor()
-                cursor.execute( sql )
-                rows = cursor.fetchall()
+                # Get all the curies for these concepts and their types (names can map to several concepts, so re-batch)
+                uc_curies_list = list(batch_curie_map)
+                rows = []
+                for i_start in range(0, len(uc_curies_list), sqlite_connection_pool.MAX_SQL_PARAMETERS):
+                    uc_curies_batch = uc_curies_list[i_start:i_start + sqlite_connection_pool.MAX_SQL_PARAMETERS]
+                    placeholders = ','.join( [ '?' ] * len(uc_curies_batch) )
+                    sql = f"""
+                        SELECT curie,unique_concept_curie,type
+                          FROM {kg_prefix}_curie{TESTSUFFIX}
+                         WHERE unique_concept_curie IN ( {placeholders} )"""
+                    cursor = self.connection.cursor()
+                    cursor.execute( sql, uc_curies_batch )
+                    rows.extend(cursor)
 
                 entity_all_types = {}
                 for row in rows:
@@ -1437,10 +1475,25 @@ class NodeSynonymizer:
                     if entity in results and results[entity] is not None:
                         results[entity]['all_types'] = all_types
 
+        # Remember the newly looked-up curies (including ones that weren't found)
+        if use_cache and curies:
+            new_entries = {}
+            for curie in curies:
+                # Differently-capitalized inputs share a key; don't let an unmatched variant mask a found one
+                if results[curie] is not None or cache_keys[curie] not in new_entries:
+                    new_entries[cache_keys[curie]] = copy_cached_result(results[curie])
+            canonical_curies_cache.put_many(new_entries.items())
 
         return results
 
 
+    # ############################################################################################
+    # Return the hit/miss counters and size of the process-wide get_canonical_curies() cache
+    @staticmethod
+    def get_cache_stats():
+        return canonical_curies_cache.get_stats()
+
+
     # ############################################################################################
     # Return results in the Node Normalizer format, either from SRI or KG1 or KG2
     def get_normalizer_results(self, entities=None, kg_name='SRI'):
@@ -1967,6 +2020,8 @@ def main():
         synonymizer.remap_unique_concepts()
 
         # Skip writing for the moment while we test
+        synonymizer.disconnect()
+        synonymizer.connect(read_only=False)
         synonymizer.create_tables()
         synonymizer.store_kg_map()
         synonymizer.create_indexes()
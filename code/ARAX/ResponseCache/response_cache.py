@@ -8,10 +8,12 @@ import sys
 import re
 import json
 import ast
-from datetime import datetime
+import gzip
+from datetime import datetime, timedelta
 import pickle
 import hashlib
 import collections
+import subprocess
 import requests
 import json
 from flask import Flask,redirect
@@ -23,11 +25,13 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import desc
 from sqlalchemy import inspect
+from sqlalchemy import func
 
 from reasoner_validator import validate_Response, ValidationError
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../..")
 from RTXConfiguration import RTXConfiguration
+from database_lru_cache import get_file_signature
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../../UI/OpenAPI/python-flask-server/")
 from openapi_server.models.response import Response as Envelope
@@ -36,6 +40,41 @@ from openapi_server.models.response import Response as Envelope
 
 Base = declarative_base()
 
+#### Local data files (relative to code/ARAX) whose contents answers depend on, so that replacing one invalidates cached answers
+ANSWER_DATA_FILES = {
+    'node_synonymizer': 'NodeSynonymizer/node_synonymizer.sqlite',
+    'ngd_database': 'ARAXQuery/Overlay/ngd/curie_to_pmids.sqlite',
+    'cohd_database': 'KnowledgeSources/COHD_local/data/COHDdatabase_v2.0.db',
+    'dtd_database': 'ARAXQuery/Overlay/predictor/retrain_data/DTD_probability_database_v1.0.db',
+}
+
+
+#### Return an identifier of the code that is running: the git commit if there is one, else the newest modification time of
+#### the ARAX source files. It is determined once per process, since the modules already loaded don't change after that
+_code_revision = None
+
+def get_code_revision():
+    global _code_revision
+    if _code_revision is None:
+        arax_dir = os.path.dirname(os.path.abspath(__file__)) + '/..'
+        try:
+            _code_revision = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=arax_dir, capture_output=True, text=True,
+                                            timeout=10, check=True).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            _code_revision = ''
+        if not _code_revision:
+            latest_mtime = 0
+            for directory, subdirectories, filenames in os.walk(arax_dir):
+                for filename in filenames:
+                    if filename.endswith('.py'):
+                        try:
+                            latest_mtime = max(latest_mtime, os.stat(f"{directory}/{filename}").st_mtime_ns)
+                        except OSError:
+                            pass
+            _code_revision = f"mtime:{latest_mtime}"
+    return _code_revision
+
+
 #### Define the database tables as classes
 class Response(Base):
     __tablename__ = 'TRAPI_1_0_0_response'
@@ -46,6 +85,15 @@ class Response(Base):
     message = Column(Text, nullable=False)
     n_results = Column(Integer, nullable=False)
 
+class CachedAnswer(Base):
+    __tablename__ = 'TRAPI_1_0_0_answer_cache'
+    cache_key = Column(String(64), primary_key=True)
+    response_id = Column(Integer, ForeignKey('TRAPI_1_0_0_response.response_id'), nullable=False)
+    cached_datetime = Column(DateTime, nullable=False)
+    last_hit_datetime = Column(DateTime, nullable=True)
+    n_hits = Column(Integer, nullable=False)
+    compute_seconds = Column(Float, nullable=False)
+
 
 #### The main ResponseCache class
 class ResponseCache:
@@ -57,6 +105,9 @@ class ResponseCache:
         self.engine_type = 'sqlite'
         if self.rtxConfig.is_production_server:
             self.engine_type = 'mysql'
+        #### Cached answers expire after a while (the KPs behind them change), and only the most recently used are kept
+        self.answer_cache_ttl = timedelta(days=7)
+        self.answer_cache_max_entries = 10000
         self.connect()
 
     #### Destructor
@@ -136,7 +187,7 @@ class ResponseCache:
         self.engine = engine
 
         #### If the tables don't exist, then create the database
-        if not engine.dialect.has_table(engine, Response.__tablename__):
+        if not engine.dialect.has_table(engine, Response.__tablename__) or not engine.dialect.has_table(engine, CachedAnswer.__tablename__):
             print(f"WARNING: {self.engine_type} tables do not exist; creating them")
             Base.metadata.create_all(engine)
 
@@ -180,8 +231,8 @@ class ResponseCache:
         envelope.id = f"https://{servername}/api/arax/v1.0/response/{stored_response.response_id}"
 
         #### Instead of storing the large response object in the MySQL database as a blob
-        #### now store it as a JSON file on the filesystem
-        response_dir = os.path.dirname(os.path.abspath(__file__)) + '/../../../data/responses_1_0'
+        #### now store it as a gzipped JSON file on the filesystem, written out piece by piece
+        response_dir = self.get_response_dir()
         if not os.path.exists(response_dir):
             try:
                 os.mkdir(response_dir)
@@ -189,17 +240,182 @@ class ResponseCache:
                 eprint(f"ERROR: Unable to create dir {response_dir}")
 
         if os.path.exists(response_dir):
-            response_filename = f"{stored_response.response_id}.json"
+            response_filename = f"{stored_response.response_id}.json.gz"
             response_path = f"{response_dir}/{response_filename}"
+            #### Write to a temporary file first so that a half-written response is never served
+            partial_response_path = f"{response_path}.partial"
             try:
-                with open(response_path, 'w') as outfile:
-                    json.dump(envelope.to_dict(), outfile, sort_keys=True, indent=2)
+                with gzip.open(partial_response_path, 'wt', encoding='utf-8', compresslevel=6) as outfile:
+                    outfile.writelines(self.iter_envelope_json(envelope))
+                os.replace(partial_response_path, response_path)
             except:
                 eprint(f"ERROR: Unable to write response to file {response_path}")
 
         return stored_response.response_id
 
 
+    ##################################################################################################
+    #### Return the directory in which the response files are stored
+    def get_response_dir(self):
+        return os.path.dirname(os.path.abspath(__file__)) + '/../../../data/responses_1_0'
+
+
+    ##################################################################################################
+    #### Return the path of the file holding a stored response, or None if there is none. Responses stored
+    #### before they were compressed are still in plain .json files
+    def get_response_path(self, response_id):
+        response_dir = self.get_response_dir()
+        for response_filename in [ f"{response_id}.json.gz", f"{response_id}.json" ]:
+            response_path = f"{response_dir}/{response_filename}"
+            if os.path.exists(response_path):
+                return response_path
+        return None
+
+
+    ##################################################################################################
+    #### Serialize an envelope to JSON text, one chunk per line, without building the whole dict or string in memory.
+    #### The layout is fixed so that get_partial_response() can read a stored response back line by line:
+    #### first the envelope attributes, then the message's query_graph, then one line per result, and finally
+    #### one line per knowledge graph node and edge
+    def iter_envelope_json(self, envelope):
+
+        def to_json(value):
+            return json.dumps(value, separators=(',',':'), default=lambda obj: obj.to_dict())
+
+        def iter_container(key, items, terminator):
+            if items is None:
+                yield f"{json.dumps(key)}:null{terminator}\n"
+                return
+            is_mapping = isinstance(items, dict)
+            yield f"{json.dumps(key)}:{'{' if is_mapping else '['}\n"
+            separator = ''
+            for item in (items.items() if is_mapping else items):
+                if is_mapping:
+                    yield f"{separator}{json.dumps(item[0])}:{to_json(item[1])}"
+                else:
+                    yield f"{separator}{to_json(item)}"
+                separator = ',\n'
+            if separator:
+                yield '\n'
+            yield f"{'}' if is_mapping else ']'}{terminator}\n"
+
+        yield '{\n'
+        for attr in envelope.openapi_types:
+            if attr != 'message':
+                yield f"{json.dumps(attr)}:{to_json(getattr(envelope, attr))},\n"
+
+        message = envelope.message
+        if message is None:
+            yield '"message":null\n}\n'
+            return
+        yield '"message":{\n'
+        yield f'"query_graph":{to_json(message.query_graph)},\n'
+        yield from iter_container('results', message.results, ',')
+        knowledge_graph = message.knowledge_graph
+        if knowledge_graph is None:
+            yield '"knowledge_graph":null\n'
+        else:
+            yield '"knowledge_graph":{\n'
+            yield from iter_container('nodes', knowledge_graph.nodes, ',')
+            yield from iter_container('edges', knowledge_graph.edges, '')
+            yield '}\n'
+        yield '}\n}\n'
+
+
+    ##################################################################################################
+    #### Return the versions of the code, of the knowledge graphs behind its endpoints and of the local data files
+    #### that answers depend on. Remote KPs (e.g. BTE) and KG2 reloads behind the same endpoint are not versioned;
+    #### the answer cache TTL bounds how stale those can get
+    def get_answer_cache_versions(self):
+        versions = { 'tool_version': self.rtxConfig.version, 'code_revision': get_code_revision() }
+        for live, live_config in sorted(self.rtxConfig.config.items()):
+            if isinstance(live_config, dict) and isinstance(live_config.get('neo4j'), dict):
+                versions[live] = { 'neo4j_bolt': live_config['neo4j'].get('bolt'), 'neo4j_database': live_config['neo4j'].get('database') }
+        #### A file that is replaced or modified (e.g. a new NGD or COHD database) gets a new signature
+        arax_dir = os.path.dirname(os.path.abspath(__file__)) + '/..'
+        for data_name, data_path in ANSWER_DATA_FILES.items():
+            versions[data_name] = get_file_signature(f"{arax_dir}/{data_path}")
+        return versions
+
+
+    ##################################################################################################
+    #### Compute the content-addressed key of the answer to a list of parsed actions run on an input message
+    def get_answer_cache_key(self, actions, message):
+        #### return() only affects how the answer is sent back, so it is left out. Serializing with sorted keys
+        #### and no whitespace makes the key independent of parameter order and formatting in the input
+        normalized_actions = [ { 'command': action['command'], 'parameters': action['parameters'] }
+            for action in actions if action['command'] != 'return' ]
+        if message is not None and hasattr(message, 'to_dict'):
+            message = message.to_dict()
+        canonical_query = { 'actions': normalized_actions, 'message': message, 'versions': self.get_answer_cache_versions() }
+        canonical_query_str = json.dumps(canonical_query, sort_keys=True, separators=(',',':'), default=str)
+        return hashlib.sha256(canonical_query_str.encode('utf-8')).hexdigest()
+
+
+    ##################################################################################################
+    #### Remember a stored response as the answer for a cache key
+    def add_cached_answer(self, cache_key, response_id, compute_seconds):
+        session = self.session
+        session.merge(CachedAnswer(cache_key=cache_key, response_id=response_id, cached_datetime=datetime.now(),
+            last_hit_datetime=None, n_hits=0, compute_seconds=compute_seconds))
+        session.commit()
+        self.evict_cached_answers()
+
+
+    ##################################################################################################
+    #### Look up the answer for a cache key. Returns a (response_id, envelope dict) tuple or None if there is no live entry
+    def get_cached_answer(self, cache_key, response=None):
+        session = self.session
+        cached_answer = session.query(CachedAnswer).filter(CachedAnswer.cache_key==cache_key).first()
+        if cached_answer is None:
+            session.commit()  # Don't leave the lookup's transaction open
+            return None
+
+        now = datetime.now()
+        if now - cached_answer.cached_datetime > self.answer_cache_ttl:
+            session.delete(cached_answer)
+            session.commit()
+            return None
+
+        envelope = self.get_response(cached_answer.response_id)
+        if not isinstance(envelope, dict) or 'message' not in envelope:
+            eprint(f"ERROR: Cached answer {cache_key} points to response_id {cached_answer.response_id}, which cannot be read. Dropping it")
+            session.delete(cached_answer)
+            session.commit()
+            return None
+
+        cached_answer.n_hits += 1
+        cached_answer.last_hit_datetime = now
+        session.commit()
+        if response is not None:
+            response.info(f"Found a cached answer (response_id {cached_answer.response_id}, computed {cached_answer.cached_datetime.isoformat()} in "
+                f"{round(cached_answer.compute_seconds, 1)} seconds, now hit {cached_answer.n_hits} times)")
+        return cached_answer.response_id, envelope
+
+
+    ##################################################################################################
+    #### Drop expired cached answers, and then the least recently used ones beyond the maximum number of entries
+    def evict_cached_answers(self):
+        session = self.session
+        n_evicted = session.query(CachedAnswer).filter(CachedAnswer.cached_datetime < datetime.now() - self.answer_cache_ttl).delete(synchronize_session=False)
+        n_excess_entries = session.query(CachedAnswer).count() - self.answer_cache_max_entries
+        if n_excess_entries > 0:
+            last_used_datetime = func.coalesce(CachedAnswer.last_hit_datetime, CachedAnswer.cached_datetime)
+            excess_keys = [ row.cache_key for row in session.query(CachedAnswer.cache_key).order_by(last_used_datetime).limit(n_excess_entries) ]
+            n_evicted += session.query(CachedAnswer).filter(CachedAnswer.cache_key.in_(excess_keys)).delete(synchronize_session=False)
+        session.commit()
+        return n_evicted
+
+
+    ##################################################################################################
+    #### Summarize how the answer cache is doing
+    def get_answer_cache_stats(self):
+        session = self.session
+        n_entries, n_hits, seconds_saved = session.query(func.count(CachedAnswer.cache_key), func.sum(CachedAnswer.n_hits),
+            func.sum(CachedAnswer.n_hits * CachedAnswer.compute_seconds)).one()
+        return { 'n_entries': n_entries, 'n_hits': n_hits or 0, 'seconds_saved': round(seconds_saved or 0.0, 1) }
+
+
     ##################################################################################################
     #### Fetch a cached response
     def get_response(self, response_id):
@@ -216,11 +432,9 @@ class ResponseCache:
             #### Find the response
             stored_response = session.query(Response).filter(Response.response_id==int(response_id)).first()
             if stored_response is not None:
-                response_dir = os.path.dirname(os.path.abspath(__file__)) + '/../../../data/responses_1_0'
-                response_filename = f"{stored_response.response_id}.json"
-                response_path = f"{response_dir}/{response_filename}"
+                response_path = self.get_response_path(stored_response.response_id)
                 try:
-                    with open(response_path) as infile:
+                    with (gzip.open if response_path.endswith('.gz') else open)(response_path, 'rt', encoding='utf-8') as infile:
                         return json.load(infile)
                 except:
                     eprint(f"ERROR: Unable to read response from file '{response_path}'")
@@ -323,6 +537,159 @@ class ResponseCache:
         return( { "status": 404, "title": "UnrecognizedResponse_idFormat", "detail": "Unrecognized response_id format", "type": "about:blank" }, 404)
 
 
+    ##################################################################################################
+    #### Stream a locally stored response as bytes, without deserializing it. Returns a (chunk iterator, content encoding)
+    #### tuple, where the encoding is 'gzip' if the compressed file is passed through as is, or None if there is no such file
+    def get_response_stream(self, response_id, accept_gzip=False, chunk_size=1024*1024):
+        response_id = str(response_id)
+        if not re.match(r'\d+\s*$',response_id):
+            return None
+        response_path = self.get_response_path(int(response_id))
+        if response_path is None:
+            return None
+
+        content_encoding = None
+        if response_path.endswith('.gz'):
+            if accept_gzip:
+                content_encoding = 'gzip'
+                infile = open(response_path, 'rb')
+            else:
+                infile = gzip.open(response_path, 'rb')
+        else:
+            infile = open(response_path, 'rb')
+
+        def iter_chunks():
+            with infile:
+                while True:
+                    chunk = infile.read(chunk_size)
+                    if not chunk:
+                        break
+                    yield chunk
+
+        return iter_chunks(), content_encoding
+
+
+    ##################################################################################################
+    #### Fetch part of a response: the envelope with only its first max_results results and the knowledge graph nodes
+    #### and edges they bind (max_results=0 gives just a summary). Compressed local responses are read line by line, only
+    #### deserializing what is kept, and stop early where possible. Anything else is fetched whole and then cut down
+    def get_partial_response(self, response_id, max_results=0):
+        session = self.session
+        envelope = None
+        n_results = None
+
+        if response_id is not None and re.match(r'\d+\s*$',str(response_id)):
+            stored_response = session.query(Response).filter(Response.response_id==int(response_id)).first()
+            session.commit()
+            response_path = None
+            if stored_response is not None:
+                response_path = self.get_response_path(stored_response.response_id)
+            if response_path is not None and response_path.endswith('.gz'):
+                try:
+                    envelope = self.read_partial_response(response_path, max_results)
+                    n_results = stored_response.n_results
+                except (ValueError, StopIteration, EOFError, OSError) as error:
+                    eprint(f"ERROR: Unable to read part of response from file '{response_path}' ({error}); reading all of it")
+                    envelope = None
+
+        if envelope is None:
+            envelope = self.get_response(response_id)
+            if not isinstance(envelope, dict) or not isinstance(envelope.get('message'), dict):
+                return envelope
+            message = envelope['message']
+            if message.get('results') is not None:
+                n_results = len(message['results'])
+                message['results'] = message['results'][:max_results]
+            if isinstance(message.get('knowledge_graph'), dict):
+                node_keys, edge_keys = self.get_bound_keys(message.get('results') or [])
+                knowledge_graph = message['knowledge_graph']
+                for container, bound_keys in [ ('nodes', node_keys), ('edges', edge_keys) ]:
+                    if knowledge_graph.get(container) is not None:
+                        knowledge_graph[container] = { key: value for key, value in knowledge_graph[container].items() if key in bound_keys }
+
+        if isinstance(envelope.get('message'), dict) and n_results is not None:
+            if envelope.get('logs') is None:
+                envelope['logs'] = []
+            envelope['logs'].append( { "code": 'PartialResponse', "level": "INFO", "timestamp": str(datetime.now().isoformat()),
+                "message": f"Showing only the first {len(envelope['message'].get('results') or [])} of {n_results} results and the knowledge graph nodes and edges they bind" } )
+        return envelope
+
+
+    ##################################################################################################
+    #### Read the first max_results results of a compressed response written by iter_envelope_json(), and the knowledge graph
+    #### nodes and edges they bind. Raises ValueError if the file is not laid out as expected
+    def read_partial_response(self, response_path, max_results):
+        decoder = json.JSONDecoder()
+        with gzip.open(response_path, 'rt', encoding='utf-8') as infile:
+            lines = ( line.rstrip('\n').rstrip(',') for line in infile )
+            if next(lines) != '{':
+                raise ValueError(f"{response_path} is not laid out one component per line")
+
+            #### Envelope attributes, one per line, until the message
+            envelope = {}
+            for line in lines:
+                if line == '}':
+                    return envelope
+                if line == '"message":{':
+                    break
+                envelope.update(json.loads('{' + line + '}'))
+            message = json.loads('{' + next(lines) + '}')
+            envelope['message'] = message
+
+            #### Results, one per line. Only the ones kept are deserialized
+            line = next(lines)
+            if line != '"results":[':
+                message.update(json.loads('{' + line + '}'))
+                results = []
+            else:
+                results = []
+                message['results'] = results
+                for line in lines:
+                    if line == ']':
+                        break
+                    if len(results) < max_results:
+                        results.append(json.loads(line))
+
+            #### Knowledge graph nodes and edges, one per line. Only the ones the results bind are deserialized,
+            #### so if there are no results, there is no need to read them at all
+            line = next(lines)
+            if line != '"knowledge_graph":{':
+                message.update(json.loads('{' + line + '}'))
+                return envelope
+            knowledge_graph = {}
+            message['knowledge_graph'] = knowledge_graph
+            if len(results) == 0:
+                knowledge_graph.update({ 'nodes': {}, 'edges': {} })
+                return envelope
+            node_keys, edge_keys = self.get_bound_keys(results)
+            for container, bound_keys in [ ('nodes', node_keys), ('edges', edge_keys) ]:
+                line = next(lines)
+                if line != f'"{container}":{{':
+                    knowledge_graph.update(json.loads('{' + line + '}'))
+                    continue
+                knowledge_graph[container] = {}
+                for line in lines:
+                    if line == '}':
+                        break
+                    key, key_end = decoder.raw_decode(line)
+                    if key in bound_keys:
+                        knowledge_graph[container][key] = json.loads(line[key_end+1:])
+            return envelope
+
+
+    ##################################################################################################
+    #### Return the sets of knowledge graph node and edge keys bound by a list of result dicts
+    def get_bound_keys(self, results):
+        node_keys = set()
+        edge_keys = set()
+        for result in results:
+            for bound_keys, bindings in [ (node_keys, result.get('node_bindings')), (edge_keys, result.get('edge_bindings')) ]:
+                for binding_list in (bindings or {}).values():
+                    for binding in binding_list or []:
+                        bound_keys.add(binding.get('id'))
+        return node_keys, edge_keys
+
+
 ############################################ Main ############################################################
 
 #### If this class is run from the command line, perform a short little test to see if it is working correctly
@@ -332,12 +699,18 @@ def main():
     import argparse
     argparser = argparse.ArgumentParser(description='CLI testing of the ResponseCache class')
     argparser.add_argument('--verbose', action='count', help='If set, print more information about ongoing processing' )
+    argparser.add_argument('--answer_cache_stats', action='store_true', help='If set, print a summary of the answer cache and exit' )
+    argparser.add_argument('--max_results', type=int, help='If set, only read and display the first N results of the response (0 for a summary)' )
     argparser.add_argument('response_id', type=str, nargs='*', help='Integer number of a response to read and display')
     params = argparser.parse_args()
 
     #### Create a new ResponseStore object
     response_cache = ResponseCache()
 
+    if params.answer_cache_stats:
+        print(json.dumps(response_cache.get_answer_cache_stats(), sort_keys=True, indent=2))
+        return
+
     #### Get the session handle
     session = response_cache.session
 
@@ -349,7 +722,10 @@ def main():
 
     else:
         print(f"Content of response_id {params.response_id[0]}:")
-        envelope = response_cache.get_response(params.response_id[0])
+        if params.max_results is not None:
+            envelope = response_cache.get_partial_response(params.response_id[0], params.max_results)
+        else:
+            envelope = response_cache.get_response(params.response_id[0])
 
         #print(json.dumps(ast.literal_eval(repr(envelope)), sort_keys=True, indent=2))
         print(json.dumps(envelope, sort_keys=True, indent=2))
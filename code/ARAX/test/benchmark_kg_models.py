@@ -0,0 +1,89 @@
+#!/bin/env python3
+"""
+Measures the memory footprint and construction time of a large knowledge graph built out of the TRAPI model classes
+(Node, Edge, Attribute) through KGQuerier._load_answers_into_kg(), fed synthetic KG2c-style neo4j results for a
+single n00--e00--n01 query edge. Run it against different versions of the openapi_server models to compare them.
+Usage: python3 benchmark_kg_models.py [--num_edges 100000 500000] [--nodes_per_edge 0.2]
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+from typing import Dict, List
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../ARAXQuery/")
+from ARAX_response import ARAXResponse
+from Expand.kg_querier import KGQuerier
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../../UI/OpenAPI/python-flask-server/")
+from openapi_server.models.query_graph import QueryGraph
+from openapi_server.models.q_node import QNode
+from openapi_server.models.q_edge import QEdge
+
+
+def _create_synthetic_neo4j_results(num_edges: int, num_nodes: int) -> List[Dict[str, List[Dict[str, any]]]]:
+    # Mimics the results table KGQuerier gets back from KG2c for a one-hop query (one column per qnode/qedge)
+    def create_node(curie: str) -> Dict[str, any]:
+        return {"id": curie, "name": f"name of {curie}", "types": ["biolink:Protein"],
+                "description": f"A description of {curie}", "uri": f"https://identifiers.org/{curie}",
+                "equivalent_curies": str([curie, f"ALT:{curie}"]), "publications": str([f"PMID:{random.randrange(10**7)}"]),
+                "all_names": str([f"name of {curie}"])}
+    n00_curies = [f"N00:{number}" for number in range(num_nodes // 2)]
+    n01_curies = [f"N01:{number}" for number in range(num_nodes - len(n00_curies))]
+    edges = []
+    for edge_number in range(num_edges):
+        subject, object = random.choice(n00_curies), random.choice(n01_curies)
+        edges.append({"id": edge_number, "simplified_edge_label": "biolink:interacts_with", "subject": subject,
+                      "object": object, "provided_by": str(["SEMMEDDB:"]),
+                      "publications": str([f"PMID:{random.randrange(10**7)}" for _ in range(random.randrange(1, 4))]),
+                      "n00": subject, "n01": object})
+    return [{"nodes_n00": [create_node(curie) for curie in n00_curies],
+             "nodes_n01": [create_node(curie) for curie in n01_curies],
+             "edges_e00": edges}]
+
+
+def _load_answers_into_kg(kg_querier: KGQuerier, neo4j_results: List[Dict[str, List[Dict[str, any]]]],
+                          qg: QueryGraph, log: ARAXResponse):
+    answer_kg, _ = kg_querier._load_answers_into_kg(neo4j_results, "KG2c", qg, log)
+    return answer_kg
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--num_edges", type=int, nargs="+", default=[100000, 500000])
+    arg_parser.add_argument("--nodes_per_edge", type=float, default=0.2, help="Number of distinct nodes per edge")
+    args = arg_parser.parse_args()
+    random.seed(0)
+
+    qg = QueryGraph(nodes={"n00": QNode(), "n01": QNode()}, edges={"e00": QEdge(subject="n00", object="n01")})
+    log = ARAXResponse()
+    log.data["parameters"] = {"enforce_directionality": False, "use_synonyms": True}
+    kg_querier = KGQuerier(log, "ARAX/KG2")
+
+    for num_edges in args.num_edges:
+        neo4j_results = _create_synthetic_neo4j_results(num_edges, max(int(num_edges * args.nodes_per_edge), 2))
+        gc.collect()
+        start = time.time()
+        answer_kg = _load_answers_into_kg(kg_querier, neo4j_results, qg, log)
+        build_time = time.time() - start
+        num_nodes = sum(len(nodes) for nodes in answer_kg.nodes_by_qg_id.values())
+        del answer_kg
+        gc.collect()
+
+        # Measure memory separately from the timing, since tracemalloc slows things down considerably
+        tracemalloc.start()
+        answer_kg = _load_answers_into_kg(kg_querier, neo4j_results, qg, log)
+        retained, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del answer_kg
+        gc.collect()
+
+        print(f"{num_edges} edges, {num_nodes} nodes: built in {round(build_time, 2)}s; "
+              f"{round(retained / 1024 / 1024, 1)} MB retained ({round(retained / num_edges)} bytes per edge), "
+              f"{round(peak / 1024 / 1024, 1)} MB peak")
+
+
+if __name__ == "__main__":
+    main()
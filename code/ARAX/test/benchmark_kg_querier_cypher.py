@@ -0,0 +1,75 @@
+#!/bin/env python3
+"""
+Compares neo4j planning time for KGQuerier's one-hop cypher with curies inlined into the query text (the old way)
+vs. passed in as parameters (the current way). Each trial uses a different set of curies, so the inlined queries are
+all distinct strings (and must each be planned) while the parameterized queries share one cached plan.
+Usage: python3 benchmark_kg_querier_cypher.py [--kg KG2c] [--num_curies 5000] [--trials 5]
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+from typing import Dict
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../ARAXQuery/")
+from ARAX_response import ARAXResponse
+from Expand.kg_querier import KGQuerier
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../../")
+import neo4j_driver_pool
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../../UI/OpenAPI/python-flask-server/")
+from openapi_server.models.query_graph import QueryGraph
+from openapi_server.models.q_node import QNode
+from openapi_server.models.q_edge import QEdge
+
+
+def _inline_parameters(cypher_query: str, parameters: Dict[str, any]) -> str:
+    # Recreates the old style of query, where curie/category lists were interpolated straight into the cypher
+    return re.sub(r"\$(\w+)", lambda match: json.dumps(parameters[match.group(1)]).replace('"', "'"), cypher_query)
+
+
+def _time_explain(cypher_query: str, parameters: Dict[str, any], live: str) -> float:
+    start = time.time()
+    neo4j_driver_pool.run_read_query(f"EXPLAIN {cypher_query}", live=live, parameters=parameters)
+    return time.time() - start
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--kg", default="KG2c", choices=["KG1", "KG2", "KG2c"])
+    arg_parser.add_argument("--num_curies", type=int, default=5000)
+    arg_parser.add_argument("--trials", type=int, default=5)
+    args = arg_parser.parse_args()
+    live = args.kg.upper() if "KG2" in args.kg else None
+
+    # Grab a pool of real curies to draw from, so the planner sees realistic inputs
+    print(f"Grabbing curies from {args.kg}..")
+    curie_pool = [row["id"] for row in neo4j_driver_pool.run_read_query(
+        f"MATCH (n) RETURN n.id AS id LIMIT {args.num_curies * (args.trials + 1)}", live=live)]
+
+    response = ARAXResponse()
+    response.data["parameters"] = {"enforce_directionality": False, "use_synonyms": args.kg == "KG2c"}
+    kg_querier = KGQuerier(response, "ARAX/KG2" if "KG2" in args.kg else "ARAX/KG1")
+    kg_querier.unwind_curie_threshold = args.num_curies + 1  # Compare like with like (no UNWIND) by default
+
+    inlined_times = []
+    parameterized_times = []
+    for trial in range(args.trials):
+        curies = random.sample(curie_pool, args.num_curies)
+        qg = QueryGraph(nodes={"n00": QNode(id=curies), "n01": QNode(category=["biolink:Protein", "biolink:Gene"])},
+                        edges={"e00": QEdge(subject="n00", object="n01")})
+        cypher_query, parameters = kg_querier._convert_one_hop_query_graph_to_cypher_query(qg, False, kg_querier.kg_name, response)
+        inlined_times.append(_time_explain(_inline_parameters(cypher_query, parameters), dict(), live))
+        parameterized_times.append(_time_explain(cypher_query, parameters, live))
+        print(f"  Trial {trial}: inlined {round(inlined_times[-1], 3)}s, parameterized {round(parameterized_times[-1], 3)}s")
+
+    print(f"Mean planning time over {args.trials} trials with {args.num_curies} curies:")
+    print(f"  inlined: {round(sum(inlined_times) / len(inlined_times), 3)}s")
+    print(f"  parameterized: {round(sum(parameterized_times) / len(parameterized_times), 3)}s "
+          f"(after first trial: {round(sum(parameterized_times[1:]) / max(len(parameterized_times) - 1, 1), 3)}s)")
+
+
+if __name__ == "__main__":
+    main()
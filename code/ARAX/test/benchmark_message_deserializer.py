@@ -0,0 +1,78 @@
+#!/bin/env python3
+"""
+Compares how long it takes to turn a large TRAPI message dict (as loaded from a stored response or an upload) into the
+openapi_server model objects via the generic, reflective util.deserialize_model() and via Message.from_dict(), which
+uses the Message-specific message_deserializer. It also checks that both give the same objects.
+Usage: python3 benchmark_message_deserializer.py [--num_edges 100000] [--nodes_per_edge 0.2] [--num_results 10000]
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+from typing import Dict
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../../UI/OpenAPI/python-flask-server/")
+from openapi_server import util
+from openapi_server.models.message import Message
+
+
+def _create_synthetic_message(num_edges: int, num_nodes: int, num_results: int) -> Dict[str, any]:
+    # Mimics a stored ARAX answer to a one-hop n00--e00--n01 query, attributes and all
+    curies = [f"CURIE:{number}" for number in range(num_nodes)]
+    nodes = {curie: {"name": f"name of {curie}", "category": ["biolink:Protein"],
+                     "attributes": [{"name": "description", "type": "NCIT:C60832", "value": f"A description of {curie}"},
+                                    {"name": "pubmed_ids", "type": "EDAM:data_1187", "url": None,
+                                     "value": [f"PMID:{random.randrange(10**7)}"]}]}
+             for curie in curies}
+    edges = {}
+    for edge_number in range(num_edges):
+        edges[f"KG2:{edge_number}"] = {"predicate": "biolink:interacts_with", "relation": "SEMMEDDB:interacts_with",
+                                       "subject": random.choice(curies), "object": random.choice(curies),
+                                       "attributes": [{"name": "provided_by", "type": "biolink:provided_by",
+                                                       "value": "SEMMEDDB:", "source": "ARAX/KG2"},
+                                                      {"name": "probability", "type": "EDAM:data_0951",
+                                                       "value": random.random(), "source": "ARAX/KG2"}]}
+    edge_keys = list(edges)
+    results = []
+    for result_number in range(num_results):
+        edge_key = random.choice(edge_keys)
+        results.append({"id": f"result_{result_number}", "essence": edges[edge_key]["object"], "confidence": random.random(),
+                        "row_data": [result_number, "biolink:Protein"], "reasoner_id": "ARAX",
+                        "node_bindings": {"n00": [{"id": edges[edge_key]["subject"]}], "n01": [{"id": edges[edge_key]["object"]}]},
+                        "edge_bindings": {"e00": [{"id": edge_key}]}})
+    return {"query_graph": {"nodes": {"n00": {"id": "CURIE:0"}, "n01": {"category": "biolink:Protein"}},
+                            "edges": {"e00": {"subject": "n00", "object": "n01"}}},
+            "knowledge_graph": {"nodes": nodes, "edges": edges},
+            "results": results}
+
+
+def _time_call(function, *args) -> (any, float):
+    gc.collect()
+    start = time.time()
+    return_value = function(*args)
+    return return_value, time.time() - start
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--num_edges", type=int, nargs="+", default=[100000])
+    arg_parser.add_argument("--nodes_per_edge", type=float, default=0.2, help="Number of distinct nodes per edge")
+    arg_parser.add_argument("--num_results", type=int, default=10000)
+    args = arg_parser.parse_args()
+    random.seed(0)
+
+    for num_edges in args.num_edges:
+        message_dict = _create_synthetic_message(num_edges, max(int(num_edges * args.nodes_per_edge), 2), args.num_results)
+        generic_message, generic_time = _time_call(util.deserialize_model, message_dict, Message)
+        message, time_taken = _time_call(Message.from_dict, message_dict)
+        assert message == generic_message, "Message.from_dict() and util.deserialize_model() gave different messages"
+        print(f"{num_edges} edges, {len(message.knowledge_graph.nodes)} nodes, {len(message.results)} results: "
+              f"util.deserialize_model() took {round(generic_time, 2)}s, Message.from_dict() took {round(time_taken, 2)}s "
+              f"({round(generic_time / time_taken, 1)}x faster)")
+        del generic_message, message
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/bin/env python3
+"""
+Compares NodeSynonymizer.get_canonical_curies() (which binds curies as query parameters, in batches) against the old
+approach of string-joining escaped curie literals into batches of 5,000 for 'WHERE C.uc_curie in (...)'. Both paths
+run against the same sqlite file, with the get_canonical_curies() cache disabled, and their results are compared.
+Usage: python3 benchmark_node_synonymizer_lookup.py [--num_curies 100000] [--return_all_types] [--database path]
+"""
+import argparse
+import os
+import re
+import sys
+import time
+import tracemalloc
+from typing import Dict, List
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../NodeSynonymizer/")
+from node_synonymizer import NodeSynonymizer
+
+
+def _get_canonical_curies_using_sql_literals(synonymizer: NodeSynonymizer, curies: List[str],
+                                             return_all_types: bool) -> Dict[str, any]:
+    # The old lookup path (for curies and return_type='canonical_curies'), kept here for comparison
+    results = {curie: None for curie in curies}
+    curie_map = {curie.upper(): curie for curie in curies}
+    escaped_curies = [re.sub(r"'", "''", curie.upper()) for curie in curies]
+    batch_strs = ["','".join(escaped_curies[i:i + 5001]) for i in range(0, len(escaped_curies), 5001)]
+    for batch_str in batch_strs:
+        sql = f"""
+            SELECT C.curie,C.unique_concept_curie,U.kg2_best_curie,U.name,U.type
+              FROM kg2_curie AS C
+             INNER JOIN kg2_unique_concept AS U ON C.unique_concept_curie == U.uc_curie
+             WHERE C.uc_curie in ( '{batch_str}' )"""
+        cursor = synonymizer.connection.cursor()
+        cursor.execute(sql)
+        batch_curie_map = {}
+        for row in cursor.fetchall():
+            entity = row[0] if row[0] in results else curie_map.get(row[0].upper(), row[0])
+            if entity in results:
+                batch_curie_map.setdefault(row[1], {})[entity] = 1
+                results[entity] = {'preferred_curie': row[2], 'preferred_name': row[3], 'preferred_type': row[4]}
+        if return_all_types:
+            concepts_str = "','".join(re.sub(r"'", "''", concept) for concept in batch_curie_map)
+            cursor = synonymizer.connection.cursor()
+            cursor.execute(f"SELECT curie,unique_concept_curie,type FROM kg2_curie WHERE unique_concept_curie IN ( '{concepts_str}' )")
+            for row in cursor.fetchall():
+                for entity in batch_curie_map[row[1]]:
+                    all_types = results[entity].setdefault('all_types', {})
+                    all_types[row[2]] = all_types.get(row[2], 0) + 1
+    return results
+
+
+def _time_call(function, *args) -> (float, any):
+    start = time.time()
+    output = function(*args)
+    return time.time() - start, output
+
+
+def _get_peak_memory_mb(function, *args) -> float:
+    # Run separately from the timing, since tracemalloc slows things down considerably
+    tracemalloc.start()
+    function(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024 / 1024
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--num_curies", type=int, default=100000)
+    arg_parser.add_argument("--return_all_types", action="store_true", default=False)
+    arg_parser.add_argument("--database", help="Path to a node_synonymizer.sqlite (defaults to the standard one)")
+    args = arg_parser.parse_args()
+
+    synonymizer = NodeSynonymizer()
+    if args.database:
+        synonymizer.disconnect()
+        synonymizer.databaseLocation, synonymizer.databaseName = os.path.split(os.path.abspath(args.database))
+        synonymizer.connect()
+    cursor = synonymizer.connection.cursor()
+    cursor.execute(f"SELECT curie FROM kg2_curie ORDER BY RANDOM() LIMIT {args.num_curies}")
+    curies = [row[0] for row in cursor.fetchall()]
+    curies += [f"FAKE:{i}" for i in range(args.num_curies - len(curies))]  # Pad with misses if the db is small
+    print(f"Looking up {len(curies)} curies (return_all_types={args.return_all_types})..")
+
+    def run_new_path():
+        return synonymizer.get_canonical_curies(curies, return_all_types=args.return_all_types, use_cache=False)
+    old_time, old_results = _time_call(_get_canonical_curies_using_sql_literals, synonymizer, curies, args.return_all_types)
+    new_time, new_results = _time_call(run_new_path)
+    old_peak = _get_peak_memory_mb(_get_canonical_curies_using_sql_literals, synonymizer, curies, args.return_all_types)
+    new_peak = _get_peak_memory_mb(run_new_path)
+    print(f"  SQL literals: {round(old_time, 3)}s (peak memory {round(old_peak, 1)} MB)")
+    print(f"  bound parameters: {round(new_time, 3)}s (peak memory {round(new_peak, 1)} MB)")
+    print(f"  results match: {old_results == new_results}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/bin/env python3
+"""
+Compares resultify's edge-binding stage (which indexes KG edges by integer (qedge, subject, object) node index tuples
+and, for each result, walks only the edges incident to the smaller of each qedge's two node sets) against the old
+approach of indexing edges by "subject--object" strings and checking every possible node pair of every result. Both
+run on the same node bindings, computed once for a synthetic KG of each requested size, and their results are compared.
+The synthetic query graph is n00 -- n01 (is_set) -- n02 (is_set), with one result per n00 node.
+Usage: python3 benchmark_resultify_edge_binding.py [--num_edges 10000 100000 1000000] [--num_results 20]
+                                                   [--set_size 100] [--max_old_edges 10000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from typing import Dict, List, Set, Tuple
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../ARAXQuery/")
+import ARAX_resultify
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../../UI/OpenAPI/python-flask-server/")
+from openapi_server.models.edge import Edge
+from openapi_server.models.knowledge_graph import KnowledgeGraph
+from openapi_server.models.node import Node
+from openapi_server.models.q_edge import QEdge
+from openapi_server.models.q_node import QNode
+from openapi_server.models.query_graph import QueryGraph
+
+
+def _create_synthetic_kg(num_edges: int, num_results: int, set_size: int) -> Tuple[KnowledgeGraph, QueryGraph]:
+    # Each n00 node links to set_size random n01 nodes; all other edges link random n01 and n02 nodes (a third of them
+    # pointing 'backwards', so that ignore_edge_direction matters)
+    qg = QueryGraph(nodes={"n00": QNode(is_set=False), "n01": QNode(is_set=True), "n02": QNode(is_set=True)},
+                    edges={"e00": QEdge(subject="n00", object="n01"), "e01": QEdge(subject="n01", object="n02")})
+    num_nodes_by_qnode_key = {"n00": num_results, "n01": set_size * 10, "n02": set_size * 10}
+    nodes = dict()
+    for qnode_key, num_nodes in num_nodes_by_qnode_key.items():
+        for node_number in range(num_nodes):
+            node = Node()
+            node.qnode_keys = [qnode_key]
+            nodes[f"{qnode_key}:{node_number}"] = node
+    edges = dict()
+    for node_number in range(num_results):
+        for n01_node_number in random.sample(range(num_nodes_by_qnode_key["n01"]), set_size):
+            edge = Edge(subject=f"n00:{node_number}", object=f"n01:{n01_node_number}")
+            edge.qedge_keys = ["e00"]
+            edges[f"e00:{len(edges)}"] = edge
+    while len(edges) < num_edges:
+        node_keys = [f"n01:{random.randrange(num_nodes_by_qnode_key['n01'])}", f"n02:{random.randrange(num_nodes_by_qnode_key['n02'])}"]
+        if random.random() < 1 / 3:
+            node_keys.reverse()
+        edge = Edge(subject=node_keys[0], object=node_keys[1])
+        edge.qedge_keys = ["e01"]
+        edges[f"e01:{len(edges)}"] = edge
+    return KnowledgeGraph(nodes=nodes, edges=edges), qg
+
+
+def _bind_edges_using_string_pairs(kg: KnowledgeGraph, qg: QueryGraph, node_bindings: List[Dict[str, Set[str]]],
+                                   ignore_edge_direction: bool) -> List[Dict[str, Set[str]]]:
+    # The old edge-binding stage of _create_result_graphs(), kept here for comparison
+    edges_by_node_pairs = {qedge_key: dict() for qedge_key in qg.edges}
+    for edge_key, edge in kg.edges.items():
+        for qedge_key in edge.qedge_keys:
+            if qedge_key in set(qg.edges):
+                edges_by_node_pairs[qedge_key].setdefault(f"{edge.subject}--{edge.object}", set()).add(edge_key)
+                if ignore_edge_direction:
+                    edges_by_node_pairs[qedge_key].setdefault(f"{edge.object}--{edge.subject}", set()).add(edge_key)
+    edge_bindings = []
+    for result_node_bindings in node_bindings:
+        result_edge_bindings = {qedge_key: set() for qedge_key in qg.edges}
+        for qedge_key, qedge in qg.edges.items():
+            possible_node_pairs = {f"{node_1}--{node_2}" for node_1 in result_node_bindings[qedge.subject]
+                                   for node_2 in result_node_bindings[qedge.object]}
+            for node_pair in possible_node_pairs:
+                result_edge_bindings[qedge_key] = result_edge_bindings[qedge_key].union(edges_by_node_pairs[qedge_key].get(node_pair, set()))
+        edge_bindings.append(result_edge_bindings)
+    return edge_bindings
+
+
+def _bind_edges_using_node_indexes(kg: KnowledgeGraph, qg: QueryGraph, node_index_result_graphs: List[Dict[str, any]],
+                                   kg_node_indexes_by_qg_key: Dict[str, Dict[str, int]],
+                                   ignore_edge_direction: bool) -> List[Dict[str, Set[str]]]:
+    kg_edge_index = ARAX_resultify._get_kg_edge_index(kg_node_indexes_by_qg_key, kg, qg, ignore_edge_direction)
+    return [{qedge_key: ARAX_resultify._get_edges_between_nodes(qedge_key, node_index_result_graph[qedge.subject],
+                                                                node_index_result_graph[qedge.object], kg_edge_index)
+             for qedge_key, qedge in qg.edges.items()}
+            for node_index_result_graph in node_index_result_graphs]
+
+
+def _time_call(function, *args) -> (float, any):
+    start = time.time()
+    output = function(*args)
+    return time.time() - start, output
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--num_edges", type=int, nargs="+", default=[10000, 100000, 1000000])
+    arg_parser.add_argument("--num_results", type=int, default=20)
+    arg_parser.add_argument("--set_size", type=int, default=100, help="Number of n01 nodes linked to each n00 node")
+    arg_parser.add_argument("--max_old_edges", type=int, default=10000, help="Skip the old approach for larger KGs")
+    arg_parser.add_argument("--respect_edge_direction", action="store_true", default=False)
+    args = arg_parser.parse_args()
+    random.seed(0)
+    ignore_edge_direction = not args.respect_edge_direction
+
+    for num_edges in args.num_edges:
+        kg, qg = _create_synthetic_kg(num_edges, args.num_results, args.set_size)
+        kg_node_keys_by_qnode_index, kg_node_indexes_by_qg_key = ARAX_resultify._get_kg_node_indexes_by_qg_key(kg, qg)
+        node_stage_time, node_index_result_graphs = _time_call(ARAX_resultify._create_node_index_result_graphs, kg, qg,
+                                                               kg_node_indexes_by_qg_key)
+        node_bindings = [{qnode_key: {kg_node_keys_by_qnode_index[qnode_key][node_index] for node_index in node_indexes.tolist()}
+                          for qnode_key, node_indexes in node_index_result_graph.items()}
+                         for node_index_result_graph in node_index_result_graphs]
+        mean_set_sizes = {qnode_key: round(sum(len(result_node_bindings[qnode_key]) for result_node_bindings in node_bindings) /
+                                           max(len(node_bindings), 1)) for qnode_key in qg.nodes}
+        print(f"{len(kg.edges)} edges: {len(node_bindings)} results (mean node set sizes {mean_set_sizes}; "
+              f"node bindings took {round(node_stage_time, 3)}s)")
+
+        new_time, new_edge_bindings = _time_call(_bind_edges_using_node_indexes, kg, qg, node_index_result_graphs,
+                                                 kg_node_indexes_by_qg_key, ignore_edge_direction)
+        print(f"  node index tuples: {round(new_time, 3)}s")
+        if len(kg.edges) <= args.max_old_edges:
+            old_time, old_edge_bindings = _time_call(_bind_edges_using_string_pairs, kg, qg, node_bindings, ignore_edge_direction)
+            print(f"  string node pairs: {round(old_time, 3)}s")
+            print(f"  results match: {old_edge_bindings == new_edge_bindings}")
+        else:
+            print("  string node pairs: skipped (KG is larger than --max_old_edges)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import pytest
+
+import time
+import threading
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../ARAXQuery")
+from ARAX_canned_query_pool import ARAXCannedQueryPool
+
+
+# Stand-ins for the legacy QuestionAnswering code: ParseQuestion maps query types to command lines, and the solution
+# script prints a message as JSON when run. SlowSolution never finishes in time
+PARSE_QUESTION = '''
+class ParseQuestion:
+    def get_execution_string(self, query_type_id, parameters):
+        if query_type_id == 'Q9':
+            return "SlowSolution.py"
+        return "FakeSolution.py -t '%s'" % parameters['term']
+'''
+
+FAKE_SOLUTION = '''
+import os
+import sys
+import json
+N_IMPORTS = globals().get('N_IMPORTS', 0) + 1
+def main():
+    with open('data.txt') as infile:
+        prefix = infile.read()
+    print(json.dumps({ 'results': [], 'query_graph': { 'nodes': { 'n00': { 'id': prefix + sys.argv[2] } }, 'edges': {} },
+                       'knowledge_graph': { 'nodes': { str(os.getpid()): { 'name': str(N_IMPORTS) } }, 'edges': {} } }))
+'''
+
+SLOW_SOLUTION = '''
+import time
+def main():
+    time.sleep(60)
+'''
+
+
+@pytest.fixture
+def solutions_dir(tmp_path):
+    for filename, content in [ ('ParseQuestion.py', PARSE_QUESTION), ('FakeSolution.py', FAKE_SOLUTION),
+                               ('SlowSolution.py', SLOW_SOLUTION), ('data.txt', 'CURIE:') ]:
+        (tmp_path / filename).write_text(content)
+    return str(tmp_path)
+
+
+def test_answer_reuses_warm_workers(solutions_dir):
+    cwd = os.getcwd()
+    pool = ARAXCannedQueryPool(n_workers=1, job_timeout=30, solutions_dir=solutions_dir, preload_modules=[ 'ParseQuestion', 'FakeSolution' ])
+    try:
+        pids = set()
+        for term in [ 'one', 'two words' ]:
+            message = pool.answer('Q1', { 'term': term })
+            # The solution found its data file relative to the solutions dir, and got its arguments from the command line
+            assert message.query_graph.nodes['n00'].id == 'CURIE:' + term
+            # Always the same worker, which imported the solution module only once
+            for pid, node in message.knowledge_graph.nodes.items():
+                pids.add(pid)
+                assert node.name == '1'
+        assert len(pids) == 1
+        assert os.getcwd() == cwd
+    finally:
+        pool.close()
+
+
+def test_timeout_replaces_worker(solutions_dir):
+    pool = ARAXCannedQueryPool(n_workers=1, job_timeout=30, solutions_dir=solutions_dir, preload_modules=[ 'ParseQuestion' ])
+    try:
+        with pytest.raises(TimeoutError):
+            pool.answer('Q9', {}, timeout=2)
+        # The stuck worker was replaced with a working one
+        message = pool.answer('Q1', { 'term': 'after' })
+        assert message.query_graph.nodes['n00'].id == 'CURIE:after'
+    finally:
+        pool.close()
+
+
+def test_errors_and_concurrency_limit(solutions_dir):
+    pool = ARAXCannedQueryPool(n_workers=1, job_timeout=30, solutions_dir=solutions_dir, preload_modules=[])
+    try:
+        with pytest.raises(RuntimeError):
+            pool.answer('Q1', {})
+
+        # While the only worker is busy, another query waits for it and times out
+        slow_query_errors = []
+        def run_slow_query():
+            try:
+                pool.answer('Q9', {}, timeout=4)
+            except Exception as error:
+                slow_query_errors.append(error)
+        slow_query = threading.Thread(target=run_slow_query)
+        slow_query.start()
+        time.sleep(1)
+        start = time.time()
+        with pytest.raises(TimeoutError):
+            pool.answer('Q1', { 'term': 'waiting' }, timeout=1)
+        assert time.time() - start < 3
+        slow_query.join()
+        assert len(slow_query_errors) == 1 and isinstance(slow_query_errors[0], TimeoutError)
+    finally:
+        pool.close()
+
+
+def test_timeout_covers_waiting_and_close_does_not_hang(solutions_dir):
+    pool = ARAXCannedQueryPool(n_workers=1, job_timeout=30, solutions_dir=solutions_dir, preload_modules=[ 'ParseQuestion' ])
+    slow_query_errors = []
+    def run_slow_query():
+        try:
+            pool.answer('Q9', {}, timeout=3)
+        except Exception as error:
+            slow_query_errors.append(error)
+    slow_query = threading.Thread(target=run_slow_query)
+    slow_query.start()
+    time.sleep(0.5)
+
+    # The time spent waiting for the busy worker is taken off the time the job itself gets
+    start = time.time()
+    with pytest.raises(TimeoutError):
+        pool.answer('Q9', {}, timeout=4)
+    assert time.time() - start < 6
+
+    # Closing the pool while a worker is busy gives up on it after the timeout rather than blocking forever
+    slow_query = threading.Thread(target=run_slow_query)
+    slow_query.start()
+    time.sleep(0.5)
+    start = time.time()
+    pool.close(timeout=1)
+    assert time.time() - start < 3
+    slow_query.join()
+    assert len(slow_query_errors) == 2 and all(isinstance(error, TimeoutError) for error in slow_query_errors)
+    with pytest.raises(RuntimeError):
+        pool.answer('Q1', { 'term': 'closed' })
+
+
+if __name__ == "__main__": pytest.main(['-v'])
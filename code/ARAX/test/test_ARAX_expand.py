@@ -7,6 +7,8 @@ Usage:
 
 import sys
 import os
+import threading
+import time
 from typing import List, Dict, Tuple
 
 import pytest
@@ -572,6 +574,22 @@ def test_COHD_expand_chi_square():
     assert all([edges_by_qg_id[qedge_key][edge_key].attributes[0].url == "http://cohd.smart-api.info/" for qedge_key in edges_by_qg_id for edge_key in edges_by_qg_id[qedge_key]])
 
 
+@pytest.mark.slow
+def test_COHD_expand_using_index():
+    actions_list = [
+        "add_qnode(id=DOID:10718, key=n00)",
+        "add_qnode(category=biolink:ChemicalSubstance, key=n01)",
+        "add_qedge(subject=n00, object=n01, key=e00)",
+        "expand(edge_key=e00, kp=COHD, COHD_method=observed_expected_ratio, COHD_method_percentile=95, use_COHD_index=true)",
+        "return(message=true, store=false)"
+    ]
+    nodes_by_qg_id, edges_by_qg_id = _run_query_and_do_standard_testing(actions_list)
+    actions_list[3] = "expand(edge_key=e00, kp=COHD, COHD_method=observed_expected_ratio, COHD_method_percentile=95)"
+    nodes_by_qg_id_sqlite, edges_by_qg_id_sqlite = _run_query_and_do_standard_testing(actions_list)
+    assert set(nodes_by_qg_id["n01"]) == set(nodes_by_qg_id_sqlite["n01"])
+    assert set(edges_by_qg_id["e00"]) == set(edges_by_qg_id_sqlite["e00"])
+
+
 def test_DTD_expand_1():
     actions_list = [
         "add_qnode(name=acetaminophen, key=n0)",
@@ -862,5 +880,169 @@ def test_issue_1212():
     nodes_by_qg_id, edges_by_qg_id = _run_query_and_do_standard_testing(actions_list, kg_should_be_incomplete=True)
 
 
+def test_branched_query_expanded_concurrently():
+    # Qedges that share only a qnode with a curie can be expanded concurrently; results should match a serial expand
+    actions_list = [
+        "add_qnode(id=DOID:14330, key=n00)",
+        "add_qnode(category=biolink:Protein, key=n01)",
+        "add_qnode(category=biolink:ChemicalSubstance, key=n02)",
+        "add_qedge(subject=n00, object=n01, key=e00)",
+        "add_qedge(subject=n00, object=n02, key=e01)",
+        "expand(kp=ARAX/KG2)",
+        "return(message=true, store=false)"
+    ]
+    nodes_by_qg_id, edges_by_qg_id = _run_query_and_do_standard_testing(actions_list)
+    actions_list = [
+        "add_qnode(id=DOID:14330, key=n00)",
+        "add_qnode(category=biolink:Protein, key=n01)",
+        "add_qnode(category=biolink:ChemicalSubstance, key=n02)",
+        "add_qedge(subject=n00, object=n01, key=e00)",
+        "add_qedge(subject=n00, object=n02, key=e01)",
+        "expand(kp=ARAX/KG2, edge_key=e00)",
+        "expand(kp=ARAX/KG2, edge_key=e01)",
+        "return(message=true, store=false)"
+    ]
+    nodes_by_qg_id_serial, edges_by_qg_id_serial = _run_query_and_do_standard_testing(actions_list)
+    assert set(nodes_by_qg_id["n01"]) == set(nodes_by_qg_id_serial["n01"])
+    assert set(nodes_by_qg_id["n02"]) == set(nodes_by_qg_id_serial["n02"])
+    assert set(edges_by_qg_id["e01"]) == set(edges_by_qg_id_serial["e01"])
+
+
+def test_stream_results():
+    actions_list = [
+        "add_qnode(id=DOID:14330, key=n00)",
+        "add_qnode(category=biolink:Protein, key=n01)",
+        "add_qedge(subject=n00, object=n01, key=e00)",
+        "expand(kp=ARAX/KG2, stream_results=true)",
+        "return(message=true, store=false)"
+    ]
+    nodes_by_qg_id, edges_by_qg_id = _run_query_and_do_standard_testing(actions_list)
+    actions_list = [
+        "add_qnode(id=DOID:14330, key=n00)",
+        "add_qnode(category=biolink:Protein, key=n01)",
+        "add_qedge(subject=n00, object=n01, key=e00)",
+        "expand(kp=ARAX/KG2)",
+        "return(message=true, store=false)"
+    ]
+    nodes_by_qg_id_collected, edges_by_qg_id_collected = _run_query_and_do_standard_testing(actions_list)
+    assert set(nodes_by_qg_id["n01"]) == set(nodes_by_qg_id_collected["n01"])
+    assert set(edges_by_qg_id["e00"]) == set(edges_by_qg_id_collected["e00"])
+
+
+def test_stream_results_max_edges():
+    actions_list = [
+        "add_qnode(id=DOID:14330, key=n00)",
+        "add_qnode(category=biolink:Protein, key=n01)",
+        "add_qedge(subject=n00, object=n01, key=e00)",
+        "expand(kp=ARAX/KG2, stream_results=true, max_edges=5)",
+        "return(message=true, store=false)"
+    ]
+    nodes_by_qg_id, edges_by_qg_id = _run_query_and_do_standard_testing(actions_list)
+    assert 0 < len(edges_by_qg_id["e00"]) <= 5
+
+
+def test_qedge_dependencies():
+    from ARAX_expander import ARAXExpander
+    from openapi_server.models.q_node import QNode
+    from openapi_server.models.q_edge import QEdge
+    query_graph = QueryGraph(nodes={"n00": QNode(id="DOID:14330"),
+                                    "n01": QNode(category="biolink:Protein"),
+                                    "n02": QNode(category="biolink:ChemicalSubstance"),
+                                    "n03": QNode(category="biolink:Gene")},
+                             edges={"e00": QEdge(subject="n00", object="n01"),
+                                    "e01": QEdge(subject="n00", object="n02"),
+                                    "e02": QEdge(subject="n01", object="n03")})
+    qedge_dependencies = ARAXExpander._get_qedge_dependencies(["e00", "e01", "e02"], query_graph)
+    assert qedge_dependencies == {"e00": set(), "e01": set(), "e02": {"e00"}}
+
+
+def test_error_cancels_pending_qedge_expansions(monkeypatch):
+    # When one qedge errors out, Expand shouldn't start queued qedge expansions or wait on the ones in flight
+    from ARAX_expander import ARAXExpander
+    from openapi_server.models.message import Message
+    from openapi_server.models.q_edge import QEdge
+    from openapi_server.models.q_node import QNode
+    from openapi_server.models.response import Response
+    release_expansions = threading.Event()
+    started_qedge_keys = []
+    def fake_expand_edge(self, qedge_key, kp_to_use, dict_kg, continue_if_no_results, query_graph, use_synonyms, log,
+                         edge_query_graph=None):
+        started_qedge_keys.append(qedge_key)
+        if qedge_key == "e00":
+            log.error(f"Fake error expanding {qedge_key}", error_code="FakeError")
+        else:
+            release_expansions.wait(timeout=30)
+        return eu.QGOrganizedKnowledgeGraph(), dict()
+    monkeypatch.setattr(ARAXExpander, "_expand_edge", fake_expand_edge)
+
+    query_graph = QueryGraph(nodes={"n00": QNode(id="DOID:14330")}, edges=dict())
+    for number in range(1, 9):
+        query_graph.nodes[f"n0{number}"] = QNode(category="biolink:Protein")
+        query_graph.edges[f"e0{number - 1}"] = QEdge(subject="n00", object=f"n0{number}")
+    response = ARAXResponse()
+    response.envelope = Response(message=Message(query_graph=query_graph))
+    expander = ARAXExpander()
+    start = time.time()
+    try:
+        expander.apply(response, {"kp": "ARAX/KG2"})
+        assert response.status == 'ERROR'
+        assert time.time() - start < 30
+        # Other than the one picked up by e00's thread once it's done, the qedges that were still queued are cancelled
+        assert started_qedge_keys[0] == "e00"
+        assert len(started_qedge_keys) <= expander.max_concurrent_qedge_expansions + 1 < len(query_graph.edges)
+    finally:
+        release_expansions.set()
+
+
+def test_concurrent_qedges_through_kg_querier(monkeypatch):
+    # Runs independent qedges concurrently through the real KGQuerier, with only the neo4j call itself faked
+    from ARAX_expander import ARAXExpander
+    from Expand import kg_querier
+    from openapi_server.models.message import Message
+    from openapi_server.models.q_edge import QEdge
+    from openapi_server.models.q_node import QNode
+    from openapi_server.models.response import Response
+    query_graph = QueryGraph(nodes={"n00": QNode(id="DOID:14330"),
+                                    "n01": QNode(category="biolink:Protein"),
+                                    "n02": QNode(category="biolink:ChemicalSubstance")},
+                             edges={"e00": QEdge(subject="n00", object="n01"),
+                                    "e01": QEdge(subject="n00", object="n02")})
+    queried_qedge_keys = []
+    def run_read_query(query, live=None, parameters=None):
+        qedge_key = next(qedge_key for qedge_key in query_graph.edges if f"edges_{qedge_key}" in query)
+        object_qnode_key = query_graph.edges[qedge_key].object
+        queried_qedge_keys.append(qedge_key)
+        object_nodes = [{"id": f"TEST:{qedge_key}-{number}", "name": f"node {number}", "category_label": "protein"}
+                        for number in range(3)]
+        edges = [{"id": f"{qedge_key}-{number}", "subject": "DOID:14330", "object": node["id"],
+                  "simplified_edge_label": "related_to", "n00": "DOID:14330", object_qnode_key: node["id"]}
+                 for number, node in enumerate(object_nodes)]
+        return [{"nodes_n00": [{"id": "DOID:14330", "name": "Parkinson's disease", "category_label": "disease"}],
+                 f"nodes_{object_qnode_key}": object_nodes,
+                 f"edges_{qedge_key}": edges}]
+    monkeypatch.setattr(kg_querier.neo4j_driver_pool, "run_read_query", run_read_query)
+
+    response = ARAXResponse()
+    response.envelope = Response(message=Message(query_graph=query_graph))
+    event_queue = response.open_event_stream()
+    ARAXExpander().apply(response, {"kp": "ARAX/KG2", "use_synonyms": "false"})
+    if response.status != 'OK':
+        print(response.show(level=ARAXResponse.DEBUG))
+    assert response.status == 'OK'
+    assert sorted(queried_qedge_keys) == ["e00", "e01"]
+    dict_kg = eu.convert_standard_kg_to_qg_organized_kg(response.envelope.message.knowledge_graph)
+    assert len(dict_kg.nodes_by_qg_id["n01"]) == 3 and len(dict_kg.nodes_by_qg_id["n02"]) == 3
+    assert len(dict_kg.edges_by_qg_id["e00"]) == 3 and len(dict_kg.edges_by_qg_id["e01"]) == 3
+    logged_messages = [message["message"] for message in response.messages]
+    assert "Sending cypher query for edge e00 to KG2 neo4j" in logged_messages
+    assert "Sending cypher query for edge e01 to KG2 neo4j" in logged_messages
+    # Each qedge's messages are streamed as they're logged, and not again when its log is merged in
+    streamed_messages = []
+    while not event_queue.empty():
+        event_type, event = event_queue.get()
+        streamed_messages.append(event["message"])
+    assert sorted(streamed_messages) == sorted(logged_messages)
+
+
 if __name__ == "__main__":
     pytest.main(['-v', 'test_ARAX_expand.py'])
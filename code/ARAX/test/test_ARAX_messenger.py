@@ -187,4 +187,33 @@ def test_add_qedge_multitest():
         assert response.error_code == parameters['error_code']
 
 
+def test_from_dict_matches_generic_deserializer():
+    sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../../UI/OpenAPI/python-flask-server/")
+    from openapi_server import util
+    from openapi_server.models.message import Message
+    from openapi_server.models.response import Response
+    message_dict = {
+        'query_graph': { 'nodes': { 'n00': { 'id': 'UniProtKB:P14136' }, 'n01': {} }, 'edges': { 'e00': { 'subject': 'n00', 'object': 'n01' } } },
+        'knowledge_graph': {
+            'nodes': { 'UniProtKB:P14136': { 'name': 'GFAP', 'category': [ 'biolink:Protein' ], 'attributes': [ { 'type': 'EDAM:data_1187', 'value': [ 'PMID:1' ] } ] },
+                       'CHEMBL.COMPOUND:CHEMBL112': { 'category': 'biolink:ChemicalSubstance', 'attributes': None } },
+            'edges': { 'KG2:1': { 'subject': 'UniProtKB:P14136', 'object': 'CHEMBL.COMPOUND:CHEMBL112', 'predicate': 'biolink:interacts_with',
+                                  'attributes': [ { 'name': 'probability', 'type': 'EDAM:data_0951', 'value': 0.5, 'url': None } ] } } },
+        'results': [ { 'node_bindings': { 'n00': [ { 'id': 'UniProtKB:P14136' } ], 'n01': [ { 'id': 'CHEMBL.COMPOUND:CHEMBL112' } ] },
+                       'edge_bindings': { 'e00': [ { 'id': 'KG2:1' } ] }, 'confidence': 1, 'row_data': [ 1, 'GFAP' ], 'result_group': 2 } ],
+    }
+    message = Message.from_dict(message_dict)
+    assert message == util.deserialize_model(message_dict, Message)
+    # Values are coerced to their declared type just like the generic deserializer does
+    assert message.knowledge_graph.edges['KG2:1'].attributes[0].value == '0.5'
+    assert message.results[0].confidence == 1.0 and isinstance(message.results[0].confidence, float)
+    envelope_dict = { 'status': 'OK', 'logs': [], 'message': message_dict }
+    assert Response.from_dict(envelope_dict) == util.deserialize_model(envelope_dict, Response)
+
+    # An explicit null for a required property is still rejected
+    message_dict['knowledge_graph']['edges']['KG2:1']['subject'] = None
+    with pytest.raises(ValueError):
+        Message.from_dict(message_dict)
+
+
 if __name__ == "__main__": pytest.main(['-v'])
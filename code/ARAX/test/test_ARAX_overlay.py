@@ -288,6 +288,170 @@ def test_FET_ex2():
         assert query_edge.object in query_node_keys
 
 
+@pytest.mark.slow
+def test_FET_batch_counts_match_expand():
+    # The grouped cypher count and the Expand-based one must give the same contingency tables
+    sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../ARAXQuery/Overlay")
+    from fisher_exact_test import ComputeFTEST
+    node_curies = ['UniProtKB:P14136', 'UniProtKB:P02675', 'UniProtKB:P01903']
+    for kp in ['ARAX/KG1', 'ARAX/KG2']:
+        response = ARAXResponse()
+        fet = ComputeFTEST(response, None, {})
+        batch_counts = fet.query_size_of_adjacent_nodes_batch(node_curies, source_type='biolink:Protein',
+                                                              adjacent_type='biolink:BiologicalProcess', kp=kp)
+        expand_counts = fet.query_size_of_adjacent_nodes(node_curies, source_type='biolink:Protein',
+                                                         adjacent_type='biolink:BiologicalProcess', kp=kp)
+        assert response.status == 'OK'
+        assert batch_counts == expand_counts
+
+
+def test_FET_batch_count_cypher(monkeypatch):
+    sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../ARAXQuery/Overlay")
+    import fisher_exact_test
+    queries = []
+    def run_read_query(query, live=None, parameters=None):
+        queries.append((query, live, parameters))
+        return [ { 'curie': 'UniProtKB:P14136', 'count': 3 }, { 'curie': 'UniProtKB:P02675', 'count': 0 } ]
+    monkeypatch.setattr(fisher_exact_test.neo4j_driver_pool, 'run_read_query', run_read_query)
+    fet = fisher_exact_test.ComputeFTEST(ARAXResponse(), None, {})
+
+    result = fet.query_size_of_adjacent_nodes_batch(['UniProtKB:P14136', 'UniProtKB:P02675'], source_type='biolink:Protein',
+                                                    adjacent_type='biolink:BiologicalProcess', kp='ARAX/KG2', rel_type='biolink:involved_in')
+    assert result == ({ 'UniProtKB:P14136': 3 }, [ 'UniProtKB:P02675' ])
+    query, live, parameters = queries[0]
+    # Edges are counted (not neighbors), in either direction, and a protein also matches genes, as in Expand
+    assert "count(distinct FET_e00)" in query and "-[FET_e00:`involved_in`]-" in query
+    assert "(FET_n01:`biological_process`)" in query
+    assert live == 'KG2'
+    assert parameters['categories_FET_n00'] == [ 'protein', 'gene' ]
+
+
+def test_FET_pvalues_match_scipy():
+    sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../ARAXQuery/Overlay")
+    from fisher_exact_test import ComputeFTEST
+    import numpy as np
+    from scipy import stats
+    tables = [ [0, 0, 0, 0], [0, 0, 3, 4], [3, 0, 4, 0], [5, 0, 0, 0], [1, 2, 3, 4], [0, 5, 5, 0], [12, 340, 85, 20000] ]
+    pvalues = ComputeFTEST._calculate_FET_pvalues(tables)
+    for table, pvalue in zip(tables, pvalues):
+        assert pvalue == pytest.approx(stats.fisher_exact(np.array(table).reshape(2, 2))[1], rel=1e-10)
+
+
+def _create_graph_database(database_path, num_curies=6, num_features=4, seed=0):
+    import sqlite3
+    import numpy as np
+    features = np.random.RandomState(seed).normal(size=(num_curies, num_features))
+    connection = sqlite3.connect(database_path)
+    connection.execute(f"create table GRAPH (curie text, {', '.join(f'c{column} real' for column in range(num_features))})")
+    connection.executemany(f"insert into GRAPH values ({','.join('?' * (num_features + 1))})",
+                           [ [ f"CURIE:{row}" ] + list(features[row]) for row in range(num_curies) ])
+    connection.commit()
+    connection.close()
+    return features
+
+
+def _create_DTD_predictor(tmp_path, model):
+    sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../ARAXQuery/Overlay/predictor")
+    from predictor import predictor
+    import joblib
+    import numpy as np
+    training_features = np.random.RandomState(1).normal(size=(50, 4))
+    model.fit(training_features, (training_features.sum(axis=1) > 0).astype(int))
+    model_path = str(tmp_path / 'model.pkl')
+    joblib.dump(model, model_path)
+    return predictor(model_file=model_path, use_prob_db=False)
+
+
+@pytest.mark.parametrize("model_name", [ "LogisticRegression", "DecisionTreeClassifier" ])
+def test_DTD_prob_matrix_matches_prob_single(tmp_path, model_name):
+    import numpy as np
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.tree import DecisionTreeClassifier
+    model = LogisticRegression() if model_name == "LogisticRegression" else DecisionTreeClassifier(max_depth=3, random_state=0)
+    graph_database = str(tmp_path / 'GRAPH.sqlite')
+    features = _create_graph_database(graph_database)
+    dtd_predictor = _create_DTD_predictor(tmp_path, model)
+    dtd_predictor.import_file(None, graph_database=graph_database)
+    assert dtd_predictor.embedding_matrix is None
+
+    sources = [ 'CURIE:0', 'CURIE:1', 'CURIE:missing', 'CURIE:2' ]
+    targets = [ 'CURIE:3', 'CURIE:missing', 'CURIE:4', 'CURIE:5' ]
+    probabilities = dtd_predictor.prob_matrix(sources, targets)
+    assert probabilities.shape == (4, 4)
+    for source_index, source in enumerate(sources):
+        for target_index, target in enumerate(targets):
+            single_probability = dtd_predictor.prob_single(source, target)
+            if single_probability is None:
+                assert 'missing' in source + target
+                assert np.isnan(probabilities[source_index, target_index])
+            else:
+                # Both match the model's probability for the pair's 'Hadamard product' features
+                source_row, target_row = int(source.split(':')[1]), int(target.split(':')[1])
+                expected = model.predict_proba(np.array([ features[source_row] * features[target_row] ], dtype=np.float32))[0, 1]
+                assert probabilities[source_index, target_index] == pytest.approx(expected, abs=1e-6)
+                assert single_probability[0] == pytest.approx(expected, abs=1e-6)
+
+    # A freshly built embedding file next to the graph database is memory-mapped and gives the same probabilities
+    sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../ARAXQuery/Overlay/predictor")
+    from predictor import predictor
+    predictor.build_embedding_file(graph_database, str(tmp_path / 'GRAPH.npy'), batch_size=4)
+    mmap_predictor = _create_DTD_predictor(tmp_path, model)
+    mmap_predictor.import_file(None, graph_database=graph_database)
+    assert mmap_predictor.embedding_matrix is not None
+    assert np.array_equal(mmap_predictor.prob_matrix(sources, targets), probabilities, equal_nan=True)
+
+
+def test_DTD_stale_embedding_file_is_not_used(tmp_path):
+    import numpy as np
+    from sklearn.linear_model import LogisticRegression
+    sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../ARAXQuery/Overlay/predictor")
+    from predictor import predictor
+    graph_database = str(tmp_path / 'GRAPH.sqlite')
+    _create_graph_database(graph_database)
+    model = LogisticRegression()
+    reference_predictor = _create_DTD_predictor(tmp_path, model)
+    reference_predictor.import_file(None, graph_database=graph_database)
+    expected = reference_predictor.prob_matrix([ 'CURIE:0', 'CURIE:1' ], [ 'CURIE:2', 'CURIE:3' ])
+
+    # Embedding files built from other versions of the graph database: more features, more curies, or other values
+    for name, num_curies, num_features, seed in [ ('wider', 6, 8, 0), ('longer', 7, 4, 0), ('different', 6, 4, 5) ]:
+        stale_database = str(tmp_path / f"{name}.sqlite")
+        _create_graph_database(stale_database, num_curies=num_curies, num_features=num_features, seed=seed)
+        predictor.build_embedding_file(stale_database, str(tmp_path / f"{name}.npy"))
+        dtd_predictor = _create_DTD_predictor(tmp_path, model)
+        dtd_predictor.import_file(None, graph_database=graph_database, embedding_file=str(tmp_path / f"{name}.npy"))
+        assert dtd_predictor.embedding_matrix is None
+        assert np.array_equal(dtd_predictor.prob_matrix([ 'CURIE:0', 'CURIE:1' ], [ 'CURIE:2', 'CURIE:3' ]), expected)
+
+
+def test_DTD_batch_probabilities_match_single_pair_queries(tmp_path, monkeypatch):
+    import sqlite3
+    sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../ARAXQuery/Overlay/predictor")
+    from predictor import predictor
+    import sqlite_connection_pool
+    # More drugs than fit in one query's parameters
+    monkeypatch.setattr(sqlite_connection_pool, "MAX_SQL_PARAMETERS", 100)
+    drugs = [ f"CHEMBL:{drug_number}" for drug_number in range(250) ]
+    diseases = [ f"DOID:{disease_number}" for disease_number in range(3) ]
+    database_path = str(tmp_path / 'DTD_probability_database.db')
+    connection = sqlite3.connect(database_path)
+    connection.execute("CREATE TABLE DTD_PROBABILITY( disease VARCHAR(255), drug VARCHAR(255), probability FLOAT )")
+    connection.executemany("INSERT INTO DTD_PROBABILITY VALUES (?, ?, ?)",
+                           [ (disease, drug, (drug_number * 7 + disease_number) % 100 / 100.0)
+                             for drug_number, drug in enumerate(drugs) for disease_number, disease in enumerate(diseases)
+                             if (drug_number + disease_number) % 5 != 0 ])
+    connection.commit()
+    connection.close()
+
+    dtd_predictor = predictor(DTD_prob_file=database_path)
+    pairs = [ (drug, disease) for drug in drugs for disease in diseases ] + [ ('CHEMBL:unknown', 'DOID:0'), ('CHEMBL:0', 'DOID:unknown') ]
+    probabilities = dtd_predictor.get_probs_from_DTD_db_based_on_pairs(pairs + pairs[:10])
+    expected = { pair: dtd_predictor.get_prob_from_DTD_db(*pair) for pair in pairs }
+    assert probabilities == { pair: probability for pair, probability in expected.items() if probability is not None }
+    assert len(probabilities) == 600
+    assert dtd_predictor.get_probs_from_DTD_db_based_on_pairs([]) == dict()
+
+
 @pytest.mark.slow
 def test_paired_concept_frequency_virtual():
     query = {"operations": {"actions": [
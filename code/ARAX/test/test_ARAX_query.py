@@ -10,6 +10,8 @@ import ast
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../ARAXQuery")
 from ARAX_query import ARAXQuery
+import ARAX_query_tracker
+from ARAX_query_tracker import ARAXQueryTracker
 
 
 #def test_query_by_canned_query_Q0():
@@ -42,4 +44,109 @@ def test_query_by_query_graph_2():
     assert response.envelope.schema_version == '1.0.0'
 
 
+def test_action_stats():
+    query = { "operations": { "actions": [
+            "create_message",
+            "add_qnode(category=biolink:ChemicalSubstance, key=n00)",
+            "add_qnode(category=biolink:Protein, key=n01)",
+            "add_qedge(subject=n00, object=n01, key=e00)",
+            "return(message=true, store=false)",
+        ] } }
+    araxq = ARAXQuery()
+    araxq.query(query)
+    response = araxq.response
+    assert response.status == 'OK'
+    action_stats = response.envelope.query_options['action_stats']
+    assert [ stats['command'] for stats in action_stats ] == [ 'create_message', 'add_qnode', 'add_qnode', 'add_qedge', 'return' ]
+    assert action_stats[1]['parameters'] == { 'category': 'biolink:ChemicalSubstance', 'key': 'n00' }
+    for stats in action_stats:
+        assert stats['wall_seconds'] >= 0 and stats['cpu_seconds'] >= 0
+        assert stats['n_kg_nodes_after'] == 0 and stats['n_results_after'] == 0
+
+
+def _create_query_with_results(actions):
+    results = [ { "node_bindings": { "n00": [ { "id": "CURIE:0" } ], "n01": [ { "id": f"CURIE:{i}" } ] },
+                  "edge_bindings": { "e00": [ { "id": f"E{i}" } ] }, "essence": f"protein {i}" } for i in range(1, 4) ]
+    return { "message": { "query_graph": { "nodes": { "n00": { "id": "CURIE:0" }, "n01": { "category": "biolink:Protein" } },
+                                           "edges": { "e00": { "subject": "n00", "object": "n01" } } },
+                          "knowledge_graph": {
+                              "nodes": { f"CURIE:{i}": { "name": f"protein {i}", "category": [ "biolink:Protein" ] } for i in range(4) },
+                              "edges": { f"E{i}": { "subject": "CURIE:0", "object": f"CURIE:{i}" } for i in range(1, 4) } },
+                          "results": results },
+             "operations": { "actions": actions } }
+
+
+def test_stream_final_results_once():
+    araxq = ARAXQuery()
+    events = [ json.loads(line) for line in araxq.query_return_stream(_create_query_with_results([ "return(message=true, store=false)" ])) ]
+    streamed_results = [ event['result'] for event in events if 'result' in event ]
+    # Each result is streamed exactly once, and the envelope that follows doesn't repeat them
+    envelope = events[-1]
+    assert len(streamed_results) == 3
+    assert [ result['essence'] for result in streamed_results ] == [ 'protein 1', 'protein 2', 'protein 3' ]
+    assert envelope['message']['results'] is None
+    assert len(envelope['message']['knowledge_graph']['nodes']) == 4
+    # The response itself (e.g., what gets stored) keeps its results
+    assert len(araxq.response.envelope.message.results) == 3
+
+
+def test_stream_results_after_last_action_that_changes_them():
+    query = _create_query_with_results([ "filter_kg(action=remove_orphaned_nodes, node_category=biolink:Protein)", "return(message=true, store=false)" ])
+    araxq = ARAXQuery()
+    events = [ json.loads(line) for line in araxq.query_return_stream(query) ]
+    assert araxq.response.status == 'OK'
+    result_positions = [ position for position, event in enumerate(events) if 'result' in event ]
+    return_position = next(position for position, event in enumerate(events) if 'level' in event and event['message'].startswith("Processing action 'return'"))
+    # The results are streamed as soon as filter_kg (the last action that could change them) is done, before the return
+    # action is processed
+    assert len(result_positions) == 3
+    assert max(result_positions) < return_position
+    assert events[-1]['message']['results'] is None
+
+
+def test_query_tracker_action_stats(tmp_path):
+    query_tracker = ARAXQueryTracker(database_url=f"sqlite:///{tmp_path}/RTXFeedback.sqlite")
+    tracker_id = query_tracker.create_tracker_entry({ 'origin': 'test', 'input_query': { 'operations': {} }, 'remote_address': 'test_address' })
+    action_stats = [ { 'action_number': number, 'command': command, 'parameters': { 'key': 'n00' }, 'start_datetime': '2021-01-01T00:00:00.000000',
+                       'wall_seconds': 1.5, 'cpu_seconds': 1.0, 'peak_rss_delta_mb': 2.0, 'n_kg_nodes_before': 0, 'n_kg_nodes_after': 3,
+                       'n_kg_edges_before': 0, 'n_kg_edges_after': 2, 'n_results_before': 0, 'n_results_after': 1 }
+                     for number, command in [ (1, 'create_message'), (2, 'expand') ] ]
+    query_tracker.add_action_stats(tracker_id, action_stats)
+    query_tracker.add_action_stats(tracker_id + 1, action_stats[:1])
+
+    stored_stats = query_tracker.get_action_stats(tracker_id)
+    assert [ (stats.action_number, stats.command) for stats in stored_stats ] == [ (1, 'create_message'), (2, 'expand') ]
+    assert stored_stats[1].wall_seconds == 1.5 and stored_stats[1].n_kg_nodes_after == 3
+    assert stored_stats[1].action_stats == action_stats[1]
+
+
+def test_query_is_tracked(tmp_path, monkeypatch):
+    # Queries from outside (with an origin) get a tracker entry with the stats of their actions; internal ones don't
+    database_url = f"sqlite:///{tmp_path}/RTXFeedback.sqlite"
+    original_connect = ARAXQueryTracker.connect
+    def connect(self):
+        self.database_url = database_url
+        original_connect(self)
+    monkeypatch.setattr(ARAX_query_tracker.ARAXQueryTracker, 'connect', connect)
+    query = { "operations": { "actions": [
+            "create_message",
+            "add_qnode(category=biolink:ChemicalSubstance, key=n00)",
+            "return(message=true, store=false)",
+        ] } }
+
+    araxq = ARAXQuery()
+    araxq.query(copy.deepcopy(query))
+    assert araxq.tracker_id is None
+
+    araxq = ARAXQuery()
+    araxq.origin = 'API'
+    araxq.remote_address = 'test_address'
+    araxq.query(copy.deepcopy(query))
+    assert araxq.tracker_id is not None
+    query_tracker = ARAXQueryTracker()
+    entry = query_tracker.session.query(ARAX_query_tracker.ARAXQuery).filter(ARAX_query_tracker.ARAXQuery.query_id == araxq.tracker_id).one()
+    assert entry.status == 'Completed OK' and entry.origin == 'API' and entry.remote_address == 'test_address'
+    assert [ stats.command for stats in query_tracker.get_action_stats(araxq.tracker_id) ] == [ 'create_message', 'add_qnode', 'return' ]
+
+
 if __name__ == "__main__": pytest.main(['-v'])
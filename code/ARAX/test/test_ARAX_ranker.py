@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+
+# Usage:
+# run all: pytest -v test_ARAX_ranker.py
+# run just certain tests: pytest -v test_ARAX_ranker.py -k test_score_result_graphs
+
+import sys
+import os
+import math
+import multiprocessing
+import random
+import pytest
+import networkx as nx
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../ARAXQuery")
+import ARAX_ranker
+from ARAX_response import ARAXResponse
+
+PACKAGE_PARENT = '../../UI/OpenAPI/python-flask-server'
+sys.path.append(os.path.normpath(os.path.join(os.getcwd(), PACKAGE_PARENT)))
+from openapi_server.models.attribute import Attribute
+from openapi_server.models.edge import Edge
+from openapi_server.models.knowledge_graph import KnowledgeGraph
+from openapi_server.models.message import Message
+from openapi_server.models.q_edge import QEdge
+from openapi_server.models.q_node import QNode
+from openapi_server.models.query_graph import QueryGraph
+from openapi_server.models.edge_binding import EdgeBinding
+from openapi_server.models.result import Result
+from openapi_server.models.response import Response
+
+
+def _create_query_graph(qnode_keys: list, qedges: dict) -> QueryGraph:
+    return QueryGraph(nodes={qnode_key: QNode() for qnode_key in qnode_keys},
+                      edges={qedge_key: QEdge(subject=subject, object=object) for qedge_key, (subject, object) in qedges.items()})
+
+
+def _create_results(query_graph: QueryGraph, num_results: int, seed: int = 0):
+    # A few KG edges per qedge (one of which fulfills every qedge between the same two qnodes); each result binds zero
+    # to two of them to each qedge
+    rng = random.Random(seed)
+    kg_edge_id_to_edge = dict()
+    edge_ids_by_qedge_key = {qedge_key: [] for qedge_key in query_graph.edges}
+    for qedge_key, qedge in query_graph.edges.items():
+        for edge_number in range(3):
+            edge = Edge(subject=f"{qedge.subject}:{edge_number}", object=f"{qedge.object}:{edge_number}")
+            edge.qedge_keys = [qedge_key]
+            edge.confidence = rng.choice([0.0, 1.0, rng.random()])
+            kg_edge_id_to_edge[f"{qedge_key}:{edge_number}"] = edge
+            edge_ids_by_qedge_key[qedge_key].append(f"{qedge_key}:{edge_number}")
+        parallel_qedge_keys = [parallel_qedge_key for parallel_qedge_key, parallel_qedge in query_graph.edges.items()
+                               if (parallel_qedge.subject, parallel_qedge.object) == (qedge.subject, qedge.object)]
+        if len(parallel_qedge_keys) > 1:
+            edge = Edge(subject=qedge.subject, object=qedge.object)
+            edge.qedge_keys = parallel_qedge_keys
+            edge.confidence = rng.random()
+            kg_edge_id_to_edge[f"{qedge_key}:shared"] = edge
+            edge_ids_by_qedge_key[qedge_key].append(f"{qedge_key}:shared")
+    results = []
+    for _ in range(num_results):
+        edge_bindings = {qedge_key: [EdgeBinding(id=edge_id) for edge_id in rng.sample(edge_ids, rng.randint(0, 2))]
+                         for qedge_key, edge_ids in edge_ids_by_qedge_key.items()}
+        results.append(Result(node_bindings=dict(), edge_bindings=edge_bindings))
+    return kg_edge_id_to_edge, results
+
+
+def _get_networkx_reference_scores(kg_edge_id_to_edge: dict, query_graph: QueryGraph, results: list) -> list:
+    # The networkx-based scoring ARAX used before it switched to stacks of adjacency matrices
+    qg_nx = ARAX_ranker._get_query_graph_networkx_from_query_graph(query_graph)
+    max_flow_scores = []
+    longest_path_scores = []
+    frobenius_norm_scores = []
+    for result in results:
+        result_graph_nx = qg_nx.copy()
+        for edge_binding_list in result.edge_bindings.values():
+            for edge_binding in edge_binding_list:
+                kg_edge = kg_edge_id_to_edge[edge_binding.id]
+                for qedge_key in kg_edge.qedge_keys:
+                    qedge = query_graph.edges[qedge_key]
+                    result_graph_nx[qedge.subject][qedge.object][qedge_key]['weight'] = kg_edge.confidence
+        apsp_dict = dict(nx.algorithms.shortest_paths.unweighted.all_pairs_shortest_path_length(result_graph_nx))
+        max_path_len = max(path_len for node_i_dict in apsp_dict.values() for path_len in node_i_dict.values())
+        pairs_with_max_path_len = [(node_i, node_j) for node_i, node_i_dict in apsp_dict.items()
+                                   for node_j, path_len in node_i_dict.items() if path_len == max_path_len]
+        if len(result_graph_nx) > 1:
+            collapsed_graph_nx = nx.DiGraph()
+            for node_i, node_j, data in result_graph_nx.edges(data=True):
+                if collapsed_graph_nx.has_edge(node_i, node_j):
+                    collapsed_graph_nx[node_i][node_j]['weight'] += data['weight']
+                else:
+                    collapsed_graph_nx.add_edge(node_i, node_j, weight=data['weight'])
+            max_flow_scores.append(np.mean([nx.algorithms.flow.maximum_flow_value(collapsed_graph_nx, node_i, node_j, capacity="weight")
+                                            for node_i, node_j in pairs_with_max_path_len]))
+        else:
+            max_flow_scores.append(1.0)
+        node_index_by_key = {node_key: node_index for node_index, node_key in enumerate(result_graph_nx.nodes)}
+        adj_matrix = nx.to_numpy_array(result_graph_nx)
+        adj_matrix_power = np.linalg.matrix_power(adj_matrix, max_path_len)/math.factorial(max_path_len)
+        longest_path_scores.append(np.mean([adj_matrix_power[node_index_by_key[node_i], node_index_by_key[node_j]]
+                                            for node_i, node_j in pairs_with_max_path_len]))
+        frobenius_norm_scores.append(np.linalg.norm(adj_matrix, ord='fro'))
+    return [max_flow_scores, longest_path_scores, frobenius_norm_scores]
+
+
+QUERY_GRAPHS = {
+    "one_hop": (["n0", "n1"], {"e0": ("n0", "n1")}),
+    "triangle_with_parallel_qedge_and_tail": (["n0", "n1", "n2", "n3"], {"e0": ("n0", "n1"), "e1": ("n1", "n2"), "e2": ("n0", "n2"),
+                                                                         "e3": ("n0", "n1"), "e4": ("n2", "n3")}),
+    "two_hop_chain": (["n0", "n1", "n2"], {"e0": ("n0", "n1"), "e1": ("n1", "n2")}),
+}
+
+
+@pytest.mark.parametrize("query_graph_name", QUERY_GRAPHS)
+def test_score_result_graphs_matches_networkx(query_graph_name):
+    query_graph = _create_query_graph(*QUERY_GRAPHS[query_graph_name])
+    kg_edge_id_to_edge, results = _create_results(query_graph, 50)
+    response = ARAXResponse()
+    scores = ARAX_ranker._score_result_graphs(kg_edge_id_to_edge, query_graph, results, response)
+    reference_scores = _get_networkx_reference_scores(kg_edge_id_to_edge, query_graph, results)
+    assert len(scores) == len(reference_scores)
+    for scorer_scores, scorer_reference_scores in zip(scores, reference_scores):
+        assert np.allclose(scorer_scores, scorer_reference_scores)
+    assert response.status == 'OK'
+
+
+class FailingPool:
+    def __init__(self, error: Exception):
+        self.error = error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def map_async(self, func, iterable):
+        return self
+
+    def get(self, timeout=None):
+        raise self.error
+
+
+class FailingContext:
+    def __init__(self, error: Exception):
+        self.error = error
+
+    def Pool(self, processes=None):
+        return FailingPool(self.error)
+
+
+@pytest.mark.parametrize("error, expected_warning", [
+    (multiprocessing.TimeoutError(), "took over"),
+    (OSError("Can't start new process"), "Failed to score results in parallel"),
+])
+def test_score_result_graphs_falls_back_to_serial(monkeypatch, error, expected_warning):
+    query_graph = _create_query_graph(*QUERY_GRAPHS["triangle_with_parallel_qedge_and_tail"])
+    kg_edge_id_to_edge, results = _create_results(query_graph, 25)
+    monkeypatch.setattr(ARAX_ranker, "MIN_RESULTS_FOR_PROCESS_POOL", 10)
+    monkeypatch.setattr(ARAX_ranker, "RESULT_SCORING_CHUNK_SIZE", 10)
+    monkeypatch.setattr(ARAX_ranker.multiprocessing, "get_context", lambda method: FailingContext(error))
+    response = ARAXResponse()
+    scores = ARAX_ranker._score_result_graphs(kg_edge_id_to_edge, query_graph, results, response)
+    assert any(expected_warning in message['message'] for message in response.messages if message['level'] == 'WARNING')
+    assert response.status == 'OK'
+    reference_scores = _get_networkx_reference_scores(kg_edge_id_to_edge, query_graph, results)
+    for scorer_scores, scorer_reference_scores in zip(scores, reference_scores):
+        assert np.allclose(scorer_scores, scorer_reference_scores)
+
+
+@pytest.mark.slow
+def test_score_result_graphs_in_parallel(monkeypatch):
+    query_graph = _create_query_graph(*QUERY_GRAPHS["triangle_with_parallel_qedge_and_tail"])
+    kg_edge_id_to_edge, results = _create_results(query_graph, 25)
+    monkeypatch.setattr(ARAX_ranker, "MIN_RESULTS_FOR_PROCESS_POOL", 10)
+    monkeypatch.setattr(ARAX_ranker, "RESULT_SCORING_CHUNK_SIZE", 10)
+    response = ARAXResponse()
+    scores = ARAX_ranker._score_result_graphs(kg_edge_id_to_edge, query_graph, results, response)
+    assert not [message for message in response.messages if message['level'] == 'WARNING']
+    reference_scores = _get_networkx_reference_scores(kg_edge_id_to_edge, query_graph, results)
+    for scorer_scores, scorer_reference_scores in zip(scores, reference_scores):
+        assert np.allclose(scorer_scores, scorer_reference_scores)
+
+
+def _create_edge(attributes: list = None) -> Edge:
+    return Edge(subject="n0", object="n1",
+                attributes=[Attribute(name=name, value=value) for name, value in attributes] if attributes is not None else None)
+
+
+def _rank_edges(ranker: ARAX_ranker.ARAXRanker, edges: list) -> ARAXResponse:
+    response = ARAXResponse()
+    response.envelope = Response(message=Message(query_graph=QueryGraph(nodes=dict(), edges=dict()),
+                                                 knowledge_graph=KnowledgeGraph(nodes=dict(), edges={f"edge{edge_index}": edge for edge_index, edge in enumerate(edges)}),
+                                                 results=[]))
+    ranker.aggregate_scores_dmk(response)
+    return response
+
+
+def test_edge_confidences_match_scalar_normalizers():
+    edges = [
+        _create_edge([("probability_treats", 0.8), ("normalized_google_distance", "0.3"), ("jaccard_index", 0.2)]),
+        _create_edge([("jaccard_index", 0.5), ("paired_concept_frequency", 0.003), ("observed_expected_ratio", 2.5)]),
+        _create_edge([("chi_square", 0.0), ("chi_square_pvalue", 1e-5), ("MAGMA-pvalue", 0.01), ("Genetics-quantile", 0.7)]),
+        _create_edge([("fisher_exact_test_p-value", 0.05), ("Richards-effector-genes", 1), ("probability", float('nan'))]),
+        _create_edge([("probability", None), ("some_unknown_attribute", "whatever")]),
+        _create_edge(None),
+        _create_edge([]),
+        _create_edge([("probability", 0.9), ("probability", 0.85), ("probability_treats", 0.7)]),
+        _create_edge([("provided_by", "SEMMEDDB:"), ("publications", ["PMID:1", "PMID:2", "PMID:3"])]),
+        _create_edge([("provided_by", "SEMMEDDB:"), ("probability", 0.95)]),
+        _create_edge([("provided_by", "infores:other"), ("publications", ["PMID:1"])]),
+        _create_edge([("confidence", 0.42), ("probability", 0.1)]),
+    ]
+    ranker = ARAX_ranker.ARAXRanker()
+    response = _rank_edges(ranker, edges)
+    assert response.status == 'OK'
+    assert ranker.score_stats['jaccard_index'] == {'minimum': 0.2, 'maximum': 0.5}
+
+    reference_ranker = ARAX_ranker.ARAXRanker()
+    reference_ranker.score_stats = ranker.score_stats
+    for edge in edges[:-1]:
+        assert edge.confidence == pytest.approx(reference_ranker.edge_attribute_score_combiner(edge))
+    assert edges[-1].confidence == 0.42
+    assert edges[5].confidence == edges[6].confidence == 1.0
+    assert edges[8].confidence < 1.0
+
+
+def test_get_edge_attribute_columns_keeps_repeated_attributes():
+    edges = [_create_edge([("probability", 0.9), ("probability", "0.85")]),
+             _create_edge([("probability", "not a number"), ("jaccard_index", 0.1)])]
+    attribute_columns, given_confidences, semmeddb_columns = ARAX_ranker.ARAXRanker().get_edge_attribute_columns(edges)
+    edge_indexes, values = attribute_columns['probability']
+    assert edge_indexes.tolist() == [0, 0, 1]
+    assert values[:2].tolist() == [0.9, 0.85]
+    assert np.isnan(values[2])
+    assert attribute_columns['jaccard_index'][0].tolist() == [1]
+    assert given_confidences == dict()
+    assert semmeddb_columns[0].size == 0
+
+
+def test_unparseable_edge_attribute_values_normalize_to_zero():
+    ranker = ARAX_ranker.ARAXRanker()
+    with pytest.raises(ValueError):  # which used to abort the ranking altogether
+        ranker.edge_attribute_score_normalizer("probability", "not a number")
+    edges = [_create_edge([("probability", "not a number"), ("probability_treats", 0.9)]),
+             _create_edge([("probability_treats", 0.9)])]
+    response = _rank_edges(ranker, edges)
+    assert response.status == 'OK'
+    assert edges[0].confidence == 0.0
+    assert edges[1].confidence == pytest.approx(ranker.edge_attribute_score_normalizer("probability_treats", 0.9))
+
+
+def test_score_stats_accumulate_across_knowledge_graphs():
+    ranker = ARAX_ranker.ARAXRanker()
+    _rank_edges(ranker, [_create_edge([("jaccard_index", 0.5)]), _create_edge([("jaccard_index", 0.3)])])
+    assert ranker.score_stats['jaccard_index'] == {'minimum': 0.3, 'maximum': 0.5}
+    edges = [_create_edge([("jaccard_index", 0.25)]), _create_edge([("jaccard_index", float('inf'))])]
+    _rank_edges(ranker, edges)
+    assert ranker.score_stats['jaccard_index'] == {'minimum': 0.25, 'maximum': 0.5}
+    assert edges[0].confidence == pytest.approx(0.5)
+    _rank_edges(ranker, [_create_edge([("jaccard_index", float('nan'))])])
+    assert ranker.score_stats['jaccard_index'] == {'minimum': 0.25, 'maximum': 0.5}
+
+
+if __name__ == "__main__":
+    pytest.main(['-v', 'test_ARAX_ranker.py'])
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import pytest
+
+import gzip
+import json
+
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../ARAXQuery")
+from ARAX_query import ARAXQuery
+from ARAX_response import ARAXResponse
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../ResponseCache")
+import response_cache
+from response_cache import ResponseCache, CachedAnswer
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../../UI/OpenAPI/python-flask-server/")
+from openapi_server.models.response import Response as Envelope
+
+
+@pytest.fixture
+def temp_response_cache(tmp_path, monkeypatch):
+    # Every ResponseCache (including the ones ARAXQuery creates) uses a fresh sqlite database and response dir
+    database_path = str(tmp_path / 'ResponseCache.sqlite')
+    def connect(self):
+        self.engine = create_engine(f"sqlite:///{database_path}")
+        response_cache.Base.metadata.create_all(self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+    monkeypatch.setattr(ResponseCache, 'connect', connect)
+    monkeypatch.setattr(ResponseCache, 'get_response_dir', lambda self: str(tmp_path / 'responses'))
+    return ResponseCache()
+
+
+def _store_response(cache, n_results=1):
+    response = ARAXResponse()
+    response.envelope = Envelope.from_dict({ 'status': 'OK', 'description': 'Test response', 'message': { 'query_graph': { 'nodes': {}, 'edges': {} },
+        'knowledge_graph': { 'nodes': {}, 'edges': {} },
+        'results': [ { 'node_bindings': {}, 'edge_bindings': {}, 'id': f"result_{i}" } for i in range(n_results) ] } })
+    return cache.add_new_response(response)
+
+
+def test_answer_cache_key(temp_response_cache, monkeypatch):
+    cache = temp_response_cache
+    message = { 'query_graph': { 'nodes': { 'n00': { 'id': 'CHEMBL.COMPOUND:CHEMBL112' }, 'n01': { 'category': 'biolink:Protein' } },
+                                 'edges': { 'e00': { 'subject': 'n00', 'object': 'n01' } } } }
+    actions = [ { 'command': 'expand', 'parameters': { 'kp': 'ARAX/KG2', 'edge_key': 'e00' } },
+                { 'command': 'return', 'parameters': { 'message': 'true', 'store': 'true' } } ]
+    key = cache.get_answer_cache_key(actions, message)
+    assert len(key) == 64
+    assert cache.get_answer_cache_key(actions, message) == key
+
+    # Parameter and property order, and how the answer is returned, don't matter
+    reordered_actions = [ { 'command': 'expand', 'parameters': { 'edge_key': 'e00', 'kp': 'ARAX/KG2' } } ]
+    reordered_message = { 'query_graph': { 'edges': { 'e00': { 'object': 'n01', 'subject': 'n00' } },
+                                           'nodes': { 'n01': { 'category': 'biolink:Protein' }, 'n00': { 'id': 'CHEMBL.COMPOUND:CHEMBL112' } } } }
+    assert cache.get_answer_cache_key(reordered_actions, reordered_message) == key
+
+    # But different actions, inputs or code do
+    assert cache.get_answer_cache_key([ { 'command': 'expand', 'parameters': { 'kp': 'ARAX/KG1', 'edge_key': 'e00' } } ], message) != key
+    assert cache.get_answer_cache_key(actions, { 'query_graph': { 'nodes': {}, 'edges': {} } }) != key
+    versions = cache.get_answer_cache_versions()
+    assert versions['code_revision'] and 'ngd_database' in versions
+    monkeypatch.setattr(response_cache, '_code_revision', 'another revision')
+    assert cache.get_answer_cache_key(actions, message) != key
+
+
+def test_cached_answer_hit_and_expiry(temp_response_cache):
+    cache = temp_response_cache
+    assert cache.get_cached_answer('a' * 64) is None
+    response_id = _store_response(cache, n_results=2)
+    cache.add_cached_answer('a' * 64, response_id, 12.5)
+
+    response = ARAXResponse()
+    cached_response_id, envelope = cache.get_cached_answer('a' * 64, response)
+    assert cached_response_id == response_id
+    assert len(envelope['message']['results']) == 2
+    assert cache.get_answer_cache_stats() == { 'n_entries': 1, 'n_hits': 1, 'seconds_saved': 12.5 }
+
+    # Once the entry is older than the TTL, it is dropped
+    cached_answer = cache.session.query(CachedAnswer).filter(CachedAnswer.cache_key == 'a' * 64).one()
+    cached_answer.cached_datetime = datetime.now() - cache.answer_cache_ttl - timedelta(minutes=1)
+    cache.session.commit()
+    assert cache.get_cached_answer('a' * 64) is None
+    assert cache.get_answer_cache_stats()['n_entries'] == 0
+
+
+def test_cached_answer_lru_eviction(temp_response_cache):
+    cache = temp_response_cache
+    cache.answer_cache_max_entries = 2
+    response_id = _store_response(cache)
+    cache.add_cached_answer('a' * 64, response_id, 1.0)
+    cache.add_cached_answer('b' * 64, response_id, 1.0)
+    # Using 'a' makes 'b' the least recently used entry, so adding 'c' evicts 'b'
+    assert cache.get_cached_answer('a' * 64) is not None
+    cache.add_cached_answer('c' * 64, response_id, 1.0)
+    assert cache.get_cached_answer('b' * 64) is None
+    assert cache.get_cached_answer('a' * 64) is not None
+    assert cache.get_cached_answer('c' * 64) is not None
+
+
+def test_query_uses_and_bypasses_cache(temp_response_cache):
+    query = { "operations": { "actions": [
+            "create_message",
+            "add_qnode(category=biolink:ChemicalSubstance, key=n00)",
+            "add_qnode(category=biolink:Protein, key=n01)",
+            "add_qedge(subject=n00, object=n01, key=e00)",
+            "return(message=true, store=true)",
+        ] } }
+    def run_query(bypass_cache=False):
+        araxq = ARAXQuery()
+        araxq.query(dict(query, bypass_cache='true') if bypass_cache else dict(query))
+        assert araxq.response.status == 'OK'
+        return [ message['message'] for message in araxq.response.messages ]
+
+    assert not any(log.startswith('Found a cached answer') for log in run_query())
+    assert any(log.startswith('Found a cached answer') for log in run_query())
+    log = run_query(bypass_cache=True)
+    assert not any(log_message.startswith('Found a cached answer') for log_message in log)
+    assert 'bypass_cache is set, so computing a fresh answer' in log
+
+
+def _create_envelope(n_results=4, results=True, knowledge_graph=True):
+    message = { 'query_graph': { 'nodes': { 'n00': { 'id': 'CURIE:0' }, 'n01': { 'category': 'biolink:Protein' } },
+                                 'edges': { 'e00': { 'subject': 'n00', 'object': 'n01' } } },
+                'knowledge_graph': { 'nodes': { f"CURIE:{i}": { 'name': f"node {i}", 'category': [ 'biolink:Protein' ] } for i in range(n_results + 1) },
+                                     'edges': { f"E{i}": { 'subject': 'CURIE:0', 'object': f"CURIE:{i}", 'attributes': [ { 'name': 'weight', 'type': 'EDAM:data_0951', 'value': i } ] }
+                                                for i in range(1, n_results + 1) } } if knowledge_graph else None,
+                'results': [ { 'node_bindings': { 'n00': [ { 'id': 'CURIE:0' } ], 'n01': [ { 'id': f"CURIE:{i}" } ] },
+                               'edge_bindings': { 'e00': [ { 'id': f"E{i}" } ] }, 'id': f"result_{i}", 'confidence': 1.0 / i }
+                             for i in range(1, n_results + 1) ] if results else None }
+    return Envelope.from_dict({ 'status': 'OK', 'description': 'Test response', 'message': message })
+
+
+def _store_envelope(cache, envelope):
+    response = ARAXResponse()
+    response.envelope = envelope
+    return cache.add_new_response(response)
+
+
+def test_envelope_json_round_trip(temp_response_cache):
+    cache = temp_response_cache
+    for envelope in [ _create_envelope(), _create_envelope(n_results=0), _create_envelope(results=False),
+                      _create_envelope(knowledge_graph=False), _create_envelope(results=False, knowledge_graph=False) ]:
+        assert json.loads(''.join(cache.iter_envelope_json(envelope))) == envelope.to_dict()
+
+
+def test_partial_response(temp_response_cache):
+    cache = temp_response_cache
+    envelope = _create_envelope()
+    response_id = _store_envelope(cache, envelope)
+    assert cache.get_response_path(response_id).endswith('.json.gz')
+    assert cache.get_response(response_id) == json.loads(json.dumps(envelope.to_dict()))
+
+    summary = cache.get_partial_response(response_id, max_results=0)
+    assert summary['description'] == 'Test response'
+    assert summary['message']['results'] == []
+    assert summary['message']['knowledge_graph'] == { 'nodes': {}, 'edges': {} }
+    assert summary['message']['query_graph'] == envelope.message.query_graph.to_dict()
+    assert summary['logs'][-1]['code'] == 'PartialResponse' and 'first 0 of 4 results' in summary['logs'][-1]['message']
+
+    # Only the first results, and the nodes and edges they bind, are read
+    partial = cache.get_partial_response(response_id, max_results=2)
+    full_message = envelope.to_dict()['message']
+    assert partial['message']['results'] == full_message['results'][:2]
+    assert set(partial['message']['knowledge_graph']['nodes']) == { 'CURIE:0', 'CURIE:1', 'CURIE:2' }
+    assert partial['message']['knowledge_graph']['edges'] == { key: full_message['knowledge_graph']['edges'][key] for key in [ 'E1', 'E2' ] }
+
+    # Asking for more results than there are gives all of them
+    partial = cache.get_partial_response(response_id, max_results=10)
+    assert partial['message']['results'] == full_message['results']
+    assert partial['message']['knowledge_graph'] == full_message['knowledge_graph']
+
+
+def test_partial_response_with_null_results_or_knowledge_graph(temp_response_cache, tmp_path):
+    cache = temp_response_cache
+    for envelope in [ _create_envelope(results=False), _create_envelope(knowledge_graph=False) ]:
+        response_path = str(tmp_path / 'response.json.gz')
+        with gzip.open(response_path, 'wt', encoding='utf-8') as outfile:
+            outfile.writelines(cache.iter_envelope_json(envelope))
+        expected_message = envelope.to_dict()['message']
+        for max_results in [ 0, 2 ]:
+            message = cache.read_partial_response(response_path, max_results)['message']
+            assert message['query_graph'] == expected_message['query_graph']
+            if envelope.message.results is None:
+                assert message['results'] is None
+                assert message['knowledge_graph'] == { 'nodes': {}, 'edges': {} }
+            else:
+                assert message['results'] == expected_message['results'][:max_results]
+                assert message['knowledge_graph'] is None
+
+
+def test_partial_response_from_legacy_json_file(temp_response_cache):
+    cache = temp_response_cache
+    envelope = _create_envelope()
+    response_id = _store_envelope(cache, envelope)
+
+    # Responses stored before they were compressed are plain .json files
+    compressed_path = cache.get_response_path(response_id)
+    with gzip.open(compressed_path, 'rt', encoding='utf-8') as infile:
+        envelope_dict = json.load(infile)
+    os.remove(compressed_path)
+    with open(f"{cache.get_response_dir()}/{response_id}.json", 'w') as outfile:
+        json.dump(envelope_dict, outfile)
+    assert cache.get_response_path(response_id).endswith('.json')
+    assert cache.get_response(response_id) == envelope_dict
+
+    partial = cache.get_partial_response(response_id, max_results=1)
+    assert partial['message']['results'] == envelope_dict['message']['results'][:1]
+    assert set(partial['message']['knowledge_graph']['nodes']) == { 'CURIE:0', 'CURIE:1' }
+    assert set(partial['message']['knowledge_graph']['edges']) == { 'E1' }
+    assert 'first 1 of 4 results' in partial['logs'][-1]['message']
+
+
+if __name__ == "__main__": pytest.main(['-v'])
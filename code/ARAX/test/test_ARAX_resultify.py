@@ -1432,5 +1432,29 @@ def test_recompute_qg_keys():
         assert edge.qedge_keys == ["e00"]
 
 
+def test_dead_ends_with_selective_qnode():
+    # Tests that dead ends are cleaned up when resultify starts from the most selective qnode (n02 here), which is
+    # fulfilled by only one KG node
+    shorthand_qnodes = {"n00": "",
+                        "n01": "is_set",
+                        "n02": ""}
+    shorthand_qedges = {"e00": "n00--n01",
+                        "e01": "n01--n02"}
+    query_graph = _convert_shorthand_to_qg(shorthand_qnodes, shorthand_qedges)
+    shorthand_kg_nodes = {"n00": ["DOID:111", "DOID:222", "DOID:333"],
+                          "n01": ["UniProtKB:111", "UniProtKB:222", "UniProtKB:333"],
+                          "n02": ["CHEBI:111"]}
+    shorthand_kg_edges = {"e00": ["DOID:111--UniProtKB:111", "DOID:222--UniProtKB:222", "DOID:333--UniProtKB:333",
+                                  "DOID:333--UniProtKB:111"],
+                          "e01": ["UniProtKB:111--CHEBI:111", "UniProtKB:333--CHEBI:111"]}
+    knowledge_graph = _convert_shorthand_to_kg(shorthand_kg_nodes, shorthand_kg_edges)
+    results = ARAX_resultify._get_results_for_kg_by_qg(knowledge_graph, query_graph)
+    assert len(results) == 2
+    result_n01_nodes_by_n00_node = {next(iter(_get_result_node_keys_by_qg_key(result)["n00"])): _get_result_node_keys_by_qg_key(result)["n01"]
+                                    for result in results}
+    assert result_n01_nodes_by_n00_node == {"DOID:111": {"UniProtKB:111"},
+                                            "DOID:333": {"UniProtKB:111", "UniProtKB:333"}}
+
+
 if __name__ == '__main__':
     pytest.main(['-v', 'test_ARAX_resultify.py'])
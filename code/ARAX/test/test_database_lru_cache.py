@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../../")
+from database_lru_cache import DatabaseLRUCache, get_file_signature
+
+
+def test_lru_eviction_and_stats():
+    cache = DatabaseLRUCache(max_size=2)
+    cache.put_many([ ('a', 1), ('b', 2) ])
+    assert cache.get_many([ 'a' ]) == { 'a': 1 }
+    # 'b' is now the least recently used entry, so it goes first
+    cache.put_many([ ('c', 3) ])
+    assert cache.get_many([ 'a', 'b', 'c' ]) == { 'a': 1, 'c': 3 }
+    stats = cache.get_stats()
+    assert stats['size'] == 2 and stats['evictions'] == 1
+    assert stats['hits'] == 3 and stats['misses'] == 1
+
+
+def test_invalidated_when_database_changes(tmp_path):
+    database_path = str(tmp_path / 'test.sqlite')
+    with open(database_path, 'w') as outfile:
+        outfile.write('version 1')
+    cache = DatabaseLRUCache(max_size=10)
+    cache.check_database(database_path)
+    cache.put_many([ ('a', 1) ])
+    cache.check_database(database_path)
+    assert cache.get_many([ 'a' ]) == { 'a': 1 }
+
+    # A new version of the file replaces the old one
+    signature = get_file_signature(database_path)
+    with open(database_path + '.new', 'w') as outfile:
+        outfile.write('version 2!')
+    os.replace(database_path + '.new', database_path)
+    assert get_file_signature(database_path) != signature
+    cache.check_database(database_path)
+    assert cache.get_many([ 'a' ]) == {}
+    assert cache.get_stats()['invalidations'] == 1
+    assert get_file_signature(str(tmp_path / 'missing.sqlite')) is None
+
+
+if __name__ == "__main__": pytest.main(['-v'])
@@ -27,11 +27,15 @@ def query(request_body, bypass_cache=None):  # noqa: E501
     # Note that we never even get here if the request_body is not schema-valid JSON
 
     query = connexion.request.get_json()
+    if bypass_cache is not None:
+        query['bypass_cache'] = bypass_cache
     araxq = ARAXQuery()
+    araxq.origin = 'API'
+    araxq.remote_address = connexion.request.headers.get('X-Forwarded-For', connexion.request.remote_addr)
 
     if "asynchronous" in query and query['asynchronous'].lower() == 'stream':
-        # Return a stream of data to let the client know what's going on
-        return Response(araxq.query_return_stream(query),mimetype='text/plain')
+        # Return a stream of newline-delimited JSON (log messages, ranked results, then the envelope) to let the client know what's going on
+        return Response(araxq.query_return_stream(query),mimetype='application/x-ndjson')
 
     # Else perform the query and return the result
     else:
@@ -1,6 +1,9 @@
 import connexion
 import six
 
+# Import to allow streaming of stored responses
+from flask import Response as FlaskResponse
+
 from openapi_server.models.response import Response  # noqa: E501
 from openapi_server import util
 
@@ -10,18 +13,33 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../../../../../ARAX
 from response_cache import ResponseCache
 
 
-def get_response(response_id):  # noqa: E501
+def get_response(response_id, max_results=None):  # noqa: E501
     """Request a previously stored response from the server
 
      # noqa: E501
 
     :param response_id: Integer identifier of the response to return
     :type response_id: int
+    :param max_results: If set, return only the first max_results results, together with the knowledge graph nodes and edges they bind
+    :type max_results: int
 
     :rtype: Response
     """
 
     response_cache = ResponseCache()
+    if max_results is not None:
+        return response_cache.get_partial_response(response_id, max_results)
+
+    # Send a locally stored response straight from its file, still gzipped if the client accepts that
+    accept_gzip = 'gzip' in connexion.request.headers.get('Accept-Encoding', '')
+    response_stream = response_cache.get_response_stream(response_id, accept_gzip=accept_gzip)
+    if response_stream is not None:
+        chunks, content_encoding = response_stream
+        http_response = FlaskResponse(chunks, mimetype='application/json')
+        if content_encoding is not None:
+            http_response.headers['Content-Encoding'] = content_encoding
+        http_response.headers['Vary'] = 'Accept-Encoding'
+        return http_response
+
     envelope = response_cache.get_response(response_id)
     return envelope
-
@@ -0,0 +1,230 @@
+"""Deserialization of TRAPI 1.0 messages into the openapi_server models.
+
+util.deserialize_model() handles any model by reflecting over openapi_types and typing_utils at every level, which
+gets slow for messages with hundreds of thousands of nodes, edges, attributes and bindings. The functions here build
+the same objects for the Message schema with plain dict lookups. They keep util's behavior: primitive values are
+coerced to their declared type, and an explicit null for a required property raises ValueError. The small parts of a
+message (query graph, logs, operations) still go through util.
+"""
+
+import contextlib
+import gc
+
+from openapi_server import util
+from openapi_server.models.attribute import Attribute
+from openapi_server.models.edge import Edge
+from openapi_server.models.edge_binding import EdgeBinding
+from openapi_server.models.node import Node
+from openapi_server.models.node_binding import NodeBinding
+from openapi_server.models.result import Result
+
+
+def _raise_none(attr):
+    raise ValueError("Invalid value for `{}`, must not be `None`".format(attr))
+
+
+def _str(value):
+    if value is None or value.__class__ is str:
+        return value
+    return util._deserialize_primitive(value, str)
+
+
+def _float(value):
+    if value is None or value.__class__ is float:
+        return value
+    return util._deserialize_primitive(value, float)
+
+
+def _int(value):
+    if value is None or value.__class__ is int:
+        return value
+    return util._deserialize_primitive(value, int)
+
+
+# The models below are created without calling __init__, and their private properties are set directly, just as
+# __init__ does. Values that already have their declared type (nearly all of them) skip the call to _str()
+
+
+def _attribute(data):
+    if data.__class__ is not dict:
+        return None if data is None else util.deserialize_model(data, Attribute)
+    get = data.get
+    name, value, type, url, source = get('name'), get('value'), get('type'), get('url'), get('source')
+    if value is None and 'value' in data:
+        _raise_none('value')
+    if type is None and 'type' in data:
+        _raise_none('type')
+    attribute = Attribute.__new__(Attribute)
+    attribute._name = name if name.__class__ is str else _str(name)
+    attribute._value = value if value.__class__ is str else _str(value)
+    attribute._type = type if type.__class__ is str else _str(type)
+    attribute._url = url if url.__class__ is str else _str(url)
+    attribute._source = source if source.__class__ is str else _str(source)
+    return attribute
+
+
+def _attributes(data):
+    if data is None:
+        return None
+    return [_attribute(attribute) for attribute in data]
+
+
+def _node(data):
+    if data.__class__ is not dict:
+        return None if data is None else util.deserialize_model(data, Node)
+    get = data.get
+    name, category = get('name'), get('category')
+    node = Node.__new__(Node)
+    node._name = name if name.__class__ is str else _str(name)
+    node._category = category if category.__class__ is str else _str(category)
+    node._attributes = _attributes(get('attributes'))
+    return node
+
+
+def _edge(data):
+    if data.__class__ is not dict:
+        return None if data is None else util.deserialize_model(data, Edge)
+    get = data.get
+    predicate, relation, subject, object = get('predicate'), get('relation'), get('subject'), get('object')
+    if subject is None and 'subject' in data:
+        _raise_none('subject')
+    if object is None and 'object' in data:
+        _raise_none('object')
+    edge = Edge.__new__(Edge)
+    edge._predicate = predicate if predicate.__class__ is str else _str(predicate)
+    edge._relation = relation if relation.__class__ is str else _str(relation)
+    edge._subject = subject if subject.__class__ is str else _str(subject)
+    edge._object = object if object.__class__ is str else _str(object)
+    edge._attributes = _attributes(get('attributes'))
+    return edge
+
+
+def _binding(data, klass):
+    if data.__class__ is not dict:
+        return None if data is None else util.deserialize_model(data, klass)
+    id = data.get('id')
+    if id is None and 'id' in data:
+        _raise_none('id')
+    binding = klass.__new__(klass)
+    binding._id = id if id.__class__ is str else _str(id)
+    return binding
+
+
+def _bindings(data, klass):
+    if data is None:
+        return None
+    return {key: None if bindings is None else [_binding(binding, klass) for binding in bindings]
+            for key, bindings in data.items()}
+
+
+def _result(data):
+    if data.__class__ is not dict:
+        return None if data is None else util.deserialize_model(data, Result)
+    get = data.get
+    node_bindings, edge_bindings, row_data = get('node_bindings'), get('edge_bindings'), get('row_data')
+    if node_bindings is None and 'node_bindings' in data:
+        _raise_none('node_bindings')
+    if edge_bindings is None and 'edge_bindings' in data:
+        _raise_none('edge_bindings')
+    result = Result.__new__(Result)
+    result._node_bindings = _bindings(node_bindings, NodeBinding)
+    result._edge_bindings = _bindings(edge_bindings, EdgeBinding)
+    result._id = _str(get('id'))
+    result._description = _str(get('description'))
+    result._essence = _str(get('essence'))
+    result._essence_category = _str(get('essence_category'))
+    result._row_data = None if row_data is None else [_str(value) for value in row_data]
+    result._score = _float(get('score'))
+    result._score_name = _str(get('score_name'))
+    result._score_direction = _str(get('score_direction'))
+    result._confidence = _float(get('confidence'))
+    result._result_group = _int(get('result_group'))
+    result._result_group_similarity_score = _float(get('result_group_similarity_score'))
+    result._reasoner_id = _str(get('reasoner_id'))
+    return result
+
+
+@contextlib.contextmanager
+def _gc_paused():
+    # Creating millions of objects that all stay alive would otherwise set off one cyclic garbage collection after
+    # another, each walking the whole growing graph for nothing. That roughly doubles the time a large message takes
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
+
+
+def _deserialize_properties(data, klass, deserializers):
+    """Deserializes a dict into a model like util.deserialize_model, using the given functions for some properties.
+
+    :param data: dict to deserialize.
+    :type data: dict
+    :param klass: class literal.
+    :param deserializers: functions to deserialize a property's value with, by property name.
+    :type deserializers: dict
+    :return: model object.
+    """
+    if data.__class__ is not dict:
+        return util.deserialize_model(data, klass)
+
+    instance = klass()
+    for attr, attr_type in klass.openapi_types.items():
+        key = klass.attribute_map[attr]
+        if key in data:
+            value = data[key]
+            deserializer = deserializers.get(attr)
+            if deserializer is not None:
+                value = None if value is None else deserializer(value)
+            else:
+                value = util._deserialize(value, attr_type)
+            setattr(instance, attr, value)
+    return instance
+
+
+def deserialize_knowledge_graph(data, klass):
+    """Deserializes a dict into a KnowledgeGraph.
+
+    :param data: dict to deserialize.
+    :type data: dict
+    :param klass: the KnowledgeGraph class literal.
+    :return: KnowledgeGraph object.
+    """
+    with _gc_paused():
+        return _deserialize_properties(data, klass, {
+            'nodes': lambda nodes: {key: _node(node) for key, node in nodes.items()},
+            'edges': lambda edges: {key: _edge(edge) for key, edge in edges.items()},
+        })
+
+
+def deserialize_message(data, klass):
+    """Deserializes a dict into a Message.
+
+    :param data: dict to deserialize.
+    :type data: dict
+    :param klass: the Message class literal.
+    :return: Message object.
+    """
+    knowledge_graph_class = klass.openapi_types['knowledge_graph']
+    with _gc_paused():
+        return _deserialize_properties(data, klass, {
+            'results': lambda results: [_result(result) for result in results],
+            'knowledge_graph': lambda knowledge_graph: deserialize_knowledge_graph(knowledge_graph, knowledge_graph_class),
+        })
+
+
+def deserialize_response(data, klass):
+    """Deserializes a dict into a Response envelope.
+
+    :param data: dict to deserialize.
+    :type data: dict
+    :param klass: the Response class literal.
+    :return: Response object.
+    """
+    message_class = klass.openapi_types['message']
+    with _gc_paused():
+        return _deserialize_properties(data, klass, {
+            'message': lambda message: deserialize_message(message, message_class),
+        })
@@ -17,6 +17,24 @@ class Attribute(Model):
     Do not edit the class manually.
     """
 
+    __slots__ = ('_name', '_value', '_type', '_url', '_source')
+
+    openapi_types = {
+        'name': str,
+        'value': str,
+        'type': str,
+        'url': str,
+        'source': str
+    }
+
+    attribute_map = {
+        'name': 'name',
+        'value': 'value',
+        'type': 'type',
+        'url': 'url',
+        'source': 'source'
+    }
+
     def __init__(self, name=None, value=None, type=None, url=None, source=None):  # noqa: E501
         """Attribute - a model defined in OpenAPI
 
@@ -31,22 +49,6 @@ class Attribute(Model):
         :param source: The source of this Attribute.  # noqa: E501
         :type source: str
         """
-        self.openapi_types = {
-            'name': str,
-            'value': str,
-            'type': str,
-            'url': str,
-            'source': str
-        }
-
-        self.attribute_map = {
-            'name': 'name',
-            'value': 'value',
-            'type': 'type',
-            'url': 'url',
-            'source': 'source'
-        }
-
         self._name = name
         self._value = value
         self._type = type
@@ -9,8 +9,12 @@ T = typing.TypeVar('T')
 
 
 class Model(object):
+    # Models that declare __slots__ (the ones a knowledge graph holds millions of, like Edge, Node and Attribute)
+    # carry no per-instance __dict__; the others keep one, so ad hoc attributes can still be set on them
+    __slots__ = ()
+
     # openapiTypes: The key is attribute name and the
-    # value is attribute type.
+    # value is attribute type. Subclasses define these maps once, at the class level.
     openapi_types = {}
 
     # attributeMap: The key is attribute name and the
@@ -85,9 +89,21 @@ class Model(object):
         """For `print` and `pprint`"""
         return self.to_str()
 
+    def _get_state(self):
+        """Returns the attributes set on this object, whether they live in slots or in __dict__
+
+        :rtype: dict
+        """
+        state = dict(getattr(self, '__dict__', {}))
+        for cls in type(self).__mro__:
+            for slot in cls.__dict__.get('__slots__', ()):
+                if hasattr(self, slot):
+                    state[slot] = getattr(self, slot)
+        return state
+
     def __eq__(self, other):
         """Returns true if both objects are equal"""
-        return self.__dict__ == other.__dict__
+        return type(other) is type(self) and self._get_state() == other._get_state()
 
     def __ne__(self, other):
         """Returns true if both objects are not equal"""
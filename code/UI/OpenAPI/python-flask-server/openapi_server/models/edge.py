@@ -17,6 +17,26 @@ class Edge(Model):
     Do not edit the class manually.
     """
 
+    # Besides the private storage for the properties below, ARAX sets qedge_keys (Expand/Overlay), qedge_id
+    # (KnowledgeGraphInfo) and confidence (the ranker) on edges
+    __slots__ = ('_predicate', '_relation', '_subject', '_object', '_attributes', 'qedge_keys', 'qedge_id', 'confidence')
+
+    openapi_types = {
+        'predicate': str,
+        'relation': str,
+        'subject': str,
+        'object': str,
+        'attributes': List[Attribute]
+    }
+
+    attribute_map = {
+        'predicate': 'predicate',
+        'relation': 'relation',
+        'subject': 'subject',
+        'object': 'object',
+        'attributes': 'attributes'
+    }
+
     def __init__(self, predicate=None, relation=None, subject=None, object=None, attributes=None):  # noqa: E501
         """Edge - a model defined in OpenAPI
 
@@ -31,22 +51,6 @@ class Edge(Model):
         :param attributes: The attributes of this Edge.  # noqa: E501
         :type attributes: List[Attribute]
         """
-        self.openapi_types = {
-            'predicate': str,
-            'relation': str,
-            'subject': str,
-            'object': str,
-            'attributes': List[Attribute]
-        }
-
-        self.attribute_map = {
-            'predicate': 'predicate',
-            'relation': 'relation',
-            'subject': 'subject',
-            'object': 'object',
-            'attributes': 'attributes'
-        }
-
         self._predicate = predicate
         self._relation = relation
         self._subject = subject
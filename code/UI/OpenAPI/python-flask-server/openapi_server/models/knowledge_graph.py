@@ -8,7 +8,7 @@ from typing import List, Dict  # noqa: F401
 from openapi_server.models.base_model_ import Model
 from openapi_server.models.edge import Edge
 from openapi_server.models.node import Node
-from openapi_server import util
+from openapi_server import message_deserializer
 
 from openapi_server.models.edge import Edge  # noqa: E501
 from openapi_server.models.node import Node  # noqa: E501
@@ -19,6 +19,16 @@ class KnowledgeGraph(Model):
     Do not edit the class manually.
     """
 
+    openapi_types = {
+        'nodes': Dict[str, Node],
+        'edges': Dict[str, Edge]
+    }
+
+    attribute_map = {
+        'nodes': 'nodes',
+        'edges': 'edges'
+    }
+
     def __init__(self, nodes=None, edges=None):  # noqa: E501
         """KnowledgeGraph - a model defined in OpenAPI
 
@@ -27,16 +37,6 @@ class KnowledgeGraph(Model):
         :param edges: The edges of this KnowledgeGraph.  # noqa: E501
         :type edges: Dict[str, Edge]
         """
-        self.openapi_types = {
-            'nodes': Dict[str, Node],
-            'edges': Dict[str, Edge]
-        }
-
-        self.attribute_map = {
-            'nodes': 'nodes',
-            'edges': 'edges'
-        }
-
         self._nodes = nodes
         self._edges = edges
 
@@ -49,7 +49,7 @@ class KnowledgeGraph(Model):
         :return: The KnowledgeGraph of this KnowledgeGraph.  # noqa: E501
         :rtype: KnowledgeGraph
         """
-        return util.deserialize_model(dikt, cls)
+        return message_deserializer.deserialize_knowledge_graph(dikt, cls)
 
     @property
     def nodes(self):
@@ -15,6 +15,20 @@ class LogEntry(Model):
     Do not edit the class manually.
     """
 
+    openapi_types = {
+        'timestamp': datetime,
+        'level': str,
+        'code': str,
+        'message': str
+    }
+
+    attribute_map = {
+        'timestamp': 'timestamp',
+        'level': 'level',
+        'code': 'code',
+        'message': 'message'
+    }
+
     def __init__(self, timestamp=None, level=None, code=None, message=None):  # noqa: E501
         """LogEntry - a model defined in OpenAPI
 
@@ -27,20 +41,6 @@ class LogEntry(Model):
         :param message: The message of this LogEntry.  # noqa: E501
         :type message: str
         """
-        self.openapi_types = {
-            'timestamp': datetime,
-            'level': str,
-            'code': str,
-            'message': str
-        }
-
-        self.attribute_map = {
-            'timestamp': 'timestamp',
-            'level': 'level',
-            'code': 'code',
-            'message': 'message'
-        }
-
         self._timestamp = timestamp
         self._level = level
         self._code = code
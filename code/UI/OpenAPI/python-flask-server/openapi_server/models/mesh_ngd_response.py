@@ -15,6 +15,18 @@ class MeshNgdResponse(Model):
     Do not edit the class manually.
     """
 
+    openapi_types = {
+        'result_code': str,
+        'message': str,
+        'value': float
+    }
+
+    attribute_map = {
+        'result_code': 'result_code',
+        'message': 'message',
+        'value': 'value'
+    }
+
     def __init__(self, result_code=None, message=None, value=None):  # noqa: E501
         """MeshNgdResponse - a model defined in OpenAPI
 
@@ -25,18 +37,6 @@ class MeshNgdResponse(Model):
         :param value: The value of this MeshNgdResponse.  # noqa: E501
         :type value: float
         """
-        self.openapi_types = {
-            'result_code': str,
-            'message': str,
-            'value': float
-        }
-
-        self.attribute_map = {
-            'result_code': 'result_code',
-            'message': 'message',
-            'value': 'value'
-        }
-
         self._result_code = result_code
         self._message = message
         self._value = value
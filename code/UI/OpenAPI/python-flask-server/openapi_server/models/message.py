@@ -9,7 +9,7 @@ from openapi_server.models.base_model_ import Model
 from openapi_server.models.knowledge_graph import KnowledgeGraph
 from openapi_server.models.query_graph import QueryGraph
 from openapi_server.models.result import Result
-from openapi_server import util
+from openapi_server import message_deserializer
 
 from openapi_server.models.knowledge_graph import KnowledgeGraph  # noqa: E501
 from openapi_server.models.query_graph import QueryGraph  # noqa: E501
@@ -21,6 +21,18 @@ class Message(Model):
     Do not edit the class manually.
     """
 
+    openapi_types = {
+        'results': List[Result],
+        'query_graph': QueryGraph,
+        'knowledge_graph': KnowledgeGraph
+    }
+
+    attribute_map = {
+        'results': 'results',
+        'query_graph': 'query_graph',
+        'knowledge_graph': 'knowledge_graph'
+    }
+
     def __init__(self, results=None, query_graph=None, knowledge_graph=None):  # noqa: E501
         """Message - a model defined in OpenAPI
 
@@ -31,18 +43,6 @@ class Message(Model):
         :param knowledge_graph: The knowledge_graph of this Message.  # noqa: E501
         :type knowledge_graph: KnowledgeGraph
         """
-        self.openapi_types = {
-            'results': List[Result],
-            'query_graph': QueryGraph,
-            'knowledge_graph': KnowledgeGraph
-        }
-
-        self.attribute_map = {
-            'results': 'results',
-            'query_graph': 'query_graph',
-            'knowledge_graph': 'knowledge_graph'
-        }
-
         self._results = results
         self._query_graph = query_graph
         self._knowledge_graph = knowledge_graph
@@ -56,7 +56,7 @@ class Message(Model):
         :return: The Message of this Message.  # noqa: E501
         :rtype: Message
         """
-        return util.deserialize_model(dikt, cls)
+        return message_deserializer.deserialize_message(dikt, cls)
 
     @property
     def results(self):
@@ -19,6 +19,23 @@ class Node(Model):
     Do not edit the class manually.
     """
 
+    # Besides the private storage for the properties below, ARAX sets qnode_keys (Expand), qnode_id
+    # (KnowledgeGraphInfo) and description (some Expand queriers) on nodes
+    __slots__ = ('_name', '_category', '_attributes', 'qnode_keys', 'qnode_id', 'description')
+
+    openapi_types = {
+        'name': str,
+#            'category': OneOfstringarray,
+        'category': str,
+        'attributes': List[Attribute]
+    }
+
+    attribute_map = {
+        'name': 'name',
+        'category': 'category',
+        'attributes': 'attributes'
+    }
+
     def __init__(self, name=None, category=None, attributes=None):  # noqa: E501
         """Node - a model defined in OpenAPI
 
@@ -29,19 +46,6 @@ class Node(Model):
         :param attributes: The attributes of this Node.  # noqa: E501
         :type attributes: List[Attribute]
         """
-        self.openapi_types = {
-            'name': str,
-#            'category': OneOfstringarray,
-            'category': str,
-            'attributes': List[Attribute]
-        }
-
-        self.attribute_map = {
-            'name': 'name',
-            'category': 'category',
-            'attributes': 'attributes'
-        }
-
         self._name = name
         self._category = category
         self._attributes = attributes
@@ -15,20 +15,22 @@ class NodeBinding(Model):
     Do not edit the class manually.
     """
 
+    __slots__ = ('_id',)
+
+    openapi_types = {
+        'id': str
+    }
+
+    attribute_map = {
+        'id': 'id'
+    }
+
     def __init__(self, id=None):  # noqa: E501
         """NodeBinding - a model defined in OpenAPI
 
         :param id: The id of this NodeBinding.  # noqa: E501
         :type id: str
         """
-        self.openapi_types = {
-            'id': str
-        }
-
-        self.attribute_map = {
-            'id': 'id'
-        }
-
         self._id = id
 
     @classmethod
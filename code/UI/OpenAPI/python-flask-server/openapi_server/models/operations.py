@@ -17,6 +17,20 @@ class Operations(Model):
     Do not edit the class manually.
     """
 
+    openapi_types = {
+        'message_uris': List[str],
+        'messages': List[Message],
+        'actions': List[str],
+        'options': Dict[str, object]
+    }
+
+    attribute_map = {
+        'message_uris': 'message_uris',
+        'messages': 'messages',
+        'actions': 'actions',
+        'options': 'options'
+    }
+
     def __init__(self, message_uris=None, messages=None, actions=None, options=None):  # noqa: E501
         """Operations - a model defined in OpenAPI
 
@@ -29,20 +43,6 @@ class Operations(Model):
         :param options: The options of this Operations.  # noqa: E501
         :type options: Dict[str, object]
         """
-        self.openapi_types = {
-            'message_uris': List[str],
-            'messages': List[Message],
-            'actions': List[str],
-            'options': Dict[str, object]
-        }
-
-        self.attribute_map = {
-            'message_uris': 'message_uris',
-            'messages': 'messages',
-            'actions': 'actions',
-            'options': 'options'
-        }
-
         self._message_uris = message_uris
         self._messages = messages
         self._actions = actions
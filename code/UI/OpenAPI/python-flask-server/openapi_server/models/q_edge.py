@@ -17,6 +17,25 @@ class QEdge(Model):
     Do not edit the class manually.
     """
 
+    openapi_types = {
+        #'predicate': OneOfstringarray,
+        'predicate': str,
+        'relation': str,
+        'subject': str,
+        'object': str,
+        'exclude': bool,
+        'option_group_id': str
+    }
+
+    attribute_map = {
+        'predicate': 'predicate',
+        'relation': 'relation',
+        'subject': 'subject',
+        'object': 'object',
+        'exclude': 'exclude',
+        'option_group_id': 'option_group_id'
+    }
+
     def __init__(self, predicate=None, relation=None, subject=None, object=None, exclude=None, option_group_id=None):  # noqa: E501
         """QEdge - a model defined in OpenAPI
 
@@ -33,25 +52,6 @@ class QEdge(Model):
         :param option_group_id: The option_group_id of this QEdge.  # noqa: E501
         :type option_group_id: str
         """
-        self.openapi_types = {
-            #'predicate': OneOfstringarray,
-            'predicate': str,
-            'relation': str,
-            'subject': str,
-            'object': str,
-            'exclude': bool,
-            'option_group_id': str
-        }
-
-        self.attribute_map = {
-            'predicate': 'predicate',
-            'relation': 'relation',
-            'subject': 'subject',
-            'object': 'object',
-            'exclude': 'exclude',
-            'option_group_id': 'option_group_id'
-        }
-
         self._predicate = predicate
         self._relation = relation
         self._subject = subject
@@ -17,6 +17,22 @@ class QNode(Model):
     Do not edit the class manually.
     """
 
+    openapi_types = {
+        #'id': OneOfstringarray,
+        'id': str,
+        #'category': OneOfstringarray,
+        'category': str,
+        'is_set': bool,
+        'option_group_id': str
+    }
+
+    attribute_map = {
+        'id': 'id',
+        'category': 'category',
+        'is_set': 'is_set',
+        'option_group_id': 'option_group_id'
+    }
+
     def __init__(self, id=None, category=None, is_set=False, option_group_id=None):  # noqa: E501
         """QNode - a model defined in OpenAPI
 
@@ -29,22 +45,6 @@ class QNode(Model):
         :param option_group_id: The option_group_id of this QNode.  # noqa: E501
         :type option_group_id: str
         """
-        self.openapi_types = {
-            #'id': OneOfstringarray,
-            'id': str,
-            #'category': OneOfstringarray,
-            'category': str,
-            'is_set': bool,
-            'option_group_id': str
-        }
-
-        self.attribute_map = {
-            'id': 'id',
-            'category': 'category',
-            'is_set': 'is_set',
-            'option_group_id': 'option_group_id'
-        }
-
         self._id = id
         self._category = category
         self._is_set = is_set
@@ -19,6 +19,28 @@ class Query(Model):
     Do not edit the class manually.
     """
 
+    openapi_types = {
+        'message': Message,
+        'bypass_cache': str,
+        'asynchronous': str,
+        'max_results': int,
+        'page_size': int,
+        'page_number': int,
+        'reasoner_ids': List[str],
+        'operations': Operations
+    }
+
+    attribute_map = {
+        'message': 'message',
+        'bypass_cache': 'bypass_cache',
+        'asynchronous': 'asynchronous',
+        'max_results': 'max_results',
+        'page_size': 'page_size',
+        'page_number': 'page_number',
+        'reasoner_ids': 'reasoner_ids',
+        'operations': 'operations'
+    }
+
     def __init__(self, message=None, bypass_cache=None, asynchronous=None, max_results=None, page_size=None, page_number=None, reasoner_ids=None, operations=None):  # noqa: E501
         """Query - a model defined in OpenAPI
 
@@ -39,28 +61,6 @@ class Query(Model):
         :param operations: The operations of this Query.  # noqa: E501
         :type operations: Operations
         """
-        self.openapi_types = {
-            'message': Message,
-            'bypass_cache': str,
-            'asynchronous': str,
-            'max_results': int,
-            'page_size': int,
-            'page_number': int,
-            'reasoner_ids': List[str],
-            'operations': Operations
-        }
-
-        self.attribute_map = {
-            'message': 'message',
-            'bypass_cache': 'bypass_cache',
-            'asynchronous': 'asynchronous',
-            'max_results': 'max_results',
-            'page_size': 'page_size',
-            'page_number': 'page_number',
-            'reasoner_ids': 'reasoner_ids',
-            'operations': 'operations'
-        }
-
         self._message = message
         self._bypass_cache = bypass_cache
         self._asynchronous = asynchronous
@@ -19,6 +19,16 @@ class QueryGraph(Model):
     Do not edit the class manually.
     """
 
+    openapi_types = {
+        'nodes': Dict[str, QNode],
+        'edges': Dict[str, QEdge]
+    }
+
+    attribute_map = {
+        'nodes': 'nodes',
+        'edges': 'edges'
+    }
+
     def __init__(self, nodes=None, edges=None):  # noqa: E501
         """QueryGraph - a model defined in OpenAPI
 
@@ -27,16 +37,6 @@ class QueryGraph(Model):
         :param edges: The edges of this QueryGraph.  # noqa: E501
         :type edges: Dict[str, QEdge]
         """
-        self.openapi_types = {
-            'nodes': Dict[str, QNode],
-            'edges': Dict[str, QEdge]
-        }
-
-        self.attribute_map = {
-            'nodes': 'nodes',
-            'edges': 'edges'
-        }
-
         self._nodes = nodes
         self._edges = edges
 
@@ -15,6 +15,16 @@ class Question(Model):
     Do not edit the class manually.
     """
 
+    openapi_types = {
+        'text': str,
+        'language': str
+    }
+
+    attribute_map = {
+        'text': 'text',
+        'language': 'language'
+    }
+
     def __init__(self, text=None, language=None):  # noqa: E501
         """Question - a model defined in OpenAPI
 
@@ -23,16 +33,6 @@ class Question(Model):
         :param language: The language of this Question.  # noqa: E501
         :type language: str
         """
-        self.openapi_types = {
-            'text': str,
-            'language': str
-        }
-
-        self.attribute_map = {
-            'text': 'text',
-            'language': 'language'
-        }
-
         self._text = text
         self._language = language
 
@@ -9,7 +9,7 @@ from openapi_server.models.base_model_ import Model
 from openapi_server.models.log_entry import LogEntry
 from openapi_server.models.message import Message
 from openapi_server.models.operations import Operations
-from openapi_server import util
+from openapi_server import message_deserializer
 
 from openapi_server.models.log_entry import LogEntry  # noqa: E501
 from openapi_server.models.message import Message  # noqa: E501
@@ -21,6 +21,48 @@ class Response(Model):
     Do not edit the class manually.
     """
 
+    openapi_types = {
+        'message': Message,
+        'status': str,
+        'description': str,
+        'logs': List[LogEntry],
+        'operations': Operations,
+        'reasoner_id': str,
+        'tool_version': str,
+        'schema_version': str,
+        'datetime': str,
+        'table_column_names': List[str],
+        'original_question': str,
+        'restated_question': str,
+        'query_type_id': str,
+        'terms': Dict[str, object],
+        'query_options': object,
+        'context': str,
+        'type': str,
+        'id': str
+    }
+
+    attribute_map = {
+        'message': 'message',
+        'status': 'status',
+        'description': 'description',
+        'logs': 'logs',
+        'operations': 'operations',
+        'reasoner_id': 'reasoner_id',
+        'tool_version': 'tool_version',
+        'schema_version': 'schema_version',
+        'datetime': 'datetime',
+        'table_column_names': 'table_column_names',
+        'original_question': 'original_question',
+        'restated_question': 'restated_question',
+        'query_type_id': 'query_type_id',
+        'terms': 'terms',
+        'query_options': 'query_options',
+        'context': 'context',
+        'type': 'type',
+        'id': 'id'
+    }
+
     def __init__(self, message=None, status=None, description=None, logs=None, operations=None, reasoner_id=None, tool_version=None, schema_version=None, datetime=None, table_column_names=None, original_question=None, restated_question=None, query_type_id=None, terms=None, query_options=None, context=None, type=None, id=None):  # noqa: E501
         """Response - a model defined in OpenAPI
 
@@ -61,48 +103,6 @@ class Response(Model):
         :param id: The id of this Response.  # noqa: E501
         :type id: str
         """
-        self.openapi_types = {
-            'message': Message,
-            'status': str,
-            'description': str,
-            'logs': List[LogEntry],
-            'operations': Operations,
-            'reasoner_id': str,
-            'tool_version': str,
-            'schema_version': str,
-            'datetime': str,
-            'table_column_names': List[str],
-            'original_question': str,
-            'restated_question': str,
-            'query_type_id': str,
-            'terms': Dict[str, object],
-            'query_options': object,
-            'context': str,
-            'type': str,
-            'id': str
-        }
-
-        self.attribute_map = {
-            'message': 'message',
-            'status': 'status',
-            'description': 'description',
-            'logs': 'logs',
-            'operations': 'operations',
-            'reasoner_id': 'reasoner_id',
-            'tool_version': 'tool_version',
-            'schema_version': 'schema_version',
-            'datetime': 'datetime',
-            'table_column_names': 'table_column_names',
-            'original_question': 'original_question',
-            'restated_question': 'restated_question',
-            'query_type_id': 'query_type_id',
-            'terms': 'terms',
-            'query_options': 'query_options',
-            'context': 'context',
-            'type': 'type',
-            'id': 'id'
-        }
-
         self._message = message
         self._status = status
         self._description = description
@@ -131,7 +131,7 @@ class Response(Model):
         :return: The Response of this Response.  # noqa: E501
         :rtype: Response
         """
-        return util.deserialize_model(dikt, cls)
+        return message_deserializer.deserialize_response(dikt, cls)
 
     @property
     def message(self):
@@ -19,6 +19,42 @@ class Result(Model):
     Do not edit the class manually.
     """
 
+    __slots__ = ('_node_bindings', '_edge_bindings', '_id', '_description', '_essence', '_essence_category', '_row_data', '_score', '_score_name', '_score_direction', '_confidence', '_result_group', '_result_group_similarity_score', '_reasoner_id')
+
+    openapi_types = {
+        'node_bindings': Dict[str, List[NodeBinding]],
+        'edge_bindings': Dict[str, List[EdgeBinding]],
+        'id': str,
+        'description': str,
+        'essence': str,
+        'essence_category': str,
+        'row_data': List[str],
+        'score': float,
+        'score_name': str,
+        'score_direction': str,
+        'confidence': float,
+        'result_group': int,
+        'result_group_similarity_score': float,
+        'reasoner_id': str
+    }
+
+    attribute_map = {
+        'node_bindings': 'node_bindings',
+        'edge_bindings': 'edge_bindings',
+        'id': 'id',
+        'description': 'description',
+        'essence': 'essence',
+        'essence_category': 'essence_category',
+        'row_data': 'row_data',
+        'score': 'score',
+        'score_name': 'score_name',
+        'score_direction': 'score_direction',
+        'confidence': 'confidence',
+        'result_group': 'result_group',
+        'result_group_similarity_score': 'result_group_similarity_score',
+        'reasoner_id': 'reasoner_id'
+    }
+
     def __init__(self, node_bindings=None, edge_bindings=None, id=None, description=None, essence=None, essence_category=None, row_data=None, score=None, score_name=None, score_direction=None, confidence=None, result_group=None, result_group_similarity_score=None, reasoner_id=None):  # noqa: E501
         """Result - a model defined in OpenAPI
 
@@ -51,40 +87,6 @@ class Result(Model):
         :param reasoner_id: The reasoner_id of this Result.  # noqa: E501
         :type reasoner_id: str
         """
-        self.openapi_types = {
-            'node_bindings': Dict[str, List[NodeBinding]],
-            'edge_bindings': Dict[str, List[EdgeBinding]],
-            'id': str,
-            'description': str,
-            'essence': str,
-            'essence_category': str,
-            'row_data': List[str],
-            'score': float,
-            'score_name': str,
-            'score_direction': str,
-            'confidence': float,
-            'result_group': int,
-            'result_group_similarity_score': float,
-            'reasoner_id': str
-        }
-
-        self.attribute_map = {
-            'node_bindings': 'node_bindings',
-            'edge_bindings': 'edge_bindings',
-            'id': 'id',
-            'description': 'description',
-            'essence': 'essence',
-            'essence_category': 'essence_category',
-            'row_data': 'row_data',
-            'score': 'score',
-            'score_name': 'score_name',
-            'score_direction': 'score_direction',
-            'confidence': 'confidence',
-            'result_group': 'result_group',
-            'result_group_similarity_score': 'result_group_similarity_score',
-            'reasoner_id': 'reasoner_id'
-        }
-
         self._node_bindings = node_bindings
         self._edge_bindings = edge_bindings
         self._id = id
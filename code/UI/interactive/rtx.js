@@ -278,6 +278,7 @@ function postQuery(qtype) {
     sesame('openmax',statusdiv);
 
     add_to_dev_info("Posted to QUERY",queryObj);
+    var streamedResults = [];
     fetch(baseAPI + "api/arax/v1.0/query", {
 	method: 'post',
 	body: JSON.stringify(queryObj),
@@ -287,6 +288,7 @@ function postQuery(qtype) {
 	var partialMsg = '';
 	var enqueue = false;
 	var numCurrMsgs = 0;
+	var numStreamedResults = 0;
 	var totalSteps = 0;
 	var finishedSteps = 0;
 	var decoder = new TextDecoder();
@@ -350,6 +352,14 @@ function postQuery(qtype) {
 			    cmddiv.appendChild(document.createElement("br"));
 			    cmddiv.scrollTop = cmddiv.scrollHeight;
 			}
+			else if (jsonMsg.result) {
+			    // final results are streamed ahead of the full response (which then leaves them out)
+			    streamedResults.push(jsonMsg.result);
+			    numStreamedResults++;
+			    cmddiv.appendChild(document.createTextNode('Result\u00A0'+numStreamedResults+':\u00A0'+jsonMsg.result.essence+'\u00A0('+jsonMsg.result.confidence+')'));
+			    cmddiv.appendChild(document.createElement("br"));
+			    cmddiv.scrollTop = cmddiv.scrollHeight;
+			}
 			else {
 			    console.log("bad msg:"+jsonMsg);
 			}
@@ -368,6 +378,8 @@ function postQuery(qtype) {
     })
         .then(response => {
 	    var data = JSON.parse(response);
+	    if (data.message && data.message.results == null && streamedResults.length > 0)
+		data.message.results = streamedResults;
 
 	    var dev = document.getElementById("devdiv");
             dev.appendChild(document.createElement("br"));
@@ -0,0 +1,86 @@
+#!/bin/env python3
+"""
+This module provides a bounded, thread-safe, process-wide LRU cache for values looked up in (or computed from) one of
+ARAX's file-based knowledge stores, e.g., canonical curies from node_synonymizer.sqlite or NGD values from
+curie_to_pmids.sqlite. Since those files are only ever replaced wholesale (e.g., when a newer version is downloaded),
+the cache drops all of its entries whenever the file's signature (inode, size and modification time) changes.
+Usage:
+    import database_lru_cache
+    cache = database_lru_cache.DatabaseLRUCache(max_size=100000)
+    cache.check_database("/path/to/node_synonymizer.sqlite")
+    found = cache.get_many(keys)
+    cache.put_many(new_items)
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+
+def get_file_signature(file_path: str) -> Optional[Tuple[int, int, int]]:
+    """
+    Returns what identifies the current version of a file: its inode, size and modification time (None if it doesn't
+    exist). Any change means the file has been replaced or modified.
+    """
+    try:
+        file_stat = os.stat(file_path)
+    except OSError:
+        return None
+    return file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns
+
+
+class DatabaseLRUCache:
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.database_signature = None
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+    def check_database(self, database_path: str):
+        # Drop all entries if the database file has been replaced or modified since they were cached
+        signature = get_file_signature(database_path)
+        with self.lock:
+            if signature != self.database_signature:
+                if self.entries:
+                    self.stats['invalidations'] += 1
+                self.entries.clear()
+                self.database_signature = signature
+
+    def get_many(self, keys: Iterable) -> Dict[Any, Any]:
+        # Returns a dict of key -> cached value for the keys that are in the cache
+        keys = list(keys)
+        found = dict()
+        with self.lock:
+            for key in keys:
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+                    found[key] = self.entries[key]
+            self.stats['hits'] += len(found)
+            self.stats['misses'] += len(keys) - len(found)
+        return found
+
+    def put_many(self, items: Iterable[Tuple[Any, Any]]):
+        if self.max_size <= 0:
+            return
+        with self.lock:
+            for key, value in items:
+                self.entries[key] = value
+                self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            stats = dict(self.stats)
+            stats['size'] = len(self.entries)
+        stats['max_size'] = self.max_size
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
@@ -13,10 +13,9 @@ import traceback
 
 from datetime import datetime
 from typing import List, Dict, Tuple, Union
-from neo4j import GraphDatabase
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../../")  # code directory
-from RTXConfiguration import RTXConfiguration
+import neo4j_driver_pool
 sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../../ARAX/NodeSynonymizer/")
 from node_synonymizer import NodeSynonymizer
 
@@ -26,19 +25,14 @@ ARRAY_EDGE_PROPERTIES = ["provided_by", "publications"]
 
 def _run_kg2_cypher_query(cypher_query: str) -> List[Dict[str, any]]:
     # This function sends a cypher query to the KG2 neo4j specified in config.json and returns the results
-    rtxc = RTXConfiguration()
-    rtxc.live = "KG2"
     try:
-        driver = GraphDatabase.driver(rtxc.neo4j_bolt, auth=(rtxc.neo4j_username, rtxc.neo4j_password))
-        with driver.session() as session:
-            print(f"  Sending cypher query to KG2 neo4j..")
-            query_results = session.run(cypher_query).data()
-            print(f"  Got {len(query_results)} results back from neo4j")
-        driver.close()
+        print(f"  Sending cypher query to KG2 neo4j..")
+        query_results = neo4j_driver_pool.run_read_query(cypher_query, live="KG2")
+        print(f"  Got {len(query_results)} results back from neo4j")
     except Exception:
         tb = traceback.format_exc()
         error_type, error, _ = sys.exc_info()
-        print(f"ERROR: Encountered a problem interacting with {rtxc.neo4j_bolt}. {tb}")
+        print(f"ERROR: Encountered a problem interacting with KG2 neo4j. {tb}")
         return []
     else:
         return query_results
@@ -0,0 +1,169 @@
+#!/bin/env python3
+"""
+This module maintains one process-wide neo4j driver per (bolt URL, credentials), so that the Bolt connection pool is
+shared by every caller (and every thread) instead of each query paying for a fresh TCP/Bolt handshake.
+Usage:
+    import neo4j_driver_pool
+    results = neo4j_driver_pool.run_read_query("MATCH (n) RETURN n.id LIMIT 1", live="KG2")
+    with neo4j_driver_pool.checkout_session(live="KG2") as session:
+        ...
+"""
+import atexit
+import sys
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Dict, Optional, Tuple
+
+from neo4j import GraphDatabase
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))  # code directory
+from RTXConfiguration import RTXConfiguration
+
+MAX_SESSIONS_PER_DRIVER = 50
+SESSION_CHECKOUT_TIMEOUT = 120  # Seconds to wait for a free session before giving up
+MAX_RETRY_TIME = 30  # Seconds the driver will keep retrying a read transaction that fails with a transient error
+
+_drivers = dict()  # Maps (bolt, username, password) to a (driver, session semaphore) tuple
+_drivers_lock = threading.Lock()
+_metrics = {"drivers_created": 0, "sessions_checked_out": 0, "queries_run": 0, "query_errors": 0,
+            "total_pool_wait_seconds": 0.0, "max_pool_wait_seconds": 0.0, "total_query_seconds": 0.0,
+            "max_query_seconds": 0.0}
+_metrics_lock = threading.Lock()
+
+
+def _get_credentials(live: Optional[str]) -> Tuple[str, str, str]:
+    rtxc = RTXConfiguration()
+    if live:
+        rtxc.live = live
+    return rtxc.neo4j_bolt, rtxc.neo4j_username, rtxc.neo4j_password
+
+
+def _get_driver_and_semaphore(live: Optional[str] = None, bolt: Optional[str] = None, username: Optional[str] = None,
+                              password: Optional[str] = None) -> Tuple[any, threading.BoundedSemaphore]:
+    if not bolt:
+        bolt, username, password = _get_credentials(live)
+    driver_key = (bolt, username, password)
+    # Avoid taking the lock in the common case where the driver already exists
+    driver_info = _drivers.get(driver_key)
+    if driver_info:
+        return driver_info
+    with _drivers_lock:
+        if driver_key not in _drivers:
+            driver = GraphDatabase.driver(bolt, auth=(username, password),
+                                          max_connection_pool_size=MAX_SESSIONS_PER_DRIVER,
+                                          connection_acquisition_timeout=SESSION_CHECKOUT_TIMEOUT,
+                                          max_retry_time=MAX_RETRY_TIME)
+            _drivers[driver_key] = (driver, threading.BoundedSemaphore(MAX_SESSIONS_PER_DRIVER))
+            _record_metrics(drivers_created=1)
+        return _drivers[driver_key]
+
+
+def get_driver(live: Optional[str] = None, bolt: Optional[str] = None, username: Optional[str] = None,
+               password: Optional[str] = None):
+    """
+    Returns the shared driver for the given RTXConfiguration 'live' setting (e.g., "KG2", "KG2C") or for the explicitly
+    provided bolt URL/credentials. Callers must not close the returned driver.
+    """
+    driver, _ = _get_driver_and_semaphore(live, bolt, username, password)
+    return driver
+
+
+@contextmanager
+def checkout_session(live: Optional[str] = None, bolt: Optional[str] = None, username: Optional[str] = None,
+                     password: Optional[str] = None):
+    """
+    Checks out a session from the shared driver, waiting if MAX_SESSIONS_PER_DRIVER sessions are already in use.
+    The session is closed (and its connection returned to the pool) when the 'with' block exits.
+    """
+    driver, semaphore = _get_driver_and_semaphore(live, bolt, username, password)
+    wait_start = time.time()
+    if not semaphore.acquire(timeout=SESSION_CHECKOUT_TIMEOUT):
+        raise TimeoutError(f"Timed out after {SESSION_CHECKOUT_TIMEOUT} seconds waiting for a neo4j session")
+    wait_time = time.time() - wait_start
+    _record_metrics(sessions_checked_out=1, total_pool_wait_seconds=wait_time, max_pool_wait_seconds=wait_time)
+    try:
+        with driver.session() as session:
+            yield session
+    finally:
+        semaphore.release()
+
+
+def run_read_query(cypher_query: str, live: Optional[str] = None, parameters: Optional[Dict[str, any]] = None,
+                   bolt: Optional[str] = None, username: Optional[str] = None,
+                   password: Optional[str] = None) -> List[Dict[str, any]]:
+    """
+    Runs the given cypher query in a read transaction (which the driver retries on transient errors) and returns the
+    results as a list of dictionaries.
+    """
+    query_start = time.time()
+    try:
+        with checkout_session(live, bolt, username, password) as session:
+            query_results = session.read_transaction(lambda tx: tx.run(cypher_query, parameters).data())
+    except Exception:
+        _record_metrics(query_errors=1)
+        raise
+    finally:
+        query_time = time.time() - query_start
+        _record_metrics(queries_run=1, total_query_seconds=query_time, max_query_seconds=query_time)
+    return query_results
+
+
+def stream_read_query(cypher_query: str, live: Optional[str] = None, parameters: Optional[Dict[str, any]] = None,
+                      bolt: Optional[str] = None, username: Optional[str] = None,
+                      password: Optional[str] = None) -> Iterator[Dict[str, any]]:
+    """
+    Runs the given cypher query and yields its result rows (as dictionaries) as they arrive from the server, rather
+    than materializing all of them first. Unlike run_read_query(), failed queries are not retried, since rows may
+    already have been consumed. Callers can stop iterating early; the session is closed when the generator is.
+    """
+    query_start = time.time()
+    try:
+        with checkout_session(live, bolt, username, password) as session:
+            for record in session.run(cypher_query, parameters):
+                yield record.data()
+    except Exception:
+        _record_metrics(query_errors=1)
+        raise
+    finally:
+        query_time = time.time() - query_start
+        _record_metrics(queries_run=1, total_query_seconds=query_time, max_query_seconds=query_time)
+
+
+def get_metrics() -> Dict[str, any]:
+    with _metrics_lock:
+        metrics = dict(_metrics)
+    metrics["drivers_open"] = len(_drivers)
+    metrics["mean_pool_wait_seconds"] = metrics["total_pool_wait_seconds"] / metrics["sessions_checked_out"] if metrics["sessions_checked_out"] else 0.0
+    metrics["mean_query_seconds"] = metrics["total_query_seconds"] / metrics["queries_run"] if metrics["queries_run"] else 0.0
+    return metrics
+
+
+def close_all():
+    with _drivers_lock:
+        for driver, _ in _drivers.values():
+            driver.close()
+        _drivers.clear()
+
+
+def _record_metrics(**increments):
+    with _metrics_lock:
+        for metric_name, value in increments.items():
+            if metric_name.startswith("max_"):
+                _metrics[metric_name] = max(_metrics[metric_name], value)
+            else:
+                _metrics[metric_name] += value
+
+
+atexit.register(close_all)
+
+
+def main():
+    results = run_read_query("MATCH (n) RETURN n.id AS id LIMIT 1", live="KG2")
+    print(results)
+    print(get_metrics())
+
+
+if __name__ == "__main__":
+    main()
@@ -27,6 +27,7 @@ import argparse
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../../")  # code directory
 from RTXConfiguration import RTXConfiguration
+import neo4j_driver_pool
 
 # NOTE to users:  neo4j password hard-coded (see NEO4J_PASSWORD below)
 # nodetype+name together uniquely define a node
@@ -453,9 +454,10 @@ class Orangeboard:
         assert self.neo4j_user is not None
         assert self.neo4j_password is not None
 
-        self.driver = neo4j.v1.GraphDatabase.driver(self.neo4j_url,
-                                                    auth=(self.neo4j_user,
-                                                          self.neo4j_password))
+        # The driver is shared process-wide (see neo4j_driver_pool), so it must not be closed here
+        self.driver = neo4j_driver_pool.get_driver(bolt=self.neo4j_url,
+                                                   username=self.neo4j_user,
+                                                   password=self.neo4j_password)
     # def neo4j_shutdown(self):
     #     """shuts down the Orangeboard by disconnecting from the Neo4j database
     #
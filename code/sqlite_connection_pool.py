@@ -0,0 +1,116 @@
+#!/bin/env python3
+"""
+This module hands out shared, read-only connections to ARAX's (multi-GB, never modified at runtime) sqlite knowledge
+stores, e.g., node_synonymizer.sqlite, curie_to_pmids.sqlite, the COHD database, GRAPH.sqlite and
+DTD_probability_database.db. Each thread gets one connection per database file, which is opened with mode=ro and
+immutable=1 (so sqlite skips file locking and change detection) and memory-maps the file, so that pages are shared
+via the OS page cache instead of being copied into a private cache per connection.
+Usage:
+    import sqlite_connection_pool
+    connection = sqlite_connection_pool.get_connection("/path/to/node_synonymizer.sqlite")
+    rows = connection.execute("SELECT ...", parameters).fetchall()
+Connections are owned by this module: callers must not close them. Batched lookups should bind at most
+MAX_SQL_PARAMETERS values per statement.
+"""
+import os
+import sqlite3
+import threading
+import urllib.parse
+from typing import Dict
+
+from database_lru_cache import get_file_signature
+
+MMAP_SIZE = 16 * 1024 ** 3  # Bytes of each database file to memory-map (sqlite caps this at the file's size)
+CACHE_SIZE_KIB = 64 * 1024  # Size of sqlite's own per-connection page cache (for pages that aren't mmapped)
+
+
+def _get_max_sql_parameters() -> int:
+    # The most values sqlite lets a single statement bind (e.g., in an IN ( ?,?,... ) lookup), which depends on how
+    # sqlite was compiled; if Python can't tell us (before 3.11), assume the default of sqlite builds before 3.32.
+    # Some builds allow hundreds of thousands, but statements that long don't make lookups any faster
+    connection = sqlite3.connect(":memory:")
+    try:
+        return min(connection.getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER), 32766)
+    except AttributeError:
+        return 999
+    finally:
+        connection.close()
+
+
+MAX_SQL_PARAMETERS = _get_max_sql_parameters()
+_local = threading.local()  # Each thread's connections, as a dict mapping database path to (connection, signature)
+_metrics = {"connections_opened": 0, "connections_reused": 0, "connections_reopened": 0}
+_metrics_lock = threading.Lock()
+
+
+def _open_connection(database_path: str) -> sqlite3.Connection:
+    uri = f"file:{urllib.parse.quote(database_path)}?mode=ro&immutable=1"
+    # Connections aren't shared between threads by this module, but tolerate objects that were created in one thread
+    # and then used in another (e.g., during Expand's concurrent qedge expansions)
+    connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    connection.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    connection.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB}")
+    connection.execute("PRAGMA query_only = ON")
+    return connection
+
+
+def get_connection(database_path: str) -> sqlite3.Connection:
+    """
+    Returns this thread's read-only connection to the given sqlite file, opening one if needed. If the file has been
+    replaced or modified since the connection was opened (e.g., a newer version was downloaded), a fresh connection
+    is opened, since immutable connections don't notice changes on their own.
+    """
+    database_path = os.path.abspath(database_path)
+    if not os.path.exists(database_path):
+        raise FileNotFoundError(f"sqlite database {database_path} does not exist")
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = dict()
+    signature = get_file_signature(database_path)
+    connection_info = connections.get(database_path)
+    if connection_info and connection_info[1] == signature:
+        _record_metrics(connections_reused=1)
+        return connection_info[0]
+    if connection_info:
+        # Objects may still hold the old connection, so leave it to be closed once they let go of it
+        _record_metrics(connections_reopened=1)
+    connection = _open_connection(database_path)
+    connections[database_path] = (connection, signature)
+    _record_metrics(connections_opened=1)
+    return connection
+
+
+def close_thread_connections():
+    """
+    Closes all of the current thread's connections (e.g., before a worker thread exits).
+    """
+    connections = getattr(_local, "connections", dict())
+    for connection, _ in connections.values():
+        connection.close()
+    connections.clear()
+
+
+def get_metrics() -> Dict[str, int]:
+    with _metrics_lock:
+        return dict(_metrics)
+
+
+def _record_metrics(**increments):
+    with _metrics_lock:
+        for metric_name, value in increments.items():
+            _metrics[metric_name] += value
+
+
+def main():
+    import argparse
+    arg_parser = argparse.ArgumentParser(description="Runs a query against a sqlite file using a shared read-only connection")
+    arg_parser.add_argument("database_path")
+    arg_parser.add_argument("query")
+    args = arg_parser.parse_args()
+    for row in get_connection(args.database_path).execute(args.query):
+        print(row)
+    print(get_metrics())
+
+
+if __name__ == "__main__":
+    main()